@@ -350,6 +350,7 @@ from snapcraft._store import (  # noqa
     list_registered,
     login,
     push,
+    push_many,
     push_metadata,
     register,
     register_key,
@@ -14,28 +14,30 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
+import concurrent.futures
 import contextlib
 import getpass
 import hashlib
+import io
 import json
 import logging
 import operator
 import os
 import re
 import subprocess
-import tempfile
 from datetime import datetime
 from subprocess import Popen
-from typing import Dict, Iterable, TextIO
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Tuple  # noqa
 
 # Ideally we would move stuff into more logical components
 from snapcraft.cli import echo
 from tabulate import tabulate
 
-from snapcraft.file_utils import calculate_sha3_384, get_tool_path
+from snapcraft.file_utils import calculate_sha3_384
 from snapcraft import storeapi, yaml_utils
-from snapcraft.internal import cache, deltas, repo
-from snapcraft.internal.errors import SnapDataExtractionError
+from snapcraft.internal import cache, deltas, repo, squashfs
+from snapcraft.internal.errors import InvalidSquashFSError, SnapDataExtractionError
 from snapcraft.internal.deltas.errors import (
     DeltaGenerationError,
     DeltaGenerationTooBigError,
@@ -47,53 +49,28 @@ logger = logging.getLogger(__name__)
 
 
 def _get_data_from_snap_file(snap_path):
-    with tempfile.TemporaryDirectory() as temp_dir:
-        unsquashfs_path = get_tool_path("unsquashfs")
-        try:
-            output = subprocess.check_output(
-                [
-                    unsquashfs_path,
-                    "-d",
-                    os.path.join(temp_dir, "squashfs-root"),
-                    snap_path,
-                    "-e",
-                    os.path.join("meta", "snap.yaml"),
-                ]
-            )
-        except subprocess.CalledProcessError:
-            raise SnapDataExtractionError(os.path.basename(snap_path))
-        logger.debug(output)
-        with open(
-            os.path.join(temp_dir, "squashfs-root", "meta", "snap.yaml")
-        ) as yaml_file:
-            snap_yaml = yaml_utils.load(yaml_file)
+    try:
+        with squashfs.open_image(snap_path) as snap:
+            with snap.open("meta/snap.yaml") as yaml_file:
+                snap_yaml = yaml_utils.load(io.TextIOWrapper(yaml_file))
+    except (OSError, InvalidSquashFSError) as e:
+        raise SnapDataExtractionError(os.path.basename(snap_path)) from e
     return snap_yaml
 
 
 @contextlib.contextmanager
 def _get_icon_from_snap_file(snap_path):
-    icon_file = None
-    with tempfile.TemporaryDirectory() as temp_dir:
-        unsquashfs_path = get_tool_path("unsquashfs")
-        try:
-            output = subprocess.check_output(
-                [
-                    unsquashfs_path,
-                    "-d",
-                    os.path.join(temp_dir, "squashfs-root"),
-                    snap_path,
-                    "-e",
-                    "meta/gui",
-                ]
-            )
-        except subprocess.CalledProcessError:
-            raise SnapDataExtractionError(os.path.basename(snap_path))
-        logger.debug("Output extracting icon from snap: %s", output)
+    try:
+        snap = squashfs.open_image(snap_path)
+    except (OSError, InvalidSquashFSError) as e:
+        raise SnapDataExtractionError(os.path.basename(snap_path)) from e
+
+    with snap:
+        icon_file = None
         for extension in ("png", "svg"):
-            icon_name = "icon.{}".format(extension)
-            icon_path = os.path.join(temp_dir, "squashfs-root", "meta/gui", icon_name)
-            if os.path.exists(icon_path):
-                icon_file = open(icon_path, "rb")
+            icon_path = "meta/gui/icon.{}".format(extension)
+            if snap.exists(icon_path):
+                icon_file = snap.open(icon_path)
                 break
         try:
             yield icon_file
@@ -553,10 +530,9 @@ def push(snap_filename, release_channels=None):
     with contextlib.suppress(KeyError):
         arch = snap_yaml["architectures"][0]
 
-    source_snap = snap_cache.get(deb_arch=arch)
-    sha3_384_available = hasattr(hashlib, "sha3_384")
+    source_snap = _get_delta_source(snap_cache, arch, snap_filename)
 
-    if sha3_384_available and source_snap:
+    if source_snap:
         try:
             result = _push_delta(snap_name, snap_filename, source_snap)
         except storeapi.errors.StoreDeltaApplicationError as e:
@@ -595,7 +571,64 @@ def _push_snap(snap_name, snap_filename):
 
 def _push_delta(snap_name, snap_filename, source_snap):
     store = storeapi.StoreClient()
-    delta_format = "xdelta3"
+    delta_filename, snap_hashes = _generate_delta(snap_filename, source_snap)
+
+    try:
+        with _requires_login():
+            delta_tracker = _upload_delta(store, snap_name, delta_filename, snap_hashes)
+        result = delta_tracker.track()
+        _raise_for_delta_code(delta_tracker)
+    finally:
+        _remove_delta(delta_filename)
+    return result
+
+
+def _get_delta_source(snap_cache, arch, snap_filename):
+    """Get the cached revision to generate a delta for snap_filename from.
+
+    The cached revision that has the most files in common with the snap is
+    picked, and no delta is generated at all if the delta is estimated to
+    be too large to be worth it.
+
+    :returns: the path to the cached revision, or None to push the full
+              snap.
+    """
+    if not hasattr(hashlib, "sha3_384"):
+        return None
+    # Reading the snap is only worth it if there is a revision to compare
+    # it to.
+    if snap_cache.get(deb_arch=arch) is None:
+        return None
+
+    try:
+        target_manifest = snap_cache.get_manifest(snap_filename)
+    except (OSError, InvalidSquashFSError) as e:
+        logger.debug("Unable to read manifest of {!r}: {}".format(snap_filename, e))
+        return snap_cache.get(deb_arch=arch)
+
+    source_snap = snap_cache.get_delta_source(
+        deb_arch=arch, target_manifest=target_manifest
+    )
+    if not source_snap:
+        return None
+
+    target_size = os.path.getsize(snap_filename)
+    delta_size = deltas.estimate_delta_size(
+        source_manifest=snap_cache.get_manifest(source_snap),
+        target_manifest=target_manifest,
+        target_size=target_size,
+    )
+    min_pct = deltas.BaseDeltasGenerator.delta_size_min_pct
+    if delta_size * 100 >= target_size * min_pct:
+        logger.info(
+            "A delta for {!r} is estimated to be over {}% of its size, "
+            "pushing full snap...".format(os.path.basename(snap_filename), min_pct)
+        )
+        return None
+    return source_snap
+
+
+def _generate_delta(snap_filename, source_snap):
     logger.debug("Found cached source snap {}.".format(source_snap))
     target_snap = os.path.join(os.getcwd(), snap_filename)
 
@@ -612,34 +645,255 @@ def _push_delta(snap_name, snap_filename, source_snap):
         "target_hash": calculate_sha3_384(target_snap),
         "delta_hash": calculate_sha3_384(delta_filename),
     }
+    return delta_filename, snap_hashes
 
+
+def _upload_delta(store, snap_name, delta_filename, snap_hashes):
+    logger.debug("Pushing delta {!r}.".format(delta_filename))
+    try:
+        return store.upload(
+            snap_name,
+            delta_filename,
+            delta_format="xdelta3",
+            source_hash=snap_hashes["source_hash"],
+            target_hash=snap_hashes["target_hash"],
+            delta_hash=snap_hashes["delta_hash"],
+        )
+    except storeapi.errors.StoreServerError as e:
+        raise storeapi.errors.StorePushError(snap_name, e.response)
+
+
+def _raise_for_delta_code(delta_tracker):
     try:
-        logger.debug("Pushing delta {!r}.".format(delta_filename))
-        with _requires_login():
-            delta_tracker = store.upload(
-                snap_name,
-                delta_filename,
-                delta_format=delta_format,
-                source_hash=snap_hashes["source_hash"],
-                target_hash=snap_hashes["target_hash"],
-                delta_hash=snap_hashes["delta_hash"],
-            )
-        result = delta_tracker.track()
         delta_tracker.raise_for_code()
     except storeapi.errors.StoreReviewError as e:
         if e.code == "processing_upload_delta_error":
             raise storeapi.errors.StoreDeltaApplicationError(str(e))
         else:
             raise
-    except storeapi.errors.StoreServerError as e:
-        raise storeapi.errors.StorePushError(snap_name, e.response)
-    finally:
-        if os.path.isfile(delta_filename):
-            try:
-                os.remove(delta_filename)
-            except OSError:
-                logger.warning("Unable to remove delta {}.".format(delta_filename))
-    return result
+
+
+def _remove_delta(delta_filename):
+    if os.path.isfile(delta_filename):
+        try:
+            os.remove(delta_filename)
+        except OSError:
+            logger.warning("Unable to remove delta {}.".format(delta_filename))
+
+
+class _PushJob:
+    """A snap file being pushed by push_many."""
+
+    def __init__(self, snap_filename):
+        self.snap_filename = snap_filename
+        snap_yaml = _get_data_from_snap_file(snap_filename)
+        self.snap_name = snap_yaml["name"]
+        self.arch = "all"
+        with contextlib.suppress(KeyError):
+            self.arch = snap_yaml["architectures"][0]
+        self.snap_cache = cache.SnapCache(project_name=self.snap_name)
+        self.use_delta = True
+        self.delta = None  # type: Optional[Tuple[str, Dict[str, str]]]
+        self.tracker = None
+        self.result = None  # type: Optional[Dict[str, Any]]
+        self.error = None  # type: Optional[Exception]
+        self.released = []  # type: List[str]
+
+    @property
+    def upload_type(self):
+        return "delta" if self.delta else "full"
+
+    def prepare(self):
+        # Generating a delta is the slow part before uploading, it is run
+        # for several snaps at a time.
+        if not self.use_delta:
+            return
+        source_snap = _get_delta_source(self.snap_cache, self.arch, self.snap_filename)
+        if not source_snap:
+            return
+        try:
+            self.delta = _generate_delta(self.snap_filename, source_snap)
+        except storeapi.errors.StoreDeltaApplicationError as e:
+            logger.warning(
+                "Error generating delta for {!r}: {}\n"
+                "Falling back to pushing full snap...".format(self.snap_filename, e)
+            )
+
+    def upload(self, store):
+        try:
+            if self.delta:
+                self._upload_delta(store)
+            if not self.tracker:
+                self.tracker = store.upload(self.snap_name, self.snap_filename)
+        except storeapi.errors.InvalidCredentialsError:
+            raise
+        except storeapi.errors.StoreError as e:
+            self.error = e
+
+    def _upload_delta(self, store):
+        delta_filename, snap_hashes = self.delta
+        try:
+            self.tracker = _upload_delta(
+                store, self.snap_name, delta_filename, snap_hashes
+            )
+        except storeapi.errors.StorePushError as e:
+            logger.warning(
+                "Unable to push delta for {!r} to store: {}\n"
+                "Falling back to pushing full snap...".format(
+                    self.snap_filename, e.error_list[0].get("message")
+                )
+            )
+            self.use_delta = False
+            self.delta = None
+        finally:
+            _remove_delta(delta_filename)
+
+    def check_result(self, result):
+        """Check the result of processing the upload.
+
+        :returns: True if the full snap needs to be uploaded again.
+        """
+        if isinstance(result, Exception):
+            # The status of the upload could not be polled.
+            self.error = result
+            return False
+        try:
+            if self.delta:
+                _raise_for_delta_code(self.tracker)
+            else:
+                self.tracker.raise_for_code()
+        except storeapi.errors.StoreDeltaApplicationError as e:
+            logger.warning(
+                "Error processing delta for {!r}: {}\n"
+                "Falling back to pushing full snap...".format(self.snap_filename, e)
+            )
+            self.use_delta = False
+            self.delta = None
+            self.tracker = None
+            return True
+        except storeapi.errors.StoreError as e:
+            self.error = e
+        else:
+            self.result = result
+            logger.info(
+                "Revision {!r} of {!r} created.".format(
+                    result["revision"], self.snap_name
+                )
+            )
+        return False
+
+
+def push_many(snap_filenames, release_channels=None):
+    """Push several snap files to the store.
+
+    Each file is pushed like push does, but as a pipeline: deltas are
+    generated for some files while others are uploaded, the processing of
+    all uploads by the store is tracked at once and a single store client
+    is shared, and with it its connections and macaroon refreshes. A
+    summary of all the pushes is printed at the end.
+
+    :param list snap_filenames: the snap files to push.
+    :param list release_channels: the channels to release every snap to
+                                  if the store deems it ready to release.
+    :raises Exception: the first error of the pushes that failed, be it a
+                       StoreError or an error polling the status of an
+                       upload, after the summary.
+    """
+    jobs = [_PushJob(snap_filename) for snap_filename in snap_filenames]
+    store = storeapi.StoreClient()
+
+    with _requires_login():
+        for snap_name in collections.OrderedDict.fromkeys(j.snap_name for j in jobs):
+            logger.debug("Run push precheck for {!r}.".format(snap_name))
+            store.push_precheck(snap_name)
+
+        _upload_jobs(store, jobs)
+        retry_jobs = _track_jobs([j for j in jobs if j.tracker])
+        if retry_jobs:
+            # The uploads of deltas the store could not apply.
+            _upload_jobs(store, retry_jobs)
+            _track_jobs([j for j in retry_jobs if j.tracker])
+
+        if release_channels:
+            for job in jobs:
+                _release_job(store, job, release_channels)
+
+    for job in jobs:
+        if job.result:
+            job.snap_cache.cache(snap_filename=job.snap_filename)
+            job.snap_cache.prune(
+                deb_arch=job.arch, keep_hash=calculate_sha3_384(job.snap_filename)
+            )
+
+    # This does not look good in green so we print instead
+    print(_tabulated_push_jobs(jobs))
+
+    failures = [job.error for job in jobs if job.error]
+    if failures:
+        raise failures[0]
+
+
+def _upload_jobs(store, jobs):
+    # Uploads are done one at a time, as they share the bandwidth, but each
+    # starts as soon as its delta is ready.
+    workers = min(len(jobs), os.cpu_count() or 1)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as delta_executor:
+        prepared = [delta_executor.submit(job.prepare) for job in jobs]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as upload_executor:
+            uploads = []
+            for job, future in zip(jobs, prepared):
+                future.result()
+                uploads.append(upload_executor.submit(job.upload, store))
+            for future in uploads:
+                future.result()
+
+
+def _track_jobs(jobs):
+    if not jobs:
+        return []
+    results = storeapi.track_all([job.tracker for job in jobs], return_exceptions=True)
+    return [job for job, result in zip(jobs, results) if job.check_result(result)]
+
+
+def _release_job(store, job, release_channels):
+    if not job.result:
+        return
+    try:
+        channels = store.release(
+            job.snap_name, job.result["revision"], release_channels
+        )
+    except storeapi.errors.InvalidCredentialsError:
+        raise
+    except storeapi.errors.StoreError as e:
+        job.error = e
+        return
+    job.released = release_channels
+    if "opened_channels" in channels:
+        logger.info(_get_text_for_opened_channels(channels["opened_channels"]))
+
+
+def _tabulated_push_jobs(jobs):
+    headers = ["Snap", "Name", "Arch", "Upload", "Revision", "Status", "Released"]
+    rows = []
+    for job in jobs:
+        if job.error:
+            status = "failed"
+        elif job.result:
+            status = job.result["code"]
+        else:
+            status = "-"
+        rows.append(
+            [
+                os.path.basename(job.snap_filename),
+                job.snap_name,
+                job.arch,
+                job.upload_type if job.tracker else "-",
+                job.result["revision"] if job.result else "-",
+                status,
+                ", ".join(job.released) or "-",
+            ]
+        )
+    return tabulate(rows, headers=headers, tablefmt="plain")
 
 
 def _get_text_for_opened_channels(opened_channels):
@@ -32,6 +32,7 @@ _BUILD_OPTION_NAMES = [
     "--shell",
     "--shell-after",
     "--destructive-mode",
+    "--parallel-parts",
 ]
 
 _BUILD_OPTIONS = [
@@ -42,6 +43,11 @@ _BUILD_OPTIONS = [
     dict(
         is_flag=True, help="Forces snapcraft to try and use the current host to build."
     ),
+    dict(
+        metavar="<n>",
+        type=click.IntRange(min=1),
+        help="Pull and build up to <n> independent parts at the same time.",
+    ),
 ]
 
 
@@ -24,6 +24,7 @@ import click
 import snapcraft
 from snapcraft.internal import log
 from .assertions import assertionscli
+from .cache import cachecli
 from .containers import containerscli
 from .discovery import discoverycli
 from .legacy import legacycli
@@ -51,6 +52,7 @@ command_groups = [
     extensioncli,
     versioncli,
     inspectcli,
+    cachecli,
 ]
 
 
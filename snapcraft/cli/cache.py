@@ -0,0 +1,111 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import os
+import time
+
+import click
+import tabulate
+
+from snapcraft.internal import cache
+
+
+_SIZE_UNITS = collections.OrderedDict(
+    [("B", 1), ("K", 2 ** 10), ("M", 2 ** 20), ("G", 2 ** 30), ("T", 2 ** 40)]
+)
+
+
+class _SizeType(click.ParamType):
+    name = "size"
+
+    def convert(self, value, param, ctx):
+        value = value.strip().upper()
+        unit = value[-1:] if value[-1:] in _SIZE_UNITS else "B"
+        try:
+            return int(float(value.rstrip(unit)) * _SIZE_UNITS[unit])
+        except ValueError:
+            self.fail("{!r} is not a size, e.g. 500M or 2G.".format(value), param, ctx)
+
+
+@click.group()
+def cachecli():
+    pass
+
+
+@cachecli.group("cache")
+def cache_group():
+    """Manage the snapcraft cache."""
+
+
+@cache_group.command()
+@click.option(
+    "--max-size",
+    type=_SizeType(),
+    help="Size to prune each cache to instead of its budget, e.g. 500M or 2G.",
+)
+def prune(max_size):
+    """Evict the least recently used entries from the caches over budget."""
+    snapcraft_cache = cache.SnapcraftCache()
+    for index in snapcraft_cache.get_indexes():
+        namespace = os.path.relpath(index.root, snapcraft_cache.cache_root)
+        size = index.stats()["size"]
+        evicted = index.evict(budget=max_size)
+        if evicted:
+            freed = size - index.stats()["size"]
+            click.echo(
+                "Pruned {} entries ({}) from {}.".format(
+                    len(evicted), _format_size(freed), namespace
+                )
+            )
+
+
+@cache_group.command()
+def stats():
+    """Show the size of the caches and their budgets."""
+    snapcraft_cache = cache.SnapcraftCache()
+    rows = []
+    for index in snapcraft_cache.get_indexes():
+        index_stats = index.stats()
+        row = collections.OrderedDict()
+        row["Cache"] = os.path.relpath(index.root, snapcraft_cache.cache_root)
+        row["Entries"] = index_stats["entries"]
+        row["Size"] = _format_size(index_stats["size"])
+        row["Budget"] = _format_size(index_stats["budget"])
+        row["Last used"] = _format_time(index_stats["last_access"])
+        rows.append(row)
+
+    if not rows:
+        click.echo("Nothing is cached.")
+        return
+    click.echo(tabulate.tabulate(rows, headers="keys"))
+
+
+def _format_size(size):
+    if size is None:
+        return "-"
+    for unit, unit_size in reversed(_SIZE_UNITS.items()):
+        if size >= unit_size:
+            break
+    if unit == "B":
+        return "{}B".format(size)
+    return "{:.1f}{}".format(size / unit_size, unit)
+
+
+def _format_time(timestamp):
+    if timestamp is None:
+        return "-"
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
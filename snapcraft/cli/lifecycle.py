@@ -36,6 +36,17 @@ from ._errors import TRACEBACK_MANAGED, TRACEBACK_HOST
 
 logger = logging.getLogger(__name__)
 
+# Where the packing report is written to in build provider instances.
+_PACK_REPORT_MANAGED = "/tmp/snapcraft_pack_report.json"
+
+_compression_option = click.option(
+    "--compression",
+    type=click.Choice(lifecycle.COMPRESSIONS),
+    default="xz",
+    envvar="SNAPCRAFT_PACK_COMPRESSION",
+    help="compression of the snap, only xz snaps are accepted by the store.",
+)
+
 
 if typing.TYPE_CHECKING:
     from snapcraft.internal.project import Project  # noqa: F401
@@ -47,9 +58,11 @@ def _execute(  # noqa: C901
     parts: str,
     pack_project: bool = False,
     output: str = None,
+    compression: str = "xz",
     shell: bool = False,
     shell_after: bool = False,
     destructive_mode: bool = False,
+    parallel_parts: int = None,
     **kwargs
 ) -> "Project":
     _clean_provider_error()
@@ -69,9 +82,11 @@ def _execute(  # noqa: C901
 
     if build_environment.is_managed_host or build_environment.is_host:
         project_config = project_loader.load_config(project)
-        lifecycle.execute(step, project_config, parts)
+        lifecycle.execute(
+            step, project_config, parts, parallel_parts=parallel_parts or 1
+        )
         if pack_project:
-            _pack(project.prime_dir, output=output)
+            _pack(project.prime_dir, output=output, compression=compression)
     else:
         build_provider_class = build_providers.get_provider_for(
             build_environment.provider
@@ -104,11 +119,23 @@ def _execute(  # noqa: C901
                         previous_step = step.previous_step()
                     # steps.PULL is the first step, so we would directly shell into it.
                     if previous_step:
-                        instance.execute_step(previous_step)
+                        instance.execute_step(
+                            previous_step, parallel_parts=parallel_parts
+                        )
                 elif pack_project:
-                    instance.pack_project(output=output)
+                    report_path = os.environ.get("SNAPCRAFT_PACK_REPORT")
+                    instance.pack_project(
+                        output=output,
+                        compression=compression,
+                        parallel_parts=parallel_parts,
+                        report=_PACK_REPORT_MANAGED if report_path else None,
+                    )
+                    if report_path:
+                        instance.pull_file(
+                            _PACK_REPORT_MANAGED, report_path, delete=True
+                        )
                 else:
-                    instance.execute_step(step)
+                    instance.execute_step(step, parallel_parts=parallel_parts)
             except Exception:
                 _retrieve_provider_error(instance)
                 if project.debug:
@@ -125,8 +152,8 @@ def _execute(  # noqa: C901
     return project
 
 
-def _pack(directory: str, *, output: str) -> None:
-    snap_name = lifecycle.pack(directory, output)
+def _pack(directory: str, *, output: str, compression: str = "xz") -> None:
+    snap_name = lifecycle.pack(directory, output, compression=compression)
     echo.info("Snapped {}".format(snap_name))
 
 
@@ -228,28 +255,38 @@ def prime(parts, **kwargs):
 @add_build_options()
 @click.argument("directory", required=False)
 @click.option("--output", "-o", help="path to the resulting snap.")
-def snap(directory, output, **kwargs):
+@_compression_option
+def snap(directory, output, compression, **kwargs):
     """Create a snap.
 
     \b
     Examples:
         snapcraft snap
         snapcraft snap --output renamed-snap.snap
+        snapcraft snap --compression lzo
 
     If you want to snap a directory, you should use the pack command
     instead.
     """
     if directory:
         deprecations.handle_deprecation_notice("dn6")
-        _pack(directory, output=output)
+        _pack(directory, output=output, compression=compression)
     else:
-        _execute(steps.PRIME, parts=[], pack_project=True, output=output, **kwargs)
+        _execute(
+            steps.PRIME,
+            parts=[],
+            pack_project=True,
+            output=output,
+            compression=compression,
+            **kwargs
+        )
 
 
 @lifecyclecli.command()
 @click.argument("directory")
 @click.option("--output", "-o", help="path to the resulting snap.")
-def pack(directory, output, **kwargs):
+@_compression_option
+def pack(directory, output, compression, **kwargs):
     """Create a snap from a directory holding a valid snap.
 
     The layout of <directory> should contain a valid meta/snap.yaml in
@@ -261,7 +298,7 @@ def pack(directory, output, **kwargs):
         snapcraft pack my-snap-directory --output renamed-snap.snap
 
     """
-    _pack(directory, output=output)
+    _pack(directory, output=output, compression=compression)
 
 
 @lifecyclecli.command()
@@ -127,17 +127,22 @@ def register(snap_name, private, store):
     help="Optional comma separated list of channels to release <snap-file>",
 )
 @click.argument(
-    "snap-file",
-    metavar="<snap-file>",
+    "snap-files",
+    metavar="<snap-file>...",
+    nargs=-1,
+    required=True,
     type=click.Path(exists=True, readable=True, resolve_path=True, dir_okay=False),
 )
-def push(snap_file, release):
+def push(snap_files, release):
     """Push <snap-file> to the store.
 
     By passing --release with a comma separated list of channels the snap would
     be released to the selected channels if the store review passes for this
     <snap-file>.
 
+    Several <snap-file> can be pushed at once, e.g. one for each architecture,
+    in which case a summary of the pushes is displayed at the end.
+
     This operation will block until the store finishes processing this
     <snap-file>.
 
@@ -149,8 +154,15 @@ def push(snap_file, release):
         snapcraft push my-snap_0.1_amd64.snap
         snapcraft push my-snap_0.2_amd64.snap --release edge
         snapcraft push my-snap_0.3_amd64.snap --release candidate,beta
+        snapcraft push my-snap_0.4_amd64.snap my-snap_0.4_arm64.snap
     """
-    click.echo("Preparing to push {!r}.".format(os.path.basename(snap_file)))
+    click.echo(
+        "Preparing to push {}.".format(
+            formatting_utils.humanize_list(
+                [os.path.basename(f) for f in snap_files], "and"
+            )
+        )
+    )
     channel_list = []
     if release:
         channel_list = release.split(",")
@@ -159,7 +171,10 @@ def push(snap_file, release):
             "".format(formatting_utils.humanize_list(channel_list, "and"))
         )
 
-    snapcraft.push(snap_file, channel_list)
+    if len(snap_files) == 1:
+        snapcraft.push(snap_files[0], channel_list)
+    else:
+        snapcraft.push_many(snap_files, channel_list)
 
 
 @storecli.command("push-metadata")
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 from contextlib import contextmanager, suppress
 import errno
 import hashlib
@@ -21,10 +22,12 @@ import logging
 import re
 import os
 import shutil
+import stat
 import subprocess
 import sys
+import tempfile
 from typing import Pattern, Callable, Generator, List
-from typing import Set  # noqa F401
+from typing import Dict, Iterable, Sequence, Set, Tuple  # noqa F401
 
 from snapcraft.internal import common
 from snapcraft.internal.errors import (
@@ -39,9 +42,28 @@ from snapcraft.internal.errors import (
 if sys.version_info < (3, 6):
     import sha3  # noqa
 
+if sys.platform != "win32":
+    import fcntl
+
 
 logger = logging.getLogger(__name__)
 
+# The ioctl to make a file share the extents of another (a reflink), as
+# defined in linux/fs.h.
+_FICLONE = 0x40049409
+
+# The digests snaps are identified by, in the store and in the snap cache.
+DIGEST_ALGORITHMS = ("sha3_384", "sha512", "sha256")
+
+# The digests calculated by calculate_digests, by absolute path, along with
+# the device, inode, modification time and size of the file at that time.
+# Only the most recently used ones are kept.
+_MemoizedDigests = Tuple[Tuple[int, int, int, int], Dict[str, str]]
+_digests = (
+    collections.OrderedDict()
+)  # type: collections.OrderedDict[str, _MemoizedDigests]
+_MAX_MEMOIZED_DIGESTS = 256
+
 
 def replace_in_file(
     directory: str, file_pattern: Pattern, search_pattern: Pattern, replacement: str
@@ -166,6 +188,38 @@ def copy(source: str, destination: str, *, follow_symlinks: bool = False) -> Non
         shutil.copy2(source, destination, follow_symlinks=follow_symlinks)
     except FileNotFoundError:
         raise SnapcraftCopyFileNotFoundError(source)
+    _copy_ownership(source, destination, follow_symlinks=follow_symlinks)
+
+
+def clone(source: str, destination: str, *, follow_symlinks: bool = False) -> None:
+    """Copy source to destination, sharing its data as a reflink if possible.
+
+    Unlike a hard link, destination is a file of its own which can be
+    changed in place without changing source, its data is only shared
+    until then on filesystems that support reflinks, and copied otherwise.
+
+    :param str source: The source to be copied to destination.
+    :param str destination: Where to put the copy.
+    :param bool follow_symlinks: Whether or not symlinks should be followed.
+
+    :raises SnapcraftCopyFileNotFoundError: If source doesn't exist.
+    """
+    try:
+        source_stat = os.stat(source, follow_symlinks=follow_symlinks)
+    except FileNotFoundError:
+        raise SnapcraftCopyFileNotFoundError(source)
+    if not stat.S_ISREG(source_stat.st_mode):
+        copy(source, destination, follow_symlinks=follow_symlinks)
+        return
+
+    clone_file(source, destination)
+    # Changing the owner clears the set-user-ID and set-group-ID bits, so the
+    # mode is copied afterwards.
+    _copy_ownership(source, destination, follow_symlinks=True)
+    shutil.copystat(source, destination)
+
+
+def _copy_ownership(source: str, destination: str, *, follow_symlinks: bool) -> None:
     uid = os.stat(source, follow_symlinks=follow_symlinks).st_uid
     gid = os.stat(source, follow_symlinks=follow_symlinks).st_gid
     try:
@@ -178,6 +232,99 @@ def copy(source: str, destination: str, *, follow_symlinks: bool = False) -> Non
         )
 
 
+def clone_file(source: str, destination: str) -> None:
+    """Copy the contents of source to destination without reading them in.
+
+    destination is made a reflink to source on filesystems that support
+    them (e.g. btrfs or XFS), so that both share their data until either
+    is changed. Otherwise the data is copied by the kernel, and only read
+    and written by Python as a last resort. destination is replaced
+    atomically, it is never seen partially written.
+
+    :param str source: the file to copy.
+    :param str destination: the file to copy source to.
+    """
+    temporary_path = _get_temporary_path(destination)
+    try:
+        with open(source, "rb") as source_file, open(
+            temporary_path, "wb"
+        ) as destination_file:
+            if not _reflink(source_file, destination_file):
+                _copy_file_contents(source_file, destination_file)
+        os.replace(temporary_path, destination)
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(temporary_path)
+
+
+def _get_temporary_path(path: str) -> str:
+    return "{}.snapcraft-{}".format(path, os.getpid())
+
+
+def supports_reflinks(source_directory: str, destination_directory: str) -> bool:
+    """Return whether files can be reflinked across the given directories.
+
+    :param str source_directory: the directory to reflink files from.
+    :param str destination_directory: the directory to reflink files to.
+    """
+    with tempfile.TemporaryFile(dir=source_directory) as source_file:
+        source_file.write(b"\0")
+        source_file.flush()
+        with tempfile.TemporaryFile(dir=destination_directory) as destination_file:
+            return _reflink(source_file, destination_file)
+
+
+def _reflink(source_file, destination_file) -> bool:
+    if sys.platform == "win32":
+        return False
+    try:
+        fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+    except OSError:
+        return False
+    return True
+
+
+def _copy_file_contents(source_file, destination_file) -> None:
+    source_fd = source_file.fileno()
+    destination_fd = destination_file.fileno()
+    size = os.fstat(source_fd).st_size
+    for name, copy_range in (
+        ("copy_file_range", _copy_file_range),
+        ("sendfile", _sendfile),
+    ):
+        try:
+            copy_range(source_fd, destination_fd, size)
+            return
+        except (AttributeError, OSError) as e:
+            # Not available in this Python or not supported for these
+            # files (e.g. copy_file_range across filesystems in older
+            # kernels), start over with the next one.
+            logger.debug("Unable to copy with {}: {!r}".format(name, e))
+            destination_file.seek(0)
+            destination_file.truncate()
+    shutil.copyfileobj(source_file, destination_file)
+
+
+def _copy_file_range(source_fd: int, destination_fd: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(  # type: ignore
+            source_fd, destination_fd, size - offset, offset, offset
+        )
+        if copied == 0:
+            break
+        offset += copied
+
+
+def _sendfile(source_fd: int, destination_fd: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(destination_fd, source_fd, offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
+
+
 def link_or_copy_tree(
     source_tree: str,
     destination_tree: str,
@@ -312,14 +459,73 @@ def requires_path_exists(path: str, error_fmt: str = None) -> Generator:
 
 
 def calculate_sha3_384(path: str) -> str:
-    """Calculate sha3 384 hash, reading the file in 1MB chunks."""
-    return calculate_hash(path, algorithm="sha3_384")
+    """Calculate sha3 384 hash, reading the file in 1MB chunks.
+
+    The hash is memoized by calculate_digests.
+    """
+    return calculate_digests(path, algorithms=["sha3_384"])["sha3_384"]
 
 
 def calculate_hash(path: str, *, algorithm: str) -> str:
     """Calculate the hash for path with algorithm."""
-    # This will raise an AttributeError if algorithm is unsupported
-    hasher = getattr(hashlib, algorithm)()
+    return _calculate_hashes(path, algorithms=[algorithm])[algorithm]
+
+
+def calculate_digests(
+    path: str, *, algorithms: Sequence[str] = DIGEST_ALGORITHMS
+) -> Dict[str, str]:
+    """Calculate the digests of path with every algorithm in a single read.
+
+    The digests of the files used last are remembered until the file is
+    replaced or modified, so only the ones that were not calculated yet
+    are calculated when asked for again.
+
+    :param str path: the path to the file to calculate the digests for.
+    :param algorithms: the names of the algorithms, as understood by
+                       hashlib.
+    :returns: a dict with the hex digest of the file for each algorithm.
+    """
+    digests = _get_memoized_digests(path)
+    missing = set(algorithms) - set(digests)
+    if missing:
+        digests.update(_calculate_hashes(path, algorithms=missing))
+    return {algorithm: digests[algorithm] for algorithm in algorithms}
+
+
+def memoize_digests(path: str, digests: Dict[str, str]) -> None:
+    """Remember the digests of path, calculated while it was written.
+
+    calculate_digests returns them instead of reading path, for as long as
+    it is not modified.
+
+    :param str path: the path to the file the digests are for.
+    :param dict digests: the hex digests of the file, by algorithm.
+    """
+    _get_memoized_digests(path).update(digests)
+
+
+def _get_memoized_digests(path: str) -> Dict[str, str]:
+    file_stat = os.stat(path)
+    path = os.path.abspath(path)
+    key = (
+        file_stat.st_dev,
+        file_stat.st_ino,
+        file_stat.st_mtime_ns,
+        file_stat.st_size,
+    )
+    memoized_key, digests = _digests.get(path, (None, dict()))
+    if memoized_key != key:
+        digests = dict()
+    _digests[path] = (key, digests)
+    _digests.move_to_end(path)
+    while len(_digests) > _MAX_MEMOIZED_DIGESTS:
+        _digests.popitem(last=False)
+    return digests
+
+
+def _calculate_hashes(path: str, *, algorithms: Iterable[str]) -> Dict[str, str]:
+    # This will raise an AttributeError if an algorithm is unsupported
+    hashers = {algorithm: getattr(hashlib, algorithm)() for algorithm in algorithms}
 
     blocksize = 2 ** 20
     with open(path, "rb") as f:
@@ -327,8 +533,9 @@ def calculate_hash(path: str, *, algorithm: str) -> str:
             buf = f.read(blocksize)
             if not buf:
                 break
-            hasher.update(buf)
-    return hasher.hexdigest()
+            for hasher in hashers.values():
+                hasher.update(buf)
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
 
 
 def get_tool_path(command_name: str) -> str:
@@ -193,16 +193,35 @@ class Provider(abc.ABC):
         """Provider steps needed to make the project available to the instance.
         """
 
-    def execute_step(self, step: steps.Step) -> None:
-        self._run(command=["snapcraft", step.name])
+    def execute_step(
+        self, step: steps.Step, *, parallel_parts: Optional[int] = None
+    ) -> None:
+        command = ["snapcraft", step.name]
+        if parallel_parts:
+            command.extend(["--parallel-parts", str(parallel_parts)])
+        self._run(command=command)
 
     def clean(self, part_names: Sequence[str]) -> None:
         self._run(command=["snapcraft", "clean"] + list(part_names))
 
-    def pack_project(self, *, output: Optional[str] = None) -> None:
+    def pack_project(
+        self,
+        *,
+        output: Optional[str] = None,
+        compression: Optional[str] = None,
+        parallel_parts: Optional[int] = None,
+        report: Optional[str] = None
+    ) -> None:
         command = ["snapcraft", "snap"]
         if output:
             command.extend(["--output", output])
+        if compression:
+            command.extend(["--compression", compression])
+        if parallel_parts:
+            command.extend(["--parallel-parts", str(parallel_parts)])
+        if report:
+            # The packing report is written to this path in the instance.
+            command = ["env", "SNAPCRAFT_PACK_REPORT={}".format(report)] + command
         self._run(command=command)
 
     def clean_project(self) -> bool:
@@ -15,6 +15,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from ._apt import AptStagePackageCache  # noqa
+from ._apt import AptStagePackageTreeCache  # noqa
 from ._cache import SnapcraftCache  # noqa
+from ._elf import ElfCache  # noqa
 from ._file import FileCache  # noqa
 from ._snap import SnapCache  # noqa
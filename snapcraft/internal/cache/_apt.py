@@ -14,16 +14,28 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
+import errno
 import logging
 import os
+import shutil
+import tempfile
+from typing import Generator, Optional, Set  # noqa: F401
 
 from ._cache import SnapcraftStagePackageCache
+from ._index import CacheIndex
 
 logger = logging.getLogger(__name__)
 
 
 class AptStagePackageCache(SnapcraftStagePackageCache):
-    """Cache for stage-packages coming from apt."""
+    """Cache for stage-packages coming from apt.
+
+    There is a cache for each set of apt sources, the least recently used
+    ones are evicted to keep them all under budget.
+    """
+
+    default_budget = 4 * 2 ** 30
 
     def __init__(self, *, sources_digest):
         """Create a new AptStagePackageCache.
@@ -33,11 +45,107 @@ class AptStagePackageCache(SnapcraftStagePackageCache):
 
         super().__init__()
         cache_base_dir = os.path.join(self.stage_package_cache_root, "apt")
-
-        # TODO: Clean old cache, LP: #1663051
+        self._index = CacheIndex(cache_base_dir, budget=self.default_budget)
+        self._sources_digest = sources_digest
 
         self.base_dir = os.path.join(cache_base_dir, sources_digest)
         self.packages_dir = os.path.join(
             self.base_dir, "var", "cache", "apt", "archives"
         )
         os.makedirs(self.packages_dir, exist_ok=True)
+
+    def update(self) -> None:
+        """Record the current size of the cache for these apt sources.
+
+        This is meant to be called after fetching packages into it, the
+        caches for other apt sources are then evicted if over budget.
+        """
+        self._index.record(self._sources_digest)
+        self._index.evict(keep=[self._sources_digest])
+
+
+class AptStagePackageTreeCache(SnapcraftStagePackageCache):
+    """Cache for the extracted contents of stage-packages coming from apt.
+
+    Each package is kept extracted, but not normalized, in a tree of its own
+    which is meant to be checked out as reflinks or copies, never as hard
+    links, so that the files checked out can be modified in place. Trees
+    are only cached on filesystems that support reflinks, where caching
+    a package extracted into place does not copy its files.
+
+    The least recently used trees are evicted to keep the cache under budget.
+    """
+
+    default_budget = 8 * 2 ** 30
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.trees_dir = os.path.join(self.stage_package_cache_root, "apt-trees")
+        # Trees are indexed by <arch>/<name>/<version>.
+        self._index = CacheIndex(self.trees_dir, depth=3, budget=self.default_budget)
+        self._used_keys = set()  # type: Set[str]
+
+    @contextlib.contextmanager
+    def batch(self) -> Generator[None, None, None]:
+        """Record the trees cached or used within the context at once.
+
+        The least recently used trees are evicted afterwards if the cache is
+        over budget, except for the trees used by this instance.
+        """
+        with self._index.batch():
+            yield
+        self._index.evict(keep=self._used_keys)
+
+    @contextlib.contextmanager
+    def staging_dir(self) -> Generator[str, None, None]:
+        """Yield a directory to extract trees to before they are cached.
+
+        The directory and what is left in it are removed afterwards.
+        """
+        os.makedirs(self.trees_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.trees_dir, prefix=".") as temp_dir:
+            yield temp_dir
+
+    def cache(self, *, tree: str, name: str, version: str, arch: str) -> str:
+        """Cache tree as the contents of a package, unless it already exists.
+
+        :param str tree: path to the extracted package, it is moved into the
+                         cache and should come from staging_dir.
+        :param str name: the name of the package.
+        :param str version: the version of the package.
+        :param str arch: the architecture of the package.
+        :returns: path to the cached tree.
+        """
+        key = self._get_tree_key(name, version, arch)
+        cached_tree_path = self._index.get_path(key)
+        os.makedirs(os.path.dirname(cached_tree_path), exist_ok=True)
+        try:
+            # Moving the whole tree at once makes it show up complete, even
+            # for other processes.
+            os.rename(tree, cached_tree_path)
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+            # Someone else cached the package in the meantime.
+            shutil.rmtree(tree)
+        self._index.record(key)
+        self._used_keys.add(key)
+        return cached_tree_path
+
+    def get(self, *, name: str, version: str, arch: str) -> Optional[str]:
+        """Get the path to the cached tree of a package.
+
+        :param str name: the name of the package.
+        :param str version: the version of the package.
+        :param str arch: the architecture of the package.
+        :returns: path to the cached tree.
+        """
+        key = self._get_tree_key(name, version, arch)
+        cached_tree_path = self._index.lookup(key)
+        if cached_tree_path is not None:
+            logger.debug("Cache hit for {}={} ({})".format(name, version, arch))
+            self._used_keys.add(key)
+        return cached_tree_path
+
+    def _get_tree_key(self, name: str, version: str, arch: str) -> str:
+        return os.path.join(arch, name, version)
@@ -14,10 +14,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import glob
 import os
+from typing import List
 
 from xdg import BaseDirectory
 
+from ._index import CacheIndex, INDEX_FILENAME
+
 
 class SnapcraftCache:
     """Generic cache base class.
@@ -28,6 +32,19 @@ class SnapcraftCache:
     def __init__(self):
         self.cache_root = os.path.join(BaseDirectory.xdg_cache_home, "snapcraft")
 
+    def get_indexes(self) -> List[CacheIndex]:
+        """Return the indexes of all the cache namespaces.
+
+        Namespaces are indexed, and size bounded, by the caches using them,
+        at most three directories deep in the cache root
+        (e.g. projects/<name>/snap_hashes).
+        """
+        index_paths = []  # type: List[str]
+        for depth in range(1, 4):
+            pattern = os.path.join(self.cache_root, *["*"] * depth, INDEX_FILENAME)
+            index_paths.extend(glob.glob(pattern))
+        return [CacheIndex(os.path.dirname(p)) for p in sorted(index_paths)]
+
 
 class SnapcraftProjectCache(SnapcraftCache):
     """Project specific cache"""
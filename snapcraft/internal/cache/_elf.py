@@ -0,0 +1,147 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Optional, Set  # noqa: F401
+
+from snapcraft.file_utils import calculate_hash
+from ._cache import SnapcraftCache
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the cached ELF data changes.
+_ELF_CACHE_VERSION = 2
+# Past this many entries, those not used during the run are dropped on save.
+_MAX_ENTRIES = 100000
+
+
+class ElfCache(SnapcraftCache):
+    """Persistent cache for the metadata extracted from ELF files.
+
+    Entries are looked up by the (device, inode, size, mtime) of the file,
+    which makes hard links to an already parsed file free, and fall back to
+    the sha256 of the file contents when the file itself is new.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.elf_cache_root = os.path.join(self.cache_root, "elf")
+        self._index_path = os.path.join(self.elf_cache_root, "index.json")
+        self._stat_index = None  # type: Dict[str, str]
+        self._data = None  # type: Dict[str, Dict[str, Any]]
+        # Hashes computed for lookups that missed, reused when caching.
+        self._missed_hashes = dict()  # type: Dict[str, str]
+        self._used_keys = set()  # type: Set[str]
+        self._dirty = False
+
+    def _load(self) -> None:
+        if self._data is not None:
+            return
+
+        self._stat_index = dict()
+        self._data = dict()
+        with contextlib.suppress(FileNotFoundError):
+            with open(self._index_path) as index_file:
+                try:
+                    index = json.load(index_file)
+                except ValueError:
+                    logger.debug(
+                        "Ignoring corrupt ELF cache {!r}".format(self._index_path)
+                    )
+                    return
+            if index.get("version") == _ELF_CACHE_VERSION:
+                self._stat_index = index["stat"]
+                self._data = index["data"]
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """Return the cached ELF data for path or None if it is not cached.
+
+        :param str path: path to the ELF file.
+        """
+        self._load()
+        stat_key = _get_stat_key(path)
+        self._used_keys.add(stat_key)
+        content_hash = self._stat_index.get(stat_key)
+        if content_hash is None:
+            content_hash = calculate_hash(path, algorithm="sha256")
+            if content_hash not in self._data:
+                self._missed_hashes[stat_key] = content_hash
+                return None
+            # Same contents, new inode: remember it for the next lookup.
+            self._stat_index[stat_key] = content_hash
+            self._dirty = True
+
+        return self._data.get(content_hash)
+
+    def set(self, path: str, data: Dict[str, Any]) -> None:
+        """Cache the ELF data extracted from path.
+
+        :param str path: path to the ELF file.
+        :param dict data: JSON serializable data extracted from path.
+        """
+        self._load()
+        stat_key = _get_stat_key(path)
+        self._used_keys.add(stat_key)
+        content_hash = self._missed_hashes.pop(stat_key, None)
+        if content_hash is None:
+            content_hash = calculate_hash(path, algorithm="sha256")
+        self._stat_index[stat_key] = content_hash
+        self._data[content_hash] = data
+        self._dirty = True
+
+    def save(self) -> None:
+        """Write the cache to disk if it was modified."""
+        if not self._dirty:
+            return
+
+        if len(self._stat_index) > _MAX_ENTRIES:
+            self._stat_index = {
+                k: v for k, v in self._stat_index.items() if k in self._used_keys
+            }
+            used_hashes = set(self._stat_index.values())
+            self._data = {k: v for k, v in self._data.items() if k in used_hashes}
+
+        index = dict(version=_ELF_CACHE_VERSION, stat=self._stat_index, data=self._data)
+        # Write and rename so concurrent runs never see a partial index.
+        temp_path = None
+        try:
+            os.makedirs(self.elf_cache_root, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.elf_cache_root, delete=False
+            ) as index_file:
+                temp_path = index_file.name
+                json.dump(index, index_file)
+            os.replace(temp_path, self._index_path)
+        except OSError:
+            logger.warning(
+                "Unable to save the ELF cache {!r}.".format(self._index_path)
+            )
+            if temp_path:
+                with contextlib.suppress(OSError):
+                    os.unlink(temp_path)
+            return
+        self._dirty = False
+
+
+def _get_stat_key(path: str) -> str:
+    stat = os.stat(path)
+    return "{}:{}:{}:{}".format(
+        stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+    )
@@ -15,25 +15,36 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import logging
 import os
-import shutil
 
-from snapcraft.file_utils import calculate_hash
+from snapcraft.file_utils import calculate_digests, clone_file
 from ._cache import SnapcraftCache
+from ._index import CacheIndex
 
 logger = logging.getLogger(__name__)
 
 
 class FileCache(SnapcraftCache):
-    """Generic file cache."""
+    """Generic file cache.
 
-    def __init__(self, *, namespace: str = "files") -> None:
+    The least recently used files are evicted to keep the cache under
+    its budget.
+    """
+
+    default_budget = 5 * 2 ** 30
+
+    def __init__(self, *, namespace: str = "files", budget: int = None) -> None:
         """Create a FileCache under namespace.
 
         :param str namespace: set the namespace for the cache
                               (default: "files").
+        :param int budget: the size in bytes to keep the cache under
+                           (default: default_budget).
         """
         super().__init__()
         self.file_cache = os.path.join(self.cache_root, namespace)
+        if budget is None:
+            budget = self.default_budget
+        self._index = CacheIndex(self.file_cache, depth=2, budget=budget)
 
     def cache(self, *, filename: str, algorithm: str, hash: str) -> str:
         """Cache a file revision with hash in XDG cache, unless it already exists.
@@ -44,7 +55,7 @@ class FileCache(SnapcraftCache):
         :returns: path to cached file.
         """
         # First we verify
-        calculated_hash = calculate_hash(filename, algorithm=algorithm)
+        calculated_hash = calculate_digests(filename, algorithms=[algorithm])[algorithm]
         if calculated_hash != hash:
             logger.warning(
                 "Skipping caching of {!r} as the expected "
@@ -52,30 +63,51 @@ class FileCache(SnapcraftCache):
                 "provided".format(filename)
             )
             return None
-        cached_file_path = os.path.join(self.file_cache, algorithm, hash)
+        key = os.path.join(algorithm, hash)
+        cached_file_path = self._index.lookup(key)
+        if cached_file_path is not None:
+            return cached_file_path
+
+        cached_file_path = self._index.get_path(key)
         os.makedirs(os.path.dirname(cached_file_path), exist_ok=True)
         try:
-            if not os.path.isfile(cached_file_path):
-                # this must not be hard-linked, as rebuilding a snap
-                # with changes should invalidate the cache, hence avoids
-                # using fileutils.link_or_copy.
-                shutil.copyfile(filename, cached_file_path)
+            # this must not be hard-linked, as rebuilding a snap
+            # with changes should invalidate the cache, hence avoids
+            # using fileutils.link_or_copy.
+            # clone_file writes to a temporary file renamed into place, so
+            # that the file is complete once it is recorded.
+            clone_file(filename, cached_file_path)
+            self._index.record(key)
+            self._index.evict(keep=[key])
         except OSError:
             logger.warning("Unable to cache file {}.".format(cached_file_path))
             return None
         return cached_file_path
 
-    def get(self, *, algorithm: str, hash: str):
+    def get(self, *, algorithm: str, hash: str, destination: str = None):
         """Get the filepath which matches the hash calculated with algorithm.
 
         :param str algorithm: algorithm used to calculate the hash as
                               understood by hashlib.
         :param str hash: hash for filename calculated with algorithm.
-        :returns: path to cached file.
+        :param str destination: if set, the cached file is checked out to
+                                this path, as a reflink when possible or
+                                else as a copy, never as a hard link as
+                                the checkout may be changed in place.
+        :returns: path to cached file, or destination if set.
         """
-        cached_file_path = os.path.join(self.file_cache, algorithm, hash)
-        if os.path.exists(cached_file_path):
-            logger.debug("Cache hit for hash {!r}".format(hash))
+        cached_file_path = self._index.lookup(os.path.join(algorithm, hash))
+        if cached_file_path is None:
+            return None
+
+        logger.debug("Cache hit for hash {!r}".format(hash))
+        if destination is None:
             return cached_file_path
-        else:
+        try:
+            clone_file(cached_file_path, destination)
+        except OSError:
+            logger.warning(
+                "Unable to check out cached file {}.".format(cached_file_path)
+            )
             return None
+        return destination
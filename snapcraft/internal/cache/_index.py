@@ -0,0 +1,306 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple  # noqa: F401
+
+if sys.platform != "win32":
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = ".index.json"
+_LOCK_FILENAME = ".index.lock"
+
+# Access times are only written back when they are older than this, the
+# same way relatime does, so that cache hits rarely write to the index.
+_ACCESS_TIME_RESOLUTION = 60 * 60
+
+
+class CacheIndex:
+    """Index of the entries in a cache namespace.
+
+    Every entry is a file or directory under root, known by its path
+    relative to root (its key). The size, creation and last access times of
+    the entries are kept in an index file in root so that looking them up
+    does not require listing and stating the namespace. Entries must be
+    moved into place atomically, e.g. with a rename, before being recorded.
+
+    The index is shared by all processes using the namespace, changes to it
+    are applied under a lock, and written to a temporary file renamed over
+    the previous index.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        *,
+        depth: int = 1,
+        budget: Optional[int] = None,
+        name_pattern: str = None
+    ) -> None:
+        """Create a CacheIndex for the namespace in root.
+
+        :param str root: the directory the entries are in.
+        :param int depth: the number of path components in the keys, used
+                          to index the entries cached before the index
+                          existed.
+        :param int budget: the size in bytes the entries should be kept
+                           under when evicting, if None, the budget last
+                           saved in the index is used.
+        :param str name_pattern: a regular expression the names of the
+                                 entries cached before the index existed
+                                 must match to be indexed.
+        """
+        self.root = root
+        self._depth = depth
+        self._budget = budget
+        self._name_pattern = re.compile(name_pattern or ".*")
+        self._index_path = os.path.join(root, INDEX_FILENAME)
+        self._entries = None  # type: Optional[Dict[str, Dict[str, Any]]]
+        # Changes made in a batch, applied at the end of it.
+        self._pending = []  # type: List[Tuple[str, str, float, int]]
+        self._batch_depth = 0
+
+    @property
+    def budget(self) -> Optional[int]:
+        if self._budget is None:
+            self._load()
+        return self._budget
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def keys(self, prefix: str = "") -> List[str]:
+        """Return the keys of the entries, optionally only those under prefix.
+
+        :param str prefix: a directory within the namespace, e.g. "amd64".
+        """
+        if prefix:
+            prefix = prefix.rstrip("/") + "/"
+        return [k for k in self._load() if k.startswith(prefix)]
+
+    def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the size, created and accessed times of the entry for key."""
+        return self._load().get(key)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the path to the entry for key, marking it as accessed.
+
+        :param str key: the path of the entry relative to root.
+        :returns: the path to the entry, or None if it is not in the index
+                  or no longer in the namespace, in which case it is also
+                  removed from the index.
+        """
+        entry = self._load().get(key)
+        if entry is None:
+            return None
+        if not os.path.lexists(self.get_path(key)):
+            logger.debug("Removing missing {!r} from cache index.".format(key))
+            self._change("remove", key)
+            return None
+        if time.time() - entry["accessed"] > _ACCESS_TIME_RESOLUTION:
+            self._change("touch", key)
+        return self.get_path(key)
+
+    def record(self, key: str) -> None:
+        """Add the entry for key to the index, or update its size.
+
+        :param str key: the path of the entry relative to root, which must
+                        already be in its final place.
+        """
+        self._change("record", key, size=_get_size(self.get_path(key)))
+
+    def remove(self, key: str) -> None:
+        """Remove the entry for key from the namespace and from the index."""
+        _remove_path(self.get_path(key))
+        self._change("remove", key)
+
+    @contextlib.contextmanager
+    def batch(self) -> Generator[None, None, None]:
+        """Apply the changes made within the context in one update."""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flush()
+
+    def evict(
+        self, *, budget: Optional[int] = None, keep: Iterable[str] = ()
+    ) -> List[str]:
+        """Remove the least recently used entries until under budget.
+
+        :param int budget: the size in bytes to keep the entries under,
+                           defaults to the budget of the index.
+        :param keep: the keys of entries which must not be removed.
+        :returns: the keys of the removed entries.
+        """
+        evicted = []  # type: List[str]
+        with self._locked() as entries:
+            if budget is None:
+                budget = self._budget
+            if budget is None:
+                return evicted
+            total_size = sum(e["size"] for e in entries.values())
+            by_access = sorted(entries, key=lambda k: entries[k]["accessed"])
+            for key in by_access:
+                if total_size <= budget:
+                    break
+                if key in keep:
+                    continue
+                try:
+                    _remove_path(self.get_path(key))
+                except OSError as e:
+                    logger.warning("Unable to evict {!r} from cache: {}".format(key, e))
+                    continue
+                total_size -= entries.pop(key)["size"]
+                evicted.append(key)
+        if evicted:
+            logger.debug(
+                "Evicted {} entries from cache {!r}.".format(len(evicted), self.root)
+            )
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of entries, their total size and the budget."""
+        entries = self._load()
+        return dict(
+            entries=len(entries),
+            size=sum(e["size"] for e in entries.values()),
+            budget=self.budget,
+            last_access=max((e["accessed"] for e in entries.values()), default=None),
+        )
+
+    def _change(self, operation: str, key: str, *, size: int = 0) -> None:
+        self._pending.append((operation, key, time.time(), size))
+        if self._batch_depth == 0:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with self._locked() as entries:
+            for operation, key, now, size in pending:
+                _apply_change(entries, operation, key, now, size)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            index = self._read()
+            if index is None:
+                with self._locked():
+                    pass
+            else:
+                self._entries = index["entries"]
+                if self._budget is None:
+                    self._budget = index.get("budget")
+        return self._entries
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._index_path) as index_file:
+                return json.load(index_file)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning("Rebuilding corrupted cache index {!r}.".format(self.root))
+            return None
+
+    @contextlib.contextmanager
+    def _locked(self) -> Generator[Dict[str, Dict[str, Any]], None, None]:
+        # Yield the current entries, which are saved back once the context
+        # exits.
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, _LOCK_FILENAME), "a") as lock_file:
+            if sys.platform != "win32":
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index = self._read()
+            if index is None:
+                entries = self._scan()
+            else:
+                entries = index["entries"]
+                if self._budget is None:
+                    self._budget = index.get("budget")
+            yield entries
+            self._write(entries)
+            self._entries = entries
+
+    def _write(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        temporary_path = "{}.{}".format(self._index_path, os.getpid())
+        with open(temporary_path, "w") as index_file:
+            json.dump(dict(budget=self._budget, entries=entries), index_file)
+        os.replace(temporary_path, self._index_path)
+
+    def _scan(self) -> Dict[str, Dict[str, Any]]:
+        # Index what was cached before there was an index.
+        entries = dict()  # type: Dict[str, Dict[str, Any]]
+        keys = [""]
+        for _ in range(self._depth):
+            keys = [
+                os.path.join(k, name)
+                for k in keys
+                if os.path.isdir(self.get_path(k))
+                for name in os.listdir(self.get_path(k))
+                if not name.startswith(".")
+            ]
+        for key in keys:
+            if not self._name_pattern.fullmatch(os.path.basename(key)):
+                continue
+            path = self.get_path(key)
+            with contextlib.suppress(FileNotFoundError):
+                mtime = os.lstat(path).st_mtime
+                entries[key] = dict(size=_get_size(path), created=mtime, accessed=mtime)
+        return entries
+
+
+def _apply_change(
+    entries: Dict[str, Dict[str, Any]], operation: str, key: str, now: float, size: int
+) -> None:
+    if operation == "remove":
+        entries.pop(key, None)
+    elif operation == "record":
+        entry = entries.setdefault(key, dict(created=now))
+        entry.update(size=size, accessed=now)
+    elif key in entries:
+        entries[key]["accessed"] = max(entries[key]["accessed"], now)
+
+
+def _get_size(path: str) -> int:
+    if not os.path.isdir(path) or os.path.islink(path):
+        return os.lstat(path).st_size
+    size = 0
+    for root, directories, files in os.walk(path):
+        for name in directories + files:
+            with contextlib.suppress(FileNotFoundError):
+                size += os.lstat(os.path.join(root, name)).st_size
+    return size
+
+
+def _remove_path(path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
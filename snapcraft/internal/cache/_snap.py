@@ -14,24 +14,43 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import logging
 import os
-import shutil
-import subprocess
-import tempfile
+from typing import Dict, List, Tuple  # noqa: F401
 
 from ._cache import SnapcraftProjectCache
+from ._index import CacheIndex
 from snapcraft import file_utils, yaml_utils
+from snapcraft.internal import deltas, squashfs
+from snapcraft.internal.errors import InvalidSquashFSError
 
 logger = logging.getLogger(__name__)
 
+_ManifestKey = Tuple[str, int, int, int]
+
 
 class SnapCache(SnapcraftProjectCache):
-    """Cache for snap revisions."""
+    """Cache for snap revisions.
+
+    Several revisions are kept, up to the budget of the project, so that
+    deltas can be generated against any of them.
+    """
+
+    default_budget = 2 * 2 ** 30
 
-    def __init__(self, *, project_name):
+    def __init__(self, *, project_name, budget=None):
         super().__init__(project_name=project_name)
         self.snap_cache_root = self._setup_snap_cache_root()
+        if budget is None:
+            budget = self.default_budget
+        # Revisions are indexed by <arch>/<sha3-384 hash>.
+        self._index = CacheIndex(
+            self.snap_cache_root, depth=2, budget=budget, name_pattern="[0-9a-f]{96}"
+        )
+        # The manifests of the snaps read, by their path, inode, size and
+        # modification time.
+        self._manifests = dict()  # type: Dict[_ManifestKey, Dict[str, List]]
 
     def _setup_snap_cache_root(self):
         snap_cache_root = os.path.join(self.project_cache_root, "snap_hashes")
@@ -39,50 +58,88 @@ class SnapCache(SnapcraftProjectCache):
         return snap_cache_root
 
     def _get_snap_deb_arch(self, snap_filename):
-        with tempfile.TemporaryDirectory() as temp_dir:
-            unsquashfs_path = file_utils.get_tool_path("unsquashfs")
-            output = subprocess.check_output(
-                [
-                    unsquashfs_path,
-                    "-d",
-                    os.path.join(temp_dir, "squashfs-root"),
-                    snap_filename,
-                    "-e",
-                    os.path.join("meta", "snap.yaml"),
-                ]
-            )
-            logger.debug(output)
-            with open(
-                os.path.join(temp_dir, "squashfs-root", "meta", "snap.yaml")
-            ) as yaml_file:
-                snap_yaml = yaml_utils.load(yaml_file)
+        with squashfs.open_image(snap_filename) as snap:
+            with snap.open("meta/snap.yaml") as yaml_file:
+                snap_yaml = yaml_utils.load(io.TextIOWrapper(yaml_file))
         # XXX: add multiarch support later
         try:
             return snap_yaml["architectures"][0]
         except KeyError:
             return "all"
 
-    def _get_snap_cache_path(self, snap_filename):
+    def _get_snap_cache_key(self, snap_filename):
         snap_hash = file_utils.calculate_sha3_384(snap_filename)
         arch = self._get_snap_deb_arch(snap_filename)
         os.makedirs(os.path.join(self.snap_cache_root, arch), exist_ok=True)
-        return os.path.join(self.snap_cache_root, arch, snap_hash)
+        return os.path.join(arch, snap_hash)
 
     def cache(self, *, snap_filename):
         """Cache snap revision by sha3-384 hash in XDG cache, unless it already exists.
         :returns: path to cached revision.
         """
-        cached_snap_path = self._get_snap_cache_path(snap_filename)
+        key = self._get_snap_cache_key(snap_filename)
+        cached_snap_path = self._index.get_path(key)
         try:
-            if not os.path.isfile(cached_snap_path):
+            if self._index.lookup(key) is None:
                 # this must not be hard-linked, as rebuilding a snap
                 # with changes should invalidate the cache, hence avoids
                 # using fileutils.link_or_copy.
-                shutil.copyfile(snap_filename, cached_snap_path)
+                file_utils.clone_file(snap_filename, cached_snap_path)
+                self._index.record(key)
         except OSError:
             logger.warning("Unable to cache snap {}.".format(snap_filename))
         return cached_snap_path
 
+    def get_manifest(self, snap_filename):
+        """Get the manifest of the files in a snap.
+
+        Manifests only take reading the metadata of the snap, they are
+        computed once per snap file and kept in memory.
+
+        :param str snap_filename: path to the snap.
+        :returns: the manifest as returned by deltas.get_snap_manifest.
+        :raises snapcraft.internal.errors.InvalidSquashFSError:
+            if the snap cannot be read.
+        """
+        snap_stat = os.stat(snap_filename)
+        manifest_key = (
+            os.path.abspath(snap_filename),
+            snap_stat.st_ino,
+            snap_stat.st_size,
+            snap_stat.st_mtime_ns,
+        )
+        if manifest_key not in self._manifests:
+            self._manifests[manifest_key] = deltas.get_snap_manifest(snap_filename)
+        return self._manifests[manifest_key]
+
+    def get_delta_source(self, *, deb_arch, target_manifest):
+        """Get the cached revision that shares the most with a target snap.
+
+        :param str deb_arch: arch as string.
+        :param dict target_manifest: the manifest of the target snap.
+        :returns: full path to the cached snap with the most bytes of the
+                  target in it, the latest one if several are as good, or
+                  None if there are no cached revisions.
+        """
+        best_key = None
+        best_rank = None
+        for key in self._index.keys(deb_arch):
+            cached_snap = self._index.get_path(key)
+            try:
+                source_manifest = self.get_manifest(cached_snap)
+            except (OSError, InvalidSquashFSError) as e:
+                logger.debug("Unable to read cached snap {}: {}".format(cached_snap, e))
+                continue
+            overlap = deltas.get_manifest_overlap(
+                source_manifest=source_manifest, target_manifest=target_manifest
+            )
+            rank = (overlap, self._index.get_entry(key)["created"])
+            if best_rank is None or rank > best_rank:
+                best_key, best_rank = key, rank
+        if best_key is None:
+            return None
+        return self._index.lookup(best_key)
+
     def get(self, *, deb_arch, snap_hash=None):
         """Get the revision by sha3-384 hash or the latest cached item.
 
@@ -91,38 +148,44 @@ class SnapCache(SnapcraftProjectCache):
 
         :returns: full path to cached snap.
         """
-        snap_cache_dir = os.path.join(self.snap_cache_root, deb_arch)
-        if not os.path.isdir(snap_cache_dir):
-            return None
-
-        cached_hashes = os.listdir(snap_cache_dir)
-        if not cached_hashes:
-            return None
-
         if snap_hash:
-            for cached_hash in cached_hashes:
-                if cached_hash == snap_hash:
-                    return os.path.join(snap_cache_dir, cached_hash)
-            return None
-
-        cached_snaps = [os.path.join(snap_cache_dir, f) for f in cached_hashes]
-        return max(cached_snaps, key=os.path.getctime)
+            return self._index.lookup(os.path.join(deb_arch, snap_hash))
+
+        # Entries removed behind the index's back are dropped by lookup.
+        cached_keys = sorted(
+            self._index.keys(deb_arch),
+            key=lambda k: self._index.get_entry(k)["created"],
+            reverse=True,
+        )
+        for key in cached_keys:
+            cached_snap = self._index.lookup(key)
+            if cached_snap is not None:
+                return cached_snap
+        return None
 
     def prune(self, *, deb_arch, keep_hash):
-        """Prune the snap revisions beside the keep_hash in XDG cache.
+        """Prune the snap revisions in XDG cache which are over budget.
+
+        The least recently used revisions are pruned first, keep_hash is
+        never pruned. Files in the cache which are not cached revisions
+        are always pruned.
 
         :returns: pruned files paths list.
         """
-
-        pruned_files_list = []
-
         snap_cache_dir = os.path.join(self.snap_cache_root, deb_arch)
-        for cached_hash in os.listdir(snap_cache_dir):
-            if cached_hash != keep_hash:
-                try:
-                    cached_snap = os.path.join(snap_cache_dir, cached_hash)
-                    os.remove(cached_snap)
-                    pruned_files_list.append(cached_snap)
-                except OSError:
-                    logger.warning("Unable to prune snap {}.".format(cached_snap))
+        cached_keys = set(self._index.keys(deb_arch))
+        pruned_files_list = [
+            os.path.join(snap_cache_dir, f)
+            for f in os.listdir(snap_cache_dir)
+            if os.path.join(deb_arch, f) not in cached_keys
+        ]
+        for stray_file in pruned_files_list:
+            try:
+                os.remove(stray_file)
+            except OSError:
+                logger.warning("Unable to prune snap {}.".format(stray_file))
+
+        keep_key = os.path.join(deb_arch, keep_hash)
+        for key in self._index.evict(keep=[keep_key]):
+            pruned_files_list.append(self._index.get_path(key))
         return pruned_files_list
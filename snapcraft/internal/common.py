@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 # Data/methods shared between plugins and snapcraft
+import functools
 import glob
 import logging
 import math
@@ -24,9 +25,10 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import threading
 import urllib
 from contextlib import suppress
-from typing import Callable, List
+from typing import IO, Callable, List, Optional
 
 from snapcraft.internal import errors
 
@@ -48,11 +50,65 @@ MAX_CHARACTERS_WRAP = 120
 
 env = []  # type: List[str]
 
+# Parts processed concurrently keep their build environment and output
+# prefix here instead of in the module wide env.
+_thread_state = threading.local()
+_output_lock = threading.Lock()
+
 logger = logging.getLogger(__name__)
 
 
+def get_env() -> List[str]:
+    """Return the build environment for the current thread."""
+    return getattr(_thread_state, "env", env)
+
+
+def set_env(new_env: List[str]) -> None:
+    """Set the build environment used by run and run_output.
+
+    When called from a thread other than the main one the environment is
+    only set for the calling thread.
+    """
+    global env
+    if threading.current_thread() is threading.main_thread():
+        env = new_env
+    else:
+        _thread_state.env = new_env
+
+
+def get_output_prefix() -> Optional[str]:
+    """Return the prefix for command output in the current thread, if any."""
+    return getattr(_thread_state, "output_prefix", None)
+
+
+def set_output_prefix(prefix: Optional[str]) -> None:
+    """Prefix every line of command output from the current thread."""
+    _thread_state.output_prefix = prefix
+
+
+def forward_output(stream: IO[bytes], prefix: str) -> None:
+    """Write every line read from stream to stdout preceded by prefix."""
+    encoding = sys.getfilesystemencoding()
+    for line in iter(stream.readline, b""):
+        with _output_lock:
+            sys.stdout.write(prefix + line.decode(encoding, "replace"))
+            sys.stdout.flush()
+
+
+def _check_call_prefixed(cmd: List[str], *, prefix: str, **kwargs) -> int:
+    process = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kwargs
+    )
+    forward_output(process.stdout, prefix)
+    process.stdout.close()
+    returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    return returncode
+
+
 def assemble_env():
-    return "\n".join(["export " + e for e in env])
+    return "\n".join(["export " + e for e in get_env()])
 
 
 def _run(cmd: List[str], runner: Callable, **kwargs):
@@ -73,7 +129,11 @@ def _run(cmd: List[str], runner: Callable, **kwargs):
 
 
 def run(cmd: List[str], **kwargs) -> None:
-    _run(cmd, subprocess.check_call, **kwargs)
+    prefix = get_output_prefix()
+    if prefix is None or "stdout" in kwargs or "stderr" in kwargs:
+        _run(cmd, subprocess.check_call, **kwargs)
+    else:
+        _run(cmd, functools.partial(_check_call_prefixed, prefix=prefix), **kwargs)
 
 
 def run_output(cmd: List[str], **kwargs) -> str:
@@ -207,8 +267,7 @@ def isurl(url):
 
 
 def reset_env():
-    global env
-    env = []
+    set_env([])
 
 
 def get_terminal_width(max_width=MAX_CHARACTERS_WRAP):
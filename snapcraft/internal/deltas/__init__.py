@@ -17,4 +17,9 @@
 
 from . import errors  # noqa
 from ._deltas import BaseDeltasGenerator  # noqa
+from ._manifest import (  # noqa
+    estimate_delta_size,
+    get_manifest_overlap,
+    get_snap_manifest,
+)
 from ._xdelta3 import XDelta3Generator  # noqa
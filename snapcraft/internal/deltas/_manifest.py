@@ -0,0 +1,96 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import stat
+from typing import Dict, List  # noqa: F401
+
+from snapcraft.internal import squashfs
+
+
+# The manifest of a snap maps the path of each of its files to their size
+# and a digest identifying their contents.
+Manifest = Dict[str, List]
+
+
+def get_snap_manifest(snap_path: str) -> Manifest:
+    """Get the manifest of the files in the snap at snap_path.
+
+    Only the metadata of the snap is read, not the contents of its files.
+    Files are identified by their size and the sizes their data blocks are
+    compressed to, which match for the same contents compressed the same
+    way. Small files are stored in fragments shared with other files
+    instead of blocks of their own, so files with no blocks are only
+    identified by their size and path.
+
+    :param str snap_path: the path to the snap.
+    :returns: a dict mapping the path of each regular file in the snap to
+              a list with its size and the digest of its contents.
+    :raises snapcraft.internal.errors.InvalidSquashFSError:
+        if the snap cannot be read.
+    """
+    manifest = dict()  # type: Manifest
+    with squashfs.SquashFS(snap_path) as snap:
+        for entry in snap.walk():
+            if not stat.S_ISREG(entry.mode):
+                continue
+            if entry.block_sizes:
+                identity = [entry.size, list(entry.block_sizes)]
+            else:
+                identity = [entry.size, entry.path]
+            digest = hashlib.sha256(repr(identity).encode()).hexdigest()
+            manifest[entry.path] = [entry.size, digest]
+    return manifest
+
+
+def get_manifest_overlap(
+    *, source_manifest: Manifest, target_manifest: Manifest
+) -> int:
+    """Get how many bytes of the target files are also in the source.
+
+    Files are matched by their contents, wherever they are in the source,
+    as a delta can copy them from anywhere.
+
+    :param dict source_manifest: the manifest of the source snap.
+    :param dict target_manifest: the manifest of the target snap.
+    :returns: the size of the target files found in the source.
+    """
+    source_digests = {digest for _, digest in source_manifest.values()}
+    return sum(
+        size for size, digest in target_manifest.values() if digest in source_digests
+    )
+
+
+def estimate_delta_size(
+    *, source_manifest: Manifest, target_manifest: Manifest, target_size: int
+) -> int:
+    """Estimate the size of a delta between two snaps from their manifests.
+
+    Snaps compress each file on its own, so the delta is estimated to be
+    the share of the target snap taken by the files not in the source.
+
+    :param dict source_manifest: the manifest of the source snap.
+    :param dict target_manifest: the manifest of the target snap.
+    :param int target_size: the size of the target snap file.
+    :returns: the estimated size of the delta in bytes.
+    """
+    total = sum(size for size, _ in target_manifest.values())
+    if not total:
+        return target_size
+    overlap = get_manifest_overlap(
+        source_manifest=source_manifest, target_manifest=target_manifest
+    )
+    return (total - overlap) * target_size // total
@@ -13,6 +13,8 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import collections
+import concurrent.futures
 import contextlib
 import glob
 import logging
@@ -21,13 +23,24 @@ import re
 import shutil
 import subprocess
 import tempfile
-from typing import Dict, FrozenSet, List, Set, Sequence, Tuple, Union  # noqa
-
+from typing import (  # noqa: F401
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+import elftools.common.exceptions
 import elftools.elf.elffile
 from pkg_resources import parse_version
 
 from snapcraft import file_utils
-from snapcraft.internal import common, errors, repo
+from snapcraft.internal import cache, common, errors, repo
 
 
 logger = logging.getLogger(__name__)
@@ -46,7 +59,7 @@ class NeededLibrary:
 
 ElfArchitectureTuple = Tuple[str, str, str]
 ElfDataTuple = Tuple[
-    ElfArchitectureTuple, str, str, Dict[str, NeededLibrary], bool
+    ElfArchitectureTuple, str, str, Dict[str, NeededLibrary], bool, List[str], List[str]
 ]  # noqa: E501
 SonameCacheDict = Dict[Tuple[ElfArchitectureTuple, str], str]
 
@@ -197,6 +210,36 @@ def _ensure_str(s):
     return s
 
 
+def _elf_data_to_dict(elf_data: ElfDataTuple) -> Dict[str, Any]:
+    arch, interp, soname, needed, execstack_set, rpath, runpath = elf_data
+    return dict(
+        arch=list(arch),
+        interp=interp,
+        soname=soname,
+        needed={name: sorted(lib.versions) for name, lib in needed.items()},
+        execstack_set=execstack_set,
+        rpath=rpath,
+        runpath=runpath,
+    )
+
+
+def _elf_data_from_dict(data: Dict[str, Any]) -> ElfDataTuple:
+    needed = dict()  # type: Dict[str, NeededLibrary]
+    for name, versions in data["needed"].items():
+        needed[name] = NeededLibrary(name=name)
+        for version in versions:
+            needed[name].add_version(version)
+    return (
+        (data["arch"][0], data["arch"][1], data["arch"][2]),
+        data["interp"],
+        data["soname"],
+        needed,
+        data["execstack_set"],
+        data["rpath"],
+        data["runpath"],
+    )
+
+
 class ElfFile:
     """ElfFile represents and elf file on a path and its attributes."""
 
@@ -208,19 +251,31 @@ class ElfFile:
         with open(path, "rb") as bin_file:
             return bin_file.read(4) == b"\x7fELF"
 
-    def __init__(self, *, path: str) -> None:
+    def __init__(self, *, path: str, elf_cache: cache.ElfCache = None) -> None:
         """Initialize an ElfFile instance.
 
         :param str path: path to an elf_file within a snapcraft project.
+        :param ElfCache elf_cache: cache to retrieve the already extracted
+                                   attributes from, and to store them in.
         """
         self.path = path
         self.dependencies = set()  # type: Set[Library]
-        elf_data = self._extract(path)
+        if elf_cache is None:
+            elf_data = self._extract(path)
+        else:
+            cached_data = elf_cache.get(path)
+            if cached_data is None:
+                elf_data = self._extract(path)
+                elf_cache.set(path, _elf_data_to_dict(elf_data))
+            else:
+                elf_data = _elf_data_from_dict(cached_data)
         self.arch = elf_data[0]
         self.interp = elf_data[1]
         self.soname = elf_data[2]
         self.needed = elf_data[3]
         self.execstack_set = elf_data[4]
+        self.rpath = elf_data[5]
+        self.runpath = elf_data[6]
 
     def _extract(self, path: str) -> ElfDataTuple:  # noqa: C901
         arch = None  # type: ElfArchitectureTuple
@@ -228,6 +283,8 @@ class ElfFile:
         soname = str()
         libs = dict()
         execstack_set = False
+        rpath = []  # type: List[str]
+        runpath = []  # type: List[str]
 
         with open(path, "rb") as fp:
             elf = elftools.elf.elffile.ELFFile(fp)
@@ -264,6 +321,10 @@ class ElfFile:
                     libs[needed] = NeededLibrary(name=needed)
                 for tag in dynamic_section.iter_tags("DT_SONAME"):
                     soname = _ensure_str(tag.soname)
+                for tag in dynamic_section.iter_tags("DT_RPATH"):
+                    rpath = _ensure_str(tag.rpath).split(":")
+                for tag in dynamic_section.iter_tags("DT_RUNPATH"):
+                    runpath = _ensure_str(tag.runpath).split(":")
 
             verneed_section = elf.get_section_by_name(_GNU_VERSION_R)
             if (
@@ -290,7 +351,7 @@ class ElfFile:
                     if mode & elftools.elf.constants.P_FLAGS.PF_X:
                         execstack_set = True
 
-        return arch, interp, soname, libs, execstack_set
+        return arch, interp, soname, libs, execstack_set, rpath, runpath
 
     def is_linker_compatible(self, *, linker_version: str) -> bool:
         """Determines if linker will work given the required glibc version."""
@@ -322,7 +383,12 @@ class ElfFile:
         return version_required
 
     def load_dependencies(
-        self, root_path: str, core_base_path: str, soname_cache: SonameCache = None
+        self,
+        root_path: str,
+        core_base_path: str,
+        soname_cache: SonameCache = None,
+        *,
+        resolver: "DependencyResolver" = None
     ) -> Set[str]:
         """Load the set of libraries that are needed to satisfy elf's runtime.
 
@@ -334,6 +400,10 @@ class ElfFile:
                                    dependencies.
         :param SonameCache soname_cache: a cache of previously search
                                          dependencies.
+        :param DependencyResolver resolver: resolve the dependencies in
+                                            process instead of running ldd,
+                                            ldd is still used for files the
+                                            resolver cannot read.
         :returns: a set of string with paths to the library dependencies of
                   elf.
         """
@@ -341,31 +411,34 @@ class ElfFile:
             soname_cache = SonameCache()
 
         logger.debug("Getting dependencies for {!r}".format(self.path))
-        ldd_out = []  # type: List[str]
-        try:
-            # ldd output sample:
-            # /lib64/ld-linux-x86-64.so.2 (0x00007fb3c5298000)
-            # libm.so.6 => /lib/x86_64-linux-gnu/libm.so.6 (0x00007fb3bef03000)
-            ldd_out = common.run_output(["ldd", self.path]).split("\n")
-        except subprocess.CalledProcessError:
+        if resolver is None:
+            sonames = self._get_ldd_dependencies()
+        else:
+            try:
+                sonames = resolver.resolve(self)
+            except (OSError, elftools.common.exceptions.ELFError) as resolve_error:
+                logger.debug(
+                    "Falling back to ldd for {!r}: {}".format(self.path, resolve_error)
+                )
+                sonames = self._get_ldd_dependencies()
+        if sonames is None:
             logger.warning(
                 "Unable to determine library dependencies for {!r}".format(self.path)
             )
             return set()
-        ldd_out_split = [l.split() for l in ldd_out]
+
         libs = set()
-        for ldd_line in ldd_out_split:
-            if len(ldd_line) > 2:
-                libs.add(
-                    Library(
-                        soname=ldd_line[0],
-                        path=ldd_line[2],
-                        root_path=root_path,
-                        core_base_path=core_base_path,
-                        arch=self.arch,
-                        soname_cache=soname_cache,
-                    )
+        for soname, path in sonames.items():
+            libs.add(
+                Library(
+                    soname=soname,
+                    path=path,
+                    root_path=root_path,
+                    core_base_path=core_base_path,
+                    arch=self.arch,
+                    soname_cache=soname_cache,
                 )
+            )
 
         self.dependencies = libs
 
@@ -376,6 +449,175 @@ class ElfFile:
                 library_paths.add(l.path)
         return library_paths
 
+    def _get_ldd_dependencies(self) -> Optional[Dict[str, str]]:
+        try:
+            # ldd output sample:
+            # /lib64/ld-linux-x86-64.so.2 (0x00007fb3c5298000)
+            # libm.so.6 => /lib/x86_64-linux-gnu/libm.so.6 (0x00007fb3bef03000)
+            ldd_out = common.run_output(["ldd", self.path]).split("\n")
+        except subprocess.CalledProcessError:
+            return None
+
+        sonames = dict()  # type: Dict[str, str]
+        for ldd_line in (line.split() for line in ldd_out):
+            if len(ldd_line) > 2:
+                sonames[ldd_line[0]] = ldd_line[2]
+        return sonames
+
+
+class DependencyResolver:
+    """Resolve the libraries needed by ELF files without running ldd.
+
+    Libraries are searched for in the same order the dynamic linker uses:
+    DT_RPATH, the paths from determine_ld_library_path, DT_RUNPATH and then
+    the system library paths, with the standard library paths in root as a
+    last resort. Every lookup is remembered, so the libraries shared by the
+    files resolved with the same resolver are only found and read once.
+    """
+
+    def __init__(
+        self,
+        *,
+        root_path: str,
+        elf_cache: cache.ElfCache = None,
+        system_library_paths: List[str] = None
+    ) -> None:
+        """Create a new DependencyResolver.
+
+        :param str root_path: the root of the tree being resolved.
+        :param ElfCache elf_cache: cache for the attributes of the libraries
+                                   found while resolving.
+        :param list system_library_paths: paths the system dynamic linker
+                                          searches, read from /etc/ld.so.conf
+                                          if not set.
+        """
+        if system_library_paths is None:
+            system_library_paths = get_system_library_paths()
+
+        self._ld_library_path = determine_ld_library_path(root_path)
+        self._fallback_library_paths = system_library_paths + [
+            path
+            for lib_dir in ("lib", "usr/lib")
+            for path in [os.path.join(root_path, lib_dir)]
+            + sorted(glob.glob(os.path.join(root_path, lib_dir, "*-linux-gnu*")))
+        ]
+        self._elf_cache = elf_cache
+        self._elf_files = dict()  # type: Dict[str, Optional[ElfFile]]
+        self._found = dict()  # type: Dict[Tuple[Any, ...], Optional[str]]
+
+    def resolve(self, elf_file: ElfFile) -> Dict[str, str]:
+        """Return the paths to all the libraries elf_file needs by soname.
+
+        Sonames that cannot be found map to an empty path.
+        """
+        sonames = collections.OrderedDict()  # type: Dict[str, str]
+        # Libraries are loaded breadth first, as the dynamic linker does.
+        queue = collections.deque([elf_file])
+        while queue:
+            current = queue.popleft()
+            search_paths = self._get_search_paths(current, elf_file)
+            for soname in current.needed:
+                # Like ldd, leave out the dynamic linker itself.
+                if soname in sonames or _DYNAMIC_LINKER_RE.match(soname):
+                    continue
+                path = self._find(soname, elf_file.arch, search_paths)
+                sonames[soname] = path or ""
+                if path:
+                    queue.append(self._get_elf_file(path))
+
+        return sonames
+
+    def _get_search_paths(self, elf_file: ElfFile, executable: ElfFile) -> List[str]:
+        paths = []  # type: List[str]
+        # DT_RPATH is ignored when DT_RUNPATH is set.
+        if not elf_file.runpath:
+            paths.extend(_expand_origin(elf_file.rpath, elf_file.path))
+            if executable is not elf_file and not executable.runpath:
+                paths.extend(_expand_origin(executable.rpath, executable.path))
+        paths.extend(self._ld_library_path)
+        paths.extend(_expand_origin(elf_file.runpath, elf_file.path))
+        paths.extend(self._fallback_library_paths)
+        return paths
+
+    def _find(
+        self, soname: str, arch: ElfArchitectureTuple, search_paths: List[str]
+    ) -> Optional[str]:
+        key = (soname, arch, tuple(search_paths))
+        with contextlib.suppress(KeyError):
+            return self._found[key]
+
+        found = None
+        for search_path in search_paths:
+            candidate = os.path.join(search_path, soname)
+            candidate_elf = self._get_elf_file(candidate)
+            if candidate_elf is not None and candidate_elf.arch == arch:
+                found = candidate
+                break
+
+        self._found[key] = found
+        return found
+
+    def _get_elf_file(self, path: str) -> Optional[ElfFile]:
+        with contextlib.suppress(KeyError):
+            return self._elf_files[path]
+
+        if ElfFile.is_elf(path):
+            elf_file = ElfFile(
+                path=path, elf_cache=self._elf_cache
+            )  # type: Optional[ElfFile]
+        else:
+            elf_file = None
+        self._elf_files[path] = elf_file
+        return elf_file
+
+
+_DYNAMIC_LINKER_RE = re.compile(r"^ld(64|-linux[\w.-]*)?\.so\.\d+$")
+
+
+def _expand_origin(paths: List[str], elf_file_path: str) -> List[str]:
+    origin = os.path.dirname(elf_file_path)
+    return [
+        p.replace("${ORIGIN}", origin).replace("$ORIGIN", origin) for p in paths if p
+    ]
+
+
+_system_library_paths = None  # type: List[str]
+
+
+def get_system_library_paths() -> List[str]:
+    """Return the library paths searched by the dynamic linker on this host."""
+    global _system_library_paths
+    if _system_library_paths is None:
+        paths = _read_ld_so_conf("/etc/ld.so.conf")
+        # Trusted directories searched after the configured ones.
+        for path in ("/lib", "/usr/lib", "/lib64", "/usr/lib64"):
+            if path not in paths:
+                paths.append(path)
+        _system_library_paths = paths
+
+    return _system_library_paths
+
+
+def _read_ld_so_conf(ld_conf_file: str) -> List[str]:
+    paths = []  # type: List[str]
+    try:
+        with open(ld_conf_file) as f:
+            lines = f.readlines()
+    except OSError:
+        return paths
+
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if line.startswith("include"):
+            pattern = line.split(None, 1)[1]
+            if not os.path.isabs(pattern):
+                pattern = os.path.join(os.path.dirname(ld_conf_file), pattern)
+            for included_file in sorted(glob.glob(pattern)):
+                paths.extend(_read_ld_so_conf(included_file))
+        elif line:
+            paths.extend(p for p in re.split(r"[:\s,]", line) if p)
+    return paths
+
 
 class Patcher:
     """Patcher holds the necessary logic to patch elf files."""
@@ -597,16 +839,31 @@ def _extract_ld_library_paths(ld_conf_file: str) -> List[str]:
 _libraries = None
 
 
-def get_elf_files(root: str, file_list: Sequence[str]) -> FrozenSet[ElfFile]:
+def get_elf_files(
+    root: str,
+    file_list: Iterable[str],
+    *,
+    elf_cache: cache.ElfCache = None,
+    workers: int = 1
+) -> FrozenSet[ElfFile]:
     """Return a frozenset of elf files from file_list prepended with root.
 
     :param str root: the root directory from where the file_list is generated.
     :param file_list: a list of file in root.
+    :param ElfCache elf_cache: cache for the attributes of the elf files, the
+                               persistent cache is loaded and saved if not
+                               set, otherwise saving it is up to the caller.
+    :param int workers: the number of processes used to read the elf files
+                        that are not cached yet.
     :returns: a frozentset of ElfFile objects.
     """
     elf_files = set()  # type: Set[ElfFile]
+    save_elf_cache = elf_cache is None
+    if elf_cache is None:
+        elf_cache = cache.ElfCache()
 
-    for part_file in file_list:
+    elf_paths = []  # type: List[str]
+    for part_file in sorted(file_list):
         # Filter out object (*.o) files-- we only care about binaries.
         if part_file.endswith(".o"):
             continue
@@ -618,14 +875,49 @@ def get_elf_files(root: str, file_list: Sequence[str]) -> FrozenSet[ElfFile]:
             continue
         # Finally, make sure this is actually an ELF file
         if ElfFile.is_elf(path):
-            elf_file = ElfFile(path=path)
-            # if we have dyn symbols we are dynamic
-            if elf_file.needed:
-                elf_files.add(elf_file)
+            elf_paths.append(path)
+
+    if workers > 1:
+        _cache_elf_data(elf_paths, elf_cache=elf_cache, workers=workers)
+
+    for path in elf_paths:
+        elf_file = ElfFile(path=path, elf_cache=elf_cache)
+        # if we have dyn symbols we are dynamic
+        if elf_file.needed:
+            elf_files.add(elf_file)
 
+    if save_elf_cache:
+        elf_cache.save()
     return frozenset(elf_files)
 
 
+def _cache_elf_data(
+    elf_paths: List[str], *, elf_cache: cache.ElfCache, workers: int
+) -> None:
+    missing_paths = [p for p in elf_paths if elf_cache.get(p) is None]
+    # Not worth starting the processes for a single file.
+    if len(missing_paths) < 2:
+        return
+
+    logger.debug(
+        "Reading {} ELF files using {} processes".format(len(missing_paths), workers)
+    )
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        # map returns the results in order, the cache is filled in the same
+        # order as in a serial run.
+        for path, elf_data in zip(
+            missing_paths, executor.map(_extract_elf_data, missing_paths)
+        ):
+            elf_cache.set(path, elf_data)
+
+
+def _extract_elf_data(path: str) -> Dict[str, Any]:
+    # Run in the worker processes of _cache_elf_data, the extracted data is
+    # returned in its serializable form.
+    elf_file = ElfFile.__new__(ElfFile)
+    return _elf_data_to_dict(elf_file._extract(path))
+
+
 def _get_dynamic_linker(library_list: List[str]) -> str:
     """Return the dynamic linker from library_list."""
     regex = re.compile(r"(?P<dynamic_linker>ld-[\d.]+.so)$")
@@ -684,3 +684,10 @@ class SnapDataExtractionError(SnapcraftError):
 
     def __init__(self, snap):
         super().__init__(snap=snap)
+
+
+class InvalidSquashFSError(SnapcraftError):
+    fmt = "Cannot read squashfs image {path!r}: {message}."
+
+    def __init__(self, *, path: str, message: str) -> None:
+        super().__init__(path=path, message=message)
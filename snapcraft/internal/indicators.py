@@ -13,12 +13,45 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import logging
 import os
+import re
 import sys
+import threading
+import time
 
+import requests
 from urllib.request import urlretrieve
 from progressbar import AnimatedMarker, Bar, Percentage, ProgressBar, UnknownLength
 
+from snapcraft import file_utils
+from snapcraft.internal.cache import SnapcraftCache
+
+logger = logging.getLogger(__name__)
+
+# Ranged downloads are read and written in chunks of this size.
+_BUFFER_SIZE = 1024 * 1024
+# Files are only split in segments of at least this size, smaller ones are
+# not worth the extra requests.
+_MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+# How many times a segment is requested again from where it stopped
+# before giving up.
+_SEGMENT_RETRIES = 5
+# Streamed downloads are read in chunks between these sizes, depending on
+# the length of the file.
+_MIN_CHUNK_SIZE = 64 * 1024
+_MAX_CHUNK_SIZE = 1024 * 1024
+# Progress bars are redrawn at most this often, in seconds.
+_PROGRESS_INTERVAL = 0.1
+_CONTENT_RANGE_PATTERN = re.compile(r"bytes \d+-\d+/(\d+)$")
+# The state of unfinished ranged downloads is saved in this directory of the
+# cache, by the hash of their destination.
+_DOWNLOAD_STATE_DIRECTORY = "downloads"
+
 
 def _init_progress_bar(total_length, destination, message=None):
     if not message:
@@ -42,6 +75,37 @@ def _init_progress_bar(total_length, destination, message=None):
     return ProgressBar(widgets=widgets, maxval=maxval)
 
 
+class _ThrottledProgressBar:
+    """Wrap a ProgressBar to redraw it at most every _PROGRESS_INTERVAL."""
+
+    def __init__(self, progress_bar):
+        self._progress_bar = progress_bar
+        self._last_update = None
+        self._value = None
+
+    def start(self):
+        self._progress_bar.start()
+
+    def update(self, value):
+        self._value = value
+        now = time.monotonic()
+        if self._last_update is None or now - self._last_update >= _PROGRESS_INTERVAL:
+            self._last_update = now
+            self._progress_bar.update(value)
+
+    def finish(self):
+        # The last value is always shown, even if it came too soon.
+        if self._value is not None:
+            self._progress_bar.update(self._value)
+        self._progress_bar.finish()
+
+
+def _get_chunk_size(total_length):
+    # Small files are read in small chunks for the progress to be smooth,
+    # larger ones in larger chunks to spend less time per byte in Python.
+    return max(_MIN_CHUNK_SIZE, min(_MAX_CHUNK_SIZE, total_length // 100))
+
+
 def download_requests_stream(request_stream, destination, message=None, total_read=0):
     """This is a facility to download a request with nice progress bars."""
 
@@ -56,7 +120,9 @@ def download_requests_stream(request_stream, destination, message=None, total_re
         if os.path.exists(destination):
             total_length += total_read
 
-    progress_bar = _init_progress_bar(total_length, destination, message)
+    progress_bar = _ThrottledProgressBar(
+        _init_progress_bar(total_length, destination, message)
+    )
     progress_bar.start()
 
     if os.path.exists(destination):
@@ -64,7 +130,7 @@ def download_requests_stream(request_stream, destination, message=None, total_re
     else:
         mode = "wb"
     with open(destination, mode) as destination_file:
-        for buf in request_stream.iter_content(1024):
+        for buf in request_stream.iter_content(_get_chunk_size(total_length)):
             destination_file.write(buf)
             if not is_dumb_terminal():
                 total_read += len(buf)
@@ -72,6 +138,295 @@ def download_requests_stream(request_stream, destination, message=None, total_re
     progress_bar.finish()
 
 
+def download_ranges(
+    url, destination, *, get=None, segments=4, message=None, algorithms=()
+):
+    """Download url into destination, fetching segments of it concurrently.
+
+    When the server supports HTTP ranges, the file is split in up to
+    segments ranges that are requested at the same time and written in
+    place into destination. Segments are requested again from where they
+    stopped if the connection drops, and a download that failed is resumed
+    by the next call for the same destination. The file is hashed with
+    algorithms while it is being downloaded, for
+    file_utils.calculate_digests to return the digests without reading it
+    again.
+
+    The file is downloaded with a single request from servers that do not
+    support ranges.
+
+    :param str url: the url to download.
+    :param str destination: the path to download url to.
+    :param get: the function to send GET requests with, like requests.get,
+                which is used by default.
+    :param int segments: the maximum number of segments to download at a
+                         time.
+    :param str message: the message to show in the progress bar.
+    :param algorithms: the algorithms to hash the file with.
+    :raises requests.exceptions.RequestException: if the download fails.
+    """
+    if get is None:
+        get = requests.get
+
+    headers = {"Range": "bytes=0-0", "Accept-Encoding": "identity"}
+    response = get(url, headers=headers, stream=True)
+    response.raise_for_status()
+    match = _CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+    if response.status_code != 206 or match is None:
+        if response.status_code == 206:
+            response.close()
+            response = get(url, stream=True)
+            response.raise_for_status()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(destination)
+        download_requests_stream(response, destination, message)
+        return
+
+    response.close()
+    download = _RangedDownload(
+        url,
+        destination,
+        get=get,
+        total_length=int(match.group(1)),
+        validator=_get_validator(response.headers),
+        message=message,
+        algorithms=algorithms,
+    )
+    download.run(segments)
+
+
+def _get_validator(headers):
+    # Weak entity tags cannot be used in If-Range (RFC 7233), servers answer
+    # with the whole file to them.
+    etag = headers.get("ETag")
+    if etag is not None and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def _get_state_path(destination):
+    key = hashlib.sha256(os.path.abspath(destination).encode()).hexdigest()
+    return os.path.join(
+        SnapcraftCache().cache_root, _DOWNLOAD_STATE_DIRECTORY, key + ".json"
+    )
+
+
+class _Segment:
+    def __init__(self, start, end, received=0):
+        self.start = start
+        self.end = end
+        self.received = received
+
+    @property
+    def position(self):
+        return self.start + self.received
+
+    @property
+    def remaining(self):
+        return self.end - self.position
+
+
+class _RangedDownload:
+    def __init__(
+        self, url, destination, *, get, total_length, validator, message, algorithms
+    ):
+        self._url = url
+        self._destination = destination
+        self._get = get
+        self._total_length = total_length
+        self._validator = validator
+        self._state_path = _get_state_path(destination)
+        self._segments = []
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._hashed_length = 0
+        self._hashers = {
+            algorithm: getattr(hashlib, algorithm)() for algorithm in set(algorithms)
+        }
+        self._progress_bar = _ThrottledProgressBar(
+            _init_progress_bar(total_length, destination, message)
+        )
+
+    def run(self, segment_count):
+        self._segments = self._load_segments()
+        if self._segments is None:
+            self._segments = self._split(segment_count)
+            self._preallocate()
+        else:
+            logger.debug("Resuming download of {!r}.".format(self._url))
+
+        try:
+            self._fetch_segments()
+        finally:
+            self._save_segments()
+
+        file_utils.memoize_digests(
+            self._destination,
+            {algorithm: h.hexdigest() for algorithm, h in self._hashers.items()},
+        )
+
+    def _split(self, segment_count):
+        segment_count = max(
+            1, min(segment_count, self._total_length // _MIN_SEGMENT_SIZE)
+        )
+        segment_length = max(1, -(-self._total_length // segment_count))
+        return [
+            _Segment(start, min(start + segment_length, self._total_length))
+            for start in range(0, self._total_length, segment_length)
+        ]
+
+    def _preallocate(self):
+        with open(self._destination, "wb") as destination_file:
+            try:
+                os.posix_fallocate(destination_file.fileno(), 0, self._total_length)
+            except (AttributeError, OSError):
+                destination_file.truncate(self._total_length)
+
+    def _load_segments(self):
+        # An unfinished download is only resumed if the server says that
+        # the file did not change since.
+        try:
+            with open(self._state_path) as state_file:
+                state = json.load(state_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if (
+            self._validator is None
+            or state.get("validator") != self._validator
+            or state.get("length") != self._total_length
+            or not os.path.isfile(self._destination)
+            or os.path.getsize(self._destination) != self._total_length
+        ):
+            return None
+        return [_Segment(*segment) for segment in state["segments"]]
+
+    def _save_segments(self):
+        if all(segment.remaining == 0 for segment in self._segments):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._state_path)
+            return
+
+        state = {
+            "validator": self._validator,
+            "length": self._total_length,
+            "segments": [[s.start, s.end, s.received] for s in self._segments],
+        }
+        os.makedirs(os.path.dirname(self._state_path), exist_ok=True)
+        with open(self._state_path, "w") as state_file:
+            json.dump(state, state_file)
+
+    def _fetch_segments(self):
+        pending = [s for s in self._segments if s.remaining > 0]
+        self._progress_bar.start()
+        self._update_progress_bar()
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(len(pending), 1)
+        ) as executor:
+            futures = [executor.submit(self._fetch_segment, s) for s in pending]
+            try:
+                not_done = futures
+                while not_done:
+                    # Hash what has been downloaded in order so far while
+                    # waiting for the rest.
+                    done, not_done = concurrent.futures.wait(not_done, timeout=0.1)
+                    for future in done:
+                        # Give up on the other segments as soon as one fails.
+                        future.result()
+                    self._hash_downloaded()
+            except BaseException:
+                self._cancelled = True
+                for future in futures:
+                    future.cancel()
+                raise
+        for future in futures:
+            future.result()
+        self._hash_downloaded()
+        self._progress_bar.finish()
+
+    def _fetch_segment(self, segment):
+        retries = 0
+        # The file is not buffered, so that what is written can be read
+        # back for hashing right away.
+        with open(self._destination, "r+b", buffering=0) as destination_file:
+            while segment.remaining > 0 and not self._cancelled:
+                try:
+                    self._fetch_range(segment, destination_file)
+                    continue
+                except (
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ConnectionError,
+                ) as e:
+                    if retries == _SEGMENT_RETRIES:
+                        raise
+                    logger.debug(
+                        "Error while downloading {!r}: {!r}. "
+                        "Retries left to download: {!r}.".format(
+                            self._url, e, _SEGMENT_RETRIES - retries
+                        )
+                    )
+                retries += 1
+                time.sleep(1)
+
+    def _fetch_range(self, segment, destination_file):
+        headers = {
+            "Range": "bytes={}-{}".format(segment.position, segment.end - 1),
+            "Accept-Encoding": "identity",
+        }
+        if self._validator is not None:
+            headers["If-Range"] = self._validator
+        response = self._get(self._url, headers=headers, stream=True)
+        try:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise requests.exceptions.HTTPError(
+                    "{!r} changed while it was being downloaded".format(self._url),
+                    response=response,
+                )
+            destination_file.seek(segment.position)
+            for buf in response.iter_content(_BUFFER_SIZE):
+                buf = buf[: segment.remaining]
+                destination_file.write(buf)
+                with self._lock:
+                    segment.received += len(buf)
+                    self._update_progress_bar()
+                if segment.remaining == 0 or self._cancelled:
+                    return
+        finally:
+            response.close()
+        if segment.remaining > 0:
+            raise requests.exceptions.ChunkedEncodingError("Response ended prematurely")
+
+    def _update_progress_bar(self):
+        if not is_dumb_terminal():
+            self._progress_bar.update(
+                sum(segment.position - segment.start for segment in self._segments)
+            )
+
+    def _hash_downloaded(self):
+        if not self._hashers:
+            return
+
+        downloaded_length = self._total_length
+        for segment in self._segments:
+            if segment.remaining > 0:
+                downloaded_length = segment.position
+                break
+
+        if downloaded_length <= self._hashed_length:
+            return
+        with open(self._destination, "rb") as destination_file:
+            destination_file.seek(self._hashed_length)
+            while self._hashed_length < downloaded_length:
+                buf = destination_file.read(
+                    min(_BUFFER_SIZE, downloaded_length - self._hashed_length)
+                )
+                if not buf:
+                    break
+                for hasher in self._hashers.values():
+                    hasher.update(buf)
+                self._hashed_length += len(buf)
+
+
 class UrllibDownloader(object):
     """This is a facility to download an uri with nice progress bars."""
 
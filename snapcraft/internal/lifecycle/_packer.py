@@ -13,13 +13,17 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import json
 import logging
 import os
+import re
 import time
 from subprocess import check_call, CalledProcessError, Popen, PIPE, STDOUT
+from typing import Any, Callable, Dict, List, Optional  # noqa: F401
 
-from progressbar import AnimatedMarker, ProgressBar
+from progressbar import Bar, Percentage, ProgressBar
 
+import snapcraft
 from . import errors
 from snapcraft import file_utils, yaml_utils
 from snapcraft.internal import common
@@ -28,6 +32,21 @@ from snapcraft.internal.indicators import is_dumb_terminal
 
 _SNAP_PATH = os.path.join(os.path.sep, "snap", "core", "current", "usr", "bin", "snap")
 
+# The mksquashfs options for each compression. xz needs to match the review
+# tools, the others pack faster for local testing.
+_COMPRESSION_ARGS = {
+    "xz": ["-comp", "xz"],
+    "lzo": ["-comp", "lzo"],
+    "none": ["-noI", "-noD"],
+}
+COMPRESSIONS = sorted(_COMPRESSION_ARGS)
+
+# mksquashfs redraws "[====   ] 120/345  34%" in place as it goes.
+_PROGRESS_PATTERN = re.compile(r"(\d+)/(\d+)\s+\d+%")
+_UNCOMPRESSED_SIZE_PATTERN = re.compile(
+    r"of uncompressed filesystem size \(([\d.]+) Kbytes\)"
+)
+
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +64,20 @@ def _snap_data_from_dir(directory):
     }
 
 
-def pack(directory, output=None):
+def pack(directory, output=None, *, compression="xz"):
+    """Pack directory into a snap.
+
+    If SNAPCRAFT_PACK_REPORT is set, a JSON report of the packing is
+    written to the path it holds.
+
+    :param str directory: the directory with the contents of the snap.
+    :param str output: the path to the snap, defaults to a name made up of
+                       its name, version and architectures.
+    :param str compression: the compression of the snap, one of
+                            COMPRESSIONS. Only xz snaps are accepted by the
+                            store.
+    :returns: the path to the snap.
+    """
     mksquashfs_path = file_utils.get_tool_path("mksquashfs")
 
     snap = _snap_data_from_dir(directory)
@@ -72,13 +104,30 @@ def pack(directory, output=None):
         logger.warning("Renaming stale build assertion to {}".format(_new))
         os.rename(snap_build, _new)
 
-    _run_mksquashfs(
+    if compression != "xz":
+        logger.warning(
+            "Packing with {} compression, the snap will not be accepted by "
+            "the store.".format(compression)
+        )
+
+    report = _run_mksquashfs(
         mksquashfs_path,
         directory=directory,
         snap_name=snap["name"],
         snap_type=snap["type"],
         output_snap_name=output_snap_name,
+        compression=compression,
+        processors=snapcraft.ProjectOptions().parallel_build_count,
     )
+    logger.debug(
+        "Packed {!r} in {:.1f}s ({} bytes).".format(
+            output_snap_name, report["duration"], report["size"]
+        )
+    )
+    report_path = os.environ.get("SNAPCRAFT_PACK_REPORT")
+    if report_path:
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=4, sort_keys=True)
 
     return output_snap_name
 
@@ -91,13 +140,22 @@ def _run_snap_pack_verification(*, directory: str) -> None:
 
 
 def _run_mksquashfs(
-    mksquashfs_command, *, directory, snap_name, snap_type, output_snap_name
+    mksquashfs_command,
+    *,
+    directory,
+    snap_name,
+    snap_type,
+    output_snap_name,
+    compression="xz",
+    processors=1
 ):
     # These options need to match the review tools:
     # http://bazaar.launchpad.net/~click-reviewers/click-reviewers-tools/trunk/view/head:/clickreviews/common.py#L38
-    mksquashfs_args = ["-noappend", "-comp", "xz", "-no-xattrs", "-no-fragments"]
+    mksquashfs_args = ["-noappend"] + _COMPRESSION_ARGS[compression]
+    mksquashfs_args += ["-no-xattrs", "-no-fragments"]
     if snap_type not in ("os", "base"):
         mksquashfs_args.append("-all-root")
+    mksquashfs_args += ["-processors", str(processors)]
 
     complete_command = [
         mksquashfs_command,
@@ -105,32 +163,74 @@ def _run_mksquashfs(
         output_snap_name,
     ] + mksquashfs_args
 
+    start_time = time.monotonic()
     with Popen(complete_command, stdout=PIPE, stderr=STDOUT) as proc:
-        ret = None
         if is_dumb_terminal():
             logger.info("Snapping {!r} ...".format(snap_name))
-            ret = proc.wait()
+            output = _read_mksquashfs_output(proc.stdout, lambda percentage: None)
         else:
             message = "\033[0;32m\rSnapping {!r}\033[0;32m ".format(snap_name)
-            progress_indicator = ProgressBar(
-                widgets=[message, AnimatedMarker()], maxval=7
-            )
-            progress_indicator.start()
-
-            ret = proc.poll()
-            count = 0
-
-            while ret is None:
-                if count >= 7:
-                    progress_indicator.start()
-                    count = 0
-                progress_indicator.update(count)
-                count += 1
-                time.sleep(.2)
-                ret = proc.poll()
-        print("")
-        if ret != 0:
-            logger.error(proc.stdout.read().decode("utf-8"))
-            raise RuntimeError("Failed to create snap {!r}".format(output_snap_name))
-
-        logger.debug(proc.stdout.read().decode("utf-8"))
+            progress_bar = ProgressBar(
+                widgets=[
+                    message,
+                    Bar(marker="=", left="[", right="]"),
+                    " ",
+                    Percentage(),
+                ],
+                maxval=100,
+            ).start()
+            output = _read_mksquashfs_output(proc.stdout, progress_bar.update)
+            progress_bar.finish()
+        ret = proc.wait()
+    duration = time.monotonic() - start_time
+    print("")
+    if ret != 0:
+        logger.error(output)
+        raise RuntimeError("Failed to create snap {!r}".format(output_snap_name))
+    logger.debug(output)
+
+    return _get_report(
+        output,
+        snap_name=snap_name,
+        output_snap_name=output_snap_name,
+        compression=compression,
+        processors=processors,
+        duration=duration,
+    )
+
+
+def _read_mksquashfs_output(
+    stdout, progress_callback: Callable[[int], None], chunk_size: int = 4096
+) -> str:
+    # Returns the output, besides the progress which is passed on as a
+    # percentage whenever it changes.
+    output_lines = []  # type: List[str]
+    percentage = None  # type: Optional[int]
+    pending = b""
+    while True:
+        chunk = stdout.read1(chunk_size)
+        *lines, pending = re.split(rb"\r\n?|\n", pending + chunk)
+        if not chunk:
+            lines.append(pending)
+        for line in (b.decode("utf-8", errors="replace") for b in lines):
+            match = _PROGRESS_PATTERN.search(line)
+            if match is None:
+                output_lines.append(line)
+                continue
+            done, total = (int(g) for g in match.groups())
+            new_percentage = done * 100 // total if total else 100
+            if new_percentage != percentage:
+                percentage = new_percentage
+                progress_callback(percentage)
+        if not chunk:
+            return "\n".join(output_lines).strip("\n")
+
+
+def _get_report(output: str, *, output_snap_name: str, **kwargs) -> Dict[str, Any]:
+    report = dict(kwargs)  # type: Dict[str, Any]
+    report["snap"] = output_snap_name
+    report["size"] = os.path.getsize(output_snap_name)
+    match = _UNCOMPRESSED_SIZE_PATTERN.search(output)
+    if match:
+        report["uncompressed_size"] = int(float(match.group(1)) * 1024)
+    return report
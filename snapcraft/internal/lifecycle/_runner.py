@@ -14,9 +14,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from concurrent import futures
 import logging
 from typing import List  # noqa: F401
-from typing import Sequence
+from typing import Dict, Sequence, Set  # noqa: F401
 
 from snapcraft import config
 from snapcraft.internal import (
@@ -39,6 +40,7 @@ def execute(
     step: steps.Step,
     project_config: "project_loader._config.Config",
     part_names: Sequence[str] = None,
+    parallel_parts: int = 1,
 ):
     """Execute until step in the lifecycle for part_names or all parts.
 
@@ -54,6 +56,10 @@ def execute(
     :param project_config: Fully loaded project (old logic moving either to
                            Project or the PluginHandler).
     :param list part_names: A list of parts to execute the lifecycle on.
+    :param int parallel_parts: Maximum number of parts to pull and build at
+                               the same time. Parts are only ever pulled or
+                               built once all the parts they are after have
+                               been staged.
     :raises RuntimeError: If a prerequesite of the part needs to be staged
                           and such part is not in the list of parts to iterate
                           over.
@@ -90,8 +96,12 @@ def execute(
     global_state.append_build_snaps(installed_snaps)
     global_state.save(filepath=project_config.project._get_global_state_file_path())
 
-    executor = _Executor(project_config)
-    executor.run(step, part_names)
+    executor = _Executor(project_config, parallel_parts=parallel_parts)
+    try:
+        executor.run(step, part_names)
+    finally:
+        # Keep what was read from the ELF files primed before any failure.
+        project_config.parts.elf_cache.save()
     if not executor.steps_were_run:
         logger.warn(
             "The requested action has already been taken. Consider\n"
@@ -118,14 +128,21 @@ def _replace_in_part(part):
     return part
 
 
+# Steps that only touch the part's own directories and can therefore run for
+# several parts at the same time.
+_CONCURRENT_STEPS = [steps.PULL, steps.BUILD]
+
+
 class _Executor:
-    def __init__(self, project_config):
+    def __init__(self, project_config, *, parallel_parts: int = 1):
         self.config = project_config
         self.project = project_config.project
         self.parts_config = project_config.parts
         self.steps_were_run = False
 
         self._cache = StatusCache(project_config)
+        self._parallel_parts = parallel_parts
+        self._scheduling = False
 
     def run(self, step: steps.Step, part_names=None):
         if part_names:
@@ -139,16 +156,137 @@ class _Executor:
             processed_part_names = self.config.part_names
 
         with config.CLIConfig() as cli_config:
-            for current_step in step.previous_steps() + [step]:
+            lifecycle_steps = step.previous_steps() + [step]
+            if self._parallel_parts > 1 and not self._scheduling:
+                self._run_concurrently(part_names, parts, step, cli_config)
+                lifecycle_steps = [
+                    s for s in lifecycle_steps if s not in _CONCURRENT_STEPS
+                ]
+
+            for current_step in lifecycle_steps:
                 if current_step == steps.STAGE:
                     # XXX check only for collisions on the parts that have
                     # already been built --elopio - 20170713
-                    pluginhandler.check_for_collisions(self.config.all_parts)
+                    pluginhandler.check_for_collisions(
+                        self.config.all_parts,
+                        workers=self.project.parallel_build_count,
+                    )
                 for part in parts:
                     self._handle_step(part_names, part, step, current_step, cli_config)
 
         self._create_meta(step, processed_part_names)
 
+    def _run_concurrently(
+        self,
+        requested_part_names: Sequence[str],
+        parts: Sequence[pluginhandler.PluginHandler],
+        requested_step: steps.Step,
+        cli_config,
+    ) -> None:
+        """Pull and build parts in a pool of workers following the after DAG.
+
+        A part is handed to a worker once every part it is after has gone
+        through the concurrent steps. The dependencies it needs staged are
+        staged from this thread while no worker is running, so stage keeps
+        its collision checks and is never run concurrently with a build.
+        """
+        concurrent_steps = [
+            s
+            for s in requested_step.previous_steps() + [requested_step]
+            if s in _CONCURRENT_STEPS
+        ]
+        pending = list(parts)
+        in_progress = {p.name for p in parts}
+        running = dict()  # type: Dict[futures.Future, pluginhandler.PluginHandler]
+        failures = []  # type: List[BaseException]
+
+        self._scheduling = True
+        try:
+            with futures.ThreadPoolExecutor(
+                max_workers=self._parallel_parts
+            ) as executor:
+                while pending or running:
+                    ready = [
+                        p
+                        for p in pending
+                        if not any(d.name in in_progress for d in p.deps)
+                    ]
+                    blocked = [
+                        p
+                        for p in ready
+                        if self._is_blocked(
+                            p, requested_part_names, requested_step, concurrent_steps
+                        )
+                    ]
+                    if blocked and not running:
+                        for part in blocked:
+                            self._prepare_dependencies(part, concurrent_steps[-1])
+                        continue
+
+                    for part in (p for p in ready if p not in blocked):
+                        pending.remove(part)
+                        future = executor.submit(
+                            self._handle_steps_for_part,
+                            requested_part_names,
+                            part,
+                            requested_step,
+                            concurrent_steps,
+                            cli_config,
+                        )
+                        running[future] = part
+
+                    done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                    for future in done:
+                        in_progress.discard(running.pop(future).name)
+                        if future.exception():
+                            failures.append(future.exception())
+                            # Do not schedule anything else once a part
+                            # fails, just wait for the ones already running.
+                            pending.clear()
+        finally:
+            self._scheduling = False
+
+        if failures:
+            raise failures[0]
+
+    def _is_blocked(
+        self,
+        part: pluginhandler.PluginHandler,
+        requested_part_names: Sequence[str],
+        requested_step: steps.Step,
+        concurrent_steps: List[steps.Step],
+    ) -> bool:
+        """Return True if part has dependencies to stage before it can run."""
+        explicitly_requested = (
+            requested_part_names
+            and part.name in requested_part_names
+            and requested_step in concurrent_steps
+        )
+        if not explicitly_requested and not self._cache.should_step_run(
+            part, concurrent_steps[-1]
+        ):
+            return False
+
+        return bool(self._get_dependencies_to_prepare(part, concurrent_steps[-1]))
+
+    def _handle_steps_for_part(
+        self,
+        requested_part_names: Sequence[str],
+        part: pluginhandler.PluginHandler,
+        requested_step: steps.Step,
+        concurrent_steps: List[steps.Step],
+        cli_config,
+    ) -> None:
+        common.set_output_prefix("{}: ".format(part.name))
+        try:
+            for current_step in concurrent_steps:
+                self._handle_step(
+                    requested_part_names, part, requested_step, current_step, cli_config
+                )
+        finally:
+            common.set_output_prefix(None)
+            common.reset_env()
+
     def _handle_step(
         self,
         requested_part_names: Sequence[str],
@@ -239,20 +377,26 @@ class _Executor:
     def _reprime(self, part, hint=""):
         self._rerun_step(step=steps.PRIME, part=part, progress="Re-priming", hint=hint)
 
-    def _prepare_step(self, *, step: steps.Step, part: pluginhandler.PluginHandler):
-        common.reset_env()
+    def _get_dependencies_to_prepare(
+        self, part: pluginhandler.PluginHandler, step: steps.Step
+    ) -> Set[pluginhandler.PluginHandler]:
         all_dependencies = self.parts_config.get_dependencies(part.name)
 
         # Filter dependencies down to only those that need to run the
         # prerequisite step
         prerequisite_step = steps.get_dependency_prerequisite_step(step)
-        dependencies = {
+        return {
             p
             for p in all_dependencies
             if self._cache.should_step_run(p, prerequisite_step)
         }
 
+    def _prepare_dependencies(
+        self, part: pluginhandler.PluginHandler, step: steps.Step
+    ) -> None:
+        dependencies = self._get_dependencies_to_prepare(part, step)
         if dependencies:
+            prerequisite_step = steps.get_dependency_prerequisite_step(step)
             dependency_names = {p.name for p in dependencies}
             # Dependencies need to go all the way to the prerequisite step to
             # be able to share the common assets that make them a dependency
@@ -263,14 +407,19 @@ class _Executor:
             )
             self.run(prerequisite_step, dependency_names)
 
+    def _prepare_step(self, *, step: steps.Step, part: pluginhandler.PluginHandler):
+        common.reset_env()
+        self._prepare_dependencies(part, step)
+
         # Run the preparation function for this step (if implemented)
         preparation_function = getattr(part, "prepare_{}".format(step.name), None)
         if preparation_function:
             notify_part_progress(part, "Preparing to {}".format(step.name), debug=True)
             preparation_function()
 
-        common.env = self.parts_config.build_env_for_part(part)
-        common.env.extend(self.config.project_env())
+        part_env = self.parts_config.build_env_for_part(part)
+        part_env.extend(self.config.project_env())
+        common.set_env(part_env)
 
         part = _replace_in_part(part)
 
@@ -287,6 +436,7 @@ class _Executor:
     def _complete_step(self, part, step):
         self._cache.clear_step(part, step)
         self._cache.add_step_run(part, step)
+        self.parts_config.invalidate_build_env(part.name, staged=step == steps.STAGE)
         self.steps_were_run = True
 
     def _rerun_step(self, *, step: steps.Step, part, progress, hint=""):
@@ -295,6 +445,7 @@ class _Executor:
 
         # First clean the step, then run it again
         part.clean(staged_state, primed_state, step)
+        self.parts_config.invalidate_build_env(part.name)
 
         # Uncache this and later steps since we just cleaned them: their status
         # has changed
@@ -335,7 +486,12 @@ class _Executor:
                 "Updating {} step for".format(step.name),
                 "({})".format(outdated_report.get_summary()),
             )
-            update_function()
+            if step in (steps.STAGE, steps.PRIME):
+                # Files removed since the last run are cleaned from the
+                # shared areas unless other parts still provide them.
+                update_function(self.config.get_project_state(step))
+            else:
+                update_function()
 
             # We know we just ran this step, so rather than check, manually
             # twiddle the cache
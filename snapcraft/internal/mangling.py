@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import logging
+import os
 import re
 import subprocess
 from typing import FrozenSet
@@ -25,10 +26,12 @@ from snapcraft.internal import elf
 logger = logging.getLogger(__name__)
 
 
-def rewrite_python_shebangs(root_dir):
+def rewrite_python_shebangs(root_dir, *, files=None):
     """Recursively change #!/usr/bin/pythonX shebangs to #!/usr/bin/env pythonX
 
     :param str root_dir: Directory that will be crawled for shebangs.
+    :param set files: the files to rewrite, relative to root_dir. If not
+                      set, every file in root_dir is rewritten.
     """
 
     file_pattern = re.compile(r"")
@@ -37,9 +40,21 @@ def rewrite_python_shebangs(root_dir):
         r"\A#!.*(python\S*)[ \t\f\v]+(\S+)$", re.MULTILINE
     )
 
-    file_utils.replace_in_file(
-        root_dir, file_pattern, argless_shebang_pattern, r"#!/usr/bin/env \1"
-    )
+    def _replace(search_pattern, replacement):
+        if files is None:
+            file_utils.replace_in_file(
+                root_dir, file_pattern, search_pattern, replacement
+            )
+            return
+        for file_path in sorted(files):
+            file_path = os.path.join(root_dir, file_path)
+            # Don't bother trying to rewrite a symlink, like replace_in_file.
+            if os.path.isfile(file_path) and not os.path.islink(file_path):
+                file_utils.search_and_replace_contents(
+                    file_path, search_pattern, replacement
+                )
+
+    _replace(argless_shebang_pattern, r"#!/usr/bin/env \1")
 
     # The above rewrite will barf if the shebang includes any args to python.
     # For example, if the shebang was `#!/usr/bin/python3 -Es`, just replacing
@@ -50,11 +65,8 @@ def rewrite_python_shebangs(root_dir):
     # then exec the original shebang with included arguments. This requires
     # some quoting hacks to ensure the file can be interpreted by both sh as
     # well as python, but it's better than shipping our own `env`.
-    file_utils.replace_in_file(
-        root_dir,
-        file_pattern,
-        shebang_pattern_with_args,
-        r"""#!/bin/sh\n''''exec \1 \2 -- "$0" "$@" # '''""",
+    _replace(
+        shebang_pattern_with_args, r"""#!/bin/sh\n''''exec \1 \2 -- "$0" "$@" # '''""",
     )
 
 
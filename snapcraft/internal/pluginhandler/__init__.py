@@ -17,14 +17,13 @@
 import collections
 import contextlib
 import copy
-import filecmp
 import logging
 import os
 import shutil
 import subprocess
 import sys
 from glob import glob, iglob
-from typing import cast, Dict, List, Set, Sequence
+from typing import cast, Any, Dict, List, Set  # noqa: F401
 
 import snapcraft.extractors
 from snapcraft import file_utils, yaml_utils
@@ -32,6 +31,8 @@ from snapcraft.internal import common, elf, errors, repo, sources, states, steps
 from snapcraft.internal.mangling import clear_execstack
 
 from ._build_attributes import BuildAttributes
+from ._collisions import CollisionChecker
+from ._fileset_resolver import resolve_fileset
 from ._metadata_extraction import extract_metadata
 from ._plugin_loader import load_plugin  # noqa
 from ._runner import Runner
@@ -61,7 +62,8 @@ class PluginHandler:
         base,
         confinement,
         snap_type,
-        soname_cache
+        soname_cache,
+        elf_cache
     ):
         self.valid = False
         self.plugin = plugin
@@ -74,6 +76,7 @@ class PluginHandler:
         self._confinement = confinement
         self._snap_type = snap_type
         self._soname_cache = soname_cache
+        self._elf_cache = elf_cache
         self._source = grammar_processor.get_source()
         if not self._source:
             self._source = part_schema["source"].get("default")
@@ -726,8 +729,22 @@ class PluginHandler:
         if self.is_clean(steps.STAGE):
             self.mark_stage_done(set(), set())
 
+    def update_stage(self, project_staged_state):
+        # Files that are no longer part of the stage fileset are removed
+        # here, the ones that changed are migrated again by _do_stage.
+        self._clean_removed_files(steps.STAGE, self.stagedir, project_staged_state)
+        self.makedirs()
+        self._runner.stage()
+
+        # Refresh the step even if override-stage did not stage anything.
+        self.mark_done(steps.STAGE, states.get_state(self.plugin.statedir, steps.STAGE))
+
     def _do_stage(self):
         snap_files, snap_dirs = self.migratable_fileset_for(steps.STAGE)
+        fingerprints = _get_fingerprints(snap_files, self.plugin.installdir)
+        changed_files = self._get_changed_files(
+            steps.STAGE, snap_files, fingerprints, self.stagedir
+        )
 
         def fixup_func(file_path):
             if os.path.islink(file_path):
@@ -737,7 +754,7 @@ class PluginHandler:
             repo.fix_pkg_config(self.stagedir, file_path, self.plugin.installdir)
 
         _migrate_files(
-            snap_files,
+            changed_files,
             snap_dirs,
             self.plugin.installdir,
             self.stagedir,
@@ -746,9 +763,9 @@ class PluginHandler:
         # TODO once `snappy try` is in place we will need to copy
         # dependencies here too
 
-        self.mark_stage_done(snap_files, snap_dirs)
+        self.mark_stage_done(snap_files, snap_dirs, fingerprints)
 
-    def mark_stage_done(self, snap_files, snap_dirs):
+    def mark_stage_done(self, snap_files, snap_dirs, fingerprints=None):
         self.mark_done(
             steps.STAGE,
             states.StageState(
@@ -757,6 +774,7 @@ class PluginHandler:
                 self._part_properties,
                 self._project_options,
                 self._scriptlet_metadata[steps.STAGE],
+                fingerprints,
             ),
         )
 
@@ -782,34 +800,66 @@ class PluginHandler:
         if self.is_clean(steps.PRIME):
             self.mark_prime_done(set(), set(), set())
 
+    def update_prime(self, project_primed_state):
+        # Files that are no longer part of the prime fileset are removed
+        # here, the ones that changed are migrated again by _do_prime.
+        self._clean_removed_files(steps.PRIME, self.primedir, project_primed_state)
+        self.makedirs()
+        self._runner.prime()
+
+        # Refresh the step even if override-prime did not prime anything.
+        self.mark_done(steps.PRIME, states.get_state(self.plugin.statedir, steps.PRIME))
+
     def _do_prime(self) -> None:
         snap_files, snap_dirs = self.migratable_fileset_for(steps.PRIME)
-        _migrate_files(snap_files, snap_dirs, self.stagedir, self.primedir)
+        fingerprints = _get_fingerprints(snap_files, self.stagedir)
+        changed_files = self._get_changed_files(
+            steps.PRIME, snap_files, fingerprints, self.primedir
+        )
+        _migrate_files(changed_files, snap_dirs, self.stagedir, self.primedir)
 
         if self._snap_type == "app":
-            dependency_paths = self._handle_elf(snap_files)
+            file_dependency_paths = self._handle_elf(changed_files)
         else:
-            dependency_paths = set()
-
-        self.mark_prime_done(snap_files, snap_dirs, dependency_paths)
-
-    def _handle_elf(self, snap_files: Sequence[str]) -> Set[str]:
-        elf_files = elf.get_elf_files(self.primedir, snap_files)
-        all_dependencies = set()
-        core_path = common.get_core_path(self._base)
-
-        # Clear the cache of all libs that aren't already in the primedir
-        self._soname_cache.reset_except_root(self.primedir)
-        for elf_file in elf_files:
-            all_dependencies.update(
-                elf_file.load_dependencies(
-                    root_path=self.primedir,
-                    core_base_path=core_path,
-                    soname_cache=self._soname_cache,
+            file_dependency_paths = dict()
+
+        # The dependencies of the files that did not change still apply,
+        # unlike those of the files that changed or were removed.
+        unchanged_files = snap_files - changed_files
+        if unchanged_files and self._snap_type == "app":
+            state = states.get_state(self.plugin.statedir, steps.PRIME)
+            previous_paths = getattr(state, "file_dependency_paths", None)
+            if previous_paths is None:
+                # The state predates tracking them per file.
+                elf_files = elf.get_elf_files(
+                    self.primedir,
+                    unchanged_files,
+                    elf_cache=self._elf_cache,
+                    workers=self._project_options.parallel_build_count,
                 )
-            )
+                file_dependency_paths.update(self._load_dependency_paths(elf_files))
+            else:
+                file_dependency_paths.update(
+                    (path, previous_paths[path])
+                    for path in unchanged_files
+                    if path in previous_paths
+                )
+        dependency_paths = set().union(*file_dependency_paths.values())
+
+        self.mark_prime_done(
+            snap_files,
+            snap_dirs,
+            dependency_paths,
+            fingerprints,
+            file_dependency_paths=file_dependency_paths,
+        )
 
-        dependency_paths = self._handle_dependencies(all_dependencies)
+    def _handle_elf(self, snap_files: Set[str]) -> Dict[str, Set[str]]:
+        workers = self._project_options.parallel_build_count
+        elf_files = elf.get_elf_files(
+            self.primedir, snap_files, elf_cache=self._elf_cache, workers=workers
+        )
+        file_dependency_paths = self._load_dependency_paths(elf_files)
 
         if not self._build_attributes.keep_execstack():
             clear_execstack(elf_files=elf_files)
@@ -831,12 +881,43 @@ class PluginHandler:
                 stagedir=self.stagedir,
                 primedir=self.primedir,
                 stage_packages=self._part_properties.get("stage-packages", []),
+                workers=workers,
             )
             part_patcher.patch()
 
-        return dependency_paths
+        return file_dependency_paths
+
+    def _load_dependency_paths(self, elf_files) -> Dict[str, Set[str]]:
+        # Returns the dependency paths of each of the elf files, by their
+        # path relative to the prime directory.
+        core_path = common.get_core_path(self._base)
+
+        # Clear the cache of all libs that aren't already in the primedir
+        self._soname_cache.reset_except_root(self.primedir)
+        resolver = elf.DependencyResolver(
+            root_path=self.primedir, elf_cache=self._elf_cache
+        )
+        file_dependencies = dict()  # type: Dict[str, Set[str]]
+        for elf_file in elf_files:
+            path = os.path.relpath(elf_file.path, self.primedir)
+            file_dependencies[path] = elf_file.load_dependencies(
+                root_path=self.primedir,
+                core_base_path=core_path,
+                soname_cache=self._soname_cache,
+                resolver=resolver,
+            )
 
-    def mark_prime_done(self, snap_files, snap_dirs, dependency_paths):
+        return self._handle_dependencies(file_dependencies)
+
+    def mark_prime_done(
+        self,
+        snap_files,
+        snap_dirs,
+        dependency_paths,
+        fingerprints=None,
+        *,
+        file_dependency_paths=None
+    ):
         self.mark_done(
             steps.PRIME,
             states.PrimeState(
@@ -846,9 +927,54 @@ class PluginHandler:
                 self._part_properties,
                 self._project_options,
                 self._scriptlet_metadata[steps.PRIME],
+                fingerprints,
+                file_dependency_paths,
             ),
         )
 
+    def _get_changed_files(
+        self,
+        step: steps.Step,
+        snap_files: Set[str],
+        fingerprints: Dict[str, List[int]],
+        dstdir: str,
+    ) -> Set[str]:
+        # Without a previous state carrying fingerprints (i.e.; the step was
+        # cleaned) every file needs to be migrated.
+        state = states.get_state(self.plugin.statedir, step)
+        previous_fingerprints = getattr(state, "fingerprints", None)
+        if previous_fingerprints is None:
+            return snap_files
+
+        changed_files = set()
+        for snap_file in snap_files:
+            dst = os.path.join(dstdir, snap_file)
+            if snap_file not in previous_fingerprints:
+                changed_files.add(snap_file)
+            elif previous_fingerprints[snap_file] != fingerprints.get(
+                snap_file
+            ) or not os.path.lexists(dst):
+                # _migrate_files leaves existing symlinks alone, this one is
+                # ours and outdated.
+                if os.path.islink(dst):
+                    os.remove(dst)
+                changed_files.add(snap_file)
+
+        logger.debug(
+            "{} of {} files changed since the last {} of {!r}".format(
+                len(changed_files), len(snap_files), step.name, self.name
+            )
+        )
+        return changed_files
+
+    def _clean_removed_files(self, step, shared_directory, project_state):
+        state = states.get_state(self.plugin.statedir, step)
+        snap_files, snap_dirs = self.migratable_fileset_for(step)
+        removed_state = type(state)(
+            state.files - snap_files, state.directories - snap_dirs
+        )
+        self._clean_shared_area(shared_directory, removed_state, project_state)
+
     def clean_prime(self, project_primed_state, hint=""):
         if self.is_clean(steps.PRIME):
             return
@@ -879,17 +1005,21 @@ class PluginHandler:
         # part.
         _clean_migrated_files(primed_files, primed_directories, shared_directory)
 
-    def _handle_dependencies(self, all_dependencies: Set[str]):
+    def _handle_dependencies(
+        self, file_dependencies: Dict[str, Set[str]]
+    ) -> Dict[str, Set[str]]:
         # Split the necessary dependencies into their corresponding location.
         # We'll only track the part and staged dependencies, since they should have
         # already been primed by other means, and migrating them again could
         # potentially override the `stage` or `snap` filtering.
-        (in_part, staged, primed, system) = _split_dependencies(
-            all_dependencies, self.plugin.installdir, self.stagedir, self.primedir
-        )
-        part_dependency_paths = {os.path.dirname(d) for d in in_part}
-        staged_dependency_paths = {os.path.dirname(d) for d in staged}
-        dependency_paths = part_dependency_paths | staged_dependency_paths
+        tracked_paths = dict()  # type: Dict[str, Set[str]]
+        system = set()  # type: Set[str]
+        for dependency in set().union(*file_dependencies.values()):
+            (in_part, staged, primed, in_system) = _split_dependencies(
+                {dependency}, self.plugin.installdir, self.stagedir, self.primedir
+            )
+            tracked_paths[dependency] = {os.path.dirname(d) for d in in_part | staged}
+            system |= in_system
 
         if system:
             formatted_system = "\n".join(sorted(system))
@@ -901,7 +1031,10 @@ class PluginHandler:
                     part_name=self.name, files=formatted_system
                 )
             )
-        return dependency_paths
+        return {
+            path: set().union(*(tracked_paths[d] for d in dependencies))
+            for path, dependencies in file_dependencies.items()
+        }
 
     def get_primed_dependency_paths(self):
         dependency_paths = set()
@@ -1032,33 +1165,7 @@ def _expand_part_properties(part_properties, part_schema):
 def _migratable_filesets(fileset, srcdir):
     includes, excludes = _get_file_list(fileset)
 
-    include_files = _generate_include_set(srcdir, includes)
-    exclude_files, exclude_dirs = _generate_exclude_set(srcdir, excludes)
-
-    # And chop files, including whole trees if any dirs are mentioned
-    snap_files = include_files - exclude_files
-    for exclude_dir in exclude_dirs:
-        snap_files = set([x for x in snap_files if not x.startswith(exclude_dir + "/")])
-
-    # Separate dirs from files
-    snap_dirs = set(
-        [
-            x
-            for x in snap_files
-            if os.path.isdir(os.path.join(srcdir, x))
-            and not os.path.islink(os.path.join(srcdir, x))
-        ]
-    )
-    snap_files = snap_files - snap_dirs
-
-    # Make sure we also obtain the parent directories of files
-    for snap_file in snap_files:
-        dirname = os.path.dirname(snap_file)
-        while dirname:
-            snap_dirs.add(dirname)
-            dirname = os.path.dirname(dirname)
-
-    return snap_files, snap_dirs
+    return resolve_fileset(srcdir, includes, excludes)
 
 
 def _migrate_files(
@@ -1104,6 +1211,21 @@ def _migrate_files(
         fixup_func(dst)
 
 
+def _get_fingerprints(snap_files, srcdir):
+    # The inode, size and modification time of each file to migrate, stored
+    # in the step state to find the files that changed on the next run.
+    fingerprints = collections.OrderedDict()  # type: Dict[str, List[int]]
+    for snap_file in sorted(snap_files):
+        with contextlib.suppress(FileNotFoundError):
+            file_stat = os.lstat(os.path.join(srcdir, snap_file))
+            fingerprints[snap_file] = [
+                file_stat.st_ino,
+                file_stat.st_size,
+                file_stat.st_mtime_ns,
+            ]
+    return fingerprints
+
+
 def _organize_filesets(part_name, fileset, base_dir, overwrite):
     for key in sorted(fileset, key=lambda x: ["*" in x, x]):
         src = os.path.join(base_dir, key)
@@ -1202,101 +1324,50 @@ def _get_file_list(stage_set):
     return includes, excludes
 
 
-def _generate_include_set(directory, includes):
-    include_files = set()
-    for include in includes:
-        if "*" in include:
-            pattern = os.path.join(directory, include)
-            matches = iglob(pattern, recursive=True)
-            include_files |= set(matches)
-        else:
-            include_files |= set([os.path.join(directory, include)])
-
-    include_dirs = [x for x in include_files if os.path.isdir(x)]
-    include_files = set([os.path.relpath(x, directory) for x in include_files])
-
-    # Expand includeFiles, so that an exclude like '*/*.so' will still match
-    # files from an include like 'lib'
-    for include_dir in include_dirs:
-        for root, dirs, files in os.walk(include_dir):
-            include_files |= set(
-                [os.path.relpath(os.path.join(root, d), directory) for d in dirs]
-            )
-            include_files |= set(
-                [os.path.relpath(os.path.join(root, f), directory) for f in files]
-            )
-
-    return include_files
-
-
-def _generate_exclude_set(directory, excludes):
-    exclude_files = set()
-
-    for exclude in excludes:
-        pattern = os.path.join(directory, exclude)
-        matches = iglob(pattern, recursive=True)
-        exclude_files |= set(matches)
-
-    exclude_dirs = [
-        os.path.relpath(x, directory) for x in exclude_files if os.path.isdir(x)
-    ]
-    exclude_files = set([os.path.relpath(x, directory) for x in exclude_files])
-
-    return exclude_files, exclude_dirs
-
-
 def _validate_relative_paths(files):
     for d in files:
         if os.path.isabs(d):
             raise errors.PluginError('path "{}" must be relative'.format(d))
 
 
-def _file_collides(file_this, file_other):
-    if not file_this.endswith(".pc"):
-        return not filecmp.cmp(file_this, file_other, shallow=False)
-
-    pc_file_1 = open(file_this)
-    pc_file_2 = open(file_other)
-
-    try:
-        for lines in zip(pc_file_1, pc_file_2):
-            for line in zip(lines[0].split("\n"), lines[1].split("\n")):
-                if line[0].startswith("prefix="):
-                    continue
-                if line[0] != line[1]:
-                    return True
-    except Exception as e:
-        raise e from e
-    finally:
-        pc_file_1.close()
-        pc_file_2.close()
-    return False
-
+def check_for_collisions(parts, *, workers: int = 1):
+    """Raises a SnapcraftPartConflictError if conflicts are found.
 
-def check_for_collisions(parts):
-    """Raises a SnapcraftPartConflictError if conflicts are found."""
-    parts_files = {}
+    :param list parts: the parts to check.
+    :param int workers: the number of files to hash at a time.
+    """
+    checker = CollisionChecker(workers=workers)
+    parts_files = {}  # type: Dict[str, Dict[str, Any]]
     for part in parts:
         # Gather our own files up
         part_files, part_directories = part.migratable_fileset_for(steps.STAGE)
         part_contents = part_files | part_directories
 
-        # Scan previous parts for collisions
-        for other_part_name in parts_files:
-            common = part_contents & parts_files[other_part_name]["files"]
-            conflict_files = []
-            for f in common:
-                this = os.path.join(part.plugin.installdir, f)
-                other = os.path.join(parts_files[other_part_name]["installdir"], f)
-
-                if _paths_collide(this, other):
-                    conflict_files.append(f)
+        # Scan previous parts for collisions, all at once so that the files
+        # whose contents need comparing are hashed together.
+        common = [
+            (other_part_name, f)
+            for other_part_name in parts_files
+            for f in part_contents & parts_files[other_part_name]["files"]
+        ]
+        collisions = checker.paths_collide(
+            (
+                os.path.join(part.plugin.installdir, f),
+                os.path.join(parts_files[other_part_name]["installdir"], f),
+            )
+            for other_part_name, f in common
+        )
+        conflicts = collections.defaultdict(list)  # type: Dict[str, List[str]]
+        for (other_part_name, f), collides in zip(common, collisions):
+            if collides:
+                conflicts[other_part_name].append(f)
 
-            if conflict_files:
+        for other_part_name in parts_files:
+            if conflicts[other_part_name]:
                 raise errors.SnapcraftPartConflictError(
                     other_part_name=other_part_name,
                     part_name=part.name,
-                    conflict_files=conflict_files,
+                    conflict_files=conflicts[other_part_name],
                 )
 
         # And add our files to the list
@@ -1306,37 +1377,6 @@ def check_for_collisions(parts):
         }
 
 
-def _paths_collide(path1: str, path2: str) -> bool:
-    if not (os.path.lexists(path1) and os.path.lexists(path2)):
-        return False
-
-    path1_is_dir = os.path.isdir(path1)
-    path2_is_dir = os.path.isdir(path2)
-    path1_is_link = os.path.islink(path1)
-    path2_is_link = os.path.islink(path2)
-
-    # Paths collide if they're both symlinks, but pointing to different places
-    if path1_is_link and path2_is_link:
-        return os.readlink(path1) != os.readlink(path2)
-
-    # Paths collide if one is a symlink, but not the other
-    elif path1_is_link or path2_is_link:
-        return True
-
-    # Paths collide if one is a directory, but not the other
-    elif path1_is_dir != path2_is_dir:
-        return True
-
-    # Paths collide if neither path is a directory, and the files have
-    # different contents
-    elif not (path1_is_dir and path2_is_dir) and _file_collides(path1, path2):
-        return True
-
-    # Otherwise, paths do not conflict
-    else:
-        return False
-
-
 def _get_includes(fileset):
     return [x for x in fileset if x[0] != "-"]
 
@@ -0,0 +1,162 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import concurrent.futures
+import contextlib
+import os
+import stat
+from typing import Dict, Iterable, List, Optional, Tuple  # noqa: F401
+
+from snapcraft import file_utils
+
+# Reading a file twice is what we want to avoid, not a cryptographic
+# attack, but a part could still be crafted to look like another one.
+_DIGEST_ALGORITHM = "sha256"
+
+# The outcome of comparing the metadata of two paths.
+_SAME = 0
+_DIFFERENT = 1
+_COMPARE_CONTENTS = 2
+
+
+class CollisionChecker:
+    """Compare the paths that different parts want to stage.
+
+    Paths are compared by their metadata first, so that hard links to the
+    same inode or files with different sizes are never read. The files that
+    are left are hashed once for the whole run, in a pool of threads,
+    however many parts ship them.
+    """
+
+    def __init__(self, *, workers: int = 1) -> None:
+        """Create a new CollisionChecker.
+
+        :param int workers: the number of files to hash at a time.
+        """
+        self._workers = workers
+        self._stats = dict()  # type: Dict[str, Optional[os.stat_result]]
+        self._digests = dict()  # type: Dict[Tuple[int, int], str]
+
+    def paths_collide(self, path_pairs: Iterable[Tuple[str, str]]) -> List[bool]:
+        """Return whether each pair of paths has different contents.
+
+        :param path_pairs: the pairs of paths to compare.
+        :returns: a list with an entry for each pair, True if that pair
+                  collides.
+        """
+        pairs = list(path_pairs)
+        outcomes = [self._compare_metadata(path1, path2) for path1, path2 in pairs]
+        self._hash_files(
+            path
+            for pair, outcome in zip(pairs, outcomes)
+            if outcome == _COMPARE_CONTENTS
+            for path in pair
+        )
+
+        collisions = []
+        for (path1, path2), outcome in zip(pairs, outcomes):
+            if outcome == _COMPARE_CONTENTS:
+                collides = self._get_digest(path1) != self._get_digest(path2)
+            else:
+                collides = outcome == _DIFFERENT
+            collisions.append(collides)
+        return collisions
+
+    def _lstat(self, path: str) -> Optional[os.stat_result]:
+        if path not in self._stats:
+            try:
+                self._stats[path] = os.lstat(path)
+            except FileNotFoundError:
+                self._stats[path] = None
+        return self._stats[path]
+
+    def _compare_metadata(self, path1: str, path2: str) -> int:
+        stat1 = self._lstat(path1)
+        stat2 = self._lstat(path2)
+        if stat1 is None or stat2 is None:
+            return _SAME
+
+        path1_is_link = stat.S_ISLNK(stat1.st_mode)
+        path2_is_link = stat.S_ISLNK(stat2.st_mode)
+        # Paths collide if they're both symlinks, but pointing to different
+        # places, or if one is a symlink but not the other.
+        if path1_is_link and path2_is_link:
+            return _outcome(os.readlink(path1) != os.readlink(path2))
+        elif path1_is_link or path2_is_link:
+            return _DIFFERENT
+
+        # Paths collide if one is a directory, but not the other.
+        path1_is_dir = stat.S_ISDIR(stat1.st_mode)
+        path2_is_dir = stat.S_ISDIR(stat2.st_mode)
+        if path1_is_dir or path2_is_dir:
+            return _outcome(path1_is_dir != path2_is_dir)
+
+        # Hard links to the same file cannot have different contents.
+        if (stat1.st_dev, stat1.st_ino) == (stat2.st_dev, stat2.st_ino):
+            return _SAME
+        # The prefix of pkg-config files depends on where the part was
+        # built, so the sizes alone say nothing about them.
+        elif path1.endswith(".pc"):
+            return _outcome(_pc_files_collide(path1, path2))
+        elif stat1.st_size != stat2.st_size:
+            return _DIFFERENT
+        else:
+            return _COMPARE_CONTENTS
+
+    def _get_key(self, path: str) -> Tuple[int, int]:
+        path_stat = self._lstat(path)
+        return (path_stat.st_dev, path_stat.st_ino)  # type: ignore
+
+    def _get_digest(self, path: str) -> str:
+        return self._digests[self._get_key(path)]
+
+    def _hash_files(self, paths: Iterable[str]) -> None:
+        # Each inode is only read once, even when several paths link to it.
+        missing = dict()  # type: Dict[Tuple[int, int], str]
+        for path in paths:
+            key = self._get_key(path)
+            if key not in self._digests:
+                missing.setdefault(key, path)
+
+        with contextlib.ExitStack() as stack:
+            if self._workers > 1 and len(missing) > 1:
+                executor = stack.enter_context(
+                    concurrent.futures.ThreadPoolExecutor(max_workers=self._workers)
+                )
+                map_function = executor.map
+            else:
+                map_function = map  # type: ignore
+            digests = map_function(_calculate_digest, missing.values())
+            self._digests.update(zip(missing.keys(), digests))
+
+
+def _outcome(collides: bool) -> int:
+    return _DIFFERENT if collides else _SAME
+
+
+def _calculate_digest(path: str) -> str:
+    return file_utils.calculate_hash(path, algorithm=_DIGEST_ALGORITHM)
+
+
+def _pc_files_collide(file_this: str, file_other: str) -> bool:
+    with open(file_this) as pc_file_1, open(file_other) as pc_file_2:
+        for lines in zip(pc_file_1, pc_file_2):
+            for line in zip(lines[0].split("\n"), lines[1].split("\n")):
+                if line[0].startswith("prefix="):
+                    continue
+                if line[0] != line[1]:
+                    return True
+    return False
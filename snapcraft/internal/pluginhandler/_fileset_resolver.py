@@ -0,0 +1,255 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import fnmatch
+import glob
+import os
+import re
+from typing import List, Set, Tuple  # noqa: F401
+
+# The kinds of pattern components.
+_LITERAL = 0
+_MAGIC = 1
+_RECURSIVE = 2
+
+
+class _Pattern:
+    """A path pattern matched one path component at a time.
+
+    Magic patterns follow the rules of glob.glob with recursive=True: '*',
+    '?' and '[...]' do not match hidden names unless the component itself
+    starts with a '.', and '**' matches any number of non hidden
+    directories. Literal patterns match the path as is.
+
+    The state of a match is the set of the indexes of the components left
+    to match, a path matches when all of them were consumed.
+    """
+
+    def __init__(self, pattern: str, *, literal: bool = False) -> None:
+        self.dir_only = pattern.endswith("/")
+        self._components = []  # type: List[Tuple[int, object, bool]]
+        for component in pattern.split("/"):
+            if component in ("", "."):
+                continue
+            if literal or not glob.has_magic(component):
+                self._components.append((_LITERAL, component, True))
+            elif component == "**":
+                self._components.append((_RECURSIVE, None, False))
+            else:
+                self._components.append(
+                    (
+                        _MAGIC,
+                        re.compile(fnmatch.translate(component)),
+                        component.startswith("."),
+                    )
+                )
+        self._end = len(self._components)
+        self.initial_states = self._close({0})
+
+    def _close(self, states: Set[int]) -> Set[int]:
+        # '**' also matches no directory at all.
+        for index in sorted(states):
+            while index < self._end and self._components[index][0] == _RECURSIVE:
+                index += 1
+                states.add(index)
+        return states
+
+    def advance(self, states: Set[int], name: str) -> Set[int]:
+        """Return the states after matching name against states."""
+        next_states = set()  # type: Set[int]
+        hidden = name.startswith(".")
+        for index in states:
+            if index == self._end:
+                continue
+            kind, value, match_hidden = self._components[index]
+            if kind == _RECURSIVE:
+                if not hidden:
+                    next_states.add(index)
+            elif kind == _LITERAL:
+                if name == value:
+                    next_states.add(index + 1)
+            elif (match_hidden or not hidden) and value.match(name):  # type: ignore
+                next_states.add(index + 1)
+        return self._close(next_states)
+
+    def is_match(self, states: Set[int], is_dir: bool) -> bool:
+        return self._end in states and (is_dir or not self.dir_only)
+
+    def is_alive(self, states: Set[int]) -> bool:
+        """Return True if descendants of the current path can still match."""
+        return any(index < self._end for index in states)
+
+
+def resolve_fileset(
+    srcdir: str, includes: List[str], excludes: List[str]
+) -> Tuple[Set[str], Set[str]]:
+    """Return the files and directories in srcdir selected by a fileset.
+
+    Includes containing a '*' and all excludes are globs, other includes
+    are paths which are selected even if they do not exist. Directories
+    that are included bring in everything below them, and directories that
+    are excluded take out everything below them.
+
+    The tree is walked once, entering only the directories that can still
+    hold a match.
+
+    :param str srcdir: the directory the fileset applies to.
+    :param list includes: the include entries of the fileset.
+    :param list excludes: the exclude entries of the fileset, without the
+                          leading '-'.
+    :returns: a tuple with the set of files (which includes symlinks) and
+              the set of directories to migrate, relative to srcdir.
+    """
+    literal_includes = {
+        os.path.relpath(os.path.join(srcdir, i), srcdir)
+        for i in includes
+        if "*" not in i
+    }
+    include_patterns = [_Pattern(i) for i in includes if "*" in i]
+    include_patterns.extend(_Pattern(i, literal=True) for i in literal_includes)
+    exclude_patterns = [_Pattern(e) for e in excludes]
+
+    walker = _FilesetWalker(include_patterns, exclude_patterns)
+    walker.walk(srcdir)
+    snap_files = walker.files
+    snap_dirs = walker.dirs
+
+    # Literal includes are selected even if they do not exist.
+    for literal_include in literal_includes - snap_files - snap_dirs:
+        if literal_include == "." or walker.is_excluded(literal_include):
+            continue
+        snap_files.add(literal_include)
+
+    # Make sure we also obtain the parent directories of files
+    for snap_file in snap_files:
+        dirname = os.path.dirname(snap_file)
+        while dirname:
+            snap_dirs.add(dirname)
+            dirname = os.path.dirname(dirname)
+
+    return snap_files, snap_dirs
+
+
+class _FilesetWalker:
+    def __init__(
+        self, include_patterns: List[_Pattern], exclude_patterns: List[_Pattern]
+    ) -> None:
+        self._include_patterns = include_patterns
+        self._exclude_patterns = exclude_patterns
+        self.files = set()  # type: Set[str]
+        self.dirs = set()  # type: Set[str]
+        self._excluded = set()  # type: Set[str]
+        self._excluded_dirs = set()  # type: Set[str]
+
+    def walk(self, srcdir: str) -> None:
+        include_states = [p.initial_states for p in self._include_patterns]
+        exclude_states = [p.initial_states for p in self._exclude_patterns]
+        # A pattern matching no component at all selects srcdir itself.
+        expanded = _matches(self._include_patterns, include_states, True)
+        if expanded and not _matches(self._exclude_patterns, exclude_states, True):
+            self.dirs.add(".")
+
+        stack = [(srcdir, "", include_states, exclude_states, expanded)]
+        while stack:
+            stack.extend(self._scan(*stack.pop()))
+
+    def is_excluded(self, path: str) -> bool:
+        if path in self._excluded:
+            return True
+        dirname = os.path.dirname(path)
+        while dirname:
+            if dirname in self._excluded_dirs:
+                return True
+            dirname = os.path.dirname(dirname)
+        return False
+
+    def _scan(self, path, relpath, include_states, exclude_states, expanded):
+        # Returns the directories to scan next, with their states.
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return []
+
+        next_dirs = []
+        for entry in entries:
+            entry_relpath = os.path.join(relpath, entry.name)
+            is_dir = _is_dir(entry)
+            entry_include_states = [
+                p.advance(s, entry.name)
+                for p, s in zip(self._include_patterns, include_states)
+            ]
+            entry_exclude_states = [
+                p.advance(s, entry.name)
+                for p, s in zip(self._exclude_patterns, exclude_states)
+            ]
+
+            # Nothing below an excluded directory can be selected either.
+            if _matches(self._exclude_patterns, entry_exclude_states, is_dir):
+                self._excluded.add(entry_relpath)
+                if is_dir:
+                    self._excluded_dirs.add(entry_relpath)
+                continue
+
+            is_included = _matches(self._include_patterns, entry_include_states, is_dir)
+            if expanded or is_included:
+                if is_dir and not entry.is_symlink():
+                    self.dirs.add(entry_relpath)
+                else:
+                    self.files.add(entry_relpath)
+
+            # Symlinked directories are only expanded when they are
+            # included themselves, not when their parent is.
+            entry_expanded = is_included or (expanded and not entry.is_symlink())
+            if is_dir and self._should_enter(
+                entry, entry_include_states, entry_expanded
+            ):
+                next_dirs.append(
+                    (
+                        entry.path,
+                        entry_relpath,
+                        entry_include_states,
+                        entry_exclude_states,
+                        entry_expanded,
+                    )
+                )
+        return next_dirs
+
+    def _should_enter(self, entry, include_states, expanded) -> bool:
+        if not expanded and not any(
+            p.is_alive(s) for p, s in zip(self._include_patterns, include_states)
+        ):
+            return False
+        return not (entry.is_symlink() and _is_link_loop(entry.path))
+
+
+def _matches(patterns: List[_Pattern], states: List[Set[int]], is_dir: bool) -> bool:
+    return any(p.is_match(s, is_dir) for p, s in zip(patterns, states))
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    # Like os.path.isdir, symlinks that cannot be resolved are not
+    # directories.
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _is_link_loop(path: str) -> bool:
+    # A symlink pointing to one of its own parents would be walked forever.
+    target = os.path.realpath(path)
+    parent = os.path.realpath(os.path.dirname(path))
+    return parent == target or parent.startswith(target + os.sep)
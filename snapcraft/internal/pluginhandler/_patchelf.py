@@ -14,10 +14,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import concurrent.futures
 import contextlib
+import functools
 import logging
 import os
-from typing import FrozenSet, List
+from typing import FrozenSet, List, Optional
 from typing import Dict  # noqa: F401
 
 import snapcraft.plugins
@@ -45,6 +47,16 @@ def is_go_based_plugin(plugin):
     return isinstance(plugin, tuple(plugin_exceptions))
 
 
+def _patch_elf_file(
+    elf_patcher: elf.Patcher, elf_file: elf.ElfFile
+) -> Optional[errors.PatcherError]:
+    try:
+        elf_patcher.patch(elf_file=elf_file)
+    except errors.PatcherError as patch_error:
+        return patch_error
+    return None
+
+
 class PartPatcher:
     """Takes care of patching files in a part if necessary."""
 
@@ -59,7 +71,8 @@ class PartPatcher:
         snap_base_path: str,  # TODO remove once project has this
         stage_packages: List[str],
         stagedir: str,
-        primedir: str
+        primedir: str,
+        workers: int = 1
     ) -> None:
         """Initialize PartPatcher.
 
@@ -78,6 +91,7 @@ class PartPatcher:
                          This is used to locate an alternate patchelf binary
                          to use.
         :param primedir: the general prime directory for the snapcraft project.
+        :param workers: the number of elf files to patch at the same time.
         """
         self._elf_files = elf_files
         self._is_go_based_plugin = is_go_based_plugin(plugin)
@@ -91,6 +105,7 @@ class PartPatcher:
         self._is_libc6_staged = "libc6" in stage_packages
         self._stagedir = stagedir
         self._primedir = primedir
+        self._workers = workers
 
     def _get_glibc_compatibility(self, linker_version: str) -> Dict[str, str]:
         linker_incompat = dict()  # type: Dict[str, str]
@@ -119,10 +134,23 @@ class PartPatcher:
         # Patching all files instead of a subset of them to ensure the
         # environment is consistent and the chain of dlopens that may
         # happen remains sane.
-        for elf_file in self._elf_files:
-            try:
-                elf_patcher.patch(elf_file=elf_file)
-            except errors.PatcherError as patch_error:
+        elf_files = sorted(self._elf_files, key=lambda e: e.path)
+        patch_file = functools.partial(_patch_elf_file, elf_patcher)
+        with contextlib.ExitStack() as stack:
+            if self._workers > 1 and len(elf_files) > 1:
+                # The work happens in patchelf itself, threads are enough.
+                executor = stack.enter_context(
+                    concurrent.futures.ThreadPoolExecutor(max_workers=self._workers)
+                )
+                results = executor.map(patch_file, elf_files)
+            else:
+                results = map(patch_file, elf_files)
+
+            # Results come in the order of elf_files, so the same error is
+            # reported no matter how many workers are used.
+            for elf_file, patch_error in zip(elf_files, results):
+                if patch_error is None:
+                    continue
                 logger.warning(
                     "An attempt to patch {!r} so that it would work "
                     "correctly in diverse environments was made and failed. "
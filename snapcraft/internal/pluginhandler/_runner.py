@@ -21,6 +21,7 @@ import subprocess
 import sys
 import tempfile
 import textwrap
+import threading
 import time
 from typing import Any, Callable, Dict  # noqa
 
@@ -120,7 +121,25 @@ class Runner:
                 script_file.flush()
                 script_file.seek(0)
 
-                process = subprocess.Popen(["/bin/sh"], stdin=script_file, cwd=workdir)
+                output_prefix = common.get_output_prefix()
+                if output_prefix is None:
+                    process = subprocess.Popen(
+                        ["/bin/sh"], stdin=script_file, cwd=workdir
+                    )
+                    output_forwarder = None
+                else:
+                    process = subprocess.Popen(
+                        ["/bin/sh"],
+                        stdin=script_file,
+                        cwd=workdir,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT,
+                    )
+                    output_forwarder = threading.Thread(
+                        target=common.forward_output,
+                        args=(process.stdout, output_prefix),
+                    )
+                    output_forwarder.start()
 
             status = None
             try:
@@ -145,6 +164,9 @@ class Runner:
             finally:
                 call_fifo.close()
                 feedback_fifo.close()
+                if output_forwarder:
+                    output_forwarder.join()
+                    process.stdout.close()
 
             if status:
                 raise errors.ScriptletRunError(
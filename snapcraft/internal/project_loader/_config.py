@@ -27,6 +27,7 @@ from snapcraft import project, formatting_utils
 from snapcraft.internal import common, deprecations, repo, states, steps
 from snapcraft.project._sanity_checks import conduct_environment_sanity_check
 from snapcraft.project._schema import Validator
+from ._config_cache import ConfigCache
 from ._parts_config import PartsConfig
 from ._extensions import apply_extensions
 from ._env import (
@@ -200,15 +201,14 @@ class Config:
         self.build_snaps = set()  # type: Set[str]
         self.project = project
 
-        # raw_snapcraft_yaml is read only, create a new copy
-        snapcraft_yaml = apply_extensions(project.info.get_raw_snapcraft())
-
-        self.validator = Validator(snapcraft_yaml)
-        self.validator.validate()
-
-        snapcraft_yaml = self._expand_filesets(snapcraft_yaml)
-
-        self.data = self._expand_env(snapcraft_yaml)
+        config_cache = ConfigCache(project)
+        self.data = config_cache.load()
+        if self.data is None:
+            self.data = self._load_snapcraft_yaml()
+            config_cache.save(self.data)
+        else:
+            logger.debug("Using the cached validated and expanded snapcraft.yaml.")
+            self.validator = Validator(self.data)
         self._ensure_no_duplicate_app_aliases()
 
         grammar_processor = grammar_processing.GlobalGrammarProcessor(
@@ -252,6 +252,17 @@ class Config:
 
         conduct_environment_sanity_check(self.project, self.data, self.validator.schema)
 
+    def _load_snapcraft_yaml(self):
+        # raw_snapcraft_yaml is read only, create a new copy
+        snapcraft_yaml = apply_extensions(self.project.info.get_raw_snapcraft())
+
+        self.validator = Validator(snapcraft_yaml)
+        self.validator.validate()
+
+        snapcraft_yaml = self._expand_filesets(snapcraft_yaml)
+
+        return self._expand_env(snapcraft_yaml)
+
     def _ensure_no_duplicate_app_aliases(self):
         # Prevent multiple apps within a snap from having duplicate alias names
         aliases = []
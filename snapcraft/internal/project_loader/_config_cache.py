@@ -0,0 +1,138 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional  # noqa: F401
+
+import snapcraft
+from snapcraft import project
+from snapcraft.internal import common
+from ._env import snapcraft_global_environment
+from . import _extensions
+
+logger = logging.getLogger(__name__)
+
+_CACHE_FILENAME = ".snapcraft_config_cache"
+
+
+class _UncacheableError(Exception):
+    pass
+
+
+class ConfigCache:
+    """The validated and expanded snapcraft.yaml of the last run.
+
+    It is kept in the parts directory, once there is one, along with a key
+    derived from everything the validation and expansion depend on: the
+    snapcraft.yaml, the schema, the extensions, the local plugins, the
+    snapcraft version and the project environment used in the expansion.
+    """
+
+    def __init__(self, project: project.Project) -> None:
+        self._path = os.path.join(project.parts_dir, _CACHE_FILENAME)
+        self._key = _get_key(project)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Return the cached data, or None if missing or out of date."""
+        try:
+            with open(self._path) as cache_file:
+                cache = json.load(cache_file)
+            if cache.get("key") != self._key:
+                return None
+            return _decode(cache["data"])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.debug("Ignoring invalid config cache: {}".format(e))
+            return None
+
+    def save(self, data: Dict[str, Any]) -> None:
+        """Save data, unless there are no parts yet or it cannot be cached.
+
+        :param dict data: the validated and expanded snapcraft.yaml.
+        """
+        if not os.path.isdir(os.path.dirname(self._path)):
+            return
+        try:
+            cache = dict(key=self._key, data=_encode(data))
+        except _UncacheableError as e:
+            logger.debug("Not caching the config: {}".format(e))
+            return
+
+        temporary_path = "{}.{}".format(self._path, os.getpid())
+        with open(temporary_path, "w") as cache_file:
+            json.dump(cache, cache_file)
+        os.replace(temporary_path, self._path)
+
+
+def _get_key(project: project.Project) -> str:
+    digest = hashlib.sha384()
+
+    def _update(*values):
+        for value in values:
+            digest.update(repr(value).encode())
+            digest.update(b"\0")
+
+    _update(snapcraft.__version__)
+    for path in (
+        project.info.snapcraft_yaml_file_path,
+        os.path.join(common.get_schemadir(), "snapcraft.json"),
+    ):
+        _update(path)
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    for directory in (os.path.dirname(_extensions.__file__), project.local_plugins_dir):
+        for root, directories, files in os.walk(directory):
+            directories[:] = sorted(d for d in directories if d != "__pycache__")
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                _update(os.path.relpath(path, directory))
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+
+    # The icon is validated by checking that it exists.
+    icon = project.info.get_raw_snapcraft().get("icon")
+    _update(icon, bool(icon) and os.path.exists(icon))
+    _update(sorted(snapcraft_global_environment(project).items()))
+
+    return digest.hexdigest()
+
+
+def _encode(value: Any) -> Any:
+    # Mappings are tagged with their type as dumping a dict or an OrderedDict
+    # to YAML orders their keys differently, and pairs keep non str keys.
+    if isinstance(value, dict):
+        kind = "ordered" if isinstance(value, collections.OrderedDict) else "dict"
+        return {kind: [[_encode(k), _encode(v)] for k, v in value.items()]}
+    elif isinstance(value, list):
+        return [_encode(v) for v in value]
+    elif value is None or isinstance(value, (str, int, float)):
+        return value
+    raise _UncacheableError("cannot cache a {!r}".format(type(value)))
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        ((kind, pairs),) = value.items()
+        mapping_type = collections.OrderedDict if kind == "ordered" else dict
+        return mapping_type((_decode(k), _decode(v)) for k, v in pairs)
+    elif isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
@@ -15,13 +15,15 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import ChainMap
+import heapq
 import logging
 from os import path
+import threading
 from typing import List
-from typing import Set  # noqa: F401
+from typing import Dict, FrozenSet, Iterable, Set  # noqa: F401
 
 import snapcraft
-from snapcraft.internal import elf, pluginhandler, repo
+from snapcraft.internal import cache, elf, pluginhandler, repo
 from ._env import (
     build_env,
     build_env_for_stage,
@@ -37,6 +39,8 @@ logger = logging.getLogger(__name__)
 class PartsConfig:
     def __init__(self, *, parts, project, validator, build_snaps, build_tools):
         self._soname_cache = elf.SonameCache()
+        # Shared by all the parts, saved once the lifecycle is done with it.
+        self.elf_cache = cache.ElfCache()
         self._parts_data = parts.get("parts", {})
         self._snap_type = parts.get("type", "app")
         self._project = project
@@ -48,6 +52,20 @@ class PartsConfig:
         self._part_names = []
         self.after_requests = {}
 
+        # The after graph, indexed by part name.
+        self._parts_by_name = dict()  # type: Dict[str, pluginhandler.PluginHandler]
+        self._dependency_names = dict()  # type: Dict[str, Set[str]]
+        self._reverse_dependency_names = dict()  # type: Dict[str, Set[str]]
+        self._dependency_closures = dict()  # type: Dict[str, FrozenSet[str]]
+        self._reverse_dependency_closures = dict()  # type: Dict[str, FrozenSet[str]]
+
+        # Build environments are computed once and kept until something
+        # they depend on is built, staged or cleaned. Parts may be prepared
+        # from several threads.
+        self._build_env_lock = threading.RLock()
+        self._build_envs = dict()  # type: Dict[str, List[str]]
+        self._dependency_envs = dict()  # type: Dict[str, List[str]]
+
         self._process_parts()
 
     @property
@@ -75,6 +93,10 @@ class PartsConfig:
     def _compute_dependencies(self):
         """Gather the lists of dependencies and adds to all_parts."""
 
+        self._parts_by_name = {part.name: part for part in self.all_parts}
+        self._dependency_names = {name: set() for name in self._part_names}
+        self._reverse_dependency_names = {name: set() for name in self._part_names}
+
         for part in self.all_parts:
             dep_names = self.after_requests.get(part.name, [])
             for dep_name in dep_names:
@@ -83,87 +105,86 @@ class PartsConfig:
                     raise errors.SnapcraftAfterPartMissingError(part.name, dep_name)
 
                 part.deps.append(dep)
+                self._dependency_names[part.name].add(dep_name)
+                self._reverse_dependency_names[dep_name].add(part.name)
 
     def _sort_parts(self):
-        """Performs an inneficient but easy to follow sorting of parts."""
-        sorted_parts = []
-
-        # We want to process parts in a consistent order between runs. The
-        # simplest way to do this is to sort them by name.
-        self.all_parts = sorted(
-            self.all_parts, key=lambda part: part.name, reverse=True
-        )
+        """Sort the parts so that each comes after its dependencies.
+
+        This is Kahn's algorithm run from the end: the parts no other part
+        depends upon are taken in reverse alphabetical order, which keeps the
+        order consistent between runs, and put before those taken so far.
+        """
+        # Rank the parts by name, negated so that the heap yields the last.
+        ranks = {
+            part.name: -rank
+            for rank, part in enumerate(sorted(self.all_parts, key=lambda p: p.name))
+        }
+        dependent_counts = {
+            part.name: len(self._reverse_dependency_names.get(part.name, ()))
+            for part in self.all_parts
+        }
+        heap = [(ranks[name], name) for name, c in dependent_counts.items() if c == 0]
+        heapq.heapify(heap)
 
-        while self.all_parts:
-            top_part = None
-            for part in self.all_parts:
-                mentioned = False
-                for other in self.all_parts:
-                    if part in other.deps:
-                        mentioned = True
-                        break
-                if not mentioned:
-                    top_part = part
-                    break
-            if not top_part:
-                raise errors.SnapcraftLogicError(
-                    "circular dependency chain found in parts definition"
-                )
-            sorted_parts = [top_part] + sorted_parts
-            self.all_parts.remove(top_part)
+        sorted_parts = []
+        while heap:
+            _, name = heapq.heappop(heap)
+            sorted_parts.append(self._parts_by_name[name])
+            for dep_name in self._dependency_names.get(name, ()):
+                dependent_counts[dep_name] -= 1
+                if dependent_counts[dep_name] == 0:
+                    heapq.heappush(heap, (ranks[dep_name], dep_name))
+
+        if len(sorted_parts) != len(self.all_parts):
+            raise errors.SnapcraftLogicError(
+                "circular dependency chain found in parts definition"
+            )
 
+        sorted_parts.reverse()
         return sorted_parts
 
     def get_dependencies(self, part_name, *, recursive=False):
         # type: (str, bool) -> Set[pluginhandler.PluginHandler]
         """Returns a set of all the parts upon which part_name depends."""
 
-        dependency_names = set(self.after_requests.get(part_name, []))
-        dependencies = {p for p in self.all_parts if p.name in dependency_names}
-
         if recursive:
-            # No need to worry about infinite recursion due to circular
-            # dependencies since the YAML validation won't allow it.
-            for dependency_name in dependency_names:
-                dependencies |= self.get_dependencies(
-                    dependency_name, recursive=recursive
+            return self._get_parts(
+                _get_closure(
+                    part_name, self._dependency_names, self._dependency_closures
                 )
-
-        return dependencies
+            )
+        return self._get_parts(self._dependency_names.get(part_name, set()))
 
     def get_reverse_dependencies(self, part_name, *, recursive=False):
         # type: (str, bool) -> Set[pluginhandler.PluginHandler]
         """Returns a set of all the parts that depend upon part_name."""
 
-        reverse_dependency_names = set()
-        for part, dependencies in self.after_requests.items():
-            if part_name in dependencies:
-                reverse_dependency_names.add(part)
-
-        reverse_dependencies = {
-            p for p in self.all_parts if p.name in reverse_dependency_names
-        }
-
         if recursive:
-            # No need to worry about infinite recursion due to circular
-            # dependencies since the YAML validation won't allow it.
-            for reverse_dependency_name in reverse_dependency_names:
-                reverse_dependencies |= self.get_reverse_dependencies(
-                    reverse_dependency_name, recursive=recursive
+            return self._get_parts(
+                _get_closure(
+                    part_name,
+                    self._reverse_dependency_names,
+                    self._reverse_dependency_closures,
                 )
-
-        return reverse_dependencies
+            )
+        return self._get_parts(self._reverse_dependency_names.get(part_name, set()))
+
+    def _get_parts(self, part_names):
+        # type: (Iterable[str]) -> Set[pluginhandler.PluginHandler]
+        return {
+            self._parts_by_name[name]
+            for name in part_names
+            if name in self._parts_by_name
+        }
 
     def get_part(self, part_name):
-        for part in self.all_parts:
-            if part.name == part_name:
-                return part
-
-        return None
+        return self._parts_by_name.get(part_name)
 
     def clean_part(self, part_name, staged_state, primed_state, step):
         part = self.get_part(part_name)
         part.clean(staged_state, primed_state, step)
+        self.invalidate_build_env(part_name)
 
     def validate(self, part_names):
         for part_name in part_names:
@@ -219,6 +240,7 @@ class PartsConfig:
             confinement=self._project.info.confinement,
             snap_type=self._snap_type,
             soname_cache=self._soname_cache,
+            elf_cache=self.elf_cache,
         )
 
         self.build_snaps |= grammar_processor.get_build_snaps()
@@ -239,46 +261,117 @@ class PartsConfig:
     def build_env_for_part(self, part, root_part=True) -> List[str]:
         """Return a build env of all the part's dependencies."""
 
+        with self._build_env_lock:
+            if root_part:
+                env = self._build_envs.get(part.name)
+                if env is None:
+                    env = self._get_root_env(part)
+                    for dep_part in part.deps:
+                        env += self._get_dependency_env(dep_part)
+                    env = _dedupe(env)
+                    self._build_envs[part.name] = env
+            else:
+                stagedir = self._project.stage_dir
+                env = part.env(stagedir)
+                env += runtime_env(stagedir, self._project.arch_triplet)
+                for dep_part in part.deps:
+                    env += self._get_dependency_env(dep_part)
+                env = _dedupe(env)
+
+        return list(env)
+
+    def invalidate_build_env(self, part_name: str, *, staged: bool = True) -> None:
+        """Forget the build environments part_name may have changed.
+
+        :param str part_name: the part which was pulled, built, staged or
+                              cleaned.
+        :param bool staged: whether what is staged may have changed, which
+                            the build environments of all the parts depend
+                            on.
+        """
+        with self._build_env_lock:
+            self._build_envs.pop(part_name, None)
+            if not staged:
+                return
+            self._build_envs.clear()
+            self._dependency_envs.pop(part_name, None)
+            for part in self.get_reverse_dependencies(part_name, recursive=True):
+                self._dependency_envs.pop(part.name, None)
+
+    def _get_root_env(self, part) -> List[str]:
         env = []  # type: List[str]
         stagedir = self._project.stage_dir
 
-        if root_part:
-            # this has to come before any {}/usr/bin
-            env += part.env(part.plugin.installdir)
-            env += runtime_env(part.plugin.installdir, self._project.arch_triplet)
-            env += runtime_env(stagedir, self._project.arch_triplet)
-            env += build_env(
-                part.plugin.installdir,
-                self._project.info.name,
-                self._project.arch_triplet,
-            )
-            env += build_env_for_stage(
-                stagedir, self._project.info.name, self._project.arch_triplet
-            )
-
-            global_env = snapcraft_global_environment(self._project)
-            part_env = snapcraft_part_environment(part)
-            # Finally, add the declared environment from the part.
-            # This is done only for the "root" part.
-            env += part.build_environment
+        # this has to come before any {}/usr/bin
+        env += part.env(part.plugin.installdir)
+        env += runtime_env(part.plugin.installdir, self._project.arch_triplet)
+        env += runtime_env(stagedir, self._project.arch_triplet)
+        env += build_env(
+            part.plugin.installdir, self._project.info.name, self._project.arch_triplet
+        )
+        env += build_env_for_stage(
+            stagedir, self._project.info.name, self._project.arch_triplet
+        )
 
-            for variable, value in ChainMap(part_env, global_env).items():
-                env.append('{}="{}"'.format(variable, value))
+        global_env = snapcraft_global_environment(self._project)
+        part_env = snapcraft_part_environment(part)
+        # Finally, add the declared environment from the part.
+        # This is done only for the "root" part.
+        env += part.build_environment
+
+        for variable, value in ChainMap(part_env, global_env).items():
+            env.append('{}="{}"'.format(variable, value))
+
+        return env
+
+    def _get_dependency_env(self, part) -> List[str]:
+        # The environment part and the parts it depends on, recursively,
+        # bring in once staged. It is kept per part so that each is only
+        # expanded once however many paths lead to it in the after graph.
+        # The runtime environment of the stage directory is left out as it
+        # is always part of the environment the dependency env is added to.
+        env = self._dependency_envs.get(part.name)
+        if env is None:
+            env = part.env(self._project.stage_dir)
+            for dep_part in part.deps:
+                env += self._get_dependency_env(dep_part)
+            env = _dedupe(env)
+            self._dependency_envs[part.name] = env
+
+        return env
+
+
+def _get_closure(
+    part_name: str, edges: Dict[str, Set[str]], closures: Dict[str, FrozenSet[str]]
+) -> FrozenSet[str]:
+    # The names of the parts reachable from part_name following edges, in
+    # post-order so that the closure of each part is computed only once.
+    # There is no need to worry about cycles, the parts have been sorted.
+    pending = [(part_name, False)]
+    while pending:
+        name, expanded = pending.pop()
+        if name in closures:
+            continue
+        if expanded:
+            closure = set(edges.get(name, ()))
+            for other_name in edges.get(name, ()):
+                closure |= closures[other_name]
+            closures[name] = frozenset(closure)
         else:
-            env += part.env(stagedir)
-            env += runtime_env(stagedir, self._project.arch_triplet)
-
-        for dep_part in part.deps:
-            env += dep_part.env(stagedir)
-            env += self.build_env_for_part(dep_part, root_part=False)
-
-        # LP: #1767625
-        # Remove duplicates from using the same plugin in dependent parts.
-        seen = set()  # type: Set[str]
-        deduped_env = list()  # type: List[str]
-        for e in env:
-            if e not in seen:
-                deduped_env.append(e)
-                seen.add(e)
-
-        return deduped_env
+            pending.append((name, True))
+            pending.extend((n, False) for n in edges.get(name, ()))
+
+    return closures[part_name]
+
+
+def _dedupe(env: List[str]) -> List[str]:
+    # LP: #1767625
+    # Remove duplicates from using the same plugin in dependent parts.
+    seen = set()  # type: Set[str]
+    deduped_env = list()  # type: List[str]
+    for e in env:
+        if e not in seen:
+            deduped_env.append(e)
+            seen.add(e)
+
+    return deduped_env
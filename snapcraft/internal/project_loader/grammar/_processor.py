@@ -15,7 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import re
-from typing import Any, Callable, Dict, List, Set
+from typing import Any, Callable, Dict, Iterable, List, Set
 
 from snapcraft import project
 from .errors import GrammarSyntaxError
@@ -43,7 +43,8 @@ class GrammarProcessor:
         project: project.Project,
         checker: Callable[[str], bool],
         *,
-        transformer: Callable[[List[Statement], str, project.Project], str] = None
+        transformer: Callable[[List[Statement], str, project.Project], str] = None,
+        bulk_checker: Callable[[Set[str]], Set[str]] = None
     ) -> None:
         """Create a new GrammarProcessor.
 
@@ -56,10 +57,18 @@ class GrammarProcessor:
         :param callable transformer: callable accepting a call stack, single
                                      primitive, and project, and returning a
                                      transformed primitive.
+        :param callable bulk_checker: callable accepting a set of primitives,
+                                      returning those which are valid. If
+                                      given, every primitive the grammar
+                                      could need checked is checked with a
+                                      single call before processing.
         """
         self._grammar = grammar
         self.project = project
         self.checker = checker
+        self._bulk_checker = bulk_checker
+        # The result of checking each primitive, as it is checked once.
+        self._checked = dict()  # type: Dict[str, bool]
 
         if transformer:
             self._transformer = transformer
@@ -85,6 +94,8 @@ class GrammarProcessor:
 
         if call_stack is None:
             call_stack = []
+            if self._bulk_checker:
+                self._check_all(grammar)
 
         primitives = set()  # type: Set[str]
         statements = _StatementCollection()
@@ -113,6 +124,62 @@ class GrammarProcessor:
 
         return primitives
 
+    def validate(self, primitives: Iterable[str]) -> bool:
+        """Ensure that all primitives are valid, checking each only once.
+
+        :param primitives: Iterable container of primitives.
+
+        :return: Whether or not all primitives are valid.
+        :rtype: bool
+        """
+        for primitive in primitives:
+            if primitive not in self._checked:
+                self._checked[primitive] = self.checker(primitive)
+            if not self._checked[primitive]:
+                return False
+        return True
+
+    def collect_primitives(
+        self, *, grammar: typing.Grammar, call_stack: typing.CallStack, checked: bool
+    ) -> Set[str]:
+        """Collect the primitives of grammar which could need to be checked.
+
+        Unlike process, the bodies and else clauses of every statement are
+        collected, whether they would be selected or not.
+
+        :param list grammar: Unprocessed grammar.
+        :param list call_stack: Call stack of statements leading to now.
+        :param bool checked: Whether a statement in the call stack checks
+                             the primitives of its bodies.
+
+        :return: Transformed primitives
+        :rtype: set
+        """
+        primitives = set()  # type: Set[str]
+        statements = _StatementCollection()
+        statement = None  # type: Statement
+
+        for section in grammar:
+            if isinstance(section, str):
+                if checked and not _ELSE_FAIL_PATTERN.match(section):
+                    primitives.add(self._transformer(call_stack, section, self.project))
+            elif isinstance(section, dict):
+                statement = self._parse_dict(section, statement, statements, call_stack)
+
+        statements.add(statement)
+        primitives |= statements.collect_all(checked=checked)
+
+        return primitives
+
+    def _check_all(self, grammar: typing.Grammar) -> None:
+        primitives = self.collect_primitives(
+            grammar=grammar, call_stack=[], checked=False
+        )
+        primitives -= self._checked.keys()
+        if primitives:
+            valid = self._bulk_checker(primitives)
+            self._checked.update((p, p in valid) for p in primitives)
+
     def _parse_dict(
         self,
         section: Dict[str, Any],
@@ -247,3 +314,18 @@ class _StatementCollection:
             primitives |= statement.process()
 
         return primitives
+
+    def collect_all(self, *, checked: bool) -> Set[str]:
+        """Collect the primitives of all statements which could be checked.
+
+        :param bool checked: Whether a statement in the call stack checks
+                             the primitives of its bodies.
+
+        :return: Transformed primitives of all statements in collection.
+        :rtype: set
+        """
+        primitives = set()  # type: Set[str]
+        for statement in self._statements:
+            primitives |= statement.collect_primitives(checked=checked)
+
+        return primitives
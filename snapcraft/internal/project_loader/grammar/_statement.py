@@ -128,10 +128,30 @@ class Statement:
         :return: Whether or not all primitives are valid.
         :rtype: bool
         """
-        for primitive in primitives:
-            if not self._processor.checker(primitive):
-                return False
-        return True
+        return self._processor.validate(primitives)
+
+    def collect_primitives(self, *, checked: bool = False) -> Set[str]:
+        """Collect the primitives of the body and else clauses.
+
+        :param bool checked: Whether a statement in the call stack checks
+                             the primitives of its bodies.
+
+        :return: The primitives of this statement which could need to be
+                 checked when processing it, whether selected or not.
+        :rtype: set
+        """
+        checked = checked or self._check_primitives
+        primitives = self._processor.collect_primitives(
+            grammar=self._body,
+            call_stack=self._call_stack(include_self=True),
+            checked=checked,
+        )
+        for else_body in self._else_bodies:
+            if else_body:
+                primitives |= self._processor.collect_primitives(
+                    grammar=else_body, call_stack=self._call_stack(), checked=checked
+                )
+        return primitives
 
     def _call_stack(self, *, include_self=False) -> List["Statement"]:
         """The call stack when processing this statement.
@@ -49,6 +49,7 @@ class GlobalGrammarProcessor:
                 self._project,
                 repo.Repo.build_package_is_valid,
                 transformer=package_transformer,
+                bulk_checker=repo.Repo.get_valid_build_packages,
             )
             self.__build_packages = processor.process()
 
@@ -31,7 +31,7 @@ class PartGrammarProcessor:
     >>> import snapcraft
     >>> # Pretend that all packages are valid
     >>> repo = mock.Mock()
-    >>> repo.is_valid.return_value = True
+    >>> repo.get_valid_packages.side_effect = set
     >>> plugin = mock.Mock()
     >>> plugin.stage_packages = [{'try': ['foo']}]
     >>> processor = PartGrammarProcessor(
@@ -47,7 +47,7 @@ class PartGrammarProcessor:
     >>> import snapcraft
     >>> # Pretend that all packages are valid
     >>> repo = mock.Mock()
-    >>> repo.is_valid.return_value = True
+    >>> repo.get_valid_build_packages.side_effect = set
     >>> plugin = mock.Mock()
     >>> plugin.build_packages = [{'try': ['foo']}]
     >>> processor = PartGrammarProcessor(
@@ -138,6 +138,7 @@ class PartGrammarProcessor:
                 self._project,
                 self._repo.build_package_is_valid,
                 transformer=package_transformer,
+                bulk_checker=self._repo.get_valid_build_packages,
             )
             self.__build_packages = processor.process()
 
@@ -150,6 +151,7 @@ class PartGrammarProcessor:
                 self._project,
                 self._repo.is_valid,
                 transformer=package_transformer,
+                bulk_checker=self._repo.get_valid_packages,
             )
             self.__stage_packages = processor.process()
 
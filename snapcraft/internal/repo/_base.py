@@ -23,7 +23,7 @@ import os
 import re
 import shutil
 import stat
-from typing import List
+from typing import Iterable, List, Set  # noqa: F401
 
 from snapcraft import file_utils
 from snapcraft.internal import mangling
@@ -134,6 +134,18 @@ class BaseRepo:
         """
         raise errors.NoNativeBackendError()
 
+    @classmethod
+    def get_valid_build_packages(cls, package_names: Iterable[str]) -> Set[str]:
+        """Return the packages of package_names which are valid on the host.
+
+        Implementations should check all the packages at once, this default
+        checks each of them with build_package_is_valid.
+
+        :param package_names: the package names to check.
+        :return: the valid package names.
+        """
+        return {p for p in package_names if cls.build_package_is_valid(p)}
+
     @classmethod
     def is_package_installed(cls, package_name):
         """Return a bool indicating if package_name is installed.
@@ -190,7 +202,7 @@ class BaseRepo:
         """
         raise errors.NoNativeBackendError()
 
-    def normalize(self, unpackdir):
+    def normalize(self, unpackdir, *, files=None):
         """Normalize artifacts in unpackdir.
 
         Repo specific packages are generally created to live in a specific
@@ -199,11 +211,14 @@ class BaseRepo:
         when building and to also work within a snap's environment.
 
         :param str unpackdir: directory where files where unpacked.
+        :param set files: the paths that were unpacked, relative to
+                          unpackdir. If not set, everything in unpackdir
+                          is scanned.
         """
         self._remove_useless_files(unpackdir)
-        self._fix_artifacts(unpackdir)
+        self._fix_artifacts(unpackdir, files=files)
         self._fix_xml_tools(unpackdir)
-        self._fix_shebangs(unpackdir)
+        self._fix_shebangs(unpackdir, files=files)
 
     def _remove_useless_files(self, unpackdir):
         """Remove files that aren't useful or will clash with other parts."""
@@ -213,7 +228,7 @@ class BaseRepo:
         for sitecustomize_file in sitecustomize_files:
             os.remove(sitecustomize_file)
 
-    def _fix_artifacts(self, unpackdir):
+    def _fix_artifacts(self, unpackdir, *, files=None):
         """Perform various modifications to unpacked artifacts.
 
         Sometimes distro packages will contain absolute symlinks (e.g. if the
@@ -223,18 +238,15 @@ class BaseRepo:
         Some unpacked items will also contain suid binaries which we do not
         want in the resulting snap.
         """
-        for root, dirs, files in os.walk(unpackdir):
-            # Symlinks to directories will be in dirs, while symlinks to
-            # non-directories will be in files.
-            for entry in itertools.chain(files, dirs):
-                path = os.path.join(root, entry)
-                if os.path.islink(path) and os.path.isabs(os.readlink(path)):
-                    self._fix_symlink(path, unpackdir, root)
-                elif os.path.exists(path):
-                    _fix_filemode(path)
+        for path in _get_unpacked_paths(unpackdir, files):
+            root = os.path.dirname(path)
+            if os.path.islink(path) and os.path.isabs(os.readlink(path)):
+                self._fix_symlink(path, unpackdir, root)
+            elif os.path.exists(path):
+                _fix_filemode(path)
 
-                if path.endswith(".pc") and not os.path.islink(path):
-                    fix_pkg_config(unpackdir, path)
+            if path.endswith(".pc") and not os.path.islink(path):
+                fix_pkg_config(unpackdir, path)
 
     def _fix_xml_tools(self, unpackdir):
         xml2_config_path = os.path.join(unpackdir, "usr", "bin", "xml2-config")
@@ -267,9 +279,9 @@ class BaseRepo:
         os.remove(path)
         os.symlink(os.path.relpath(target, root), path)
 
-    def _fix_shebangs(self, unpackdir):
+    def _fix_shebangs(self, unpackdir, *, files=None):
         """Change hard-coded shebangs in unpacked files to use env."""
-        mangling.rewrite_python_shebangs(unpackdir)
+        mangling.rewrite_python_shebangs(unpackdir, files=files)
 
 
 class DummyRepo(BaseRepo):
@@ -277,6 +289,21 @@ class DummyRepo(BaseRepo):
         return set()
 
 
+def _get_unpacked_paths(unpackdir, files):
+    if files is None:
+        for root, dirs, walked_files in os.walk(unpackdir):
+            # Symlinks to directories will be in dirs, while symlinks to
+            # non-directories will be in files.
+            for entry in itertools.chain(walked_files, dirs):
+                yield os.path.join(root, entry)
+    else:
+        for unpacked_file in sorted(files):
+            path = os.path.join(unpackdir, unpacked_file)
+            # Some files may be gone already, e.g. the useless ones.
+            if os.path.lexists(path):
+                yield path
+
+
 def _try_copy_local(path, target):
     real_path = os.path.realpath(path)
     if os.path.exists(real_path):
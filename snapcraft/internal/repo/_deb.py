@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import contextlib
 import glob
 import hashlib
@@ -25,9 +26,12 @@ import stat
 import string
 import subprocess
 import sys
+import threading
+import time
 import urllib
+import urllib.parse
 import urllib.request
-from typing import Dict, Set, List, Tuple  # noqa: F401
+from typing import Dict, Iterable, Optional, Set, List, Tuple  # noqa: F401
 
 import apt
 from xml.etree import ElementTree
@@ -37,6 +41,7 @@ from snapcraft import file_utils
 from snapcraft.internal import cache, repo, common, os_release
 from snapcraft.internal.indicators import is_dumb_terminal
 from ._base import BaseRepo
+from ._deb_extractor import extract_debs_by_package
 from . import errors
 
 
@@ -55,6 +60,87 @@ deb http://${security}.ubuntu.com/${suffix} ${release}-security multiverse
 _GEOIP_SERVER = "http://geoip.ubuntu.com/lookup"
 _library_list = dict()  # type: Dict[str, Set[str]]
 _HASHSUM_MISMATCH_PATTERN = re.compile(r"(E:Failed to fetch.+Hash Sum mismatch)+")
+# The number of seconds the package lists of a set of apt sources are used
+# for before being refreshed, across runs. By default they are refreshed
+# once per run.
+_INDEX_TTL_ENVVAR = "SNAPCRAFT_APT_INDEX_TTL"
+_INDEX_STAMP = ".snapcraft-index-updated"
+
+
+class _AptIndexes:
+    """The package lists and apt.Cache of the apt sources used in this process.
+
+    Each set of apt sources has a cache directory of its own, named after
+    the digest of the sources. Its package lists are refreshed at most once
+    per run, or once per _INDEX_TTL_ENVVAR, and the apt.Cache opened last
+    is shared by every _AptCache with the same sources. Whether packages
+    are available from the sources is remembered until they are refreshed.
+    """
+
+    def __init__(self) -> None:
+        # apt_pkg has a single, process wide, configuration so only one
+        # apt.Cache can be in use at a time.
+        self.lock = threading.RLock()
+        self._updated = set()  # type: Set[str]
+        self._cache_dir = None  # type: Optional[str]
+        self._apt_cache = None  # type: Optional[apt.Cache]
+        self._package_validity = dict()  # type: Dict[str, Dict[str, bool]]
+
+    def get_cache(self, cache_dir: str) -> Optional[apt.Cache]:
+        """Return the apt.Cache opened last if it was opened for cache_dir."""
+        if cache_dir == self._cache_dir:
+            return self._apt_cache
+        return None
+
+    def set_cache(self, cache_dir: str, apt_cache: apt.Cache) -> None:
+        self._cache_dir = cache_dir
+        self._apt_cache = apt_cache
+
+    def needs_update(self, cache_dir: str) -> bool:
+        if cache_dir in self._updated:
+            return False
+        ttl = _get_index_ttl()
+        if ttl is None:
+            return True
+        try:
+            age = time.time() - os.path.getmtime(os.path.join(cache_dir, _INDEX_STAMP))
+        except FileNotFoundError:
+            return True
+        if age > ttl:
+            return True
+        logger.debug("Using package lists updated {:.0f}s ago.".format(age))
+        self._updated.add(cache_dir)
+        return False
+
+    def get_package_validity(self, cache_dir: str) -> Dict[str, bool]:
+        """Return whether each package checked so far is in cache_dir."""
+        return self._package_validity.setdefault(cache_dir, dict())
+
+    def mark_updated(self, cache_dir: str) -> None:
+        self._updated.add(cache_dir)
+        self._package_validity.pop(cache_dir, None)
+        with open(os.path.join(cache_dir, _INDEX_STAMP), "w"):
+            pass
+
+
+_apt_indexes = _AptIndexes()
+
+
+def _get_index_ttl() -> Optional[float]:
+    ttl = os.environ.get(_INDEX_TTL_ENVVAR)
+    if not ttl:
+        return None
+    try:
+        seconds = float(ttl)
+    except ValueError:
+        seconds = -1
+    if not 0 <= seconds < float("inf"):
+        logger.warning(
+            "Ignoring {}={!r}, it must be a number of seconds. The package "
+            "lists will be refreshed.".format(_INDEX_TTL_ENVVAR, ttl)
+        )
+        return None
+    return seconds
 
 
 class _AptCache:
@@ -67,6 +153,12 @@ class _AptCache:
             keyrings = list()
         self._keyrings = keyrings
 
+        self.progress = apt.progress.text.AcquireProgress()
+        if is_dumb_terminal():
+            # Make output more suitable for logging.
+            self.progress.pulse = lambda owner: True
+            self.progress._width = 0
+
     def _setup_apt(self, cache_dir):
         # Do not install recommends
         apt.apt_pkg.config.set("Apt::Install-Recommends", "False")
@@ -130,12 +222,6 @@ class _AptCache:
         # on the system.
         apt.apt_pkg.config.clear("APT::Update::Post-Invoke-Success")
 
-        self.progress = apt.progress.text.AcquireProgress()
-        if is_dumb_terminal():
-            # Make output more suitable for logging.
-            self.progress.pulse = lambda owner: True
-            self.progress._width = 0
-
         sources_list_file = os.path.join(cache_dir, "etc", "apt", "sources.list")
 
         os.makedirs(os.path.dirname(sources_list_file), exist_ok=True)
@@ -168,6 +254,8 @@ class _AptCache:
 
     def _create_cache(self, cache_dir: str, sources_list_file: str) -> apt.Cache:
         apt_cache = apt.Cache(rootdir=cache_dir, memonly=True)
+        if not _apt_indexes.needs_update(cache_dir):
+            return apt_cache
         try:
             apt_cache.update(
                 fetch_progress=self.progress, sources_list=sources_list_file
@@ -187,21 +275,33 @@ class _AptCache:
                     raise errors.CacheUpdateFailedError(str(retry))
             else:
                 raise errors.CacheUpdateFailedError(str(e))
+        _apt_indexes.mark_updated(cache_dir)
         return apt_cache
 
     @contextlib.contextmanager
     def archive(self, cache_dir):
-        try:
-            apt_cache = self._setup_apt(cache_dir)
-            apt_cache.open()
+        """Yield the apt.Cache of these sources, with nothing marked.
+
+        The package lists are refreshed the first time, the apt.Cache is
+        then shared with the other users of the same sources until other
+        sources are used.
 
+        :param str cache_dir: the cache directory of these sources.
+        """
+        with _apt_indexes.lock:
             try:
+                apt_cache = _apt_indexes.get_cache(cache_dir)
+                if apt_cache is None:
+                    apt_cache = self._setup_apt(cache_dir)
+                    apt_cache.open()
+                    _apt_indexes.set_cache(cache_dir, apt_cache)
+                else:
+                    # Only drop what a previous user marked.
+                    apt_cache.clear()
                 yield apt_cache
-            finally:
-                apt_cache.close()
-        except Exception as e:
-            logger.debug("Exception occurred: {!r}".format(e))
-            raise e
+            except Exception as e:
+                logger.debug("Exception occurred: {!r}".format(e))
+                raise e
 
     def sources_digest(self):
         return hashlib.sha384(
@@ -220,37 +320,60 @@ class _AptCache:
 
         return _get_local_sources_list()
 
-    def fetch_binary(self, *, package_candidate, destination: str) -> None:
+    def fetch_binaries(self, *, package_candidates, destination: str) -> List[str]:
+        """Fetch the .deb files of package_candidates into destination.
+
+        All the packages that are not in destination yet are queued into a
+        single apt_pkg.Acquire, which pipelines their downloads, runs them
+        concurrently and reports their progress as a whole.
+
+        :param package_candidates: the package versions to fetch.
+        :param str destination: the directory to fetch the packages to.
+        :returns: the paths to the fetched packages, in the same order as
+                  package_candidates.
+        :raises apt.package.FetchError: if any package could not be fetched.
+        """
         # This is a workaround for the overly verbose python-apt we use.
         # There is an unreleased patch which once released could replace
         # this code https://salsa.debian.org/apt-team/python-apt/commit/d122f9142df614dbb5f7644112280140dc155ecc  # noqa
         # What follows is almost a tit for tat implementation of upstream's
-        # fetch_binary logic.
-        base = os.path.basename(package_candidate._records.filename)
-        destfile = os.path.join(destination, base)
-        if apt.package._file_is_same(
-            destfile, package_candidate.size, package_candidate._records.md5_hash
-        ):
-            logging.debug("Ignoring already existing file: {}".format(destfile))
-            return os.path.abspath(destfile)
+        # fetch_binary logic, for many packages at once.
         acq = apt.apt_pkg.Acquire(self.progress)
-        acqfile = apt.apt_pkg.AcquireFile(
-            acq,
-            package_candidate.uri,
-            package_candidate._records.md5_hash,
-            package_candidate.size,
-            base,
-            destfile=destfile,
-        )
-        acq.run()
+        acqfiles = []
+        destfiles = []
+        for package_candidate in package_candidates:
+            base = os.path.basename(package_candidate._records.filename)
+            destfile = os.path.join(destination, base)
+            destfiles.append(os.path.abspath(destfile))
+            if apt.package._file_is_same(
+                destfile, package_candidate.size, package_candidate._records.md5_hash
+            ):
+                logging.debug("Ignoring already existing file: {}".format(destfile))
+                continue
+            acqfiles.append(
+                apt.apt_pkg.AcquireFile(
+                    acq,
+                    package_candidate.uri,
+                    package_candidate._records.md5_hash,
+                    package_candidate.size,
+                    base,
+                    destfile=destfile,
+                )
+            )
 
-        if acqfile.status != acqfile.STAT_DONE:
+        if acqfiles:
+            acq.run()
+
+        failed = [a for a in acqfiles if a.status != a.STAT_DONE]
+        if failed:
             raise apt.package.FetchError(
-                "The item %r could not be fetched: %s"
-                % (acqfile.destfile, acqfile.error_text)
+                "\n".join(
+                    "The item %r could not be fetched: %s" % (a.destfile, a.error_text)
+                    for a in failed
+                )
             )
 
-        return os.path.abspath(destfile)
+        return destfiles
 
 
 class Ubuntu(BaseRepo):
@@ -397,8 +520,12 @@ class Ubuntu(BaseRepo):
 
     @classmethod
     def build_package_is_valid(cls, package_name):
+        return package_name in cls.get_valid_build_packages([package_name])
+
+    @classmethod
+    def get_valid_build_packages(cls, package_names: Iterable[str]) -> Set[str]:
         with apt.Cache() as apt_cache:
-            return package_name in apt_cache
+            return {p for p in package_names if p in apt_cache}
 
     @classmethod
     def is_package_installed(cls, package_name):
@@ -428,14 +555,35 @@ class Ubuntu(BaseRepo):
         self._apt = _AptCache(
             project_options.deb_arch, sources_list=sources, keyrings=keyrings
         )
+        self._workers = project_options.parallel_build_count
 
         self._cache = cache.AptStagePackageCache(
             sources_digest=self._apt.sources_digest()
         )
+        self._tree_cache = cache.AptStagePackageTreeCache()
 
     def is_valid(self, package_name):
-        with self._apt.archive(self._cache.base_dir) as apt_cache:
-            return package_name in apt_cache
+        return package_name in self.get_valid_packages([package_name])
+
+    def get_valid_packages(self, package_names: Iterable[str]) -> Set[str]:
+        """Return the packages of package_names available from the sources.
+
+        The packages not checked yet during this run are all looked up in
+        one go in the package lists.
+
+        :param package_names: the package names to check.
+        :return: the valid package names.
+        """
+        package_names = set(package_names)
+        validity = _apt_indexes.get_package_validity(self._cache.base_dir)
+        if not package_names <= validity.keys():
+            with self._apt.archive(self._cache.base_dir) as apt_cache:
+                # Refreshing the package lists forgets what was checked.
+                validity = _apt_indexes.get_package_validity(self._cache.base_dir)
+                validity.update(
+                    (p, p in apt_cache) for p in package_names - validity.keys()
+                )
+        return {p for p in package_names if validity[p]}
 
     def get(self, package_names) -> None:
         with self._apt.archive(self._cache.base_dir) as apt_cache:
@@ -493,20 +641,24 @@ class Ubuntu(BaseRepo):
         # 2. Download packages in a different manner.
         #
         # In the end, (2) was chosen for minimal overhead and a simpler cache
-        # implementation. So we're using fetch_binary() here instead.
-        # Downloading each package individually has the drawback of witholding
-        # any clue of how long the whole pulling process will take, but that's
-        # something we'll have to live with.
+        # implementation. So we're using fetch_binaries() here instead, which
+        # still downloads all the packages in one go.
         pkg_list = []
+        package_candidates = []
         for package in apt_cache.get_changes():
             pkg_list.append(str(package.candidate))
-            try:
-                source = self._apt.fetch_binary(
-                    package_candidate=package.candidate,
-                    destination=self._cache.packages_dir,
-                )
-            except apt.package.FetchError as e:
-                raise errors.PackageFetchError(str(e))
+            package_candidates.append(package.candidate)
+
+        try:
+            sources = self._apt.fetch_binaries(
+                package_candidates=package_candidates,
+                destination=self._cache.packages_dir,
+            )
+        except apt.package.FetchError as e:
+            raise errors.PackageFetchError(str(e))
+        self._cache.update()
+
+        for source in sources:
             destination = os.path.join(self._downloaddir, os.path.basename(source))
             with contextlib.suppress(FileNotFoundError):
                 os.remove(destination)
@@ -516,13 +668,71 @@ class Ubuntu(BaseRepo):
 
     def unpack(self, unpackdir) -> None:
         pkgs_abs_path = glob.glob(os.path.join(self._downloaddir, "*.deb"))
+        with self._tree_cache.batch():
+            self._unpack(pkgs_abs_path, unpackdir)
+
+    def _unpack(self, pkgs_abs_path: List[str], unpackdir: str) -> None:
+        unpacked_files = set()  # type: Set[str]
+        uncached_pkgs = []  # type: List[str]
+        missing_packages = dict()  # type: Dict[str, Tuple[str, str, str]]
         for pkg in pkgs_abs_path:
-            # TODO needs elegance and error control
-            try:
-                subprocess.check_call(["dpkg-deb", "--extract", pkg, unpackdir])
-            except subprocess.CalledProcessError:
-                raise errors.UnpackError(pkg)
-        self.normalize(unpackdir)
+            package_key = _get_package_key(pkg)
+            tree = None
+            if package_key is not None:
+                name, version, arch = package_key
+                tree = self._tree_cache.get(name=name, version=version, arch=arch)
+            if tree is not None:
+                unpacked_files |= _check_out_package_tree(tree, unpackdir)
+                continue
+            uncached_pkgs.append(pkg)
+            if package_key is not None:
+                missing_packages[pkg] = package_key
+
+        if not uncached_pkgs:
+            self.normalize(unpackdir, files=unpacked_files)
+            return
+
+        manifests = extract_debs_by_package(
+            uncached_pkgs, unpackdir, workers=self._workers
+        )
+        # The trees are cached before normalizing them.
+        self._cache_package_trees(missing_packages, manifests, unpackdir)
+        if any(manifest is None for manifest in manifests.values()):
+            # Scan the whole unpackdir if the extracted files are unknown.
+            self.normalize(unpackdir)
+            return
+        for manifest in manifests.values():
+            unpacked_files.update(manifest)
+        self.normalize(unpackdir, files=unpacked_files)
+
+    def _cache_package_trees(
+        self,
+        missing_packages: Dict[str, Tuple[str, str, str]],
+        manifests: Dict[str, Optional[List[str]]],
+        unpackdir: str,
+    ) -> None:
+        # The packages extracted into unpackdir are cached as reflinks to the
+        # files extracted. Where reflinks are not supported (e.g. on ext4),
+        # caching them would mean writing every file once more, which is
+        # what the cache is meant to save, so they are not cached.
+        if not missing_packages:
+            return
+        with self._tree_cache.staging_dir() as staging_dir:
+            if not file_utils.supports_reflinks(unpackdir, staging_dir):
+                logger.debug("Not caching stage-packages, reflinks are unsupported.")
+                return
+
+            # The files more than one package extracted could be the ones
+            # from either of them.
+            shared_paths = _get_shared_paths(manifests.values(), unpackdir)
+            for index, (pkg, package_key) in enumerate(missing_packages.items()):
+                manifest = manifests[pkg]
+                if manifest is None or not shared_paths.isdisjoint(manifest):
+                    continue
+                name, version, arch = package_key
+                tree = os.path.join(staging_dir, str(index))
+                _clone_package_tree(unpackdir, manifest, tree)
+                self._tree_cache.cache(tree=tree, name=name, version=version, arch=arch)
 
     def _manifest_dep_names(self, apt_cache):
         manifest_dep_names = set()
@@ -536,6 +746,70 @@ class Ubuntu(BaseRepo):
         return manifest_dep_names
 
 
+def _get_package_key(pkg_path: str) -> Optional[Tuple[str, str, str]]:
+    # Packages in the archive are named <name>_<version>_<arch>.deb, which
+    # is what their trees are cached by.
+    pkg_name_parts = os.path.splitext(os.path.basename(pkg_path))[0].split("_")
+    if len(pkg_name_parts) != 3:
+        return None
+    name, version, arch = (urllib.parse.unquote(p) for p in pkg_name_parts)
+    return name, version, arch
+
+
+def _check_out_package_tree(tree: str, unpackdir: str) -> Set[str]:
+    checked_out_files = set()  # type: Set[str]
+
+    def _record_files(directory: str, names: List[str]) -> List[str]:
+        relative_directory = os.path.relpath(directory, tree)
+        checked_out_files.update(
+            os.path.normpath(os.path.join(relative_directory, n)) for n in names
+        )
+        return []
+
+    # The tree is shared by every build using the package, and the files
+    # unpacked are changed in place later on (e.g. by execstack or by the
+    # part's own scriptlets), so they must never be hard links to it.
+    file_utils.link_or_copy_tree(
+        tree, unpackdir, ignore=_record_files, copy_function=file_utils.clone
+    )
+    return checked_out_files
+
+
+def _get_shared_paths(
+    manifests: Iterable[Optional[List[str]]], unpackdir: str
+) -> Set[str]:
+    path_counts = collections.Counter(
+        path for manifest in manifests if manifest is not None for path in manifest
+    )
+    return {
+        path
+        for path, count in path_counts.items()
+        if count > 1 and not _is_directory(os.path.join(unpackdir, path))
+    }
+
+
+def _clone_package_tree(unpackdir: str, manifest: List[str], tree: str) -> None:
+    os.mkdir(tree)
+    directories = []  # type: List[str]
+    for path in manifest:
+        source = os.path.join(unpackdir, path)
+        destination = os.path.join(tree, path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if _is_directory(source):
+            os.makedirs(destination, exist_ok=True)
+            directories.append(path)
+        else:
+            file_utils.clone(source, destination)
+    # The modes of the directories are set last, and the deepest ones
+    # first, in case they are not writable or searchable.
+    for path in sorted(directories, reverse=True):
+        shutil.copystat(os.path.join(unpackdir, path), os.path.join(tree, path))
+
+
+def _is_directory(path: str) -> bool:
+    return os.path.isdir(path) and not os.path.islink(path)
+
+
 def _get_local_sources_list():
     sources_list = glob.glob("/etc/apt/sources.list.d/*.list")
     sources_list.append("/etc/apt/sources.list")
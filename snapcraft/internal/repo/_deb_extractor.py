@@ -0,0 +1,219 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import concurrent.futures
+import errno
+import logging
+import os
+import shutil
+import subprocess
+import tarfile
+from typing import Dict, List, Optional, Set, Tuple  # noqa: F401
+
+import debian.arfile
+
+from . import errors
+
+
+logger = logging.getLogger(__name__)
+
+# The compressions of data.tar that tarfile can stream, anything else
+# (e.g. zstd) is left to dpkg-deb.
+_SUPPORTED_DATA_MEMBERS = ("data.tar", "data.tar.gz", "data.tar.xz", "data.tar.bz2")
+
+
+def extract_debs(
+    deb_paths: List[str], unpackdir: str, *, workers: int = 1
+) -> Optional[Set[str]]:
+    """Extract the contents of the .deb files in deb_paths into unpackdir.
+
+    The data of the packages is read and written from Python, with up to
+    workers packages being extracted at the same time. Packages which data
+    cannot be read this way are extracted with dpkg-deb.
+
+    :param list deb_paths: the paths to the .deb files to extract.
+    :param str unpackdir: the directory to extract the packages to.
+    :param int workers: the number of packages to extract at a time.
+    :returns: the paths extracted, relative to unpackdir, or None if they
+              are unknown because dpkg-deb had to be used.
+    :raises snapcraft.internal.repo.errors.UnpackError:
+        if a package could not be extracted.
+    """
+    extracted_paths = set()  # type: Set[str]
+    for manifest in extract_debs_by_package(
+        deb_paths, unpackdir, workers=workers
+    ).values():
+        if manifest is None:
+            return None
+        extracted_paths.update(manifest)
+    return extracted_paths
+
+
+def extract_debs_by_package(
+    deb_paths: List[str], unpackdir: str, *, workers: int = 1
+) -> Dict[str, Optional[List[str]]]:
+    """Extract the .deb files in deb_paths into unpackdir, like extract_debs.
+
+    :param list deb_paths: the paths to the .deb files to extract.
+    :param str unpackdir: the directory to extract the packages to.
+    :param int workers: the number of packages to extract at a time.
+    :returns: the paths extracted from each package, relative to unpackdir,
+              or None for the packages dpkg-deb had to extract.
+    :raises snapcraft.internal.repo.errors.UnpackError:
+        if a package could not be extracted.
+    """
+    manifests = _extract_all([(p, unpackdir) for p in deb_paths], workers)
+    return dict(zip(deb_paths, manifests))
+
+
+def _extract_all(
+    jobs: List[Tuple[str, str]], workers: int
+) -> List[Optional[List[str]]]:
+    # Returns the paths extracted for each job, or None when dpkg-deb did
+    # the extraction.
+    manifests = [None] * len(jobs)  # type: List[Optional[List[str]]]
+    streamable = []  # type: List[int]
+    for index, (deb_path, unpackdir) in enumerate(jobs):
+        if _get_data_member_name(deb_path) is None:
+            _extract_deb_with_dpkg(deb_path, unpackdir)
+        else:
+            streamable.append(index)
+
+    deb_paths = [jobs[i][0] for i in streamable]
+    unpackdirs = [jobs[i][1] for i in streamable]
+    if workers > 1 and len(streamable) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            streamed_manifests = list(executor.map(_extract_deb, deb_paths, unpackdirs))
+    else:
+        streamed_manifests = list(map(_extract_deb, deb_paths, unpackdirs))
+
+    for index, manifest in zip(streamable, streamed_manifests):
+        manifests[index] = manifest
+    return manifests
+
+
+def _get_data_member_name(deb_path: str) -> Optional[str]:
+    try:
+        deb_ar = debian.arfile.ArFile(deb_path)
+    except (debian.arfile.ArError, OSError):
+        return None
+    for name in deb_ar.getnames():
+        if name.startswith("data.tar"):
+            return name if name in _SUPPORTED_DATA_MEMBERS else None
+    return None
+
+
+def _extract_deb_with_dpkg(deb_path: str, unpackdir: str) -> None:
+    try:
+        subprocess.check_call(["dpkg-deb", "--extract", deb_path, unpackdir])
+    except subprocess.CalledProcessError:
+        raise errors.UnpackError(deb_path)
+
+
+def _extract_deb(deb_path: str, unpackdir: str) -> List[str]:
+    deb_ar = debian.arfile.ArFile(deb_path)
+    data_member = deb_ar.getmember(_get_data_member_name(deb_path))
+    extracted_paths = []  # type: List[str]
+    directory_modes = []  # type: List[Tuple[str, int]]
+    try:
+        with tarfile.open(fileobj=data_member, mode="r|*") as tar:
+            for member in tar:
+                path = _get_relative_path(member.name)
+                if path is not None and _extract_member(
+                    tar, member, unpackdir, path, directory_modes
+                ):
+                    extracted_paths.append(path)
+        # Like tarfile does, the modes of the directories are only set once
+        # everything is in them, in case they are not writable, and the
+        # deepest ones first, in case they are not searchable.
+        for path, mode in sorted(directory_modes, reverse=True):
+            _chmod_directory(path, mode)
+    except (tarfile.TarError, OSError) as e:
+        logger.debug("Failed to extract {!r}: {}".format(deb_path, e))
+        raise errors.UnpackError(deb_path)
+    finally:
+        data_member.close()
+    return extracted_paths
+
+
+def _get_relative_path(name: str) -> Optional[str]:
+    # Entries are relative to the root of the package, e.g. './usr/bin/foo',
+    # anything that would end up outside of it is ignored.
+    path = os.path.normpath(name)
+    if path == "." or path.startswith(("..", "/")):
+        return None
+    return path
+
+
+def _extract_member(
+    tar: tarfile.TarFile,
+    member: tarfile.TarInfo,
+    unpackdir: str,
+    relpath: str,
+    directory_modes: List[Tuple[str, int]],
+) -> bool:
+    # Other packages may be extracted to the same directories at the same
+    # time, so directories are allowed to exist already and everything else
+    # is written next to its destination and then moved over it atomically.
+    # That also breaks hard links to the previous contents of path instead
+    # of writing through them. The modes of directories are added to
+    # directory_modes, to be set after extracting everything.
+    path = os.path.join(unpackdir, relpath)
+    if member.isdir():
+        os.makedirs(path, exist_ok=True)
+        directory_modes.append((path, member.mode))
+        return True
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = "{}.snapcraft-{}".format(path, os.getpid())
+    if member.isreg():
+        with open(temporary_path, "wb") as f:
+            shutil.copyfileobj(tar.extractfile(member), f)
+        os.chmod(temporary_path, member.mode)
+        os.utime(temporary_path, (member.mtime, member.mtime))
+    elif member.issym():
+        os.symlink(member.linkname, temporary_path)
+    elif member.islnk():
+        # The stream has already gone past the target of the hard link,
+        # which is then in its place.
+        target = _get_relative_path(member.linkname)
+        if target is None:
+            return False
+        os.link(os.path.join(unpackdir, target), temporary_path)
+    else:
+        # Devices and pipes cannot be created unprivileged, dpkg-deb does
+        # not extract them either.
+        logger.debug("Skipping special file {!r}".format(member.name))
+        return False
+
+    os.replace(temporary_path, path)
+    return True
+
+
+def _chmod_directory(path: str, mode: int) -> None:
+    # The directory may have been replaced by a symlink since, which must
+    # not be followed, and os.chmod cannot be told not to on Linux.
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    except OSError as e:
+        if e.errno not in (errno.ELOOP, errno.ENOTDIR):
+            raise
+        logger.debug("Not setting the mode of {!r}: {}".format(path, e))
+        return
+    try:
+        os.fchmod(fd, mode)
+    finally:
+        os.close(fd)
@@ -21,10 +21,7 @@ import sys
 
 import snapcraft.internal.common
 from snapcraft.internal.cache import FileCache
-from snapcraft.internal.indicators import (
-    download_requests_stream,
-    download_urllib_source,
-)
+from snapcraft.internal.indicators import download_ranges, download_urllib_source
 from ._checksum import split_checksum, verify_checksum
 from . import errors
 
@@ -133,25 +130,25 @@ class FileBase(Base):
         file_cache = FileCache()
         if self.source_checksum:
             algorithm, hash = split_checksum(self.source_checksum)
-            cache_file = file_cache.get(algorithm=algorithm, hash=hash)
-            if cache_file:
-                # We make this copy as the provisioning logic can delete
-                # this file and we don't want that.
-                shutil.copy2(cache_file, self.file)
+            # The file is checked out rather than used in place as the
+            # provisioning logic can delete it and we don't want that.
+            if file_cache.get(algorithm=algorithm, hash=hash, destination=self.file):
                 return self.file
 
         # If not we download and store
         if snapcraft.internal.common.get_url_scheme(self.source) == "ftp":
             download_urllib_source(self.source, self.file)
         else:
+            # Hashing the file with the algorithm of the checksum while it
+            # is downloaded saves reading it again to verify it.
+            algorithms = []
+            if self.source_checksum:
+                algorithms.append(split_checksum(self.source_checksum)[0])
             try:
-                request = requests.get(self.source, stream=True, allow_redirects=True)
-                request.raise_for_status()
+                download_ranges(self.source, self.file, algorithms=algorithms)
             except requests.exceptions.RequestException as e:
                 raise errors.SnapcraftRequestError(message=e)
 
-            download_requests_stream(request, self.file)
-
         # We verify the file if source_checksum is defined
         # and we cache the file for future reuse.
         if self.source_checksum:
@@ -13,7 +13,7 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from snapcraft.file_utils import calculate_hash
+from snapcraft.file_utils import calculate_digests
 from . import errors
 
 from typing import Tuple
@@ -45,7 +45,7 @@ def verify_checksum(source_checksum: str, checkfile: str) -> Tuple:
     """
     algorithm, digest = split_checksum(source_checksum)
 
-    calculated_digest = calculate_hash(checkfile, algorithm=algorithm)
+    calculated_digest = calculate_digests(checkfile, algorithms=[algorithm])[algorithm]
     if digest != calculated_digest:
         raise errors.DigestDoesNotMatchError(digest, calculated_digest)
 
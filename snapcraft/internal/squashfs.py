@@ -0,0 +1,615 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Read-only access to squashfs 4.0 images, such as snaps.
+
+Only what is needed to look up, list and read the members of an image is
+implemented, following the layout documented in the squashfs-tools
+sources. Nothing is ever extracted to disk, except for images compressed
+with an algorithm not available in Python, which open_image reads with
+unsquashfs instead.
+"""
+
+import collections
+import errno
+import io
+import lzma
+import os
+import stat
+import struct
+import subprocess
+import tempfile
+import zlib
+from typing import (  # noqa: F401
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from snapcraft import file_utils
+from snapcraft.internal import errors
+
+_MAGIC = 0x73717368
+_SUPERBLOCK = struct.Struct("<IIIIIHHHHHHQQQQQQQQ")
+
+# Metadata (inodes, directories, fragment entries) is stored in blocks of
+# up to 8KiB, each of them preceded by a 16 bit header holding its size.
+_METADATA_UNCOMPRESSED = 0x8000
+_DATA_UNCOMPRESSED = 1 << 24
+_NO_FRAGMENT = 0xFFFFFFFF
+_FRAGMENT_ENTRIES_PER_BLOCK = 512
+
+_INODE_HEADER = struct.Struct("<HHHHII")
+_DIR_INODE = struct.Struct("<IIHHI")
+_EXT_DIR_INODE = struct.Struct("<IIIIHHI")
+_FILE_INODE = struct.Struct("<IIII")
+_EXT_FILE_INODE = struct.Struct("<QQQIIII")
+_SYMLINK_INODE = struct.Struct("<II")
+_DIR_HEADER = struct.Struct("<III")
+_DIR_ENTRY = struct.Struct("<HhHH")
+_FRAGMENT_ENTRY = struct.Struct("<QII")
+_FRAGMENT_POINTER = struct.Struct("<Q")
+
+# The basic inode types, the extended ones come right after them.
+_INODE_TYPES = {
+    1: stat.S_IFDIR,
+    2: stat.S_IFREG,
+    3: stat.S_IFLNK,
+    4: stat.S_IFBLK,
+    5: stat.S_IFCHR,
+    6: stat.S_IFIFO,
+    7: stat.S_IFSOCK,
+}
+_EXTENDED_INODE_OFFSET = 7
+
+# lzma.decompress handles both the legacy lzma and the xz formats.
+_DECOMPRESSORS = {
+    1: zlib.decompress,
+    2: lzma.decompress,
+    4: lzma.decompress,
+}  # type: Dict[int, Callable[[bytes], bytes]]
+_COMPRESSOR_NAMES = {3: "lzo", 5: "lz4", 6: "zstd"}
+
+
+class _UnsupportedCompressionError(errors.InvalidSquashFSError):
+    pass
+
+
+# block_sizes are the sizes the data blocks of a regular file are stored
+# with, as found in its inode, which does not include its tail if that is
+# in a fragment.
+SquashFSEntry = collections.namedtuple(
+    "SquashFSEntry", ["path", "mode", "size", "link_target", "block_sizes"]
+)
+
+
+class _Inode:
+    def __init__(self, *, mode: int) -> None:
+        self.mode = mode
+        self.size = 0
+        # Where the listing of a directory starts in the directory table.
+        self.directory_position = (0, 0)
+        # The data blocks of a file, and the tail of it that is in a
+        # fragment, if any.
+        self.blocks = []  # type: List[Tuple[int, int]]
+        self.fragment = _NO_FRAGMENT
+        self.fragment_offset = 0
+        self.link_target = None  # type: Optional[str]
+
+
+class _MetadataCursor:
+    def __init__(self, image: "SquashFS", position: int, offset: int) -> None:
+        self._image = image
+        self._position = position
+        self._offset = offset
+
+    def read(self, size: int) -> bytes:
+        chunks = []
+        while size > 0:
+            data, next_position = self._image._read_metadata_block(self._position)
+            chunk = data[self._offset : self._offset + size]
+            chunks.append(chunk)
+            size -= len(chunk)
+            self._offset += len(chunk)
+            if self._offset >= len(data):
+                self._position = next_position
+                self._offset -= len(data)
+        return b"".join(chunks)
+
+    def unpack(self, structure: struct.Struct) -> Tuple:
+        return structure.unpack(self.read(structure.size))
+
+
+class SquashFS:
+    """A squashfs image opened for reading.
+
+    Members are looked up by their path relative to the root of the image,
+    e.g. 'meta/snap.yaml'. The metadata blocks that are read are kept in
+    memory, so looking up several members of the same image only reads
+    and decompresses the inode and directory tables once.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the squashfs image in path.
+
+        :param str path: the path to the image.
+        :raises snapcraft.internal.errors.InvalidSquashFSError:
+            if path is not a squashfs image that can be read.
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._metadata_blocks = dict()  # type: Dict[int, Tuple[bytes, int]]
+        self._directories = dict()  # type: Dict[Tuple[int, int], Dict[str, int]]
+        self._fragments = dict()  # type: Dict[int, bytes]
+        try:
+            self._read_superblock()
+        except Exception:
+            self._file.close()
+            raise
+
+    def __enter__(self) -> "SquashFS":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the image, members that are open cannot be read anymore."""
+        self._file.close()
+
+    def exists(self, member: str) -> bool:
+        """Return whether member is in the image.
+
+        :param str member: the path to the member.
+        """
+        try:
+            self._lookup(member)
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+        return True
+
+    def open(self, member: str) -> BinaryIO:
+        """Open a regular file in the image for reading.
+
+        The file is decompressed a block at a time while it is being read.
+
+        :param str member: the path to the file.
+        :returns: a seekable binary file object.
+        :raises FileNotFoundError: if member is not in the image.
+        """
+        inode = self._lookup(member)
+        if stat.S_ISDIR(inode.mode):
+            raise IsADirectoryError(errno.EISDIR, os.strerror(errno.EISDIR), member)
+        elif not stat.S_ISREG(inode.mode):
+            raise OSError(errno.EINVAL, "Not a regular file", member)
+        return io.BufferedReader(
+            _SquashFSFileReader(self, inode, member),  # type: ignore
+            buffer_size=self._block_size,
+        )
+
+    def read(self, member: str) -> bytes:
+        """Return the contents of a regular file in the image.
+
+        :param str member: the path to the file.
+        :raises FileNotFoundError: if member is not in the image.
+        """
+        with self.open(member) as member_file:
+            return member_file.read()
+
+    def listdir(self, member: str = "") -> List[str]:
+        """Return the names of the entries of a directory in the image.
+
+        :param str member: the path to the directory, the root by default.
+        :raises NotADirectoryError: if member is not a directory.
+        """
+        inode = self._lookup(member)
+        if not stat.S_ISDIR(inode.mode):
+            raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR), member)
+        return list(self._read_directory(inode))
+
+    def walk(self, member: str = "") -> Iterator[SquashFSEntry]:
+        """Yield an entry for everything under a directory in the image.
+
+        Entries are yielded depth first, in the order they are stored in,
+        which is sorted by name.
+
+        :param str member: the path to the directory, the root by default.
+        :returns: an iterator over SquashFSEntry tuples, with paths
+                  relative to the root of the image.
+        """
+        root = _normalize_member(member)
+        pending = [(root, self._lookup(member))]
+        while pending:
+            path, inode = pending.pop()
+            if path != root:
+                yield SquashFSEntry(
+                    path,
+                    inode.mode,
+                    inode.size,
+                    inode.link_target,
+                    tuple(size for _, size in inode.blocks),
+                )
+            if stat.S_ISDIR(inode.mode):
+                children = list(self._read_directory(inode).items())
+                for name, reference in reversed(children):
+                    child_path = os.path.join(path, name)
+                    pending.append((child_path, self._read_inode(reference)))
+
+    def _read(self, position: int, size: int) -> bytes:
+        self._file.seek(position)
+        data = self._file.read(size)
+        if len(data) != size:
+            raise errors.InvalidSquashFSError(
+                path=self.path, message="unexpected end of file"
+            )
+        return data
+
+    def _decompress(self, data: bytes) -> bytes:
+        try:
+            return self._decompressor(data)
+        except (lzma.LZMAError, zlib.error) as e:
+            raise errors.InvalidSquashFSError(path=self.path, message=str(e)) from e
+
+    def _read_superblock(self) -> None:
+        superblock = self._read(0, _SUPERBLOCK.size)
+        (
+            magic,
+            _,
+            _,
+            self._block_size,
+            _,
+            compressor,
+            _,
+            _,
+            _,
+            major,
+            minor,
+            self._root_inode,
+            _,
+            _,
+            _,
+            self._inode_table,
+            self._directory_table,
+            self._fragment_table,
+            _,
+        ) = _SUPERBLOCK.unpack(superblock)
+        if magic != _MAGIC:
+            raise errors.InvalidSquashFSError(
+                path=self.path, message="not a squashfs image"
+            )
+        if (major, minor) != (4, 0):
+            raise errors.InvalidSquashFSError(
+                path=self.path,
+                message="unsupported version {}.{}".format(major, minor),
+            )
+        try:
+            self._decompressor = _DECOMPRESSORS[compressor]
+        except KeyError:
+            raise _UnsupportedCompressionError(
+                path=self.path,
+                message="unsupported compression {!r}".format(
+                    _COMPRESSOR_NAMES.get(compressor, compressor)
+                ),
+            )
+
+    def _read_metadata_block(self, position: int) -> Tuple[bytes, int]:
+        # Returns the contents of the block and the position of the next one.
+        if position not in self._metadata_blocks:
+            (header,) = struct.unpack("<H", self._read(position, 2))
+            size = header & ~_METADATA_UNCOMPRESSED
+            data = self._read(position + 2, size)
+            if not header & _METADATA_UNCOMPRESSED:
+                data = self._decompress(data)
+            if not data:
+                raise errors.InvalidSquashFSError(
+                    path=self.path, message="empty metadata block"
+                )
+            self._metadata_blocks[position] = (data, position + 2 + size)
+        return self._metadata_blocks[position]
+
+    def _read_data_block(self, position: int, size: int) -> bytes:
+        compressed_size = size & ~_DATA_UNCOMPRESSED
+        # Blocks of a sparse file that are all zeros are not stored.
+        if compressed_size == 0:
+            return bytes(self._block_size)
+        data = self._read(position, compressed_size)
+        if not size & _DATA_UNCOMPRESSED:
+            data = self._decompress(data)
+        return data
+
+    def _read_fragment(self, index: int) -> bytes:
+        if index not in self._fragments:
+            block_index, entry_index = divmod(index, _FRAGMENT_ENTRIES_PER_BLOCK)
+            (position,) = _FRAGMENT_POINTER.unpack(
+                self._read(
+                    self._fragment_table + block_index * _FRAGMENT_POINTER.size,
+                    _FRAGMENT_POINTER.size,
+                )
+            )
+            cursor = _MetadataCursor(self, position, entry_index * _FRAGMENT_ENTRY.size)
+            start, size, _ = cursor.unpack(_FRAGMENT_ENTRY)
+            self._fragments[index] = self._read_data_block(start, size)
+        return self._fragments[index]
+
+    def _read_file_block(self, inode: _Inode, index: int) -> bytes:
+        if index < len(inode.blocks):
+            return self._read_data_block(*inode.blocks[index])
+        fragment = self._read_fragment(inode.fragment)
+        tail_size = inode.size - index * self._block_size
+        return fragment[inode.fragment_offset : inode.fragment_offset + tail_size]
+
+    def _read_inode(self, reference: int) -> _Inode:
+        # References hold the position of the metadata block the inode is
+        # in, relative to the inode table, and its offset in that block.
+        cursor = _MetadataCursor(
+            self, self._inode_table + (reference >> 16), reference & 0xFFFF
+        )
+        inode_type, permissions, _, _, _, _ = cursor.unpack(_INODE_HEADER)
+        basic_type = inode_type
+        if basic_type > _EXTENDED_INODE_OFFSET:
+            basic_type -= _EXTENDED_INODE_OFFSET
+        if basic_type not in _INODE_TYPES:
+            raise errors.InvalidSquashFSError(
+                path=self.path, message="unknown inode type {}".format(inode_type)
+            )
+
+        inode = _Inode(mode=_INODE_TYPES[basic_type] | permissions)
+        reader = self._INODE_READERS.get(inode_type)
+        if reader is not None:
+            reader(self, cursor, inode)
+        return inode
+
+    def _read_dir_inode(self, cursor: _MetadataCursor, inode: _Inode) -> None:
+        start_block, _, size, offset, _ = cursor.unpack(_DIR_INODE)
+        inode.directory_position = (start_block, offset)
+        inode.size = size
+
+    def _read_ext_dir_inode(self, cursor: _MetadataCursor, inode: _Inode) -> None:
+        _, size, start_block, _, _, offset, _ = cursor.unpack(_EXT_DIR_INODE)
+        inode.directory_position = (start_block, offset)
+        inode.size = size
+
+    def _read_file_inode(self, cursor: _MetadataCursor, inode: _Inode) -> None:
+        start, fragment, fragment_offset, size = cursor.unpack(_FILE_INODE)
+        self._read_file_blocks(cursor, inode, start, size, fragment, fragment_offset)
+
+    def _read_ext_file_inode(self, cursor: _MetadataCursor, inode: _Inode) -> None:
+        start, size, _, _, fragment, fragment_offset, _ = cursor.unpack(_EXT_FILE_INODE)
+        self._read_file_blocks(cursor, inode, start, size, fragment, fragment_offset)
+
+    def _read_file_blocks(
+        self,
+        cursor: _MetadataCursor,
+        inode: _Inode,
+        start: int,
+        size: int,
+        fragment: int,
+        fragment_offset: int,
+    ) -> None:
+        inode.size = size
+        inode.fragment = fragment
+        inode.fragment_offset = fragment_offset
+        # The inode is followed by the sizes of the blocks the file is
+        # stored in, its tail is in a fragment block shared with other
+        # files unless there is none.
+        if fragment == _NO_FRAGMENT:
+            block_count = -(-size // self._block_size)
+        else:
+            block_count = size // self._block_size
+        sizes = cursor.unpack(struct.Struct("<{}I".format(block_count)))
+        position = start
+        for block_size in sizes:
+            inode.blocks.append((position, block_size))
+            position += block_size & ~_DATA_UNCOMPRESSED
+
+    def _read_symlink_inode(self, cursor: _MetadataCursor, inode: _Inode) -> None:
+        _, target_size = cursor.unpack(_SYMLINK_INODE)
+        inode.link_target = cursor.read(target_size).decode("utf-8", "surrogateescape")
+        inode.size = target_size
+
+    _INODE_READERS = {
+        1: _read_dir_inode,
+        2: _read_file_inode,
+        3: _read_symlink_inode,
+        8: _read_ext_dir_inode,
+        9: _read_ext_file_inode,
+        10: _read_symlink_inode,
+    }  # type: Dict[int, Callable[[SquashFS, _MetadataCursor, _Inode], None]]
+
+    def _read_directory(self, inode: _Inode) -> Dict[str, int]:
+        # Returns the inode references of the entries of the directory,
+        # by name.
+        # The size accounts for the '.' and '..' entries, which are not
+        # stored. An empty directory has no listing of its own, its
+        # position can be that of the listing of another directory.
+        if inode.size <= 3:
+            return collections.OrderedDict()
+        if inode.directory_position not in self._directories:
+            start_block, offset = inode.directory_position
+            cursor = _MetadataCursor(self, self._directory_table + start_block, offset)
+            entries = collections.OrderedDict()  # type: Dict[str, int]
+            remaining = inode.size - 3
+            while remaining > 0:
+                count, inode_block, _ = cursor.unpack(_DIR_HEADER)
+                remaining -= _DIR_HEADER.size
+                for _ in range(count + 1):
+                    inode_offset, _, _, name_size = cursor.unpack(_DIR_ENTRY)
+                    name = cursor.read(name_size + 1)
+                    remaining -= _DIR_ENTRY.size + len(name)
+                    entries[name.decode("utf-8", "surrogateescape")] = (
+                        inode_block << 16
+                    ) | inode_offset
+            self._directories[inode.directory_position] = entries
+        return self._directories[inode.directory_position]
+
+    def _lookup(self, member: str) -> _Inode:
+        path = _normalize_member(member)
+        inode = self._read_inode(self._root_inode)
+        for name in path.split("/") if path else []:
+            if not stat.S_ISDIR(inode.mode):
+                raise NotADirectoryError(
+                    errno.ENOTDIR, os.strerror(errno.ENOTDIR), member
+                )
+            try:
+                reference = self._read_directory(inode)[name]
+            except KeyError:
+                raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), member)
+            inode = self._read_inode(reference)
+        return inode
+
+
+class _SquashFSFileReader(io.RawIOBase):
+    def __init__(self, image: SquashFS, inode: _Inode, name: str) -> None:
+        super().__init__()
+        self.name = name
+        self._image = image
+        self._inode = inode
+        self._position = 0
+        self._block = (-1, b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._inode.size
+        if offset < 0:
+            raise ValueError("negative seek position {}".format(offset))
+        self._position = offset
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        if self._position >= self._inode.size:
+            return 0
+        index, offset = divmod(self._position, self._image._block_size)
+        if self._block[0] != index:
+            self._block = (index, self._image._read_file_block(self._inode, index))
+        size = min(len(buffer), self._inode.size - self._position)
+        chunk = self._block[1][offset : offset + size]
+        if not chunk:
+            raise errors.InvalidSquashFSError(
+                path=self._image.path, message="truncated data block"
+            )
+        buffer[: len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+
+class UnsquashFS:
+    """A squashfs image read with unsquashfs.
+
+    This is for images SquashFS cannot decompress, e.g. lzo, lz4 or zstd
+    ones. Members are extracted to a temporary directory as they are looked
+    up, which is removed once the image is closed.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the squashfs image in path.
+
+        :param str path: the path to the image.
+        """
+        self.path = path
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._root = os.path.join(self._temp_dir.name, "squashfs-root")
+        self._extracted = set()  # type: Set[str]
+
+    def __enter__(self) -> "UnsquashFS":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the image, removing what was extracted from it."""
+        self._temp_dir.cleanup()
+
+    def exists(self, member: str) -> bool:
+        """Return whether member is in the image.
+
+        :param str member: the path to the member.
+        """
+        return os.path.lexists(self._extract(member))
+
+    def open(self, member: str) -> BinaryIO:
+        """Open a regular file in the image for reading.
+
+        :param str member: the path to the file.
+        :raises FileNotFoundError: if member is not in the image.
+        """
+        return open(self._extract(member), "rb")
+
+    def read(self, member: str) -> bytes:
+        """Return the contents of a regular file in the image.
+
+        :param str member: the path to the file.
+        :raises FileNotFoundError: if member is not in the image.
+        """
+        with self.open(member) as member_file:
+            return member_file.read()
+
+    def _extract(self, member: str) -> str:
+        path = _normalize_member(member)
+        if path not in self._extracted:
+            unsquashfs_path = file_utils.get_tool_path("unsquashfs")
+            try:
+                # Extracting a member missing from the image is not an error.
+                subprocess.check_output(
+                    [unsquashfs_path, "-f", "-d", self._root, self.path, path],
+                    stderr=subprocess.STDOUT,
+                )
+            except subprocess.CalledProcessError as e:
+                raise errors.InvalidSquashFSError(
+                    path=self.path, message=e.output.decode("utf-8", "replace").strip(),
+                ) from e
+            self._extracted.add(path)
+        return os.path.join(self._root, path)
+
+
+def open_image(path: str) -> Union[SquashFS, UnsquashFS]:
+    """Open the squashfs image in path with SquashFS if possible.
+
+    Images compressed with an algorithm SquashFS does not support are
+    opened with UnsquashFS instead, which only supports looking up and
+    reading members.
+
+    :param str path: the path to the image.
+    :raises snapcraft.internal.errors.InvalidSquashFSError:
+        if path is not a squashfs image that can be read.
+    """
+    try:
+        return SquashFS(path)
+    except _UnsupportedCompressionError:
+        return UnsquashFS(path)
+
+
+def _normalize_member(member: str) -> str:
+    # Members are always relative to the root of the image.
+    return os.path.normpath("/" + member).lstrip("/")
@@ -29,6 +29,8 @@ class PrimeState(PartState):
         part_properties=None,
         project=None,
         scriptlet_metadata=None,
+        fingerprints=None,
+        file_dependency_paths=None,
     ):
         super().__init__(part_properties, project)
 
@@ -39,6 +41,11 @@ class PrimeState(PartState):
         self.directories = directories
         self.dependency_paths = set()
         self.scriptlet_metadata = scriptlet_metadata
+        # The (inode, size, mtime) of each file when it was migrated.
+        self.fingerprints = fingerprints
+        # The dependency paths of each ELF file, dependency_paths is the
+        # union of them.
+        self.file_dependency_paths = file_dependency_paths
 
         if dependency_paths:
             self.dependency_paths = dependency_paths
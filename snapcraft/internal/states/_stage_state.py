@@ -28,6 +28,7 @@ class StageState(PartState):
         part_properties=None,
         project=None,
         scriptlet_metadata=None,
+        fingerprints=None,
     ):
         super().__init__(part_properties, project)
 
@@ -37,6 +38,8 @@ class StageState(PartState):
         self.files = files
         self.directories = directories
         self.scriptlet_metadata = scriptlet_metadata
+        # The (inode, size, mtime) of each file when it was migrated.
+        self.fingerprints = fingerprints
 
     def properties_of_interest(self, part_properties):
         """Extract the properties concerning this step from part_properties.
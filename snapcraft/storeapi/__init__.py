@@ -53,4 +53,5 @@ def _deserialize_macaroon(value):
         raise errors.InvalidCredentialsError("Failed to deserialize macaroon")
 
 
+from ._status_tracker import track_all  # noqa
 from ._store_client import StoreClient  # noqa
@@ -1,15 +1,41 @@
+from datetime import datetime, timezone
+import email.utils
+import heapq
 import itertools
-from time import sleep
-from threading import Thread
-from queue import Queue
+import random
+import time
+from threading import Event, Lock, Thread
+from queue import Empty, Queue
 
 from progressbar import AnimatedMarker, ProgressBar, UnknownLength
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from . import constants
 from . import errors
 
+# How many times in a row a status can fail to be polled before giving up.
+_ERRORS_ALLOWED = 10
+# Responses that ask to poll again later, usually with a Retry-After.
+_RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# The statuses of all the uploads are polled through one pool of
+# connections instead of opening a new one for each request.
+_session = None
+_session_lock = Lock()
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=32)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
 
 class StatusTracker:
 
@@ -27,37 +53,15 @@ class StatusTracker:
         "need_manual_review",
     }
 
-    def __init__(self, status_details_url):
+    def __init__(self, status_details_url, *, session=None):
         self.__status_details_url = status_details_url
+        self.__session = session
+        self.__content = {}
+        self.__polls = 0
+        self.__errors = 0
 
     def track(self):
-        queue = Queue()
-        thread = Thread(target=self._update_status, args=(queue,))
-        thread.start()
-
-        widgets = ["Processing...", AnimatedMarker()]
-        progress_indicator = ProgressBar(widgets=widgets, maxval=UnknownLength)
-        progress_indicator.start()
-
-        content = {}
-        for indicator_count in itertools.count():
-            progress_indicator.update(indicator_count)
-            if not queue.empty():
-                content = queue.get()
-                if isinstance(content, Exception):
-                    raise content
-            if content.get("processed"):
-                break
-            else:
-                widgets[0] = self._get_message(content)
-            sleep(0.1)
-        progress_indicator.finish()
-        # Print at the end to avoid a left over spinner artifact
-        print(self._get_message(content))
-
-        self.__content = content
-
-        return content
+        return track_all([self])[0]
 
     def raise_for_code(self):
         if self.__content["code"] in self.__error_codes:
@@ -69,21 +73,142 @@ class StatusTracker:
         except KeyError:
             return self.__messages.get("being_processed")
 
-    def _update_status(self, queue):
-        for content in self._get_status():
-            queue.put(content)
-            if content["processed"]:
-                break
-            sleep(constants.SCAN_STATUS_POLL_DELAY)
+    def _poll(self):
+        """Get the status once.
 
-    def _get_status(self):
-        connection_errors_allowed = 10
-        while True:
+        :returns: the status and how long to wait, in seconds, before
+                  polling it again.
+        """
+        session = self.__session or _get_session()
+        response = None
+        try:
+            response = session.get(self.__status_details_url)
+            if response.status_code in _RETRY_STATUS_CODES:
+                response.raise_for_status()
+        except (requests.ConnectionError, requests.HTTPError):
+            self.__errors += 1
+            if self.__errors > _ERRORS_ALLOWED:
+                raise
+            self.__content = {"processed": False, "code": "being_processed"}
+        else:
+            self.__errors = 0
+            response.raise_for_status()
+            self.__content = response.json()
+        return self.__content, self._get_delay(response)
+
+    def _get_delay(self, response):
+        retry_after = _get_retry_after(response)
+        if retry_after is not None:
+            return retry_after
+
+        delay = min(
+            constants.SCAN_STATUS_POLL_MAX_DELAY,
+            constants.SCAN_STATUS_POLL_DELAY
+            * constants.SCAN_STATUS_POLL_BACKOFF ** self.__polls,
+        )
+        self.__polls += 1
+        # The jitter keeps the polls for uploads pushed at the same time
+        # from reaching the server together.
+        return random.uniform(delay / 2, delay)
+
+
+def track_all(trackers, *, return_exceptions=False):
+    """Track the processing of several uploads at once.
+
+    The statuses are polled from a single thread, which waits for the next
+    status that is due, backing off exponentially for each upload and
+    honoring the Retry-After of the server.
+
+    :param list trackers: the StatusTracker of each upload.
+    :param bool return_exceptions: if True, the error raised while polling
+                                   the status of an upload is returned as
+                                   its final status and the other uploads
+                                   are still tracked, otherwise the first
+                                   error is raised.
+    :returns: the final status of each upload, in the order of trackers.
+    """
+    updates = Queue()  # type: Queue
+    stop = Event()
+    thread = Thread(target=_poll_statuses, args=(trackers, updates, stop))
+    thread.daemon = True
+    thread.start()
+
+    widgets = ["Processing...", AnimatedMarker()]
+    progress_indicator = ProgressBar(widgets=widgets, maxval=UnknownLength)
+    progress_indicator.start()
+
+    contents = [{} for _ in trackers]
+    try:
+        for indicator_count in itertools.count():
+            progress_indicator.update(indicator_count)
+            # Waiting for the next update keeps the spinner going.
             try:
-                content = requests.get(self.__status_details_url).json()
-            except (requests.ConnectionError, requests.HTTPError) as e:
-                if not connection_errors_allowed:
-                    yield e
-                content = {"processed": False, "code": "being_processed"}
-                connection_errors_allowed -= 1
-            yield content
+                index, content = updates.get(timeout=0.1)
+            except Empty:
+                continue
+            if isinstance(content, Exception) and not return_exceptions:
+                raise content
+            contents[index] = content
+            if all(_is_done(c) for c in contents):
+                break
+            widgets[0] = _get_progress_message(trackers, contents)
+    finally:
+        stop.set()
+    progress_indicator.finish()
+    # Print at the end to avoid a left over spinner artifact
+    for tracker, content in zip(trackers, contents):
+        if not isinstance(content, Exception):
+            print(tracker._get_message(content))
+
+    return contents
+
+
+def _is_done(content):
+    return isinstance(content, Exception) or content.get("processed")
+
+
+def _get_progress_message(trackers, contents):
+    if len(trackers) == 1:
+        return trackers[0]._get_message(contents[0])
+    processed = sum(1 for c in contents if _is_done(c))
+    return "Processing... ({} of {} done)".format(processed, len(trackers))
+
+
+def _poll_statuses(trackers, updates, stop):
+    # A queue of when each status is due to be polled next.
+    now = time.monotonic()
+    schedule = [(now, index) for index in range(len(trackers))]
+    while schedule:
+        due, index = heapq.heappop(schedule)
+        if stop.wait(max(0.0, due - time.monotonic())):
+            return
+        try:
+            content, delay = trackers[index]._poll()
+        except Exception as e:
+            # The status of this upload is not polled again.
+            updates.put((index, e))
+            continue
+        updates.put((index, content))
+        if not content.get("processed"):
+            heapq.heappush(schedule, (time.monotonic() + delay, index))
+
+
+def _get_retry_after(response):
+    if response is None:
+        return None
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+
+    # Retry-After is either a number of seconds or an HTTP date.
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
@@ -1,15 +1,13 @@
-import hashlib
 import os
+import threading
 import urllib.parse
-from time import sleep
 from typing import Dict, Iterable, List, TextIO, Union
 
 import pymacaroons
-import requests
 
 import snapcraft
-from snapcraft import config
-from snapcraft.internal.indicators import download_requests_stream
+from snapcraft import config, file_utils
+from snapcraft.internal.indicators import download_ranges
 
 from . import logger
 from . import _upload
@@ -32,6 +30,7 @@ class StoreClient:
         self.cpi = SnapIndexClient(self.conf)
         self.updown = UpDownClient(self.conf)
         self.sca = SCAClient(self.conf)
+        self._refresh_lock = threading.Lock()
 
     def login(
         self,
@@ -89,15 +88,23 @@ class StoreClient:
         self.conf.save()
 
     def _refresh_if_necessary(self, func, *args, **kwargs):
-        """Make a request, refreshing macaroons if necessary."""
+        """Make a request, refreshing macaroons if necessary.
+
+        Requests made from several threads at the same time share a single
+        refresh.
+        """
+        unbound_discharge = self.conf.get("unbound_discharge")
         try:
             return func(*args, **kwargs)
         except errors.StoreMacaroonNeedsRefreshError:
-            unbound_discharge = self.sso.refresh_unbound_discharge(
-                self.conf.get("unbound_discharge")
-            )
-            self.conf.set("unbound_discharge", unbound_discharge)
-            self.conf.save()
+            with self._refresh_lock:
+                # Unless another request refreshed it in the meantime.
+                if self.conf.get("unbound_discharge") == unbound_discharge:
+                    unbound_discharge = self.sso.refresh_unbound_discharge(
+                        unbound_discharge
+                    )
+                    self.conf.set("unbound_discharge", unbound_discharge)
+                    self.conf.save()
             return func(*args, **kwargs)
 
     def whoami(self):
@@ -260,46 +267,9 @@ class StoreClient:
             logger.info("Already downloaded {} at {}".format(name, download_path))
             return
         logger.info("Downloading {}".format(name))
-
-        # we only resume when redirected to our CDN since we use internap's
-        # special sauce.
-        resume_possible = False
-        total_read = 0
-        probe_url = requests.head(download_url)
-        if probe_url.is_redirect and "internap" in probe_url.headers["Location"]:
-            download_url = probe_url.headers["Location"]
-            resume_possible = True
-
-        # HttpAdapter cannot help here as this is a stream.
-        # LP: #1617765
-        not_downloaded = True
-        retry_count = 5
-        while not_downloaded and retry_count:
-            headers = {}
-            if resume_possible and os.path.exists(download_path):
-                total_read = os.path.getsize(download_path)
-                headers["Range"] = "bytes={}-".format(total_read)
-            request = self.cpi.get(download_url, headers=headers, stream=True)
-            request.raise_for_status()
-            redirections = [h.headers["Location"] for h in request.history]
-            if redirections:
-                logger.debug(
-                    "Redirections for {!r}: {}".format(
-                        download_url, ", ".join(redirections)
-                    )
-                )
-            try:
-                download_requests_stream(request, download_path, total_read=total_read)
-                not_downloaded = False
-            except requests.exceptions.ChunkedEncodingError as e:
-                logger.debug(
-                    "Error while downloading: {!r}. "
-                    "Retries left to download: {!r}.".format(e, retry_count)
-                )
-                retry_count -= 1
-                if not retry_count:
-                    raise e
-                sleep(1)
+        download_ranges(
+            download_url, download_path, get=self.cpi.get, algorithms=["sha512"]
+        )
 
         if self._is_downloaded(download_path, expected_sha512):
             logger.info("Successfully downloaded {} at {}".format(name, download_path))
@@ -310,11 +280,8 @@ class StoreClient:
         if not os.path.exists(path):
             return False
 
-        file_sum = hashlib.sha512()
-        with open(path, "rb") as f:
-            for file_chunk in iter(lambda: f.read(file_sum.block_size * 128), b""):
-                file_sum.update(file_chunk)
-        return expected_sha512 == file_sum.hexdigest()
+        file_sum = file_utils.calculate_digests(path, algorithms=["sha512"])
+        return expected_sha512 == file_sum["sha512"]
 
     def push_assertion(self, snap_id, assertion, endpoint, force=False):
         return self.sca.push_assertion(snap_id, assertion, endpoint, force)
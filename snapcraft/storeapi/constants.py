@@ -20,6 +20,8 @@ from __future__ import absolute_import, unicode_literals
 # become available server side -- vila 2016-04-22
 DEFAULT_SERIES = "16"
 SCAN_STATUS_POLL_DELAY = 5
+SCAN_STATUS_POLL_BACKOFF = 1.5
+SCAN_STATUS_POLL_MAX_DELAY = 30
 SCAN_STATUS_POLL_RETRIES = 5
 UBUNTU_SSO_API_ROOT_URL = "https://login.ubuntu.com/api/v2/"
 UBUNTU_STORE_API_ROOT_URL = "https://dashboard.snapcraft.io/dev/api/"
@@ -20,6 +20,8 @@ import json
 import logging
 import http.server
 import os
+import re
+import socketserver
 import urllib.parse
 import pymacaroons
 
@@ -57,6 +59,63 @@ class FakeFileHTTPRequestHandler(BaseHTTPRequestHandler):
             self.wfile.write(data.encode())
 
 
+class FakeRangeFileHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Serve the same contents for every path, supporting byte ranges."""
+
+    daemon_threads = True
+
+    def __init__(self, server_address, contents):
+        super().__init__(server_address, FakeRangeFileHTTPRequestHandler)
+        self.contents = contents
+        self.etag = '"{}"'.format(len(contents))
+        self.last_modified = "Thu, 01 Aug 2019 10:00:00 GMT"
+        self.supports_ranges = True
+        # The ranges that were requested, as (start, end) tuples.
+        self.requested_ranges = []
+        # How many of the next ranged responses to cut short.
+        self.truncated_responses = 0
+
+
+class FakeRangeFileHTTPRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        contents = self.server.contents
+        match = re.match(r"bytes=(\d+)-(\d+)$", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if (
+            match is None
+            or not self.server.supports_ranges
+            or (
+                if_range is not None
+                and (
+                    if_range.startswith("W/")
+                    or if_range not in (self.server.etag, self.server.last_modified)
+                )
+            )
+        ):
+            self.send_response(200)
+            body = contents
+            truncate = False
+        else:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), len(contents) - 1)
+            self.server.requested_ranges.append((start, end))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, end, len(contents))
+            )
+            body = contents[start : end + 1]
+            truncate = len(body) > 1 and self.server.truncated_responses > 0
+        self.send_header("Content-Length", len(body))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Last-Modified", self.server.last_modified)
+        self.end_headers()
+        if truncate:
+            self.server.truncated_responses -= 1
+            body = body[: len(body) // 2]
+        self.wfile.write(body)
+
+
 class FakePartsServer(http.server.HTTPServer):
     def __init__(self, server_address):
         super().__init__(server_address, FakePartsRequestHandler)
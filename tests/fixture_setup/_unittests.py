@@ -128,37 +128,85 @@ def _fake_elffile_extract(self, path):
         glibc = elf.NeededLibrary(name="libc.so.6")
         glibc.add_version("GLIBC_2.2.5")
         glibc.add_version("GLIBC_2.26")
-        return (arch, "/lib64/ld-linux-x86-64.so.2", "", {glibc.name: glibc}, False)
+        return (
+            arch,
+            "/lib64/ld-linux-x86-64.so.2",
+            "",
+            {glibc.name: glibc},
+            False,
+            [],
+            [],
+        )
     elif name == "fake_elf-2.23":
         glibc = elf.NeededLibrary(name="libc.so.6")
         glibc.add_version("GLIBC_2.2.5")
         glibc.add_version("GLIBC_2.23")
-        return (arch, "/lib64/ld-linux-x86-64.so.2", "", {glibc.name: glibc}, False)
+        return (
+            arch,
+            "/lib64/ld-linux-x86-64.so.2",
+            "",
+            {glibc.name: glibc},
+            False,
+            [],
+            [],
+        )
     elif name == "fake_elf-1.1":
         glibc = elf.NeededLibrary(name="libc.so.6")
         glibc.add_version("GLIBC_1.1")
         glibc.add_version("GLIBC_0.1")
-        return (arch, "/lib64/ld-linux-x86-64.so.2", "", {glibc.name: glibc}, False)
+        return (
+            arch,
+            "/lib64/ld-linux-x86-64.so.2",
+            "",
+            {glibc.name: glibc},
+            False,
+            [],
+            [],
+        )
     elif name == "fake_elf-static":
-        return arch, "", "", {}, False
+        return arch, "", "", {}, False, [], []
     elif name == "fake_elf-shared-object":
         openssl = elf.NeededLibrary(name="libssl.so.1.0.0")
         openssl.add_version("OPENSSL_1.0.0")
-        return arch, "", "libfake_elf.so.0", {openssl.name: openssl}, False
+        return (
+            arch,
+            "",
+            "libfake_elf.so.0",
+            {openssl.name: openssl},
+            False,
+            [],
+            [],
+        )
     elif name == "fake_elf-with-execstack":
         glibc = elf.NeededLibrary(name="libc.so.6")
         glibc.add_version("GLIBC_2.23")
-        return (arch, "/lib64/ld-linux-x86-64.so.2", "", {glibc.name: glibc}, True)
+        return (
+            arch,
+            "/lib64/ld-linux-x86-64.so.2",
+            "",
+            {glibc.name: glibc},
+            True,
+            [],
+            [],
+        )
     elif name == "fake_elf-with-bad-execstack":
         glibc = elf.NeededLibrary(name="libc.so.6")
         glibc.add_version("GLIBC_2.23")
-        return (arch, "/lib64/ld-linux-x86-64.so.2", "", {glibc.name: glibc}, True)
+        return (
+            arch,
+            "/lib64/ld-linux-x86-64.so.2",
+            "",
+            {glibc.name: glibc},
+            True,
+            [],
+            [],
+        )
     elif name == "libc.so.6":
-        return arch, "", "libc.so.6", {}, False
+        return arch, "", "libc.so.6", {}, False, [], []
     elif name == "libssl.so.1.0.0":
-        return arch, "", "libssl.so.1.0.0", {}, False
+        return arch, "", "libssl.so.1.0.0", {}, False, [], []
     else:
-        return arch, "", "", {}, False
+        return arch, "", "", {}, False, [], []
 
 
 class FakeElf(fixtures.Fixture):
@@ -254,6 +302,9 @@ class FakeElf(fixtures.Fixture):
                 f.write(b"\x7fELF")
                 if elf_file.path.endswith("fake_elf-bad-patchelf"):
                     f.write(b"nointerpreter")
+                else:
+                    # Keep the contents unique, the ELF cache is keyed by them.
+                    f.write(os.path.basename(elf_file.path).encode())
 
         self.root_libraries = {"foo.so.1": os.path.join(self.root_path, "foo.so.1")}
 
@@ -433,14 +484,17 @@ class FakeAptCache(fixtures.Fixture):
         for package, version in self.packages:
             self.add_package(FakeAptCachePackage(package, version))
 
-        def fetch_binary(package_candidate, destination):
-            path = os.path.join(self.path, "{}.deb".format(package_candidate.name))
-            open(path, "w").close()
-            return path
-
-        patcher = mock.patch("snapcraft.repo._deb._AptCache.fetch_binary")
-        mock_fetch_binary = patcher.start()
-        mock_fetch_binary.side_effect = fetch_binary
+        def fetch_binaries(package_candidates, destination):
+            paths = []
+            for package_candidate in package_candidates:
+                path = os.path.join(self.path, "{}.deb".format(package_candidate.name))
+                open(path, "w").close()
+                paths.append(path)
+            return paths
+
+        patcher = mock.patch("snapcraft.repo._deb._AptCache.fetch_binaries")
+        mock_fetch_binaries = patcher.start()
+        mock_fetch_binaries.side_effect = fetch_binaries
         self.addCleanup(patcher.stop)
 
         # Add all the packages in the manifest.
@@ -22,6 +22,7 @@ from unittest.mock import call, patch, Mock
 from testtools.matchers import Equals, EndsWith, DirExists, FileContains, Not
 
 from . import BaseProviderBaseTest, MacBaseProviderWithBasesBaseTest, ProviderImpl
+from snapcraft.internal import steps
 from snapcraft.internal.build_providers import errors, _base_provider
 from tests import unit
 
@@ -188,6 +189,49 @@ class BaseProviderTest(BaseProviderBaseTest):
             ["snapcraft", "clean", "part1", "part2"]
         )
 
+    def test_execute_step(self):
+        provider = ProviderImpl(project=self.project, echoer=self.echoer_mock)
+
+        provider.execute_step(steps.PULL)
+
+        provider.run_mock.assert_called_once_with(["snapcraft", "pull"])
+
+    def test_execute_step_with_parallel_parts(self):
+        provider = ProviderImpl(project=self.project, echoer=self.echoer_mock)
+
+        provider.execute_step(steps.BUILD, parallel_parts=4)
+
+        provider.run_mock.assert_called_once_with(
+            ["snapcraft", "build", "--parallel-parts", "4"]
+        )
+
+    def test_pack_project_with_parallel_parts(self):
+        provider = ProviderImpl(project=self.project, echoer=self.echoer_mock)
+
+        provider.pack_project(output="fake.snap", parallel_parts=2)
+
+        provider.run_mock.assert_called_once_with(
+            ["snapcraft", "snap", "--output", "fake.snap", "--parallel-parts", "2"]
+        )
+
+    def test_pack_project_with_compression(self):
+        provider = ProviderImpl(project=self.project, echoer=self.echoer_mock)
+
+        provider.pack_project(compression="lzo")
+
+        provider.run_mock.assert_called_once_with(
+            ["snapcraft", "snap", "--compression", "lzo"]
+        )
+
+    def test_pack_project_with_report(self):
+        provider = ProviderImpl(project=self.project, echoer=self.echoer_mock)
+
+        provider.pack_project(report="/tmp/report.json")
+
+        provider.run_mock.assert_called_once_with(
+            ["env", "SNAPCRAFT_PACK_REPORT=/tmp/report.json", "snapcraft", "snap"]
+        )
+
 
 class BaseProviderProvisionSnapcraftTest(BaseProviderBaseTest):
     def test_setup_snapcraft(self):
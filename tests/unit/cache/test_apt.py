@@ -0,0 +1,93 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from unittest import mock
+
+from testtools.matchers import DirExists, Equals, FileContains, Is, Not
+
+from snapcraft.internal import cache
+from tests import unit
+
+
+class AptStagePackageTreeCacheTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tree_cache = cache.AptStagePackageTreeCache()
+
+    def _stage_tree(self, staging_dir, name, contents):
+        tree = os.path.join(staging_dir, name)
+        os.makedirs(os.path.join(tree, "usr"))
+        with open(os.path.join(tree, "usr", "file"), "w") as f:
+            f.write(contents)
+        return tree
+
+    def test_get_nothing_cached(self):
+        tree = self.tree_cache.get(name="foo", version="1.0", arch="amd64")
+        self.assertThat(tree, Is(None))
+
+    def test_cache_and_retrieve(self):
+        with self.tree_cache.staging_dir() as staging_dir:
+            staged_tree = self._stage_tree(staging_dir, "foo", "foo")
+            cached_tree = self.tree_cache.cache(
+                tree=staged_tree, name="foo", version="1:1.0", arch="amd64"
+            )
+
+        self.assertThat(staging_dir, Not(DirExists()))
+        self.assertThat(
+            self.tree_cache.get(name="foo", version="1:1.0", arch="amd64"),
+            Equals(cached_tree),
+        )
+        self.assertThat(os.path.join(cached_tree, "usr", "file"), FileContains("foo"))
+        self.assertThat(
+            self.tree_cache.get(name="foo", version="1:1.0", arch="i386"), Is(None)
+        )
+
+    def test_cache_existing_tree_keeps_the_first_one(self):
+        with self.tree_cache.staging_dir() as staging_dir:
+            first_tree = self._stage_tree(staging_dir, "first", "first")
+            second_tree = self._stage_tree(staging_dir, "second", "second")
+            self.tree_cache.cache(
+                tree=first_tree, name="foo", version="1.0", arch="amd64"
+            )
+            cached_tree = self.tree_cache.cache(
+                tree=second_tree, name="foo", version="1.0", arch="amd64"
+            )
+            self.assertThat(second_tree, Not(DirExists()))
+
+        self.assertThat(os.path.join(cached_tree, "usr", "file"), FileContains("first"))
+
+    @mock.patch.object(cache.AptStagePackageTreeCache, "default_budget", 0)
+    def test_batch_evicts_unused_trees(self):
+        with self.tree_cache.staging_dir() as staging_dir:
+            staged_tree = self._stage_tree(staging_dir, "foo", "foo")
+            old_tree = self.tree_cache.cache(
+                tree=staged_tree, name="foo", version="1.0", arch="amd64"
+            )
+
+        tree_cache = cache.AptStagePackageTreeCache()
+        with tree_cache.batch():
+            with tree_cache.staging_dir() as staging_dir:
+                staged_tree = self._stage_tree(staging_dir, "bar", "bar")
+                new_tree = tree_cache.cache(
+                    tree=staged_tree, name="bar", version="1.0", arch="amd64"
+                )
+
+        self.assertThat(old_tree, Not(DirExists()))
+        self.assertThat(new_tree, DirExists())
+        self.assertThat(
+            tree_cache.get(name="bar", version="1.0", arch="amd64"), Equals(new_tree)
+        )
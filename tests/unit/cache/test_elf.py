@@ -0,0 +1,81 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+
+from testtools.matchers import Equals, FileExists, Is
+
+from snapcraft.internal import cache
+from tests import unit
+
+
+class ElfCacheTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        with open("binary", "wb") as f:
+            f.write(b"\x7fELF fake contents")
+        self.data = dict(arch=["ELFCLASS64", "ELFDATA2LSB", "EM_X86_64"])
+
+    def test_get_nothing_cached(self):
+        self.assertThat(cache.ElfCache().get("binary"), Is(None))
+
+    def test_set_and_get(self):
+        elf_cache = cache.ElfCache()
+        elf_cache.set("binary", self.data)
+
+        self.assertThat(elf_cache.get("binary"), Equals(self.data))
+
+    def test_get_hard_link(self):
+        elf_cache = cache.ElfCache()
+        elf_cache.set("binary", self.data)
+        os.link("binary", "hard-link")
+
+        self.assertThat(elf_cache.get("hard-link"), Equals(self.data))
+
+    def test_get_copy_falls_back_to_contents(self):
+        elf_cache = cache.ElfCache()
+        elf_cache.set("binary", self.data)
+        shutil.copyfile("binary", "copy")
+
+        self.assertThat(elf_cache.get("copy"), Equals(self.data))
+
+    def test_get_modified_file(self):
+        elf_cache = cache.ElfCache()
+        elf_cache.set("binary", self.data)
+        with open("binary", "ab") as f:
+            f.write(b"more")
+
+        self.assertThat(elf_cache.get("binary"), Is(None))
+
+    def test_save_and_load(self):
+        elf_cache = cache.ElfCache()
+        elf_cache.set("binary", self.data)
+        elf_cache.save()
+
+        self.assertThat(
+            os.path.join(elf_cache.elf_cache_root, "index.json"), FileExists()
+        )
+        self.assertThat(cache.ElfCache().get("binary"), Equals(self.data))
+
+    def test_corrupt_index_is_ignored(self):
+        elf_cache = cache.ElfCache()
+        os.makedirs(elf_cache.elf_cache_root)
+        with open(os.path.join(elf_cache.elf_cache_root, "index.json"), "w") as f:
+            f.write("{not json")
+
+        self.assertThat(elf_cache.get("binary"), Is(None))
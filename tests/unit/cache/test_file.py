@@ -16,7 +16,7 @@
 import os
 from unittest.mock import patch
 
-from testtools.matchers import EndsWith, Is
+from testtools.matchers import EndsWith, Equals, Is
 
 from snapcraft.file_utils import calculate_hash
 from snapcraft.internal import cache
@@ -75,9 +75,69 @@ class FileCacheTestCase(unit.TestCase):
             f.write("random stub data")
 
         calculated_hash = calculate_hash("hash_file", algorithm=self.algo)
-        with patch("shutil.copyfile") as mock_copyfile:
-            mock_copyfile.side_effect = OSError()
+        with patch("snapcraft.internal.cache._file.clone_file") as mock_clone_file:
+            mock_clone_file.side_effect = OSError()
             file = self.file_cache.cache(
                 filename="hash_file", algorithm=self.algo, hash=calculated_hash
             )
         self.assertThat(file, Is(None))
+
+    def test_cache_and_check_out(self):
+        with open("hash_file", "w") as f:
+            f.write("random stub data")
+
+        calculated_hash = calculate_hash("hash_file", algorithm=self.algo)
+        self.file_cache.cache(
+            filename="hash_file", algorithm=self.algo, hash=calculated_hash
+        )
+        os.remove("hash_file")
+
+        file = self.file_cache.get(
+            algorithm=self.algo, hash=calculated_hash, destination="checkout"
+        )
+        self.assertThat(file, Equals("checkout"))
+        with open("checkout") as f:
+            self.assertThat(f.read(), Equals("random stub data"))
+
+    def test_check_out_does_not_share_the_cached_file(self):
+        with open("hash_file", "w") as f:
+            f.write("random stub data")
+        calculated_hash = calculate_hash("hash_file", algorithm=self.algo)
+        cached_file = self.file_cache.cache(
+            filename="hash_file", algorithm=self.algo, hash=calculated_hash
+        )
+
+        self.file_cache.get(
+            algorithm=self.algo, hash=calculated_hash, destination="checkout"
+        )
+        os.chmod("checkout", 0o700)
+        with open("checkout", "a") as f:
+            f.write("changed in place")
+
+        self.assertFalse(os.path.samefile("checkout", cached_file))
+        with open(cached_file) as f:
+            self.assertThat(f.read(), Equals("random stub data"))
+
+    def test_check_out_nothing_cached(self):
+        file = self.file_cache.get(algorithm=self.algo, hash="1", destination="out")
+        self.assertThat(file, Is(None))
+        self.assertFalse(os.path.exists("out"))
+
+
+class FileCacheEvictionTestCase(unit.TestCase):
+    def test_cache_evicts_least_recently_used(self):
+        file_cache = cache.FileCache(budget=30)
+        cached_files = []
+        for index in range(3):
+            with open("hash_file", "w") as f:
+                f.write("{}".format(index) * 15)
+            calculated_hash = calculate_hash("hash_file", algorithm="sha256")
+            cached_files.append(
+                file_cache.cache(
+                    filename="hash_file", algorithm="sha256", hash=calculated_hash
+                )
+            )
+
+        self.assertFalse(os.path.exists(cached_files[0]))
+        self.assertTrue(os.path.exists(cached_files[1]))
+        self.assertTrue(os.path.exists(cached_files[2]))
@@ -0,0 +1,178 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from unittest import mock
+
+from testtools.matchers import DirExists, Equals, FileExists, Is, Not
+
+from snapcraft.internal import cache
+from snapcraft.internal.cache._index import CacheIndex
+from tests import unit
+
+
+class CacheIndexTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = os.path.join(self.path, "cache")
+        self.index = CacheIndex(self.root, depth=2, budget=10)
+
+    def _add_file(self, key, size):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return path
+
+    def test_record_and_lookup(self):
+        path = self._add_file("a/1", 4)
+        self.index.record("a/1")
+
+        self.assertThat(self.index.lookup("a/1"), Equals(path))
+        self.assertThat(self.index.lookup("a/2"), Is(None))
+        self.assertThat(self.index.get_entry("a/1")["size"], Equals(4))
+
+    def test_index_is_shared(self):
+        self._add_file("a/1", 4)
+        self.index.record("a/1")
+
+        other_index = CacheIndex(self.root, depth=2)
+
+        self.assertThat(other_index.keys(), Equals(["a/1"]))
+        self.assertThat(other_index.budget, Equals(10))
+
+    def test_lookup_does_not_list_the_namespace(self):
+        self._add_file("a/1", 4)
+        self.index.record("a/1")
+
+        with mock.patch("os.listdir") as listdir_mock:
+            CacheIndex(self.root, depth=2).lookup("a/1")
+
+        listdir_mock.assert_not_called()
+
+    def test_lookup_missing_entry_is_a_miss(self):
+        path = self._add_file("a/1", 4)
+        self.index.record("a/1")
+        os.remove(path)
+
+        self.assertThat(self.index.lookup("a/1"), Is(None))
+        self.assertThat(self.index.get_entry("a/1"), Is(None))
+        self.assertThat(CacheIndex(self.root, depth=2).keys(), Equals([]))
+
+    def test_keys_with_prefix(self):
+        for key in ("a/1", "a/2", "ab/1"):
+            self._add_file(key, 1)
+            self.index.record(key)
+
+        self.assertThat(sorted(self.index.keys("a")), Equals(["a/1", "a/2"]))
+
+    def test_existing_entries_are_indexed(self):
+        self._add_file("a/1", 4)
+        self._add_file("b/2", 2)
+        self._add_file("b/.partial", 2)
+
+        self.assertThat(sorted(self.index.keys()), Equals(["a/1", "b/2"]))
+
+    def test_existing_entries_not_matching_name_pattern_are_not_indexed(self):
+        self._add_file("a/1", 4)
+        self._add_file("a/foo", 4)
+        index = CacheIndex(self.root, depth=2, name_pattern="[0-9]+")
+
+        self.assertThat(index.keys(), Equals(["a/1"]))
+
+    def test_evict_least_recently_used(self):
+        with mock.patch("time.time", return_value=1000):
+            for key in ("a/1", "a/2", "a/3"):
+                self._add_file(key, 4)
+                self.index.record(key)
+        with mock.patch("time.time", return_value=100000):
+            self.index.lookup("a/1")
+
+        evicted = self.index.evict()
+
+        self.assertThat(evicted, Equals(["a/2"]))
+        self.assertThat(os.path.join(self.root, "a", "2"), Not(FileExists()))
+        self.assertThat(sorted(self.index.keys()), Equals(["a/1", "a/3"]))
+        self.assertThat(
+            sorted(CacheIndex(self.root, depth=2).keys()), Equals(["a/1", "a/3"])
+        )
+
+    def test_evict_keeps(self):
+        with mock.patch("time.time", return_value=1000):
+            for key in ("a/1", "a/2", "a/3"):
+                self._add_file(key, 4)
+                self.index.record(key)
+
+        evicted = self.index.evict(budget=0, keep=["a/1"])
+
+        self.assertThat(evicted, Equals(["a/2", "a/3"]))
+        self.assertThat(self.index.keys(), Equals(["a/1"]))
+
+    def test_evict_directories(self):
+        self._add_file("a/1/file", 20)
+        self.index.record("a/1")
+
+        self.assertThat(self.index.get_entry("a/1")["size"], Equals(20))
+        self.assertThat(self.index.evict(), Equals(["a/1"]))
+        self.assertThat(os.path.join(self.root, "a", "1"), Not(DirExists()))
+
+    def test_batch_writes_once(self):
+        for key in ("a/1", "a/2"):
+            self._add_file(key, 1)
+
+        with mock.patch.object(
+            self.index, "_write", wraps=self.index._write
+        ) as write_mock:
+            with self.index.batch():
+                self.index.record("a/1")
+                self.index.record("a/2")
+                self.assertThat(write_mock.call_count, Equals(0))
+
+        self.assertThat(write_mock.call_count, Equals(1))
+        self.assertThat(sorted(self.index.keys()), Equals(["a/1", "a/2"]))
+
+    def test_remove(self):
+        path = self._add_file("a/1", 1)
+        self.index.record("a/1")
+
+        self.index.remove("a/1")
+
+        self.assertThat(path, Not(FileExists()))
+        self.assertThat(self.index.lookup("a/1"), Is(None))
+
+    def test_stats(self):
+        with mock.patch("time.time", return_value=1000):
+            for key in ("a/1", "a/2"):
+                self._add_file(key, 3)
+                self.index.record(key)
+
+        self.assertThat(
+            self.index.stats(),
+            Equals(dict(entries=2, size=6, budget=10, last_access=1000)),
+        )
+
+    def test_get_indexes(self):
+        snapcraft_cache = cache.SnapcraftCache()
+        cache.FileCache()._index.keys()
+        cache.SnapCache(project_name="foo")._index.keys()
+
+        self.assertThat(
+            [
+                os.path.relpath(i.root, snapcraft_cache.cache_root)
+                for i in snapcraft_cache.get_indexes()
+            ],
+            Equals(["files", os.path.join("projects", "foo", "snap_hashes")]),
+        )
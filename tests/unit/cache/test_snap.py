@@ -17,13 +17,14 @@
 import glob
 import os
 from textwrap import dedent
+from unittest import mock
 
 from testtools.matchers import Equals
 
 import snapcraft
 import tests
 from snapcraft import file_utils
-from snapcraft.internal import cache
+from snapcraft.internal import cache, deltas
 from tests.unit.commands import CommandBaseTestCase
 
 
@@ -214,7 +215,7 @@ class SnapCachePruneTestCase(SnapCacheBaseTestCase):
         self.assertThat(result.exit_code, Equals(0))
         snap_file = glob.glob("*0.1_*.snap")[0]
 
-        snap_cache = cache.SnapCache(project_name="my-snap-name")
+        snap_cache = cache.SnapCache(project_name="my-snap-name", budget=0)
         snap_file_path = snap_cache.cache(snap_filename=snap_file)
         _, snap_file_hash = os.path.split(snap_file_path)
 
@@ -260,3 +261,111 @@ class SnapCachePruneTestCase(SnapCacheBaseTestCase):
         self.assertNotIn(
             os.path.join(snap_cache.snap_cache_root, snap_file_2_hash), pruned_files
         )
+
+
+class SnapCacheEvictionTestCase(SnapCacheBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.snap_with_icon_path = os.path.join(
+            os.path.dirname(tests.__file__), "data", "test-snap-with-icon.snap"
+        )
+
+    def test_prune_keeps_revisions_within_budget(self):
+        snap_cache = cache.SnapCache(project_name="my-snap-name")
+        first_snap = snap_cache.cache(snap_filename=self.snap_path)
+        second_snap = snap_cache.cache(snap_filename=self.snap_with_icon_path)
+
+        pruned_files = snap_cache.prune(
+            deb_arch="amd64", keep_hash=os.path.basename(second_snap)
+        )
+
+        self.assertThat(pruned_files, Equals([]))
+        self.assertTrue(os.path.isfile(first_snap))
+        self.assertThat(snap_cache.get(deb_arch="amd64"), Equals(second_snap))
+
+    def test_prune_evicts_least_recently_used_over_budget(self):
+        snap_cache = cache.SnapCache(
+            project_name="my-snap-name",
+            budget=os.path.getsize(self.snap_with_icon_path),
+        )
+        first_snap = snap_cache.cache(snap_filename=self.snap_path)
+        second_snap = snap_cache.cache(snap_filename=self.snap_with_icon_path)
+
+        pruned_files = snap_cache.prune(
+            deb_arch="amd64", keep_hash=os.path.basename(second_snap)
+        )
+
+        self.assertThat(pruned_files, Equals([first_snap]))
+        self.assertFalse(os.path.exists(first_snap))
+        self.assertThat(snap_cache.get(deb_arch="amd64"), Equals(second_snap))
+
+    def test_prune_removes_files_which_are_not_cached_revisions(self):
+        snap_cache = cache.SnapCache(project_name="my-snap-name")
+        cached_snap = snap_cache.cache(snap_filename=self.snap_path)
+        stray_file = os.path.join(os.path.dirname(cached_snap), "stray.snap")
+        open(stray_file, "w").close()
+
+        pruned_files = snap_cache.prune(
+            deb_arch="amd64", keep_hash=os.path.basename(cached_snap)
+        )
+
+        self.assertThat(pruned_files, Equals([stray_file]))
+        self.assertTrue(os.path.isfile(cached_snap))
+
+
+class SnapCacheManifestTestCase(SnapCacheBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.snap_cache = cache.SnapCache(project_name="my-snap-name")
+        self.snap_with_icon_path = os.path.join(
+            os.path.dirname(tests.__file__), "data", "test-snap-with-icon.snap"
+        )
+
+    def test_cache_does_not_compute_manifest(self):
+        with mock.patch(
+            "snapcraft.internal.deltas.get_snap_manifest"
+        ) as get_snap_manifest_mock:
+            self.snap_cache.cache(snap_filename=self.snap_path)
+
+        get_snap_manifest_mock.assert_not_called()
+
+    def test_get_manifest_is_computed_once(self):
+        with mock.patch(
+            "snapcraft.internal.deltas.get_snap_manifest",
+            wraps=deltas.get_snap_manifest,
+        ) as get_snap_manifest_mock:
+            first = self.snap_cache.get_manifest(self.snap_path)
+            second = self.snap_cache.get_manifest(self.snap_path)
+
+        self.assertThat(first, Equals(second))
+        get_snap_manifest_mock.assert_called_once_with(self.snap_path)
+
+    def test_get_delta_source_with_most_overlap(self):
+        icon_snap = self.snap_cache.cache(snap_filename=self.snap_with_icon_path)
+        self.snap_cache.cache(snap_filename=self.snap_path)
+
+        source_snap = self.snap_cache.get_delta_source(
+            deb_arch="amd64",
+            target_manifest=deltas.get_snap_manifest(self.snap_with_icon_path),
+        )
+
+        self.assertThat(source_snap, Equals(icon_snap))
+
+    def test_get_delta_source_skips_invalid_snaps(self):
+        snap_cache_dir = os.path.join(self.snap_cache.snap_cache_root, "amd64")
+        os.makedirs(snap_cache_dir)
+        with open(os.path.join(snap_cache_dir, "0" * 96), "w") as f:
+            f.write("not a snap")
+
+        source_snap = self.snap_cache.get_delta_source(
+            deb_arch="amd64", target_manifest=deltas.get_snap_manifest(self.snap_path)
+        )
+
+        self.assertThat(source_snap, Equals(None))
+
+    def test_get_delta_source_nothing_cached(self):
+        source_snap = self.snap_cache.get_delta_source(
+            deb_arch="amd64", target_manifest={}
+        )
+
+        self.assertThat(source_snap, Equals(None))
@@ -80,7 +80,9 @@ class BuildProviderDebugCommandTestCase(LifecycleCommandsBaseTestCase):
         shell_mock = mock.Mock()
 
         class Provider(ProviderImpl):
-            def execute_step(self, step: steps.Step) -> None:
+            def execute_step(
+                self, step: steps.Step, *, parallel_parts: Optional[int] = None
+            ) -> None:
                 raise ProviderExecError(
                     provider_name="fake", command=["snapcraft", "pull"], exit_code=1
                 )
@@ -128,14 +130,20 @@ class BuildProviderShellCommandTestCase(LifecycleCommandsBaseTestCase):
 
         shell_mock = mock.Mock()
         pack_project_mock = mock.Mock()
+        pull_file_mock = mock.Mock()
         execute_step_mock = mock.Mock()
 
         class Provider(ProviderImpl):
-            def pack_project(self, *, output: Optional[str] = None) -> None:
-                pack_project_mock(output)
+            def pack_project(self, *, output: Optional[str] = None, **kwargs) -> None:
+                pack_project_mock(output, **kwargs)
 
-            def execute_step(self, step: steps.Step) -> None:
-                execute_step_mock(step)
+            def execute_step(
+                self, step: steps.Step, *, parallel_parts: Optional[int] = None
+            ) -> None:
+                execute_step_mock(step, parallel_parts=parallel_parts)
+
+            def pull_file(self, name: str, destination: str, delete: bool = False):
+                pull_file_mock(name, destination, delete=delete)
 
             def shell(self):
                 shell_mock()
@@ -148,6 +156,7 @@ class BuildProviderShellCommandTestCase(LifecycleCommandsBaseTestCase):
 
         self.shell_mock = shell_mock
         self.pack_project_mock = pack_project_mock
+        self.pull_file_mock = pull_file_mock
         self.execute_step_mock = execute_step_mock
 
         self.make_snapcraft_yaml("pull", base=self.base)
@@ -157,14 +166,16 @@ class BuildProviderShellCommandTestCase(LifecycleCommandsBaseTestCase):
 
         self.assertThat(result.exit_code, Equals(0))
         self.pack_project_mock.assert_not_called()
-        self.execute_step_mock.assert_called_once_with(steps.PULL)
+        self.execute_step_mock.assert_called_once_with(steps.PULL, parallel_parts=None)
         self.shell_mock.assert_called_once_with()
 
     def test_snap_with_shell_after(self):
         result = self.run_command(["snap", "--output", "fake.snap", "--shell-after"])
 
         self.assertThat(result.exit_code, Equals(0))
-        self.pack_project_mock.assert_called_once_with("fake.snap")
+        self.pack_project_mock.assert_called_once_with(
+            "fake.snap", compression="xz", parallel_parts=None, report=None
+        )
         self.execute_step_mock.assert_not_called()
         self.shell_mock.assert_called_once_with()
 
@@ -173,7 +184,7 @@ class BuildProviderShellCommandTestCase(LifecycleCommandsBaseTestCase):
 
         self.assertThat(result.exit_code, Equals(0))
         self.pack_project_mock.assert_not_called()
-        self.execute_step_mock.assert_called_once_with(steps.PULL)
+        self.execute_step_mock.assert_called_once_with(steps.PULL, parallel_parts=None)
         self.shell_mock.assert_not_called()
 
     def test_error_with_shell_after_error_and_debug(self):
@@ -184,7 +195,7 @@ class BuildProviderShellCommandTestCase(LifecycleCommandsBaseTestCase):
         )
 
         self.pack_project_mock.assert_not_called()
-        self.execute_step_mock.assert_called_once_with(steps.PULL)
+        self.execute_step_mock.assert_called_once_with(steps.PULL, parallel_parts=None)
         self.shell_mock.assert_called_once_with()
 
     def test_pull_step_with_shell(self):
@@ -200,7 +211,7 @@ class BuildProviderShellCommandTestCase(LifecycleCommandsBaseTestCase):
 
         self.assertThat(result.exit_code, Equals(0))
         self.pack_project_mock.assert_not_called()
-        self.execute_step_mock.assert_called_once_with(steps.BUILD)
+        self.execute_step_mock.assert_called_once_with(steps.BUILD, parallel_parts=None)
         self.shell_mock.assert_called_once_with()
 
     def test_snap_with_shell(self):
@@ -208,17 +219,59 @@ class BuildProviderShellCommandTestCase(LifecycleCommandsBaseTestCase):
 
         self.assertThat(result.exit_code, Equals(0))
         self.pack_project_mock.assert_not_called()
-        self.execute_step_mock.assert_called_once_with(steps.PRIME)
+        self.execute_step_mock.assert_called_once_with(steps.PRIME, parallel_parts=None)
         self.shell_mock.assert_called_once_with()
 
     def test_snap_without_shell(self):
         result = self.run_command(["snap"])
 
         self.assertThat(result.exit_code, Equals(0))
-        self.pack_project_mock.assert_called_once_with(None)
+        self.pack_project_mock.assert_called_once_with(
+            None, compression="xz", parallel_parts=None, report=None
+        )
         self.execute_step_mock.assert_not_called()
         self.shell_mock.assert_not_called()
 
+    def test_step_with_parallel_parts(self):
+        result = self.run_command(["build", "--parallel-parts", "4"])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.execute_step_mock.assert_called_once_with(steps.BUILD, parallel_parts=4)
+
+    def test_snap_with_parallel_parts(self):
+        result = self.run_command(["snap", "--parallel-parts", "2"])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.pack_project_mock.assert_called_once_with(
+            None, compression="xz", parallel_parts=2, report=None
+        )
+
+    def test_snap_with_compression(self):
+        result = self.run_command(["snap", "--compression", "lzo"])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.pack_project_mock.assert_called_once_with(
+            None, compression="lzo", parallel_parts=None, report=None
+        )
+
+    def test_snap_with_pack_report(self):
+        self.useFixture(
+            fixtures.EnvironmentVariable("SNAPCRAFT_PACK_REPORT", "report.json")
+        )
+
+        result = self.run_command(["snap"])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.pack_project_mock.assert_called_once_with(
+            None,
+            compression="xz",
+            parallel_parts=None,
+            report="/tmp/snapcraft_pack_report.json",
+        )
+        self.pull_file_mock.assert_called_once_with(
+            "/tmp/snapcraft_pack_report.json", "report.json", delete=True
+        )
+
 
 class BuildProviderCleanCommandTestCase(LifecycleCommandsBaseTestCase):
     scenarios = (("core18", dict(base="core18")), ("no base", dict(base=None)))
@@ -233,7 +286,9 @@ class BuildProviderCleanCommandTestCase(LifecycleCommandsBaseTestCase):
         clean_mock = mock.Mock()
 
         class Provider(ProviderImpl):
-            def execute_step(self, step: steps.Step) -> None:
+            def execute_step(
+                self, step: steps.Step, *, parallel_parts: Optional[int] = None
+            ) -> None:
                 raise ProviderExecError(
                     provider_name="fake", command=["snapcraft", "pull"], exit_code=1
                 )
@@ -0,0 +1,91 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import textwrap
+from unittest import mock
+
+from testtools.matchers import Contains, Equals
+
+from snapcraft.file_utils import calculate_hash
+from snapcraft.internal import cache
+from . import CommandBaseTestCase
+
+
+class CacheCommandTestCase(CommandBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.file_cache = cache.FileCache(budget=2 ** 20)
+        self.cached_files = []
+        for contents in ("first", "second"):
+            with open("file", "w") as f:
+                f.write(contents * 100)
+            self.cached_files.append(
+                self.file_cache.cache(
+                    filename="file",
+                    algorithm="sha256",
+                    hash=calculate_hash("file", algorithm="sha256"),
+                )
+            )
+
+    def test_stats(self):
+        with mock.patch("time.localtime", return_value=(2019, 5, 1, 12, 0, 0, 0, 0, 0)):
+            result = self.run_command(["cache", "stats"])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.assertThat(
+            result.output,
+            Equals(
+                textwrap.dedent(
+                    """\
+                    Cache      Entries  Size    Budget    Last used
+                    -------  ---------  ------  --------  ----------------
+                    files            2  1.1K    1.0M      2019-05-01 12:00
+                    """
+                )
+            ),
+        )
+
+    def test_stats_nothing_cached(self):
+        shutil.rmtree(self.file_cache.file_cache)
+
+        result = self.run_command(["cache", "stats"])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.assertThat(result.output, Equals("Nothing is cached.\n"))
+
+    def test_prune_within_budget(self):
+        result = self.run_command(["cache", "prune"])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.assertThat(result.output, Equals(""))
+        self.assertTrue(all(os.path.exists(f) for f in self.cached_files))
+
+    def test_prune_with_max_size(self):
+        result = self.run_command(["cache", "prune", "--max-size", "1000"])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.assertThat(result.output, Equals("Pruned 1 entries (500B) from files.\n"))
+        self.assertFalse(os.path.exists(self.cached_files[0]))
+        self.assertTrue(os.path.exists(self.cached_files[1]))
+
+    def test_prune_with_invalid_max_size(self):
+        result = self.run_command(["cache", "prune", "--max-size", "big"])
+
+        self.assertThat(result.exit_code, Equals(2))
+        self.assertThat(result.output, Contains("'BIG' is not a size"))
@@ -33,6 +33,10 @@ class PackCommandBaseTestCase(CommandBaseTestCase):
         self.popen_spy = patcher.start()
         self.addCleanup(patcher.stop)
 
+        patcher = mock.patch("multiprocessing.cpu_count", return_value=2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
 
 class PackCommandTestCase(PackCommandBaseTestCase):
 
@@ -76,6 +80,8 @@ class PackCommandTestCase(PackCommandBaseTestCase):
                 "-no-xattrs",
                 "-no-fragments",
                 "-all-root",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -110,6 +116,8 @@ class PackCommandTestCase(PackCommandBaseTestCase):
                 "-no-xattrs",
                 "-no-fragments",
                 "-all-root",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -145,6 +153,8 @@ class PackCommandTestCase(PackCommandBaseTestCase):
                 "xz",
                 "-no-xattrs",
                 "-no-fragments",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
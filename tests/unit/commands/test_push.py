@@ -14,12 +14,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import os
+import shutil
 from unittest import mock
 
-from testtools.matchers import Contains, Equals, FileExists, Not
+import requests
+from testtools.matchers import Contains, Equals, FileExists, Is, Not
 from xdg import BaseDirectory
 
 from snapcraft import file_utils, storeapi, internal
+from snapcraft.internal import cache
 from snapcraft.storeapi.errors import (
     StoreDeltaApplicationError,
     StorePushError,
@@ -390,6 +393,15 @@ class PushCommandDeltasTestCase(PushCommandBaseTestCase):
 
         self.assertThat(cached_snap, FileExists())
 
+    def test_push_without_cached_revision_does_not_read_manifest(self):
+        with mock.patch("snapcraft.storeapi._status_tracker.StatusTracker"), mock.patch(
+            "snapcraft.internal.deltas.get_snap_manifest"
+        ) as get_snap_manifest_mock:
+            result = self.run_command(["push", self.snap_file])
+
+        self.assertThat(result.exit_code, Equals(0))
+        get_snap_manifest_mock.assert_not_called()
+
     def test_push_revision_uses_available_delta(self):
         # Push
         with mock.patch("snapcraft.storeapi._status_tracker.StatusTracker"):
@@ -542,6 +554,57 @@ class PushCommandDeltasTestCase(PushCommandBaseTestCase):
         )
 
 
+class PushCommandDeltaSourceTestCase(PushCommandBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        mock_tracker = mock.Mock(storeapi._status_tracker.StatusTracker)
+        mock_tracker.track.return_value = {
+            "code": "ready_to_release",
+            "processed": True,
+            "revision": 9,
+        }
+        patcher = mock.patch.object(storeapi.StoreClient, "upload")
+        self.mock_upload = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_upload.return_value = mock_tracker
+
+        patcher = mock.patch("snapcraft._store._push_delta")
+        self.mock_push_delta = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_push_delta.return_value = mock_tracker.track.return_value
+
+        self.cached_snap = cache.SnapCache(project_name="basic").cache(
+            snap_filename=self.snap_file
+        )
+
+    def test_push_uses_cached_revision_with_most_overlap(self):
+        result = self.run_command(["push", self.snap_file])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.mock_push_delta.assert_called_once_with(
+            "basic", self.snap_file, self.cached_snap
+        )
+
+    def test_push_full_snap_if_delta_is_estimated_too_big(self):
+        with mock.patch(
+            "snapcraft.internal.deltas.estimate_delta_size",
+            return_value=os.path.getsize(self.snap_file),
+        ):
+            result = self.run_command(["push", self.snap_file])
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.mock_push_delta.assert_not_called()
+        self.mock_upload.assert_called_once_with("basic", self.snap_file)
+        self.assertThat(
+            self.fake_logger.output,
+            Contains(
+                "A delta for 'test-snap.snap' is estimated to be over 90% of its "
+                "size, pushing full snap..."
+            ),
+        )
+
+
 class PushCommandDeltasWithPruneTestCase(PushCommandBaseTestCase):
 
     scenarios = [
@@ -619,3 +682,178 @@ class PushCommandDeltasWithPruneTestCase(PushCommandBaseTestCase):
             snap = snap.format(deb_arch)
             self.assertThat(os.path.join(snap_cache, snap), Not(FileExists()))
         self.assertThat(len(os.listdir(snap_cache)), Equals(1))
+
+
+class PushManyCommandTestCase(PushCommandBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.snap_files = []
+        for arch in ("amd64", "arm64"):
+            snap_file = os.path.abspath("basic_0.1_{}.snap".format(arch))
+            shutil.copyfile(self.snap_file, snap_file)
+            self.snap_files.append(snap_file)
+
+        self.trackers = [mock.Mock(storeapi._status_tracker.StatusTracker)]
+        self.trackers.append(mock.Mock(storeapi._status_tracker.StatusTracker))
+        patcher = mock.patch.object(storeapi.StoreClient, "upload")
+        self.mock_upload = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_upload.side_effect = self.trackers
+
+        patcher = mock.patch("snapcraft.storeapi.track_all")
+        self.mock_track_all = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_track_all.return_value = [
+            {"code": "ready_to_release", "processed": True, "revision": 9},
+            {"code": "ready_to_release", "processed": True, "revision": 10},
+        ]
+
+    def test_push_many_snaps(self):
+        result = self.run_command(["push"] + self.snap_files)
+
+        self.assertThat(result.exit_code, Equals(0))
+        self.assertThat(
+            result.output,
+            Contains(
+                "Preparing to push 'basic_0.1_amd64.snap' and "
+                "'basic_0.1_arm64.snap'."
+            ),
+        )
+        self.mock_precheck.assert_called_once_with("basic")
+        self.mock_upload.assert_has_calls(
+            [
+                mock.call("basic", self.snap_files[0]),
+                mock.call("basic", self.snap_files[1]),
+            ]
+        )
+        self.mock_track_all.assert_called_once_with(
+            self.trackers, return_exceptions=True
+        )
+        self.assertThat(
+            result.output,
+            Contains("basic_0.1_amd64.snap  basic   amd64   full               9"),
+        )
+        self.assertThat(
+            result.output,
+            Contains("basic_0.1_arm64.snap  basic   amd64   full              10"),
+        )
+
+    def test_push_many_snaps_and_release(self):
+        patcher = mock.patch.object(storeapi.StoreClient, "release")
+        mock_release = patcher.start()
+        self.addCleanup(patcher.stop)
+        mock_release.return_value = {"opened_channels": ["edge"]}
+
+        result = self.run_command(["push", "--release", "edge"] + self.snap_files)
+
+        self.assertThat(result.exit_code, Equals(0))
+        mock_release.assert_has_calls(
+            [mock.call("basic", 9, ["edge"]), mock.call("basic", 10, ["edge"])]
+        )
+        self.assertThat(result.output, Contains("ready_to_release  edge"))
+
+    def test_push_many_snaps_with_delta_processing_failure_falls_back(self):
+        cache.SnapCache(project_name="basic").cache(snap_filename=self.snap_file)
+
+        def generate_delta(snap_filename, source_snap):
+            delta_filename = snap_filename + ".delta"
+            open(delta_filename, "w").close()
+            return (
+                delta_filename,
+                {
+                    "source_hash": "source",
+                    "target_hash": "target",
+                    "delta_hash": "delta",
+                },
+            )
+
+        patcher = mock.patch(
+            "snapcraft._store._generate_delta", side_effect=generate_delta
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.trackers.append(mock.Mock(storeapi._status_tracker.StatusTracker))
+        self.trackers[0].raise_for_code.side_effect = storeapi.errors.StoreReviewError(
+            {"code": "processing_upload_delta_error"}
+        )
+        self.mock_track_all.side_effect = [
+            self.mock_track_all.return_value,
+            [{"code": "ready_to_release", "processed": True, "revision": 11}],
+        ]
+
+        result = self.run_command(["push"] + self.snap_files)
+
+        self.assertThat(result.exit_code, Equals(0))
+        delta_call = mock.call(
+            "basic",
+            mock.ANY,
+            delta_format="xdelta3",
+            source_hash="source",
+            target_hash="target",
+            delta_hash="delta",
+        )
+        self.assertThat(
+            self.mock_upload.call_args_list,
+            Equals([delta_call, delta_call, mock.call("basic", self.snap_files[0])]),
+        )
+        self.mock_track_all.assert_has_calls(
+            [
+                mock.call(self.trackers[:2], return_exceptions=True),
+                mock.call(self.trackers[2:], return_exceptions=True),
+            ]
+        )
+        self.assertThat(
+            result.output,
+            Contains("basic_0.1_amd64.snap  basic   amd64   full              11"),
+        )
+        self.assertThat(
+            result.output,
+            Contains("basic_0.1_arm64.snap  basic   amd64   delta             10"),
+        )
+        self.assertThat(self.snap_files[0] + ".delta", Not(FileExists()))
+
+    def test_push_many_snaps_with_review_failure(self):
+        self.trackers[1].raise_for_code.side_effect = storeapi.errors.StoreReviewError(
+            {"code": "need_manual_review"}
+        )
+
+        self.assertRaises(
+            storeapi.errors.StoreReviewError,
+            self.run_command,
+            ["push"] + self.snap_files,
+        )
+        self.assertThat(self.mock_upload.call_count, Equals(2))
+
+    def test_push_many_snaps_with_tracking_failure(self):
+        error = requests.ConnectionError()
+        self.mock_track_all.return_value = [
+            {"code": "ready_to_release", "processed": True, "revision": 9},
+            error,
+        ]
+        patcher = mock.patch(
+            "snapcraft._store._tabulated_push_jobs", return_value="summary"
+        )
+        mock_tabulated_push_jobs = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        raised = self.assertRaises(
+            requests.ConnectionError, self.run_command, ["push"] + self.snap_files
+        )
+
+        self.assertThat(raised, Is(error))
+        snap_cache = os.path.join(
+            BaseDirectory.xdg_cache_home,
+            "snapcraft",
+            "projects",
+            "basic",
+            "snap_hashes",
+            "amd64",
+        )
+        self.assertThat(
+            os.listdir(snap_cache),
+            Equals([file_utils.calculate_sha3_384(self.snap_files[0])]),
+        )
+        jobs = mock_tabulated_push_jobs.call_args[0][0]
+        self.assertThat([job.error for job in jobs], Equals([None, error]))
@@ -68,6 +68,10 @@ class SnapCommandBaseTestCase(CommandBaseTestCase):
         self.popen_spy = patcher.start()
         self.addCleanup(patcher.stop)
 
+        patcher = mock.patch("multiprocessing.cpu_count", return_value=2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def make_snapcraft_yaml(self, n=1, snap_type="app", snapcraft_yaml=None):
         if not snapcraft_yaml:
             base_entry = "base: core18" if snap_type == "app" else ""
@@ -98,6 +102,8 @@ class SnapCommandTestCase(SnapCommandBaseTestCase):
                 "-no-xattrs",
                 "-no-fragments",
                 "-all-root",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -134,6 +140,8 @@ class SnapCommandTestCase(SnapCommandBaseTestCase):
                 "-no-xattrs",
                 "-no-fragments",
                 "-all-root",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -157,6 +165,8 @@ class SnapCommandTestCase(SnapCommandBaseTestCase):
                 "xz",
                 "-no-xattrs",
                 "-no-fragments",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -182,6 +192,8 @@ class SnapCommandTestCase(SnapCommandBaseTestCase):
                 "xz",
                 "-no-xattrs",
                 "-no-fragments",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -226,6 +238,8 @@ class SnapCommandTestCase(SnapCommandBaseTestCase):
                 "-no-xattrs",
                 "-no-fragments",
                 "-all-root",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -263,6 +277,8 @@ architectures: [amd64, armhf]
                 "-no-xattrs",
                 "-no-fragments",
                 "-all-root",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -299,6 +315,8 @@ version: 99
                 "-no-xattrs",
                 "-no-fragments",
                 "-all-root",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -337,6 +355,8 @@ type: os
                 "xz",
                 "-no-xattrs",
                 "-no-fragments",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -375,6 +395,8 @@ type: os
                 "-no-xattrs",
                 "-no-fragments",
                 "-all-root",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -466,6 +488,8 @@ class SnapCommandAsDefaultTestCase(SnapCommandBaseTestCase):
                 "-no-xattrs",
                 "-no-fragments",
                 "-all-root",
+                "-processors",
+                "2",
             ],
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
@@ -16,6 +16,7 @@
 
 import logging
 import os
+import re
 import subprocess
 import textwrap
 from unittest import mock
@@ -27,6 +28,9 @@ from testtools.matchers import (
     Equals,
     FileContains,
     FileExists,
+    Is,
+    LessThan,
+    MatchesRegex,
     Not,
 )
 
@@ -113,6 +117,88 @@ class ExecutionTestCase(LifecycleTestBase):
         self.assertThat(self.fake_logger.output, Contains("Pulling part2"))
         self.assertThat(self.fake_logger.output, Not(Contains("Pulling part1")))
 
+    @mock.patch("snapcraft.repo.snaps.install_snaps")
+    def test_elf_cache_is_shared_and_saved_once(self, mock_install_build_snaps):
+        project_config = self.make_snapcraft_project(
+            textwrap.dedent(
+                """\
+                parts:
+                  part1:
+                    plugin: nil
+                  part2:
+                    plugin: nil
+                """
+            )
+        )
+        elf_cache = project_config.parts.elf_cache
+
+        with mock.patch.object(elf_cache, "save") as mock_save:
+            lifecycle.execute(steps.PRIME, project_config)
+
+        for part in project_config.parts.all_parts:
+            self.assertThat(part._elf_cache, Is(elf_cache))
+        mock_save.assert_called_once_with()
+
+    @mock.patch("snapcraft.repo.snaps.install_snaps")
+    def test_parallel_parts_stages_dependencies_before_pulling(
+        self, mock_install_build_snaps
+    ):
+        project_config = self.make_snapcraft_project(
+            textwrap.dedent(
+                """\
+                parts:
+                  part1:
+                    plugin: nil
+                  part2:
+                    plugin: nil
+                  part3:
+                    plugin: nil
+                    after:
+                      - part1
+                      - part2
+                """
+            )
+        )
+
+        lifecycle.execute(steps.PULL, project_config, parallel_parts=2)
+
+        self.assertThat(
+            self.fake_logger.output,
+            MatchesRegex(
+                ".*'part3' has dependencies that need to be staged: part. part.*",
+                flags=re.DOTALL,
+            ),
+        )
+        for part in project_config.parts.all_parts:
+            self.assertThat(os.path.join(part.plugin.statedir, "pull"), FileExists())
+        self.assertThat(
+            self.fake_logger.output.index("Staging part1"),
+            LessThan(self.fake_logger.output.index("Pulling part3")),
+        )
+
+    @mock.patch("snapcraft.repo.snaps.install_snaps")
+    def test_parallel_parts_failure_is_raised(self, mock_install_build_snaps):
+        project_config = self.make_snapcraft_project(
+            textwrap.dedent(
+                """\
+                parts:
+                  part1:
+                    plugin: nil
+                    override-build: exit 1
+                  part2:
+                    plugin: nil
+                """
+            )
+        )
+
+        self.assertRaises(
+            errors.ScriptletRunError,
+            lifecycle.execute,
+            steps.BUILD,
+            project_config,
+            parallel_parts=2,
+        )
+
     def test_os_type_returned_by_lifecycle(self):
         project_config = self.make_snapcraft_project(
             textwrap.dedent(
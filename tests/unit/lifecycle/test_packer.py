@@ -0,0 +1,200 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import json
+import logging
+import os
+import sys
+from textwrap import dedent
+from unittest import mock
+
+import fixtures
+from testtools.matchers import Contains, Equals
+
+from snapcraft.internal import lifecycle
+from snapcraft.internal.lifecycle import _packer
+from tests import unit
+
+
+class PackTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        os.makedirs(os.path.join("prime", "meta"))
+        with open(os.path.join("prime", "meta", "snap.yaml"), "w") as f:
+            f.write(
+                dedent(
+                    """\
+                    name: my-snap
+                    version: '1.0'
+                    architectures: [amd64]
+                    """
+                )
+            )
+
+        # A mksquashfs which saves its arguments, and outputs its progress
+        # and statistics like the real one does.
+        bin_dir = os.path.join(self.path, "bin")
+        os.makedirs(bin_dir)
+        self.mksquashfs_args = os.path.join(self.path, "mksquashfs-args")
+        with open(os.path.join(bin_dir, "mksquashfs"), "w") as f:
+            f.write(
+                dedent(
+                    """\
+                    #!{python}
+                    import json, os, sys
+                    with open({args_path!r}, "w") as f:
+                        json.dump(sys.argv[1:], f)
+                    with open(sys.argv[2], "w") as f:
+                        f.write("snap")
+                    print("Parallel mksquashfs: Using 2 processors")
+                    for done in range(1, 5):
+                        print("[=  ] {{}}/4  {{}}%".format(done, done * 25), end="\\r")
+                    print()
+                    print("\\t50.00% of uncompressed filesystem size (2.00 Kbytes)")
+                    sys.exit(int(os.environ.get("FAKE_EXIT", 0)))
+                    """
+                ).format(python=sys.executable, args_path=self.mksquashfs_args)
+            )
+        os.chmod(os.path.join(bin_dir, "mksquashfs"), 0o755)
+        self.useFixture(
+            fixtures.EnvironmentVariable(
+                "PATH", "{}:{}".format(bin_dir, os.environ["PATH"])
+            )
+        )
+
+        patcher = mock.patch("multiprocessing.cpu_count", return_value=2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch(
+            "snapcraft.internal.lifecycle._packer.is_dumb_terminal", return_value=False,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch("snapcraft.internal.lifecycle._packer.ProgressBar")
+        self.progress_bar_mock = patcher.start().return_value.start.return_value
+        self.addCleanup(patcher.stop)
+
+    def get_mksquashfs_args(self):
+        with open(self.mksquashfs_args) as f:
+            return json.load(f)
+
+    def test_pack(self):
+        snap = lifecycle.pack("prime")
+
+        self.assertThat(snap, Equals("my-snap_1.0_amd64.snap"))
+        self.assertThat(
+            self.get_mksquashfs_args(),
+            Equals(
+                [
+                    "prime",
+                    "my-snap_1.0_amd64.snap",
+                    "-noappend",
+                    "-comp",
+                    "xz",
+                    "-no-xattrs",
+                    "-no-fragments",
+                    "-all-root",
+                    "-processors",
+                    "2",
+                ]
+            ),
+        )
+
+    def test_pack_shows_progress(self):
+        lifecycle.pack("prime")
+
+        self.assertThat(
+            self.progress_bar_mock.update.mock_calls,
+            Equals([mock.call(25), mock.call(50), mock.call(75), mock.call(100)]),
+        )
+        self.progress_bar_mock.finish.assert_called_once_with()
+
+    def test_pack_with_fast_compression(self):
+        fake_logger = fixtures.FakeLogger(level=logging.WARNING)
+        self.useFixture(fake_logger)
+
+        lifecycle.pack("prime", compression="lzo")
+
+        self.assertThat(self.get_mksquashfs_args()[3:5], Equals(["-comp", "lzo"]))
+        self.assertThat(
+            fake_logger.output,
+            Contains("Packing with lzo compression, the snap will not be accepted"),
+        )
+
+    def test_pack_without_compression(self):
+        lifecycle.pack("prime", compression="none")
+
+        self.assertThat(self.get_mksquashfs_args()[3:5], Equals(["-noI", "-noD"]))
+
+    def test_pack_writes_report(self):
+        self.useFixture(
+            fixtures.EnvironmentVariable("SNAPCRAFT_PACK_REPORT", "report.json")
+        )
+
+        with mock.patch("time.monotonic", side_effect=[10, 12.5]):
+            lifecycle.pack("prime", output="my.snap")
+
+        with open("report.json") as f:
+            self.assertThat(
+                json.load(f),
+                Equals(
+                    dict(
+                        snap_name="my-snap",
+                        snap="my.snap",
+                        compression="xz",
+                        processors=2,
+                        duration=2.5,
+                        size=4,
+                        uncompressed_size=2048,
+                    )
+                ),
+            )
+
+    def test_pack_failure(self):
+        self.useFixture(fixtures.EnvironmentVariable("FAKE_EXIT", "1"))
+
+        raised = self.assertRaises(RuntimeError, lifecycle.pack, "prime")
+
+        self.assertThat(
+            str(raised), Equals("Failed to create snap 'my-snap_1.0_amd64.snap'")
+        )
+
+
+class ReadMksquashfsOutputTestCase(unit.TestCase):
+    def test_progress_is_not_in_output(self):
+        progress_callback = mock.Mock()
+        stdout = io.BufferedReader(
+            io.BytesIO(
+                b"Parallel mksquashfs\n"
+                b"[=   ] 1/3  33%\r[==  ] 2/3  66%\r[==  ] 2/3  66%\r"
+                b"[====] 3/3 100%\n"
+                b"Exportable Squashfs 4.0 filesystem\n"
+            )
+        )
+
+        output = _packer._read_mksquashfs_output(stdout, progress_callback, 5)
+
+        self.assertThat(
+            output, Equals("Parallel mksquashfs\nExportable Squashfs 4.0 filesystem"),
+        )
+        self.assertThat(
+            progress_callback.mock_calls,
+            Equals([mock.call(33), mock.call(66), mock.call(100)]),
+        )
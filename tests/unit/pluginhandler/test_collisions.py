@@ -0,0 +1,141 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from unittest import mock
+
+from testtools.matchers import Equals
+
+from snapcraft.internal.pluginhandler import _collisions
+from tests import unit
+
+
+def _write(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(contents)
+
+
+class CollisionCheckerTestCase(unit.TestCase):
+
+    scenarios = (("serial", dict(workers=1)), ("parallel", dict(workers=2)))
+
+    def setUp(self):
+        super().setUp()
+
+        self.checker = _collisions.CollisionChecker(workers=self.workers)
+        patcher = mock.patch.object(
+            _collisions, "_calculate_digest", wraps=_collisions._calculate_digest
+        )
+        self.digest_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_contents(self):
+        _write("a/file", "contents")
+        _write("b/file", "contents")
+
+        self.assertThat(
+            self.checker.paths_collide([("a/file", "b/file")]), Equals([False])
+        )
+        self.assertThat(self.digest_mock.call_count, Equals(2))
+
+    def test_different_contents_same_size(self):
+        _write("a/file", "contents1")
+        _write("b/file", "contents2")
+
+        self.assertThat(
+            self.checker.paths_collide([("a/file", "b/file")]), Equals([True])
+        )
+
+    def test_different_sizes_are_not_read(self):
+        _write("a/file", "contents")
+        _write("b/file", "more contents")
+
+        self.assertThat(
+            self.checker.paths_collide([("a/file", "b/file")]), Equals([True])
+        )
+        self.digest_mock.assert_not_called()
+
+    def test_hard_links_are_not_read(self):
+        _write("a/file", "contents")
+        os.makedirs("b")
+        os.link("a/file", "b/file")
+
+        self.assertThat(
+            self.checker.paths_collide([("a/file", "b/file")]), Equals([False])
+        )
+        self.digest_mock.assert_not_called()
+
+    def test_files_are_hashed_once(self):
+        _write("a/file", "contents")
+        _write("b/file", "contents")
+        _write("c/file", "contents")
+
+        self.assertThat(
+            self.checker.paths_collide([("b/file", "a/file"), ("c/file", "a/file")]),
+            Equals([False, False]),
+        )
+        self.assertThat(
+            self.checker.paths_collide([("c/file", "b/file")]), Equals([False])
+        )
+        self.assertThat(self.digest_mock.call_count, Equals(3))
+
+    def test_pc_files_ignore_prefix(self):
+        _write("a/file.pc", "prefix=/a/long/prefix\nLibs: -lfoo\n")
+        _write("b/file.pc", "prefix=/b\nLibs: -lfoo\n")
+        _write("c/file.pc", "prefix=/c\nLibs: -lbar\n")
+
+        self.assertThat(
+            self.checker.paths_collide(
+                [("b/file.pc", "a/file.pc"), ("c/file.pc", "a/file.pc")]
+            ),
+            Equals([False, True]),
+        )
+
+    def test_symlinks(self):
+        os.makedirs("a")
+        os.makedirs("b")
+        os.symlink("foo", "a/link")
+        os.symlink("foo", "b/link")
+        os.symlink("bar", "b/other-link")
+        _write("b/file", "contents")
+
+        self.assertThat(
+            self.checker.paths_collide(
+                [("a/link", "b/link"), ("a/link", "b/other-link"), ("a/link", "b/file")]
+            ),
+            Equals([False, True, True]),
+        )
+
+    def test_directories(self):
+        os.makedirs("a/dir")
+        os.makedirs("b/dir")
+        _write("b/file", "contents")
+        _write("a/file", "contents")
+        os.makedirs("b/dir2")
+        _write("a/dir2", "contents")
+
+        self.assertThat(
+            self.checker.paths_collide([("a/dir", "b/dir"), ("a/dir2", "b/dir2")]),
+            Equals([False, True]),
+        )
+
+    def test_missing_paths_do_not_collide(self):
+        _write("a/file", "contents")
+
+        self.assertThat(
+            self.checker.paths_collide([("a/file", "b/file")]), Equals([False])
+        )
@@ -0,0 +1,109 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from testtools.matchers import Equals
+
+from snapcraft.internal.pluginhandler._fileset_resolver import resolve_fileset
+from tests import unit
+
+
+class ResolveFilesetTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        os.makedirs("install/lib/nested")
+        os.makedirs("install/.hidden")
+        open("install/1.so", "w").close()
+        open("install/.hidden/2.so", "w").close()
+        open("install/lib/3.so", "w").close()
+        open("install/lib/.4.so", "w").close()
+        open("install/lib/nested/5.so", "w").close()
+        open("install/lib/nested/6.txt", "w").close()
+
+    def test_everything(self):
+        files, dirs = resolve_fileset("install", ["*"], [])
+
+        self.assertThat(
+            files,
+            Equals(
+                {"1.so", "lib/3.so", "lib/.4.so", "lib/nested/5.so", "lib/nested/6.txt"}
+            ),
+        )
+        self.assertThat(dirs, Equals({"lib", "lib/nested"}))
+
+    def test_hidden_entries_only_match_explicitly(self):
+        files, dirs = resolve_fileset("install", ["*/*.so", ".*/*.so"], [])
+
+        self.assertThat(files, Equals({"lib/3.so", ".hidden/2.so"}))
+        self.assertThat(dirs, Equals({"lib", ".hidden"}))
+
+    def test_recursive_glob(self):
+        files, dirs = resolve_fileset("install", ["**/*.so"], [])
+
+        self.assertThat(files, Equals({"1.so", "lib/3.so", "lib/nested/5.so"}))
+        self.assertThat(dirs, Equals({"lib", "lib/nested"}))
+
+    def test_excluded_directory_takes_out_its_tree(self):
+        files, dirs = resolve_fileset("install", ["lib"], ["lib/nested"])
+
+        self.assertThat(files, Equals({"lib/3.so", "lib/.4.so"}))
+        self.assertThat(dirs, Equals({"lib"}))
+
+    def test_exclude_glob_applies_to_expanded_directory(self):
+        files, dirs = resolve_fileset("install", ["lib"], ["*/*/*.so"])
+
+        self.assertThat(files, Equals({"lib/3.so", "lib/.4.so", "lib/nested/6.txt"}))
+        self.assertThat(dirs, Equals({"lib", "lib/nested"}))
+
+    def test_missing_literal_include_is_selected(self):
+        files, dirs = resolve_fileset("install", ["missing/file"], [])
+
+        self.assertThat(files, Equals({"missing/file"}))
+        self.assertThat(dirs, Equals({"missing"}))
+
+    def test_excluded_literal_include_is_not_selected(self):
+        files, dirs = resolve_fileset("install", ["1.so"], ["*.so"])
+
+        self.assertThat(files, Equals(set()))
+        self.assertThat(dirs, Equals(set()))
+
+    def test_included_symlinked_directory_is_expanded(self):
+        os.symlink("lib", "install/link")
+
+        files, dirs = resolve_fileset("install", ["link"], ["*/nested/*.txt"])
+
+        self.assertThat(
+            files, Equals({"link", "link/3.so", "link/.4.so", "link/nested/5.so"})
+        )
+        self.assertThat(dirs, Equals({"link", "link/nested"}))
+
+    def test_symlinked_directory_in_included_directory_is_a_file(self):
+        os.symlink("nested", "install/lib/link")
+
+        files, dirs = resolve_fileset("install", ["lib"], ["lib/nested"])
+
+        self.assertThat(files, Equals({"lib/3.so", "lib/.4.so", "lib/link"}))
+        self.assertThat(dirs, Equals({"lib"}))
+
+    def test_symlink_loop_is_not_followed(self):
+        os.symlink("..", "install/lib/loop")
+
+        files, dirs = resolve_fileset("install", ["**/*.txt"], [])
+
+        self.assertThat(files, Equals({"lib/nested/6.txt"}))
+        self.assertThat(dirs, Equals({"lib", "lib/nested"}))
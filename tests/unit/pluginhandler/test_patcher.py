@@ -13,8 +13,15 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import subprocess
 from unittest import mock
 
+from testtools.matchers import Equals
+
+from snapcraft.internal import errors
+from snapcraft.internal.pluginhandler import PartPatcher
+
 from tests import unit
 
 
@@ -59,4 +66,60 @@ class PrimeTypeAppDoesPatchingTestCase(unit.TestCase):
                 snap_base_path="/snap/fake-name/current",
                 stage_packages=[],
                 stagedir=self.stage_dir,
+                workers=2,
             )
+
+
+class PartPatcherTestCase(unit.TestCase):
+    scenarios = (("serial", dict(workers=1)), ("parallel", dict(workers=4)))
+
+    def setUp(self):
+        super().setUp()
+
+        project = mock.Mock()
+        project.is_host_compatible_with_base.return_value = True
+        project.get_core_dynamic_linker.return_value = "/lib/ld-linux.so.2"
+        self.elf_files = frozenset(
+            mock.Mock(path=os.path.join(self.prime_dir, "bin", str(i)))
+            for i in range(10)
+        )
+        self.part_patcher = PartPatcher(
+            elf_files=self.elf_files,
+            plugin=mock.Mock(),
+            project=project,
+            confinement="classic",
+            core_base="core18",
+            snap_base_path="/snap/fake-name/current",
+            stage_packages=[],
+            stagedir=self.stage_dir,
+            primedir=self.prime_dir,
+            workers=self.workers,
+        )
+
+        patcher = mock.patch("snapcraft.internal.elf.Patcher.patch")
+        self.patch_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_patch_all_files(self):
+        self.part_patcher.patch()
+
+        self.assertThat(
+            {c[1]["elf_file"] for c in self.patch_mock.call_args_list},
+            Equals(set(self.elf_files)),
+        )
+
+    def test_patch_error_is_deterministic(self):
+        def _patch(*, elf_file):
+            if elf_file.path.endswith(("3", "7")):
+                raise errors.PatcherGenericError(
+                    elf_file=elf_file.path,
+                    process_exception=subprocess.CalledProcessError(1, ["patchelf"]),
+                )
+
+        self.patch_mock.side_effect = _patch
+
+        raised = self.assertRaises(errors.PatcherGenericError, self.part_patcher.patch)
+
+        self.assertThat(
+            raised.elf_file, Equals(os.path.join(self.prime_dir, "bin", "3"))
+        )
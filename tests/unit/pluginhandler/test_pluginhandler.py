@@ -22,7 +22,7 @@ import stat
 import tempfile
 from collections import OrderedDict
 from textwrap import dedent
-from unittest.mock import call, Mock, MagicMock, patch
+from unittest.mock import ANY, call, Mock, MagicMock, patch
 
 from testtools.matchers import Contains, Equals, FileExists, MatchesRegex, Not
 
@@ -1468,7 +1468,10 @@ class StateTestCase(StateBaseTestCase):
         self.assertThat(self.handler.latest_step(), Equals(steps.PRIME))
         self.assertRaises(errors.NoNextStepError, self.handler.next_step)
         self.get_elf_files_mock.assert_called_once_with(
-            self.handler.primedir, {"bin/1", "bin/2"}
+            self.handler.primedir,
+            {"bin/1", "bin/2"},
+            elf_cache=self.handler._elf_cache,
+            workers=2,
         )
         self.assertFalse(mock_copy.called)
 
@@ -1548,7 +1551,10 @@ class StateTestCase(StateBaseTestCase):
         # bin/2 shouldn't be in this list as it was already primed by another
         # part.
         self.get_elf_files_mock.assert_called_once_with(
-            self.handler.primedir, {"bin/1"}
+            self.handler.primedir,
+            {"bin/1"},
+            elf_cache=self.handler._elf_cache,
+            workers=2,
         )
         self.assertFalse(mock_copy.called)
 
@@ -1571,7 +1577,7 @@ class StateTestCase(StateBaseTestCase):
 
     @patch(
         "snapcraft.internal.elf.ElfFile._extract",
-        return_value=(("", "", ""), "EXEC", "", dict(), False),
+        return_value=(("", "", ""), "EXEC", "", dict(), False, [], []),
     )
     @patch("snapcraft.internal.elf.ElfFile.load_dependencies")
     @patch("snapcraft.internal.pluginhandler._migrate_files")
@@ -1608,7 +1614,10 @@ class StateTestCase(StateBaseTestCase):
         self.assertThat(self.handler.latest_step(), Equals(steps.PRIME))
         self.assertRaises(errors.NoNextStepError, self.handler.next_step)
         self.get_elf_files_mock.assert_called_once_with(
-            self.handler.primedir, {"bin/1", "bin/2"}
+            self.handler.primedir,
+            {"bin/1", "bin/2"},
+            elf_cache=self.handler._elf_cache,
+            workers=2,
         )
         mock_migrate_files.assert_has_calls(
             [
@@ -1644,7 +1653,7 @@ class StateTestCase(StateBaseTestCase):
 
     @patch(
         "snapcraft.internal.elf.ElfFile._extract",
-        return_value=(("", "", ""), "EXEC", "", dict(), False),
+        return_value=(("", "", ""), "EXEC", "", dict(), False, [], []),
     )
     @patch("snapcraft.internal.elf.ElfFile.load_dependencies")
     @patch("snapcraft.internal.pluginhandler._migrate_files")
@@ -1681,7 +1690,10 @@ class StateTestCase(StateBaseTestCase):
         self.assertThat(self.handler.latest_step(), Equals(steps.PRIME))
         self.assertRaises(errors.NoNextStepError, self.handler.next_step)
         self.get_elf_files_mock.assert_called_once_with(
-            self.handler.primedir, {"bin/file"}
+            self.handler.primedir,
+            {"bin/file"},
+            elf_cache=self.handler._elf_cache,
+            workers=2,
         )
         # Verify that only the part's files were migrated-- not the system
         # dependency.
@@ -1700,7 +1712,7 @@ class StateTestCase(StateBaseTestCase):
 
     @patch(
         "snapcraft.internal.elf.ElfFile._extract",
-        return_value=(("", "", ""), "EXEC", "", dict(), False),
+        return_value=(("", "", ""), "EXEC", "", dict(), False, [], []),
     )
     @patch(
         "snapcraft.internal.elf.ElfFile.load_dependencies",
@@ -1732,7 +1744,10 @@ class StateTestCase(StateBaseTestCase):
         self.assertThat(self.handler.latest_step(), Equals(steps.PRIME))
         self.assertRaises(errors.NoNextStepError, self.handler.next_step)
         self.get_elf_files_mock.assert_called_once_with(
-            self.handler.primedir, {"bin/1", "foo/bar/baz"}
+            self.handler.primedir,
+            {"bin/1", "foo/bar/baz"},
+            elf_cache=self.handler._elf_cache,
+            workers=2,
         )
         mock_migrate_files.assert_called_once_with(
             {"bin/1", "foo/bar/baz"},
@@ -1766,7 +1781,10 @@ class StateTestCase(StateBaseTestCase):
         self.assertThat(self.handler.latest_step(), Equals(steps.PRIME))
         self.assertRaises(errors.NoNextStepError, self.handler.next_step)
         self.get_elf_files_mock.assert_called_once_with(
-            self.handler.primedir, {"bin/1"}
+            self.handler.primedir,
+            {"bin/1"},
+            elf_cache=self.handler._elf_cache,
+            workers=2,
         )
         self.assertFalse(mock_copy.called)
 
@@ -2560,6 +2578,145 @@ class CleanStageTestCase(CleanBaseTestCase):
         )
 
 
+class UpdateStageAndPrimeTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.handler = self.load_part("test_part")
+        self.handler.makedirs()
+
+        self.installdir = self.handler.plugin.installdir
+        os.makedirs(os.path.join(self.installdir, "dir"))
+        for file_name in ("changed", "removed", "unchanged", "dir/removed"):
+            with open(os.path.join(self.installdir, file_name), "w") as f:
+                f.write("old")
+        self.handler.mark_done(steps.BUILD)
+
+    def _update_install_files(self):
+        with open(os.path.join(self.installdir, "changed"), "w") as f:
+            f.write("new contents")
+        os.remove(os.path.join(self.installdir, "removed"))
+        shutil.rmtree(os.path.join(self.installdir, "dir"))
+        open(os.path.join(self.installdir, "added"), "w").close()
+
+    def test_update_stage_migrates_changed_files(self):
+        self.handler.stage()
+        self._update_install_files()
+
+        with patch(
+            "snapcraft.internal.pluginhandler._migrate_files",
+            wraps=pluginhandler._migrate_files,
+        ) as mock_migrate_files:
+            self.handler.update_stage({})
+
+        mock_migrate_files.assert_called_once_with(
+            {"added", "changed"},
+            set(),
+            self.installdir,
+            self.stage_dir,
+            fixup_func=ANY,
+        )
+        self.assertThat(
+            sorted(os.listdir(self.stage_dir)),
+            Equals(["added", "changed", "unchanged"]),
+        )
+        with open(os.path.join(self.stage_dir, "changed")) as f:
+            self.assertThat(f.read(), Equals("new contents"))
+
+        state = states.get_state(self.handler.plugin.statedir, steps.STAGE)
+        self.assertThat(state.files, Equals({"added", "changed", "unchanged"}))
+        self.assertThat(
+            list(state.fingerprints), Equals(["added", "changed", "unchanged"])
+        )
+
+    def test_update_stage_keeps_files_from_other_parts(self):
+        self.handler.stage()
+        self._update_install_files()
+
+        other_state = states.StageState({"removed"}, set())
+        self.handler.update_stage({"other_part": other_state})
+
+        self.assertThat(os.path.join(self.stage_dir, "removed"), FileExists())
+        self.assertFalse(os.path.exists(os.path.join(self.stage_dir, "dir")))
+
+    def test_update_stage_without_fingerprints_migrates_all_files(self):
+        self.handler.stage()
+        state = states.get_state(self.handler.plugin.statedir, steps.STAGE)
+        state.fingerprints = None
+        self.handler.mark_done(steps.STAGE, state)
+
+        with patch(
+            "snapcraft.internal.pluginhandler._migrate_files"
+        ) as mock_migrate_files:
+            self.handler.update_stage({})
+
+        mock_migrate_files.assert_called_once_with(
+            {"changed", "removed", "unchanged", "dir/removed"},
+            {"dir"},
+            self.installdir,
+            self.stage_dir,
+            fixup_func=ANY,
+        )
+
+    def test_update_prime_handles_changed_elf_files(self):
+        self.handler.stage()
+        with patch.object(
+            self.handler,
+            "_handle_elf",
+            return_value={
+                "changed": {"old/lib"},
+                "removed": {"removed/lib"},
+                "unchanged": {"lib"},
+            },
+        ) as mock_handle_elf:
+            self.handler.prime()
+            mock_handle_elf.assert_called_once_with(
+                {"changed", "removed", "unchanged", "dir/removed"}
+            )
+
+        self._update_install_files()
+        self.handler.update_stage({})
+        with patch.object(
+            self.handler, "_handle_elf", return_value={"changed": {"usr/lib"}}
+        ) as mock_handle_elf:
+            self.handler.update_prime({})
+            mock_handle_elf.assert_called_once_with({"added", "changed"})
+
+        self.assertThat(
+            sorted(os.listdir(self.prime_dir)),
+            Equals(["added", "changed", "unchanged"]),
+        )
+        state = states.get_state(self.handler.plugin.statedir, steps.PRIME)
+        self.assertThat(state.dependency_paths, Equals({"lib", "usr/lib"}))
+        self.assertThat(
+            state.file_dependency_paths,
+            Equals({"changed": {"usr/lib"}, "unchanged": {"lib"}}),
+        )
+
+    def test_update_prime_without_file_dependency_paths_reloads_them(self):
+        self.handler.stage()
+        with patch.object(
+            self.handler, "_handle_elf", return_value={"removed": {"removed/lib"}}
+        ):
+            self.handler.prime()
+        state = states.get_state(self.handler.plugin.statedir, steps.PRIME)
+        state.file_dependency_paths = None
+        self.handler.mark_done(steps.PRIME, state)
+
+        self._update_install_files()
+        self.handler.update_stage({})
+        with patch.object(
+            self.handler, "_handle_elf", return_value={"changed": {"usr/lib"}}
+        ), patch.object(
+            self.handler, "_load_dependency_paths", return_value={"unchanged": {"lib"}},
+        ) as mock_load_dependency_paths:
+            self.handler.update_prime({})
+
+        mock_load_dependency_paths.assert_called_once_with(ANY)
+        state = states.get_state(self.handler.plugin.statedir, steps.PRIME)
+        self.assertThat(state.dependency_paths, Equals({"lib", "usr/lib"}))
+
+
 class PerStepCleanTestCase(unit.TestCase):
     def setUp(self):
         super().setUp()
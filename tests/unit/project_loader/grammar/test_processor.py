@@ -16,6 +16,7 @@
 
 import testtools
 from testtools.matchers import Equals
+from unittest import mock
 from unittest.mock import patch
 
 import snapcraft
@@ -312,3 +313,69 @@ class InvalidGrammarTestCase(GrammarBaseTestCase):
                 self.grammar, snapcraft.ProjectOptions(), self.checker
             )
             processor.process()
+
+
+class BulkCheckerGrammarTestCase(GrammarBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = patch("platform.machine", return_value="x86_64")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("platform.architecture", return_value=("64bit", "ELF"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.checker_mock = mock.Mock(side_effect=self.checker)
+        self.bulk_checker_mock = mock.Mock(
+            side_effect=lambda primitives: {p for p in primitives if self.checker(p)}
+        )
+
+    def process(self, grammar_to_process):
+        processor = grammar.GrammarProcessor(
+            grammar_to_process,
+            snapcraft.ProjectOptions(target_deb_arch="i386"),
+            self.checker_mock,
+            transformer=lambda call_stack, primitive, project: (
+                "{}:i386".format(primitive)
+                if any(isinstance(s, _to.ToStatement) for s in call_stack)
+                else primitive
+            ),
+            bulk_checker=self.bulk_checker_mock,
+        )
+        return processor.process()
+
+    def test_all_checked_primitives_are_checked_at_once(self):
+        primitives = self.process(
+            [
+                "foo",
+                {"try": ["invalid1", {"on amd64": ["bar"]}]},
+                {"else": ["baz"]},
+                {"to i386": [{"try": ["invalid2"]}, {"else": ["qux"]}]},
+                {"on armhf": ["quux"]},
+            ]
+        )
+
+        self.assertThat(primitives, Equals({"foo", "baz", "qux:i386"}))
+        self.bulk_checker_mock.assert_called_once_with(
+            {"invalid1", "bar", "baz", "invalid2:i386", "qux:i386"}
+        )
+        self.checker_mock.assert_not_called()
+
+    def test_nothing_checked_without_try(self):
+        primitives = self.process(["foo", {"on amd64": ["bar"]}, {"else": ["baz"]}])
+
+        self.assertThat(primitives, Equals({"bar", "foo"}))
+        self.bulk_checker_mock.assert_not_called()
+        self.checker_mock.assert_not_called()
+
+    def test_primitives_are_checked_once(self):
+        processor = grammar.GrammarProcessor(
+            [{"try": ["foo"]}, {"on amd64": [{"try": ["foo"]}]}],
+            snapcraft.ProjectOptions(target_deb_arch="i386"),
+            self.checker_mock,
+        )
+
+        processor.process()
+        processor.process()
+
+        self.checker_mock.assert_called_once_with("foo")
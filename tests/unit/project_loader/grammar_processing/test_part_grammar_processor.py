@@ -404,7 +404,10 @@ class PartGrammarBuildAndStagePackagesTestCase(unit.TestCase):
         platform_machine_mock.return_value = self.host_arch
         platform_architecture_mock.return_value = ("64bit", "ELF")
 
+        # Pretend that all packages are valid
         repo = mock.Mock()
+        repo.get_valid_build_packages.side_effect = set
+        repo.get_valid_packages.side_effect = set
         plugin = mock.Mock()
         plugin.build_packages = self.packages
         plugin.stage_packages = self.packages
@@ -0,0 +1,128 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import datetime
+import os
+from textwrap import dedent
+from unittest import mock
+
+from testtools.matchers import Equals, FileExists, IsInstance, Not
+
+from snapcraft.internal.project_loader import _config_cache
+from . import LoadPartBaseTest
+
+
+class ConfigCacheTestCase(LoadPartBaseTest):
+    def setUp(self):
+        super().setUp()
+
+        self.snapcraft_yaml = dedent(
+            """\
+            name: test
+            base: core18
+            version: "1"
+            summary: test
+            description: test
+            confinement: strict
+            grade: stable
+
+            parts:
+              part1:
+                plugin: nil
+                filesets:
+                  binaries: [bin/*]
+                stage: [$binaries]
+        """
+        )
+        self.cache_path = os.path.join(self.parts_dir, ".snapcraft_config_cache")
+
+        patcher = mock.patch(
+            "snapcraft.internal.project_loader._config.Validator.validate"
+        )
+        self.validate_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached_config_is_not_validated_again(self):
+        os.mkdir(self.parts_dir)
+        config = self.make_snapcraft_project(self.snapcraft_yaml)
+        self.assertThat(self.cache_path, FileExists())
+
+        cached_config = self.make_snapcraft_project(self.snapcraft_yaml)
+
+        self.validate_mock.assert_called_once_with()
+        self.assertThat(cached_config.data, Equals(config.data))
+        self.assertThat(
+            cached_config.data["parts"]["part1"]["stage"], Equals(["bin/*"])
+        )
+
+    def test_not_cached_without_parts_dir(self):
+        self.make_snapcraft_project(self.snapcraft_yaml)
+
+        self.assertThat(self.cache_path, Not(FileExists()))
+
+    def test_changed_snapcraft_yaml_is_validated(self):
+        os.mkdir(self.parts_dir)
+        self.make_snapcraft_project(self.snapcraft_yaml)
+
+        config = self.make_snapcraft_project(
+            self.snapcraft_yaml.replace('version: "1"', 'version: "2"')
+        )
+
+        self.assertThat(self.validate_mock.call_count, Equals(2))
+        self.assertThat(config.data["version"], Equals("2"))
+
+    def test_changed_local_plugin_is_validated(self):
+        os.mkdir(self.parts_dir)
+        os.makedirs(self.local_plugins_dir)
+        self.make_snapcraft_project(self.snapcraft_yaml)
+
+        with open(os.path.join(self.local_plugins_dir, "x_plugin.py"), "w") as f:
+            f.write("import snapcraft")
+        self.make_snapcraft_project(self.snapcraft_yaml)
+
+        self.assertThat(self.validate_mock.call_count, Equals(2))
+
+    def test_invalid_cache_is_ignored(self):
+        os.mkdir(self.parts_dir)
+        with open(self.cache_path, "w") as f:
+            f.write("{")
+
+        config = self.make_snapcraft_project(self.snapcraft_yaml)
+
+        self.validate_mock.assert_called_once_with()
+        self.assertThat(config.data["name"], Equals("test"))
+
+
+class EncodingTestCase(LoadPartBaseTest):
+    def test_mapping_types_are_kept(self):
+        data = collections.OrderedDict(
+            [("z", dict(b=1, a=[None, True, 1.5])), ("a", {1: "one"})]
+        )
+
+        decoded = _config_cache._decode(_config_cache._encode(data))
+
+        self.assertThat(decoded, Equals(data))
+        self.assertThat(list(decoded), Equals(["z", "a"]))
+        self.assertThat(decoded, IsInstance(collections.OrderedDict))
+        self.assertThat(decoded["z"], Not(IsInstance(collections.OrderedDict)))
+
+    def test_unknown_types_are_not_cached(self):
+        self.assertRaises(
+            _config_cache._UncacheableError,
+            _config_cache._encode,
+            dict(date=datetime.date(2019, 5, 1)),
+        )
@@ -574,3 +574,65 @@ class EnvironmentTest(ProjectLoaderBaseTest):
         self.assertThat(
             project_config.parts.build_env_for_part(part2), Contains('BAZ="QUX"')
         )
+
+    def _make_diamond_project(self):
+        snapcraft_yaml = dedent(
+            """\
+            name: test
+            base: core18
+            version: "1"
+            summary: test
+            description: test
+            confinement: strict
+            grade: stable
+
+            parts:
+              part1:
+                plugin: nil
+                after: [part2, part3]
+              part2:
+                plugin: nil
+                after: [part4]
+              part3:
+                plugin: nil
+                after: [part4]
+              part4:
+                plugin: nil
+        """
+        )
+        return self.make_snapcraft_project(snapcraft_yaml)
+
+    def test_build_env_expands_each_dependency_once(self):
+        project_config = self._make_diamond_project()
+        part1 = project_config.parts.get_part("part1")
+        part4 = project_config.parts.get_part("part4")
+
+        with mock.patch.object(part4, "env", return_value=["PART4=1"]) as env_mock:
+            env = project_config.parts.build_env_for_part(part1)
+
+        env_mock.assert_called_once_with(self.stage_dir)
+        self.assertThat(env.count("PART4=1"), Equals(1))
+
+    def test_build_env_is_kept_until_staged(self):
+        project_config = self._make_diamond_project()
+        part1 = project_config.parts.get_part("part1")
+        part4 = project_config.parts.get_part("part4")
+        env = project_config.parts.build_env_for_part(part1)
+        os.makedirs(os.path.join(self.stage_dir, "lib"))
+
+        with mock.patch.object(part4, "env", return_value=[]) as env_mock:
+            self.assertThat(project_config.parts.build_env_for_part(part1), Equals(env))
+            project_config.parts.invalidate_build_env("part4", staged=False)
+            self.assertThat(project_config.parts.build_env_for_part(part1), Equals(env))
+            env_mock.assert_not_called()
+
+            project_config.parts.invalidate_build_env("part4")
+            env = project_config.parts.build_env_for_part(part1)
+
+        env_mock.assert_called_once_with(self.stage_dir)
+        self.assertThat(
+            env,
+            Contains(
+                'LD_LIBRARY_PATH="$LD_LIBRARY_PATH:{}/lib"'.format(self.stage_dir)
+            ),
+        )
@@ -14,14 +14,20 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
+import copy
+import random
 from textwrap import dedent
+from typing import Set  # noqa: F401
+from unittest import mock
 
-from testtools.matchers import Equals, HasLength
+from testtools.matchers import Equals, HasLength, LessThan
 
 from . import LoadPartBaseTest, ProjectLoaderBaseTest
 from snapcraft.project import Project
 from snapcraft.internal import project_loader
-from tests import fixture_setup
+from snapcraft.internal.project_loader._parts_config import PartsConfig
+from tests import fixture_setup, unit
 
 
 class TestParts(ProjectLoaderBaseTest):
@@ -187,3 +193,91 @@ class PluginLoadTest(LoadPartBaseTest):
             "nil",
             {"stage-packages": ["fswebcam"], "plugin": "nil", "stage": [], "prime": []},
         )
+
+
+class LargeProjectTestCase(unit.TestCase):
+    """Synthetic 500 part project with a deep and wide after graph."""
+
+    def setUp(self):
+        super().setUp()
+
+        # Every part is after a few of the parts with lower numbers, which
+        # are given names in a different order.
+        rng = random.Random(0)
+        self.names = ["part-{}".format(rng.random()) for _ in range(500)]
+        parts = collections.OrderedDict()
+        for i, name in enumerate(self.names):
+            after = {self.names[rng.randrange(i)] for _ in range(min(i, 3))}
+            parts[name] = dict(plugin="nil", after=sorted(after))
+        self.parts = parts
+
+        def load_part(parts_config, part_name, plugin_name, properties):
+            part = mock.Mock(deps=[])
+            part.name = part_name
+            parts_config.all_parts.append(part)
+            return part
+
+        patcher = mock.patch.object(
+            PartsConfig, "load_part", autospec=True, side_effect=load_part
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_parts_config(self):
+        return PartsConfig(
+            parts=dict(parts=copy.deepcopy(self.parts)),
+            project=mock.Mock(),
+            validator=mock.Mock(),
+            build_snaps=set(),
+            build_tools=set(),
+        )
+
+    def get_closure(self, name, *, reverse=False):
+        if reverse:
+            edges = {
+                n: {m for m in self.parts if n in self.parts[m]["after"]}
+                for n in self.parts
+            }
+        else:
+            edges = {n: set(self.parts[n]["after"]) for n in self.parts}
+        closure = set()  # type: Set[str]
+        pending = list(edges[name])
+        while pending:
+            dependency = pending.pop()
+            if dependency not in closure:
+                closure.add(dependency)
+                pending.extend(edges[dependency])
+        return closure
+
+    def test_parts_are_sorted_after_their_dependencies(self):
+        parts_config = self.make_parts_config()
+
+        order = [p.name for p in parts_config.all_parts]
+        self.assertThat(sorted(order), Equals(sorted(self.names)))
+        for index, part in enumerate(parts_config.all_parts):
+            for dependency in part.deps:
+                self.assertThat(order.index(dependency.name), LessThan(index))
+        self.assertThat(
+            [p.name for p in self.make_parts_config().all_parts], Equals(order)
+        )
+
+    def test_dependencies(self):
+        parts_config = self.make_parts_config()
+
+        for name in self.names[::50]:
+            self.expectThat(
+                {p.name for p in parts_config.get_dependencies(name)},
+                Equals(set(self.parts[name]["after"])),
+            )
+            self.expectThat(
+                {p.name for p in parts_config.get_dependencies(name, recursive=True)},
+                Equals(self.get_closure(name)),
+            )
+            self.expectThat(
+                {
+                    p.name
+                    for p in parts_config.get_reverse_dependencies(name, recursive=True)
+                },
+                Equals(self.get_closure(name, reverse=True)),
+            )
+            self.expectThat(parts_config.get_part(name).name, Equals(name))
@@ -14,7 +14,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import logging
+import tarfile
 import tempfile
 
 import fixtures
@@ -30,3 +32,35 @@ class RepoBaseTestCase(unit.TestCase):
         tempdirObj = tempfile.TemporaryDirectory()
         self.addCleanup(tempdirObj.cleanup)
         self.tempdir = tempdirObj.name
+
+
+def make_deb(path, members, *, data_name="data.tar.xz"):
+    # members is a list of (name, type, contents or link name, mode).
+    data = io.BytesIO()
+    compression = data_name.split(".")[-1] if data_name != "data.tar" else ""
+    with tarfile.open(fileobj=data, mode="w:" + compression) as tar:
+        for name, member_type, value, mode in members:
+            info = tarfile.TarInfo(name)
+            info.type = member_type
+            info.mode = mode
+            if member_type == tarfile.REGTYPE:
+                info.size = len(value)
+                tar.addfile(info, io.BytesIO(value))
+            else:
+                info.linkname = value or ""
+                tar.addfile(info)
+
+    with open(path, "wb") as f:
+        f.write(b"!<arch>\n")
+        for name, contents in (
+            ("debian-binary", b"2.0\n"),
+            ("control.tar.gz", b""),
+            (data_name, data.getvalue()),
+        ):
+            header = "{:<16}{:<12}{:<6}{:<6}{:<8}{:<10}`\n".format(
+                name, 0, 0, 0, 100644, len(contents)
+            )
+            f.write(header.encode())
+            f.write(contents)
+            if len(contents) % 2:
+                f.write(b"\n")
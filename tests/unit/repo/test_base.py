@@ -340,3 +340,24 @@ class FixSUIDTestCase(RepoBaseTestCase):
         BaseRepo(self.tempdir).normalize(self.tempdir)
 
         self.assertThat(stat.S_IMODE(os.stat(file).st_mode), Equals(self.expected_mod))
+
+
+class NormalizeUnpackedFilesTestCase(RepoBaseTestCase):
+    def test_normalize_only_unpacked_files(self):
+        os.makedirs(os.path.join("root", "usr", "bin"))
+        for name in ("unpacked", "other"):
+            path = os.path.join("root", "usr", "bin", name)
+            with open(path, "w") as f:
+                f.write("#!/usr/bin/python3\n")
+            os.chmod(path, 0o4755)
+
+        BaseRepo("root").normalize(
+            "root", files={"usr", "usr/bin", "usr/bin/unpacked", "usr/bin/removed"},
+        )
+
+        unpacked_path = os.path.join("root", "usr", "bin", "unpacked")
+        self.assertThat(unpacked_path, FileContains("#!/usr/bin/env python3\n"))
+        self.assertThat(stat.S_IMODE(os.stat(unpacked_path).st_mode), Equals(0o0755))
+        other_path = os.path.join("root", "usr", "bin", "other")
+        self.assertThat(other_path, FileContains("#!/usr/bin/python3\n"))
+        self.assertThat(stat.S_IMODE(os.stat(other_path).st_mode), Equals(0o4755))
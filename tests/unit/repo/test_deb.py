@@ -15,17 +15,22 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import apt
+import fixtures
+import hashlib
+import logging
 import os
+import stat
+import tarfile
 from subprocess import CalledProcessError
 from unittest.mock import ANY, DEFAULT, call, patch, MagicMock
 
-from testtools.matchers import Contains, Equals, FileExists, Not
+from testtools.matchers import Contains, Equals, FileContains, FileExists, Not
 
 import snapcraft
-from snapcraft.internal import repo
+from snapcraft.internal import cache, repo
 from snapcraft.internal.repo import errors
 from tests import fixture_setup, unit
-from . import RepoBaseTestCase
+from . import RepoBaseTestCase, make_deb
 
 
 class UbuntuTestCase(RepoBaseTestCase):
@@ -44,12 +49,12 @@ class UbuntuTestCase(RepoBaseTestCase):
         self.mock_package.candidate.fetch_binary.side_effect = _fetch_binary
         self.mock_cache.return_value.get_changes.return_value = [self.mock_package]
 
-    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binary")
+    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binaries")
     @patch("snapcraft.internal.repo._deb.apt.apt_pkg")
-    def test_cache_update_failed(self, mock_apt_pkg, mock_fetch_binary):
+    def test_cache_update_failed(self, mock_apt_pkg, mock_fetch_binaries):
         fake_package_path = os.path.join(self.path, "fake-package.deb")
         open(fake_package_path, "w").close()
-        mock_fetch_binary.return_value = fake_package_path
+        mock_fetch_binaries.return_value = [fake_package_path]
         self.mock_cache().is_virtual_package.return_value = False
         self.mock_cache().update.side_effect = apt.cache.FetchFailedException()
         project_options = snapcraft.ProjectOptions()
@@ -57,12 +62,14 @@ class UbuntuTestCase(RepoBaseTestCase):
         self.assertRaises(errors.CacheUpdateFailedError, ubuntu.get, ["fake-package"])
 
     @patch("shutil.rmtree")
-    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binary")
+    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binaries")
     @patch("snapcraft.internal.repo._deb.apt.apt_pkg")
-    def test_cache_hashsum_mismatch(self, mock_apt_pkg, mock_fetch_binary, mock_rmtree):
+    def test_cache_hashsum_mismatch(
+        self, mock_apt_pkg, mock_fetch_binaries, mock_rmtree
+    ):
         fake_package_path = os.path.join(self.path, "fake-package.deb")
         open(fake_package_path, "w").close()
-        mock_fetch_binary.return_value = fake_package_path
+        mock_fetch_binaries.return_value = [fake_package_path]
         self.mock_cache().is_virtual_package.return_value = False
         self.mock_cache().update.side_effect = [
             apt.cache.FetchFailedException(
@@ -89,12 +96,12 @@ class UbuntuTestCase(RepoBaseTestCase):
         self.assertThat(name, Equals("hello"))
         self.assertThat(version, Equals("2.10-1"))
 
-    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binary")
+    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binaries")
     @patch("snapcraft.internal.repo._deb.apt.apt_pkg")
-    def test_get_package(self, mock_apt_pkg, mock_fetch_binary):
+    def test_get_package(self, mock_apt_pkg, mock_fetch_binaries):
         fake_package_path = os.path.join(self.path, "fake-package.deb")
         open(fake_package_path, "w").close()
-        mock_fetch_binary.return_value = fake_package_path
+        mock_fetch_binaries.return_value = [fake_package_path]
         self.mock_cache().is_virtual_package.return_value = False
 
         fake_trusted_parts_path = os.path.join(self.path, "fake-trusted-parts")
@@ -152,10 +159,10 @@ class UbuntuTestCase(RepoBaseTestCase):
         )
         self.assertThat(os.listdir(trusted_parts_dir), Equals(["trusted-part.gpg"]))
 
-    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binary")
+    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binaries")
     @patch("snapcraft.internal.repo._deb.apt.apt_pkg")
-    def test_get_package_fetch_error(self, mock_apt_pkg, mock_fetch_binary):
-        mock_fetch_binary.side_effect = apt.package.FetchError("foo")
+    def test_get_package_fetch_error(self, mock_apt_pkg, mock_fetch_binaries):
+        mock_fetch_binaries.side_effect = apt.package.FetchError("foo")
         self.mock_cache().is_virtual_package.return_value = False
         project_options = snapcraft.ProjectOptions()
         ubuntu = repo.Ubuntu(self.tempdir, project_options=project_options)
@@ -164,14 +171,14 @@ class UbuntuTestCase(RepoBaseTestCase):
         )
         self.assertThat(str(raised), Equals("Package fetch error: foo"))
 
-    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binary")
+    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binaries")
     @patch("snapcraft.internal.repo._deb.apt.apt_pkg")
     def test_get_package_trusted_parts_already_imported(
-        self, mock_apt_pkg, mock_fetch_binary
+        self, mock_apt_pkg, mock_fetch_binaries
     ):
         fake_package_path = os.path.join(self.path, "fake-package.deb")
         open(fake_package_path, "w").close()
-        mock_fetch_binary.return_value = fake_package_path
+        mock_fetch_binaries.return_value = [fake_package_path]
         self.mock_cache().is_virtual_package.return_value = False
 
         def _fake_find_file(key: str):
@@ -217,12 +224,12 @@ class UbuntuTestCase(RepoBaseTestCase):
             os.path.join(self.tempdir, "download", "fake-package.deb"), FileExists()
         )
 
-    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binary")
+    @patch("snapcraft.internal.repo._deb._AptCache.fetch_binaries")
     @patch("snapcraft.internal.repo._deb.apt.apt_pkg")
-    def test_get_multiarch_package(self, mock_apt_pkg, mock_fetch_binary):
+    def test_get_multiarch_package(self, mock_apt_pkg, mock_fetch_binaries):
         fake_package_path = os.path.join(self.path, "fake-package.deb")
         open(fake_package_path, "w").close()
-        mock_fetch_binary.return_value = fake_package_path
+        mock_fetch_binaries.return_value = [fake_package_path]
         self.mock_cache().is_virtual_package.return_value = False
 
         fake_trusted_parts_path = os.path.join(self.path, "fake-trusted-parts")
@@ -355,6 +362,112 @@ deb http://ports.ubuntu.com/ubuntu-ports trusty-security multiverse
         self.assertFalse(mock_cc.called)
 
 
+class AptIndexesTestCase(RepoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = patch("snapcraft.repo._deb.apt.Cache")
+        self.mock_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch("snapcraft.internal.repo._deb.apt.apt_pkg")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.project_options = snapcraft.ProjectOptions()
+
+    def test_apt_cache_is_shared_by_the_same_sources(self):
+        first = repo.Ubuntu(self.tempdir, project_options=self.project_options)
+        second = repo.Ubuntu(self.tempdir, project_options=self.project_options)
+
+        first.is_valid("foo")
+        second.is_valid("bar")
+        first.is_valid("baz")
+
+        self.mock_cache.assert_called_once_with(memonly=True, rootdir=ANY)
+        self.mock_cache.return_value.update.assert_called_once_with(
+            fetch_progress=ANY, sources_list=ANY
+        )
+        self.mock_cache.return_value.open.assert_called_once_with()
+        self.assertThat(self.mock_cache.return_value.clear.call_count, Equals(2))
+
+    def test_other_sources_get_their_own_apt_cache(self):
+        first = repo.Ubuntu(self.tempdir, project_options=self.project_options)
+        second = repo.Ubuntu(
+            self.tempdir,
+            sources="deb http://archive.ubuntu.com/ubuntu/ bionic main",
+            project_options=self.project_options,
+        )
+
+        first.is_valid("foo")
+        second.is_valid("bar")
+        first.is_valid("baz")
+
+        self.assertThat(self.mock_cache.call_count, Equals(3))
+        # The package lists of each are only refreshed once.
+        self.assertThat(self.mock_cache.return_value.update.call_count, Equals(2))
+
+    def test_package_lists_within_ttl_are_not_refreshed(self):
+        self.useFixture(fixtures.EnvironmentVariable("SNAPCRAFT_APT_INDEX_TTL", "3600"))
+        ubuntu = repo.Ubuntu(self.tempdir, project_options=self.project_options)
+        open(
+            os.path.join(ubuntu._cache.base_dir, ".snapcraft-index-updated"), "w"
+        ).close()
+
+        ubuntu.is_valid("foo")
+
+        self.mock_cache.return_value.update.assert_not_called()
+
+    def test_package_lists_over_ttl_are_refreshed(self):
+        self.useFixture(fixtures.EnvironmentVariable("SNAPCRAFT_APT_INDEX_TTL", "3600"))
+        ubuntu = repo.Ubuntu(self.tempdir, project_options=self.project_options)
+        stamp = os.path.join(ubuntu._cache.base_dir, ".snapcraft-index-updated")
+        open(stamp, "w").close()
+        os.utime(stamp, (0, 0))
+
+        ubuntu.is_valid("foo")
+
+        self.mock_cache.return_value.update.assert_called_once_with(
+            fetch_progress=ANY, sources_list=ANY
+        )
+        self.assertTrue(os.path.getmtime(stamp) > 0)
+
+    def test_invalid_ttl_is_ignored(self):
+        fake_logger = fixtures.FakeLogger(level=logging.WARNING)
+        self.useFixture(fake_logger)
+        self.useFixture(fixtures.EnvironmentVariable("SNAPCRAFT_APT_INDEX_TTL", "1h"))
+        ubuntu = repo.Ubuntu(self.tempdir, project_options=self.project_options)
+        open(
+            os.path.join(ubuntu._cache.base_dir, ".snapcraft-index-updated"), "w"
+        ).close()
+
+        ubuntu.is_valid("foo")
+
+        self.mock_cache.return_value.update.assert_called_once_with(
+            fetch_progress=ANY, sources_list=ANY
+        )
+        self.assertThat(
+            fake_logger.output, Contains("Ignoring SNAPCRAFT_APT_INDEX_TTL='1h'"),
+        )
+
+    def test_packages_are_checked_at_once_and_once_only(self):
+        apt_cache = self.mock_cache.return_value
+        apt_cache.__contains__.side_effect = lambda p: p != "invalid"
+        ubuntu = repo.Ubuntu(self.tempdir, project_options=self.project_options)
+
+        valid = ubuntu.get_valid_packages(["foo", "bar", "invalid"])
+        self.assertThat(valid, Equals({"foo", "bar"}))
+        self.assertThat(apt_cache.__contains__.call_count, Equals(3))
+
+        self.assertFalse(ubuntu.is_valid("invalid"))
+        self.assertTrue(
+            repo.Ubuntu(self.tempdir, project_options=self.project_options).is_valid(
+                "foo"
+            )
+        )
+        self.assertThat(apt_cache.__contains__.call_count, Equals(3))
+        apt_cache.clear.assert_not_called()
+
+
 class UbuntuTestCaseWithFakeAptCache(RepoBaseTestCase):
     def setUp(self):
         super().setUp()
@@ -376,6 +489,223 @@ class UbuntuTestCaseWithFakeAptCache(RepoBaseTestCase):
         )
 
 
+class FetchBinariesTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.apt = repo._deb._AptCache("amd64")
+        self.apt.progress = apt.progress.base.AcquireProgress()
+        os.mkdir("archive")
+        os.mkdir("download")
+
+    def _make_candidate(self, name, contents):
+        path = os.path.abspath(os.path.join("archive", "{}.deb".format(name)))
+        with open(path, "wb") as f:
+            f.write(contents)
+        candidate = MagicMock()
+        candidate.uri = "file://{}".format(path)
+        candidate.size = len(contents)
+        candidate._records.filename = "pool/main/{}.deb".format(name)
+        candidate._records.md5_hash = hashlib.md5(contents).hexdigest()
+        return candidate
+
+    def test_fetch_binaries(self):
+        candidates = [
+            self._make_candidate("package{}".format(i), "contents{}".format(i).encode())
+            for i in range(3)
+        ]
+
+        paths = self.apt.fetch_binaries(
+            package_candidates=candidates, destination="download"
+        )
+
+        self.assertThat(
+            paths,
+            Equals(
+                [os.path.abspath("download/package{}.deb".format(i)) for i in range(3)]
+            ),
+        )
+        for i, path in enumerate(paths):
+            with open(path, "rb") as f:
+                self.assertThat(f.read(), Equals("contents{}".format(i).encode()))
+
+    @patch("apt.package._file_is_same")
+    def test_fetch_binaries_skips_existing_files(self, mock_file_is_same):
+        mock_file_is_same.side_effect = lambda path, size, md5: path.endswith(
+            "existing.deb"
+        )
+        candidates = [
+            self._make_candidate("existing", b"contents"),
+            self._make_candidate("package", b"contents"),
+        ]
+        os.remove("archive/existing.deb")
+
+        paths = self.apt.fetch_binaries(
+            package_candidates=candidates, destination="download"
+        )
+
+        self.assertThat(
+            paths,
+            Equals(
+                [
+                    os.path.abspath("download/existing.deb"),
+                    os.path.abspath("download/package.deb"),
+                ]
+            ),
+        )
+        self.assertThat("download/existing.deb", Not(FileExists()))
+        self.assertThat("download/package.deb", FileExists())
+
+    def test_fetch_binaries_error(self):
+        candidates = [
+            self._make_candidate("package", b"contents"),
+            self._make_candidate("missing1", b"contents"),
+            self._make_candidate("missing2", b"contents"),
+        ]
+        os.remove("archive/missing1.deb")
+        os.remove("archive/missing2.deb")
+
+        raised = self.assertRaises(
+            apt.package.FetchError,
+            self.apt.fetch_binaries,
+            package_candidates=candidates,
+            destination="download",
+        )
+
+        self.assertThat(str(raised), Contains("'download/missing1.deb'"))
+        self.assertThat(str(raised), Contains("'download/missing2.deb'"))
+        self.assertThat(str(raised), Not(Contains("'download/package.deb'")))
+
+
+class UnpackTestCase(RepoBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.ubuntu = repo.Ubuntu(
+            self.tempdir, project_options=snapcraft.ProjectOptions()
+        )
+        self.downloaddir = os.path.join(self.tempdir, "download")
+        os.makedirs(self.downloaddir)
+        make_deb(
+            os.path.join(self.downloaddir, "foo_1.0-1_amd64.deb"),
+            [
+                ("./usr/bin/foo", tarfile.REGTYPE, b"#!/usr/bin/python3\n", 0o4755),
+                ("./usr/bin/foo-link", tarfile.SYMTYPE, "foo", 0o777),
+            ],
+        )
+        make_deb(
+            os.path.join(self.downloaddir, "bar_1%3a2.0_all.deb"),
+            [("./usr/share/bar", tarfile.REGTYPE, b"bar", 0o644)],
+        )
+
+        # Packages are cached as if reflinks were supported, their files are
+        # copied where they are not.
+        patcher = patch("snapcraft.file_utils.supports_reflinks", return_value=True)
+        self.supports_reflinks_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unpack_checks_out_cached_trees(self):
+        self.ubuntu.unpack("install1")
+
+        tree_cache = cache.AptStagePackageTreeCache()
+        foo_tree = tree_cache.get(name="foo", version="1.0-1", arch="amd64")
+        self.assertThat("install1/usr/share/bar", FileContains("bar"))
+        self.assertThat(os.stat("install1/usr/share/bar").st_nlink, Equals(1))
+        self.assertThat(os.readlink("install1/usr/bin/foo-link"), Equals("foo"))
+
+        # Normalizing does not change the cached trees.
+        self.assertThat(
+            "install1/usr/bin/foo", FileContains("#!/usr/bin/env python3\n")
+        )
+        self.assertThat(
+            stat.S_IMODE(os.stat("install1/usr/bin/foo").st_mode), Equals(0o755)
+        )
+        cached_foo = os.path.join(foo_tree, "usr/bin/foo")
+        self.assertThat(cached_foo, FileContains("#!/usr/bin/python3\n"))
+        self.assertThat(stat.S_IMODE(os.stat(cached_foo).st_mode), Equals(0o4755))
+
+    def test_unpack_cached_trees_again(self):
+        self.ubuntu.unpack("install1")
+
+        with patch(
+            "snapcraft.internal.repo._deb.extract_debs_by_package"
+        ) as mock_extract:
+            self.ubuntu.unpack("install2")
+
+        mock_extract.assert_not_called()
+        self.assertThat("install2/usr/share/bar", FileContains("bar"))
+        self.assertThat(
+            "install2/usr/bin/foo", FileContains("#!/usr/bin/env python3\n")
+        )
+
+    def test_unpacked_files_changed_in_place_do_not_change_the_cache(self):
+        self.ubuntu.unpack("install1")
+        with open("install1/usr/share/bar", "a") as f:
+            f.write("changed")
+        os.chmod("install1/usr/share/bar", 0o755)
+
+        self.ubuntu.unpack("install2")
+
+        self.assertThat("install2/usr/share/bar", FileContains("bar"))
+        self.assertThat(
+            stat.S_IMODE(os.stat("install2/usr/share/bar").st_mode), Equals(0o644)
+        )
+
+    def test_unpack_extracts_missing_packages_in_place(self):
+        with patch(
+            "snapcraft.internal.repo._deb._check_out_package_tree"
+        ) as mock_check_out:
+            self.ubuntu.unpack("install1")
+
+        mock_check_out.assert_not_called()
+        self.assertThat("install1/usr/share/bar", FileContains("bar"))
+        tree_cache = cache.AptStagePackageTreeCache()
+        bar_tree = tree_cache.get(name="bar", version="1:2.0", arch="all")
+        self.assertThat(os.path.join(bar_tree, "usr/share/bar"), FileContains("bar"))
+
+    def test_unpack_without_reflinks_does_not_cache(self):
+        self.supports_reflinks_mock.return_value = False
+
+        self.ubuntu.unpack("install1")
+
+        self.assertThat("install1/usr/share/bar", FileContains("bar"))
+        tree_cache = cache.AptStagePackageTreeCache()
+        self.assertThat(
+            tree_cache.get(name="bar", version="1:2.0", arch="all"), Equals(None)
+        )
+
+    def test_unpack_does_not_cache_files_shared_by_packages(self):
+        make_deb(
+            os.path.join(self.downloaddir, "baz_1.0_all.deb"),
+            [("./usr/share/bar", tarfile.REGTYPE, b"baz", 0o644)],
+        )
+
+        self.ubuntu.unpack("install1")
+
+        tree_cache = cache.AptStagePackageTreeCache()
+        self.assertThat(
+            tree_cache.get(name="bar", version="1:2.0", arch="all"), Equals(None)
+        )
+        self.assertThat(
+            tree_cache.get(name="baz", version="1.0", arch="all"), Equals(None)
+        )
+        self.assertThat(
+            tree_cache.get(name="foo", version="1.0-1", arch="amd64"),
+            Not(Equals(None)),
+        )
+
+    def test_unpack_package_with_unknown_name_is_not_cached(self):
+        make_deb(
+            os.path.join(self.downloaddir, "baz.deb"),
+            [("./usr/share/baz", tarfile.REGTYPE, b"baz", 0o644)],
+        )
+
+        self.ubuntu.unpack("install")
+
+        self.assertThat("install/usr/share/baz", FileContains("baz"))
+        self.assertThat(os.stat("install/usr/share/baz").st_nlink, Equals(1))
+
+
 class AutokeepTestCase(RepoBaseTestCase):
     def test_autokeep(self):
         self.fake_apt_cache = fixture_setup.FakeAptCache()
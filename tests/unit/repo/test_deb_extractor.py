@@ -0,0 +1,173 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import stat
+import tarfile
+from unittest import mock
+
+from testtools.matchers import Equals, FileContains
+
+from snapcraft.internal.repo import errors
+from snapcraft.internal.repo._deb_extractor import extract_debs
+from tests import unit
+from . import make_deb
+
+
+class ExtractDebsTestCase(unit.TestCase):
+
+    scenarios = (("serial", dict(workers=1)), ("parallel", dict(workers=2)))
+
+    def setUp(self):
+        super().setUp()
+
+        make_deb(
+            "package1.deb",
+            [
+                ("./usr", tarfile.DIRTYPE, None, 0o755),
+                ("./usr/bin", tarfile.DIRTYPE, None, 0o755),
+                ("./usr/bin/foo", tarfile.REGTYPE, b"foo", 0o4755),
+                ("./usr/bin/bar", tarfile.SYMTYPE, "foo", 0o777),
+                ("./usr/bin/baz", tarfile.LNKTYPE, "./usr/bin/foo", 0o755),
+            ],
+        )
+        make_deb(
+            "package2.deb",
+            [
+                ("./usr", tarfile.DIRTYPE, None, 0o755),
+                ("./usr/lib", tarfile.DIRTYPE, None, 0o755),
+                ("./usr/lib/libfoo.so", tarfile.REGTYPE, b"libfoo", 0o644),
+                ("./dev/null", tarfile.CHRTYPE, None, 0o666),
+                ("../outside", tarfile.REGTYPE, b"outside", 0o644),
+            ],
+            data_name="data.tar.gz",
+        )
+
+    def test_extract(self):
+        files = extract_debs(
+            ["package1.deb", "package2.deb"], "unpack", workers=self.workers
+        )
+
+        self.assertThat(
+            files,
+            Equals(
+                {
+                    "usr",
+                    "usr/bin",
+                    "usr/bin/foo",
+                    "usr/bin/bar",
+                    "usr/bin/baz",
+                    "usr/lib",
+                    "usr/lib/libfoo.so",
+                }
+            ),
+        )
+        self.assertThat("unpack/usr/bin/foo", FileContains("foo"))
+        self.assertThat(
+            stat.S_IMODE(os.stat("unpack/usr/bin/foo").st_mode), Equals(0o4755)
+        )
+        self.assertThat(os.readlink("unpack/usr/bin/bar"), Equals("foo"))
+        self.assertThat(
+            os.stat("unpack/usr/bin/baz").st_ino,
+            Equals(os.stat("unpack/usr/bin/foo").st_ino),
+        )
+        self.assertThat("unpack/usr/lib/libfoo.so", FileContains("libfoo"))
+        self.assertFalse(os.path.exists("unpack/dev/null"))
+        self.assertFalse(os.path.exists("outside"))
+
+    def test_extract_replaces_hard_links(self):
+        os.makedirs("unpack/usr/bin")
+        with open("cached-foo", "w") as f:
+            f.write("cached")
+        os.link("cached-foo", "unpack/usr/bin/foo")
+
+        extract_debs(["package1.deb"], "unpack", workers=self.workers)
+
+        self.assertThat("unpack/usr/bin/foo", FileContains("foo"))
+        self.assertThat("cached-foo", FileContains("cached"))
+
+    def test_extract_read_only_directories(self):
+        make_deb(
+            "package3.deb",
+            [
+                ("./etc", tarfile.DIRTYPE, None, 0o555),
+                ("./etc/foo", tarfile.DIRTYPE, None, 0o500),
+                ("./etc/foo/bar", tarfile.REGTYPE, b"bar", 0o444),
+            ],
+        )
+
+        extract_debs(["package3.deb"], "unpack", workers=self.workers)
+
+        self.assertThat("unpack/etc/foo/bar", FileContains("bar"))
+        self.assertThat(stat.S_IMODE(os.stat("unpack/etc").st_mode), Equals(0o555))
+        self.assertThat(stat.S_IMODE(os.stat("unpack/etc/foo").st_mode), Equals(0o500))
+
+    def test_extract_does_not_chmod_through_symlinks(self):
+        os.makedirs("unpack/usr/lib")
+        os.chmod("unpack/usr/lib", 0o755)
+        os.symlink("usr/lib", "unpack/lib")
+        make_deb(
+            "package3.deb",
+            [
+                ("./lib", tarfile.DIRTYPE, None, 0o700),
+                ("./lib/libbar.so", tarfile.REGTYPE, b"libbar", 0o644),
+            ],
+        )
+
+        extract_debs(["package3.deb"], "unpack", workers=self.workers)
+
+        self.assertThat("unpack/usr/lib/libbar.so", FileContains("libbar"))
+        self.assertThat(stat.S_IMODE(os.stat("unpack/usr/lib").st_mode), Equals(0o755))
+
+    @mock.patch("subprocess.check_call")
+    def test_unsupported_compression_uses_dpkg_deb(self, mock_check_call):
+        make_deb(
+            "package3.deb",
+            [("./usr", tarfile.DIRTYPE, None, 0o755)],
+            data_name="data.tar",
+        )
+        os.rename("package3.deb", "package3.deb.orig")
+        with open("package3.deb.orig", "rb") as f:
+            contents = f.read().replace(b"data.tar        ", b"data.tar.zst    ")
+        with open("package3.deb", "wb") as f:
+            f.write(contents)
+
+        files = extract_debs(
+            ["package1.deb", "package2.deb", "package3.deb"],
+            "unpack",
+            workers=self.workers,
+        )
+
+        self.assertThat(files, Equals(None))
+        mock_check_call.assert_called_once_with(
+            ["dpkg-deb", "--extract", "package3.deb", "unpack"]
+        )
+        self.assertThat("unpack/usr/bin/foo", FileContains("foo"))
+
+    def test_corrupt_package(self):
+        with open("package1.deb", "r+b") as f:
+            f.seek(-100, os.SEEK_END)
+            f.write(b"corrupt" * 10)
+
+        raised = self.assertRaises(
+            errors.UnpackError,
+            extract_debs,
+            ["package1.deb", "package2.deb"],
+            "unpack",
+            workers=self.workers,
+        )
+
+        self.assertThat(raised.package, Equals("package1.deb"))
@@ -52,10 +52,9 @@ class TestFileBase(unit.TestCase):
             file_src.source_dir, src=expected, clean_target=False
         )
 
-    @mock.patch("snapcraft.internal.sources._base.requests")
-    @mock.patch("snapcraft.internal.sources._base.download_requests_stream")
+    @mock.patch("snapcraft.internal.sources._base.download_ranges")
     @mock.patch("snapcraft.internal.sources._base.download_urllib_source")
-    def test_download_file_destination(self, dus, drs, req):
+    def test_download_file_destination(self, dus, dr):
         file_src = self.get_mock_file_base("http://snapcraft.io/snapcraft.yaml", "dir")
         self.assertFalse(hasattr(file_src, "file"))
 
@@ -78,21 +77,31 @@ class TestFileBase(unit.TestCase):
 
         self.assertThat(str(raised), Contains("Network request error"))
 
-    @mock.patch("snapcraft.internal.sources._base.download_requests_stream")
-    @mock.patch("snapcraft.internal.sources._base.requests")
-    def test_download_http(self, mock_requests, mock_download):
+    @mock.patch("snapcraft.internal.sources._base.download_ranges")
+    def test_download_http(self, mock_download):
         file_src = self.get_mock_file_base("http://snapcraft.io/snapcraft.yaml", "dir")
 
-        mock_request = mock.Mock()
-        mock_requests.get.return_value = mock_request
+        file_src.pull()
+
+        mock_download.assert_called_once_with(
+            file_src.source, file_src.file, algorithms=[]
+        )
+
+    @mock.patch("snapcraft.internal.sources._base.FileCache")
+    @mock.patch("snapcraft.internal.sources._base.verify_checksum")
+    @mock.patch("snapcraft.internal.sources._base.download_ranges")
+    def test_download_http_with_checksum(self, mock_download, mock_verify, mock_cache):
+        mock_cache().get.return_value = None
+        mock_verify.return_value = ("sha512", "digest")
+        file_src = self.get_mock_file_base("http://snapcraft.io/snapcraft.yaml", "dir")
+        file_src.source_checksum = "sha512/digest"
 
         file_src.pull()
 
-        mock_requests.get.assert_called_once_with(
-            file_src.source, stream=True, allow_redirects=True
+        mock_download.assert_called_once_with(
+            file_src.source, file_src.file, algorithms=["sha512"]
         )
-        mock_request.raise_for_status.assert_called_once_with()
-        mock_download.assert_called_once_with(mock_request, file_src.file)
+        mock_verify.assert_any_call("sha512/digest", file_src.file)
 
     @mock.patch("snapcraft.internal.sources._base.download_urllib_source")
     def test_download_ftp(self, mock_download):
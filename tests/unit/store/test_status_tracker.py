@@ -0,0 +1,203 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, timedelta, timezone
+import email.utils
+from unittest import mock
+
+import requests
+from testtools.matchers import Equals, GreaterThan, IsInstance, LessThan
+
+from snapcraft.storeapi import _status_tracker, errors
+from tests import unit
+
+_PROCESSING = {"code": "being_processed", "processed": False}
+_READY = {"code": "ready_to_release", "processed": True}
+_REVIEW = {"code": "need_manual_review", "processed": True}
+
+
+def _response(content=None, *, status_code=200, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response.json = mock.Mock(return_value=content)
+    return response
+
+
+class StatusTrackerTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = mock.Mock(requests.Session)
+
+        patcher = mock.patch(
+            "snapcraft.storeapi._status_tracker.ProgressBar",
+            new=unit.SilentProgressBar,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Tests do not wait between polls, unless told to by the server.
+        patcher = mock.patch(
+            "snapcraft.storeapi.constants.SCAN_STATUS_POLL_DELAY", new=0
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch("random.uniform", side_effect=lambda a, b: b)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_track(self):
+        self.session.get.side_effect = [_response(_PROCESSING), _response(_READY)]
+        tracker = _status_tracker.StatusTracker("http://status", session=self.session)
+
+        self.assertThat(tracker.track(), Equals(_READY))
+        self.session.get.assert_has_calls([mock.call("http://status")] * 2)
+        # This should not raise
+        tracker.raise_for_code()
+
+    def test_track_review(self):
+        self.session.get.return_value = _response(_REVIEW)
+        tracker = _status_tracker.StatusTracker("http://status", session=self.session)
+
+        self.assertThat(tracker.track(), Equals(_REVIEW))
+        self.assertRaises(errors.StoreReviewError, tracker.raise_for_code)
+
+    def test_track_with_connection_errors(self):
+        self.session.get.side_effect = [
+            requests.ConnectionError(),
+            _response(status_code=503),
+            _response(_READY),
+        ]
+        tracker = _status_tracker.StatusTracker("http://status", session=self.session)
+
+        self.assertThat(tracker.track(), Equals(_READY))
+
+    def test_track_too_many_connection_errors(self):
+        self.session.get.side_effect = requests.ConnectionError()
+        tracker = _status_tracker.StatusTracker("http://status", session=self.session)
+
+        self.assertRaises(requests.ConnectionError, tracker.track)
+        self.assertThat(self.session.get.call_count, Equals(11))
+
+    def test_track_client_error(self):
+        self.session.get.return_value = _response(status_code=404)
+        tracker = _status_tracker.StatusTracker("http://status", session=self.session)
+
+        self.assertRaises(requests.HTTPError, tracker.track)
+        self.session.get.assert_called_once_with("http://status")
+
+    def test_track_all(self):
+        responses = {
+            "http://status/1": iter([_response(_PROCESSING), _response(_READY)]),
+            "http://status/2": iter([_response(_REVIEW)]),
+        }
+        self.session.get.side_effect = lambda url: next(responses[url])
+        trackers = [
+            _status_tracker.StatusTracker(url, session=self.session)
+            for url in sorted(responses)
+        ]
+
+        self.assertThat(_status_tracker.track_all(trackers), Equals([_READY, _REVIEW]))
+        self.assertThat(self.session.get.call_count, Equals(3))
+
+    def test_track_all_returns_exceptions(self):
+        responses = {
+            "http://status/1": iter([_response(_PROCESSING), _response(_READY)]),
+            "http://status/2": iter([_response(status_code=404)]),
+        }
+        self.session.get.side_effect = lambda url: next(responses[url])
+        trackers = [
+            _status_tracker.StatusTracker(url, session=self.session)
+            for url in sorted(responses)
+        ]
+
+        ready, error = _status_tracker.track_all(trackers, return_exceptions=True)
+
+        self.assertThat(ready, Equals(_READY))
+        self.assertThat(error, IsInstance(requests.HTTPError))
+        self.assertThat(self.session.get.call_count, Equals(3))
+
+
+class PollDelayTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = mock.Mock(requests.Session)
+        self.tracker = _status_tracker.StatusTracker(
+            "http://status", session=self.session
+        )
+
+    def test_exponential_backoff(self):
+        self.session.get.return_value = _response(_PROCESSING)
+
+        with mock.patch("random.uniform", side_effect=lambda a, b: b):
+            delays = [self.tracker._poll()[1] for _ in range(7)]
+
+        self.assertThat(delays, Equals([5, 7.5, 11.25, 16.875, 25.3125, 30, 30]))
+
+    def test_jitter(self):
+        self.session.get.return_value = _response(_PROCESSING)
+
+        with mock.patch("random.uniform", return_value=3) as uniform_mock:
+            content, delay = self.tracker._poll()
+
+        self.assertThat(content, Equals(_PROCESSING))
+        self.assertThat(delay, Equals(3))
+        uniform_mock.assert_called_once_with(2.5, 5)
+
+    def test_retry_after_seconds(self):
+        self.session.get.return_value = _response(
+            status_code=429, headers={"Retry-After": "120"}
+        )
+
+        content, delay = self.tracker._poll()
+
+        self.assertThat(content, Equals(_PROCESSING))
+        self.assertThat(delay, Equals(120))
+
+    def test_retry_after_date(self):
+        date = datetime.now(timezone.utc) + timedelta(seconds=60)
+        self.session.get.return_value = _response(
+            _PROCESSING,
+            headers={"Retry-After": email.utils.format_datetime(date, usegmt=True)},
+        )
+
+        delay = self.tracker._poll()[1]
+
+        self.assertThat(delay, GreaterThan(50))
+        self.assertThat(delay, LessThan(61))
+
+    def test_invalid_retry_after_is_ignored(self):
+        self.session.get.return_value = _response(
+            _PROCESSING, headers={"Retry-After": "soon"}
+        )
+
+        with mock.patch("random.uniform", side_effect=lambda a, b: b):
+            delay = self.tracker._poll()[1]
+
+        self.assertThat(delay, Equals(5))
+
+    def test_shared_session(self):
+        tracker = _status_tracker.StatusTracker("http://status")
+
+        with mock.patch("requests.Session.get") as get_mock:
+            get_mock.return_value = _response(_READY)
+            tracker._poll()
+
+        self.assertThat(
+            _status_tracker._get_session(), Equals(_status_tracker._get_session())
+        )
+        get_mock.assert_called_once_with("http://status")
@@ -164,6 +164,40 @@ class LoginTestCase(StoreTestCase):
         self.assertTrue(config.Config().is_empty())
 
 
+class RefreshMacaroonTestCase(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.conf.set("unbound_discharge", "old")
+        patcher = mock.patch.object(
+            self.client.sso, "refresh_unbound_discharge", return_value="new"
+        )
+        self.mock_refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_refresh(self):
+        request = mock.Mock(
+            side_effect=[errors.StoreMacaroonNeedsRefreshError(), "response"]
+        )
+
+        self.assertThat(self.client._refresh_if_necessary(request), Equals("response"))
+        self.mock_refresh.assert_called_once_with("old")
+        self.assertThat(self.client.conf.get("unbound_discharge"), Equals("new"))
+
+    def test_refreshed_by_another_request(self):
+        def refreshed_meanwhile():
+            self.client.conf.set("unbound_discharge", "new")
+            raise errors.StoreMacaroonNeedsRefreshError()
+
+        request = mock.Mock()
+        request.side_effect = lambda: (
+            refreshed_meanwhile() if request.call_count == 1 else "response"
+        )
+
+        self.assertThat(self.client._refresh_if_necessary(request), Equals("response"))
+        self.mock_refresh.assert_not_called()
+        self.assertThat(request.call_count, Equals(2))
+
+
 class DownloadTestCase(StoreTestCase):
 
     # sha512 of tests/data/test-snap.snap
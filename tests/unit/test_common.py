@@ -15,7 +15,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import threading
 
+import fixtures
 from testtools.matchers import Equals
 
 from snapcraft.internal import common, errors
@@ -36,6 +38,37 @@ class CommonTestCase(unit.TestCase):
         self.assertFalse(common.isurl("/fo:o"))
 
 
+class RunTestCase(unit.TestCase):
+    def test_run_prefixes_output(self):
+        fake_stdout = self.useFixture(fixtures.StringStream("stdout"))
+        self.useFixture(fixtures.MonkeyPatch("sys.stdout", fake_stdout.stream))
+        common.set_output_prefix("part1: ")
+        self.addCleanup(common.set_output_prefix, None)
+
+        common.run(["/bin/sh", "-c", "echo first; echo second >&2"])
+
+        fake_stdout.stream.flush()
+        self.assertThat(
+            fake_stdout.getDetails()["stdout"].as_text(),
+            Equals("part1: first\npart1: second\n"),
+        )
+
+    def test_env_set_in_thread_is_not_shared(self):
+        common.set_env(["FOO=main"])
+        thread_env = []
+
+        def _set_thread_env():
+            common.set_env(["FOO=thread"])
+            thread_env.extend(common.get_env())
+
+        thread = threading.Thread(target=_set_thread_env)
+        thread.start()
+        thread.join()
+
+        self.assertThat(thread_env, Equals(["FOO=thread"]))
+        self.assertThat(common.get_env(), Equals(["FOO=main"]))
+
+
 class CommonMigratedTestCase(unit.TestCase):
     def test_parallel_build_count_migration_message(self):
         raised = self.assertRaises(
@@ -0,0 +1,138 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import stat
+from unittest import mock
+
+from testtools.matchers import Equals, Not
+
+import tests
+from snapcraft.internal import deltas, squashfs
+from tests import unit
+
+
+class SnapManifestTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.snap_path = os.path.join(
+            os.path.dirname(tests.__file__), "data", "test-snap-with-icon.snap"
+        )
+
+    def test_get_snap_manifest(self):
+        with squashfs.SquashFS(self.snap_path) as snap:
+            snap_yaml = snap.read("meta/snap.yaml")
+            icon = snap.read("meta/gui/icon.svg")
+
+        manifest = deltas.get_snap_manifest(self.snap_path)
+
+        self.assertThat(
+            sorted(manifest), Equals(["meta/gui/icon.svg", "meta/snap.yaml"])
+        )
+        self.assertThat(manifest["meta/snap.yaml"][0], Equals(len(snap_yaml)))
+        self.assertThat(manifest["meta/gui/icon.svg"][0], Equals(len(icon)))
+
+    def test_get_snap_manifest_does_not_read_contents(self):
+        with mock.patch(
+            "snapcraft.internal.squashfs.SquashFS.open"
+        ) as open_mock, mock.patch(
+            "snapcraft.internal.squashfs.SquashFS._read_data_block"
+        ) as read_data_block_mock:
+            deltas.get_snap_manifest(self.snap_path)
+
+        open_mock.assert_not_called()
+        read_data_block_mock.assert_not_called()
+
+    def test_get_snap_manifest_identifies_contents(self):
+        entries = [
+            squashfs.SquashFSEntry("a", stat.S_IFREG, 300000, None, (1000, 2000)),
+            squashfs.SquashFSEntry("b", stat.S_IFREG, 300000, None, (1000, 2000)),
+            squashfs.SquashFSEntry("c", stat.S_IFREG, 300000, None, (1000, 2001)),
+            squashfs.SquashFSEntry("d", stat.S_IFREG, 10, None, ()),
+            squashfs.SquashFSEntry("e", stat.S_IFREG, 10, None, ()),
+            squashfs.SquashFSEntry("f", stat.S_IFDIR, 0, None, ()),
+        ]
+
+        with mock.patch(
+            "snapcraft.internal.squashfs.SquashFS.walk", return_value=entries
+        ):
+            manifest = deltas.get_snap_manifest(self.snap_path)
+
+        self.assertThat(sorted(manifest), Equals(["a", "b", "c", "d", "e"]))
+        self.assertThat(manifest["a"], Equals(manifest["b"]))
+        self.assertThat(manifest["a"][1], Not(Equals(manifest["c"][1])))
+        # Files in fragments only match at the same path.
+        self.assertThat(manifest["d"][1], Not(Equals(manifest["e"][1])))
+
+
+class DeltaEstimateTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source_manifest = {
+            "bin/foo": [600, "foo"],
+            "lib/libbar.so": [300, "bar"],
+            "meta/snap.yaml": [100, "yaml-1"],
+        }
+
+    def test_overlap(self):
+        target_manifest = {
+            "bin/foo": [600, "foo"],
+            "lib/libbar.so": [350, "bar-2"],
+            "meta/snap.yaml": [100, "yaml-2"],
+        }
+
+        self.assertThat(
+            deltas.get_manifest_overlap(
+                source_manifest=self.source_manifest, target_manifest=target_manifest
+            ),
+            Equals(600),
+        )
+
+    def test_moved_files_overlap(self):
+        target_manifest = {"usr/bin/foo": [600, "foo"], "meta/snap.yaml": [10, "new"]}
+
+        self.assertThat(
+            deltas.get_manifest_overlap(
+                source_manifest=self.source_manifest, target_manifest=target_manifest
+            ),
+            Equals(600),
+        )
+
+    def test_estimate_delta_size(self):
+        target_manifest = {
+            "bin/foo": [600, "foo"],
+            "lib/libbar.so": [300, "bar-2"],
+            "meta/snap.yaml": [100, "yaml-2"],
+        }
+
+        self.assertThat(
+            deltas.estimate_delta_size(
+                source_manifest=self.source_manifest,
+                target_manifest=target_manifest,
+                target_size=500,
+            ),
+            Equals(200),
+        )
+
+    def test_estimate_delta_size_of_empty_snap(self):
+        self.assertThat(
+            deltas.estimate_delta_size(
+                source_manifest=self.source_manifest,
+                target_manifest={},
+                target_size=4096,
+            ),
+            Equals(4096),
+        )
@@ -13,6 +13,7 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import elftools.common.exceptions
 import fixtures
 import logging
 import os
@@ -201,6 +202,175 @@ class TestGetLibraries(TestElfBase):
         )
 
 
+class TestDependencyResolver(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.arch = ("ELFCLASS64", "ELFDATA2LSB", "EM_X86_64")
+        self.elf_data = dict()
+
+        def _fake_extract(elf_file, path):
+            return self.elf_data[os.path.normpath(path)]
+
+        patcher = mock.patch.object(elf.ElfFile, "_extract", new=_fake_extract)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.system_path = os.path.join(self.path, "system")
+        self.resolver = elf.DependencyResolver(
+            root_path=self.path, system_library_paths=[self.system_path]
+        )
+
+    def _make_elf(self, path, *, needed=None, rpath=None, runpath=None, arch=None):
+        path = os.path.join(self.path, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"\x7fELF" + path.encode())
+        self.elf_data[path] = (
+            arch if arch else self.arch,
+            "",
+            "",
+            {n: elf.NeededLibrary(name=n) for n in needed or []},
+            False,
+            rpath or [],
+            runpath or [],
+        )
+        return path
+
+    def test_resolve_from_rpath_with_origin(self):
+        app = self._make_elf(
+            "bin/app", needed=["libfoo.so.1"], rpath=["$ORIGIN/../lib"]
+        )
+        self._make_elf("lib/libfoo.so.1")
+        self._make_elf("system/libfoo.so.1")
+
+        # Like the dynamic linker, the path is used as it was expanded.
+        self.assertThat(
+            self.resolver.resolve(elf.ElfFile(path=app)),
+            Equals({"libfoo.so.1": os.path.join(self.path, "bin/../lib/libfoo.so.1")}),
+        )
+
+    def test_runpath_disables_rpath(self):
+        app = self._make_elf(
+            "bin/app",
+            needed=["libfoo.so.1"],
+            rpath=["$ORIGIN/rpath"],
+            runpath=["$ORIGIN/runpath"],
+        )
+        self._make_elf("bin/rpath/libfoo.so.1")
+        libfoo = self._make_elf("bin/runpath/libfoo.so.1")
+
+        self.assertThat(
+            self.resolver.resolve(elf.ElfFile(path=app)),
+            Equals({"libfoo.so.1": libfoo}),
+        )
+
+    def test_resolve_dependencies_of_dependencies(self):
+        app = self._make_elf("bin/app", needed=["libfoo.so.1"])
+        libfoo = self._make_elf("system/libfoo.so.1", needed=["libbar.so.1"])
+        libbar = self._make_elf("system/libbar.so.1")
+
+        self.assertThat(
+            self.resolver.resolve(elf.ElfFile(path=app)),
+            Equals({"libfoo.so.1": libfoo, "libbar.so.1": libbar}),
+        )
+
+    def test_resolve_from_root_library_paths(self):
+        app = self._make_elf("bin/app", needed=["libfoo.so.1"])
+        libfoo = self._make_elf("usr/lib/x86_64-linux-gnu/libfoo.so.1")
+        resolver = elf.DependencyResolver(
+            root_path=self.path, system_library_paths=[self.system_path]
+        )
+
+        self.assertThat(
+            resolver.resolve(elf.ElfFile(path=app)), Equals({"libfoo.so.1": libfoo})
+        )
+
+    def test_libraries_for_other_architectures_are_skipped(self):
+        app = self._make_elf("bin/app", needed=["libfoo.so.1"], rpath=["$ORIGIN"])
+        self._make_elf("bin/libfoo.so.1", arch=("ELFCLASS32", "ELFDATA2LSB", "EM_ARM"))
+        libfoo = self._make_elf("system/libfoo.so.1")
+
+        self.assertThat(
+            self.resolver.resolve(elf.ElfFile(path=app)),
+            Equals({"libfoo.so.1": libfoo}),
+        )
+
+    def test_unresolved_sonames_have_no_path(self):
+        app = self._make_elf("bin/app", needed=["libmissing.so.1"])
+
+        self.assertThat(
+            self.resolver.resolve(elf.ElfFile(path=app)),
+            Equals({"libmissing.so.1": ""}),
+        )
+
+    def test_dynamic_linker_is_skipped(self):
+        app = self._make_elf("bin/app", needed=["libc.so.6"])
+        libc = self._make_elf("system/libc.so.6", needed=["ld-linux-x86-64.so.2"])
+        self._make_elf("system/ld-linux-x86-64.so.2")
+
+        self.assertThat(
+            self.resolver.resolve(elf.ElfFile(path=app)), Equals({"libc.so.6": libc})
+        )
+
+    def test_load_dependencies_with_resolver(self):
+        app = self._make_elf("bin/app", needed=["libfoo.so.1"], rpath=["$ORIGIN"])
+        libfoo = self._make_elf("bin/libfoo.so.1")
+
+        with mock.patch("snapcraft.internal.common.run_output") as mock_run_output:
+            libs = elf.ElfFile(path=app).load_dependencies(
+                root_path=self.path,
+                core_base_path="/snap/core18/current",
+                resolver=self.resolver,
+            )
+
+        mock_run_output.assert_not_called()
+        self.assertThat(libs, Equals({libfoo}))
+
+    def test_load_dependencies_falls_back_to_ldd(self):
+        app = self._make_elf("bin/app", needed=["libfoo.so.1"])
+
+        with mock.patch.object(
+            self.resolver,
+            "resolve",
+            side_effect=elftools.common.exceptions.ELFError("bad"),
+        ):
+            with mock.patch(
+                "snapcraft.internal.common.run_output",
+                return_value="libfoo.so.1 => /lib/libfoo.so.1 (0x00007fb3bef03000)",
+            ) as mock_run_output:
+                elf_file = elf.ElfFile(path=app)
+                elf_file.load_dependencies(
+                    root_path=self.path,
+                    core_base_path="/snap/core18/current",
+                    resolver=self.resolver,
+                )
+
+        mock_run_output.assert_called_once_with(["ldd", app])
+        self.assertThat(
+            [d.soname for d in elf_file.dependencies], Equals(["libfoo.so.1"])
+        )
+
+
+class TestReadLdSoConf(unit.TestCase):
+    def test_read_ld_so_conf_with_includes(self):
+        os.mkdir("ld.so.conf.d")
+        with open("ld.so.conf", "w") as f:
+            f.write("# comment\ninclude ld.so.conf.d/*.conf\n/opt/lib\n")
+        with open(os.path.join("ld.so.conf.d", "b.conf"), "w") as f:
+            f.write("/usr/lib/b\n")
+        with open(os.path.join("ld.so.conf.d", "a.conf"), "w") as f:
+            f.write("/usr/lib/a:/usr/local/lib/a # comment\n")
+
+        self.assertThat(
+            elf._read_ld_so_conf(os.path.abspath("ld.so.conf")),
+            Equals(["/usr/lib/a", "/usr/local/lib/a", "/usr/lib/b", "/opt/lib"]),
+        )
+
+    def test_read_missing_ld_so_conf(self):
+        self.assertThat(elf._read_ld_so_conf("missing.conf"), Equals([]))
+
+
 class TestGetElfFiles(TestElfBase):
     def test_get_elf_files(self):
         elf_files = elf.get_elf_files(self.fake_elf.root_path, {"fake_elf-2.23"})
@@ -209,6 +379,38 @@ class TestGetElfFiles(TestElfBase):
         elf_file = set(elf_files).pop()
         self.assertThat(elf_file.interp, Equals("/lib64/ld-linux-x86-64.so.2"))
 
+    def test_get_elf_files_uses_cache(self):
+        elf.get_elf_files(self.fake_elf.root_path, {"fake_elf-2.23"})
+
+        with mock.patch.object(elf.ElfFile, "_extract") as mock_extract:
+            elf_files = elf.get_elf_files(self.fake_elf.root_path, {"fake_elf-2.23"})
+
+        mock_extract.assert_not_called()
+        elf_file = set(elf_files).pop()
+        self.assertThat(elf_file.interp, Equals("/lib64/ld-linux-x86-64.so.2"))
+        self.assertThat(elf_file.needed["libc.so.6"].versions, Contains("GLIBC_2.23"))
+
+    def test_get_elf_files_with_workers(self):
+        file_list = {
+            "fake_elf-2.23",
+            "fake_elf-2.26",
+            "fake_elf-1.1",
+            "fake_elf-static",
+        }
+
+        elf_files = elf.get_elf_files(self.fake_elf.root_path, file_list, workers=2)
+
+        self.assertThat(
+            sorted((e.path, e.get_required_glibc()) for e in elf_files),
+            Equals(
+                [
+                    (os.path.join(self.fake_elf.root_path, "fake_elf-1.1"), "1.1"),
+                    (os.path.join(self.fake_elf.root_path, "fake_elf-2.23"), "2.23"),
+                    (os.path.join(self.fake_elf.root_path, "fake_elf-2.26"), "2.26"),
+                ]
+            ),
+        )
+
     def test_skip_object_files(self):
         open(os.path.join(self.fake_elf.root_path, "object_file.o"), "w").close()
 
@@ -804,6 +804,16 @@ class ErrorFormattingTestCase(unit.TestCase):
                 "expected_message": ("Unable to parse mountinfo row: [1, 2, 3]"),
             },
         ),
+        (
+            "InvalidSquashFSError",
+            {
+                "exception": errors.InvalidSquashFSError,
+                "kwargs": {"path": "test.snap", "message": "not a squashfs image"},
+                "expected_message": (
+                    "Cannot read squashfs image 'test.snap': not a squashfs image."
+                ),
+            },
+        ),
         (
             "InvalidStepError",
             {
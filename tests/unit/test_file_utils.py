@@ -14,8 +14,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
 import os
 import re
+import stat
 import subprocess
 from unittest import mock
 
@@ -29,6 +31,7 @@ from snapcraft.internal.errors import (
     RequiredCommandFailure,
     RequiredCommandNotFound,
     RequiredPathDoesNotExist,
+    SnapcraftCopyFileNotFoundError,
     SnapcraftEnvironmentError,
     SnapcraftError,
 )
@@ -101,6 +104,90 @@ class ReplaceInFileTestCase(unit.TestCase):
             self.assertThat(f.read(), Equals(file_info["expected"]))
 
 
+class CalculateDigestsTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        with open("file", "wb") as f:
+            f.write(b"content")
+
+        patcher = mock.patch(
+            "snapcraft.file_utils._calculate_hashes",
+            wraps=file_utils._calculate_hashes,
+        )
+        self.calculate_hashes_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_calculate_digests(self):
+        digests = file_utils.calculate_digests("file")
+
+        self.assertThat(
+            digests,
+            Equals(
+                {
+                    "sha3_384": hashlib.sha3_384(b"content").hexdigest(),
+                    "sha512": hashlib.sha512(b"content").hexdigest(),
+                    "sha256": hashlib.sha256(b"content").hexdigest(),
+                }
+            ),
+        )
+        self.calculate_hashes_mock.assert_called_once_with(
+            "file", algorithms={"sha3_384", "sha512", "sha256"}
+        )
+
+    def test_only_the_algorithms_asked_for_are_calculated(self):
+        digests = file_utils.calculate_digests("file", algorithms=["sha512"])
+
+        self.assertThat(list(digests), Equals(["sha512"]))
+        self.calculate_hashes_mock.assert_called_once_with(
+            "file", algorithms={"sha512"}
+        )
+
+    def test_digests_are_memoized(self):
+        sha512 = file_utils.calculate_digests(
+            "file", algorithms=["sha512", "sha3_384"]
+        )["sha512"]
+        sha3_384 = file_utils.calculate_sha3_384(os.path.abspath("file"))
+
+        self.assertThat(sha512, Equals(hashlib.sha512(b"content").hexdigest()))
+        self.assertThat(sha3_384, Equals(hashlib.sha3_384(b"content").hexdigest()))
+        self.assertThat(self.calculate_hashes_mock.call_count, Equals(1))
+
+    def test_other_algorithms_are_calculated_once(self):
+        file_utils.calculate_digests("file")
+        md5 = file_utils.calculate_digests("file", algorithms=["md5", "sha256"])
+        file_utils.calculate_digests("file", algorithms=["md5"])
+
+        self.assertThat(md5["md5"], Equals(hashlib.md5(b"content").hexdigest()))
+        self.assertThat(self.calculate_hashes_mock.call_count, Equals(2))
+        self.calculate_hashes_mock.assert_called_with("file", algorithms={"md5"})
+
+    def test_modified_file_is_read_again(self):
+        file_utils.calculate_digests("file")
+        with open("file", "wb") as f:
+            f.write(b"new content")
+
+        digests = file_utils.calculate_digests("file")
+
+        self.assertThat(
+            digests["sha256"], Equals(hashlib.sha256(b"new content").hexdigest())
+        )
+        self.assertThat(self.calculate_hashes_mock.call_count, Equals(2))
+
+    def test_only_the_digests_used_last_are_kept(self):
+        self.useFixture(
+            fixtures.MockPatch("snapcraft.file_utils._MAX_MEMOIZED_DIGESTS", 2)
+        )
+        for name in ("file1", "file2"):
+            with open(name, "wb") as f:
+                f.write(b"content")
+
+        for name in ("file", "file1", "file", "file2", "file", "file1"):
+            file_utils.calculate_digests(name, algorithms=["sha256"])
+
+        # file1 was dropped when file2 was added.
+        self.assertThat(self.calculate_hashes_mock.call_count, Equals(4))
+
+
 class TestLinkOrCopyTree(unit.TestCase):
     def setUp(self):
         super().setUp()
@@ -190,6 +277,106 @@ class TestLinkOrCopy(unit.TestCase):
         self.assertTrue(os.path.isfile("foo2/bar/baz/4"))
 
 
+class CloneFileTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        with open("source", "wb") as f:
+            f.write(b"content" * 1000)
+
+        # Reflinks are not supported by the filesystem of every test run.
+        patcher = mock.patch("snapcraft.file_utils._reflink", return_value=False)
+        self.reflink_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_copied(self, destination):
+        with open(destination, "rb") as f:
+            self.assertThat(f.read(), Equals(b"content" * 1000))
+        self.assertFalse(os.path.samefile("source", destination))
+
+    def test_clone_file(self):
+        file_utils.clone_file("source", "destination")
+
+        self.assert_copied("destination")
+
+    def test_clone_file_replaces_destination(self):
+        with open("destination", "wb") as f:
+            f.write(b"previous content that is longer than the new one" * 1000)
+
+        file_utils.clone_file("source", "destination")
+
+        self.assert_copied("destination")
+
+    def test_clone_file_without_copy_file_range(self):
+        with mock.patch(
+            "snapcraft.file_utils._copy_file_range", side_effect=OSError()
+        ) as copy_file_range_mock:
+            file_utils.clone_file("source", "destination")
+
+        copy_file_range_mock.assert_called_once_with(mock.ANY, mock.ANY, 7000)
+        self.assert_copied("destination")
+
+    def test_clone_file_without_kernel_copies(self):
+        with mock.patch(
+            "snapcraft.file_utils._copy_file_range", side_effect=OSError()
+        ), mock.patch("snapcraft.file_utils._sendfile", side_effect=OSError()):
+            file_utils.clone_file("source", "destination")
+
+        self.assert_copied("destination")
+
+    def test_clone_file_reflink(self):
+        self.reflink_mock.return_value = True
+
+        with mock.patch(
+            "snapcraft.file_utils._copy_file_contents"
+        ) as copy_file_contents_mock:
+            file_utils.clone_file("source", "destination")
+
+        copy_file_contents_mock.assert_not_called()
+        self.assertTrue(os.path.isfile("destination"))
+
+    def test_clone_file_error_leaves_nothing_behind(self):
+        with mock.patch(
+            "snapcraft.file_utils._copy_file_contents", side_effect=OSError()
+        ):
+            self.assertRaises(OSError, file_utils.clone_file, "source", "destination")
+
+        self.assertThat(os.listdir(), Equals(["source"]))
+
+    def test_clone_keeps_mode(self):
+        os.chmod("source", 0o754)
+
+        file_utils.clone("source", "destination")
+
+        self.assert_copied("destination")
+        self.assertThat(stat.S_IMODE(os.stat("destination").st_mode), Equals(0o754))
+
+    def test_clone_keeps_setuid(self):
+        os.chmod("source", 0o4755)
+
+        file_utils.clone("source", "destination")
+
+        self.assertThat(stat.S_IMODE(os.stat("destination").st_mode), Equals(0o4755))
+
+    def test_supports_reflinks(self):
+        os.mkdir("directory")
+
+        self.assertThat(file_utils.supports_reflinks(".", "directory"), Equals(False))
+        self.reflink_mock.return_value = True
+        self.assertThat(file_utils.supports_reflinks(".", "directory"), Equals(True))
+
+    def test_clone_symlink(self):
+        os.symlink("source", "source-link")
+
+        file_utils.clone("source-link", "destination")
+
+        self.assertThat(os.readlink("destination"), Equals("source"))
+
+    def test_clone_missing_source(self):
+        self.assertRaises(
+            SnapcraftCopyFileNotFoundError, file_utils.clone, "missing", "destination",
+        )
+
+
 class ExecutableExistsTestCase(unit.TestCase):
     def test_file_does_not_exist(self):
         workdir = self.useFixture(fixtures.TempDir()).path
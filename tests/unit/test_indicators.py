@@ -15,15 +15,20 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import fixtures
+import hashlib
+import json
 import os
 import progressbar
 import requests
+import threading
+from unittest import mock
 from unittest.mock import patch
 
-from testtools.matchers import Equals
+from testtools.matchers import Equals, FileExists
 
+from snapcraft import file_utils
 from snapcraft.internal import indicators
-from tests import unit
+from tests import fake_servers, unit
 
 
 class DumbTerminalTests(unit.TestCase):
@@ -100,3 +105,217 @@ class IndicatorsDownloadTests(unit.FakeFileHTTPServerBasedTestCase):
         indicators.download_urllib_source(self.source, self.dest_file)
 
         self.assertTrue(os.path.exists(self.dest_file))
+
+
+class ThrottledProgressBarTests(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.progress_bar = mock.Mock()
+        self.throttled_progress_bar = indicators._ThrottledProgressBar(
+            self.progress_bar
+        )
+
+        patcher = patch("time.monotonic")
+        self.monotonic_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_updates_are_rate_limited(self):
+        self.monotonic_mock.side_effect = [10.0, 10.05, 10.09, 10.2, 10.25]
+        for value in range(5):
+            self.throttled_progress_bar.update(value)
+
+        self.assertThat(
+            self.progress_bar.update.call_args_list,
+            Equals([mock.call(0), mock.call(3)]),
+        )
+
+    def test_finish_shows_last_value(self):
+        self.monotonic_mock.side_effect = [10.0, 10.05]
+        self.throttled_progress_bar.update(1)
+        self.throttled_progress_bar.update(2)
+        self.throttled_progress_bar.finish()
+
+        self.assertThat(
+            self.progress_bar.update.call_args_list,
+            Equals([mock.call(1), mock.call(2)]),
+        )
+        self.progress_bar.finish.assert_called_once_with()
+
+    def test_chunk_size(self):
+        self.assertThat(indicators._get_chunk_size(0), Equals(64 * 1024))
+        self.assertThat(indicators._get_chunk_size(50 * 1024 * 1024), Equals(524288))
+        self.assertThat(indicators._get_chunk_size(2 ** 30), Equals(1024 * 1024))
+
+
+class DownloadRangesTests(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.useFixture(fixtures.EnvironmentVariable("no_proxy", "localhost,127.0.0.1"))
+        self.contents = os.urandom(10000)
+        self.server = fake_servers.FakeRangeFileHTTPServer(
+            ("127.0.0.1", 0), self.contents
+        )
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        self.addCleanup(server_thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        server_thread.start()
+        self.source = "http://{}:{}/file".format(*self.server.server_address)
+
+        for name, value in (
+            ("_MIN_SEGMENT_SIZE", 1000),
+            ("_BUFFER_SIZE", 500),
+            ("_SEGMENT_RETRIES", 2),
+        ):
+            patcher = patch.object(indicators, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("snapcraft.internal.indicators.time.sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_downloaded(self):
+        with open("file", "rb") as f:
+            self.assertThat(f.read(), Equals(self.contents))
+        self.assertFalse(os.path.exists(indicators._get_state_path("file")))
+
+    def test_download_in_segments(self):
+        indicators.download_ranges(self.source, "file", segments=4)
+
+        self.assert_downloaded()
+        self.assertThat(
+            sorted(self.server.requested_ranges),
+            Equals([(0, 0), (0, 2499), (2500, 4999), (5000, 7499), (7500, 9999)]),
+        )
+
+    def test_small_files_are_not_split(self):
+        self.contents = self.contents[:1500]
+        self.server.contents = self.contents
+
+        indicators.download_ranges(self.source, "file", segments=4)
+
+        self.assert_downloaded()
+        self.assertThat(
+            sorted(self.server.requested_ranges), Equals([(0, 0), (0, 1499)])
+        )
+
+    def test_download_without_ranges(self):
+        self.server.supports_ranges = False
+
+        indicators.download_ranges(self.source, "file")
+
+        self.assert_downloaded()
+
+    def test_segments_are_resumed(self):
+        self.server.truncated_responses = 2
+
+        indicators.download_ranges(self.source, "file", segments=2)
+
+        self.assert_downloaded()
+        # The segments were requested again from where they stopped.
+        self.assertThat(
+            sorted(self.server.requested_ranges),
+            Equals([(0, 0), (0, 4999), (2500, 4999), (5000, 9999), (7500, 9999)]),
+        )
+
+    def test_failed_download_is_resumed(self):
+        self.server.truncated_responses = 3
+        self.assertRaises(
+            requests.exceptions.ChunkedEncodingError,
+            indicators.download_ranges,
+            self.source,
+            "file",
+            segments=1,
+        )
+        self.assertThat(indicators._get_state_path("file"), FileExists())
+        # Nothing but the file is left next to it.
+        self.assertThat(os.listdir(), Equals(["file"]))
+        self.server.requested_ranges.clear()
+
+        indicators.download_ranges(self.source, "file", segments=1)
+
+        self.assert_downloaded()
+        # The last response was cut short after 1250 bytes, of which the
+        # chunks that were read whole were kept.
+        self.assertThat(self.server.requested_ranges, Equals([(0, 0), (8500, 9999)]))
+
+    def test_download_with_weak_etag(self):
+        self.server.etag = 'W/"weak"'
+
+        indicators.download_ranges(self.source, "file", segments=4)
+
+        self.assert_downloaded()
+        self.assertThat(
+            sorted(self.server.requested_ranges),
+            Equals([(0, 0), (0, 2499), (2500, 4999), (5000, 7499), (7500, 9999)]),
+        )
+
+    def test_digests_are_calculated_while_downloading(self):
+        indicators.download_ranges(self.source, "file", algorithms=["md5", "sha512"])
+
+        with patch("snapcraft.file_utils._calculate_hashes") as calculate_mock:
+            digests = file_utils.calculate_digests("file", algorithms=["md5", "sha512"])
+        calculate_mock.assert_not_called()
+        self.assertThat(
+            digests,
+            Equals(
+                {
+                    "md5": hashlib.md5(self.contents).hexdigest(),
+                    "sha512": hashlib.sha512(self.contents).hexdigest(),
+                }
+            ),
+        )
+
+    def test_download_is_only_hashed_with_the_algorithms_asked_for(self):
+        with patch.object(indicators.hashlib, "sha3_384") as sha3_384_mock:
+            indicators.download_ranges(self.source, "file", algorithms=["md5"])
+
+        sha3_384_mock.assert_not_called()
+        with patch("snapcraft.file_utils._calculate_hashes") as calculate_mock:
+            file_utils.calculate_digests("file", algorithms=["md5"])
+        calculate_mock.assert_not_called()
+
+    def test_failed_segment_cancels_the_others(self):
+        never_set = threading.Event()
+
+        class SlowResponse:
+            status_code = 206
+
+            def __init__(self, length):
+                self._length = length
+
+            def raise_for_status(self):
+                pass
+
+            def iter_content(self, chunk_size):
+                for _ in range(self._length):
+                    never_set.wait(0.01)
+                    yield b"x"
+
+            def close(self):
+                pass
+
+        def get(url, *, headers=None, stream=False):
+            start, end = headers["Range"][len("bytes=") :].split("-")
+            if end == "0":
+                return requests.get(url, headers=headers, stream=stream)
+            elif start == "0":
+                raise requests.exceptions.HTTPError("error")
+            return SlowResponse(int(end) - int(start) + 1)
+
+        self.assertRaises(
+            requests.exceptions.HTTPError,
+            indicators.download_ranges,
+            self.source,
+            "file",
+            get=get,
+            segments=4,
+        )
+
+        # The other segments were not downloaded to the end.
+        with open(indicators._get_state_path("file")) as state_file:
+            segments = json.load(state_file)["segments"]
+        self.assertThat(len(segments), Equals(4))
+        for start, end, received in segments[1:]:
+            self.assertThat(received < end - start, Equals(True))
@@ -153,6 +153,26 @@ class ManglingPythonShebangTestCase(unit.TestCase):
             ),
         )
 
+    def test_only_given_files(self):
+        file_path1 = _create_file("file1", "#!/usr/bin/python3")
+        file_path2 = _create_file("file2", "#!/usr/bin/python3 -E")
+        file_path3 = _create_file("file3", "#!/usr/bin/python3")
+        mangling.rewrite_python_shebangs(
+            os.path.dirname(file_path1), files={"file1", "file2", "missing"}
+        )
+        self.assertThat(file_path1, FileContains("#!/usr/bin/env python3"))
+        self.assertThat(
+            file_path2,
+            FileContains(
+                textwrap.dedent(
+                    """\
+                #!/bin/sh
+                ''''exec python3 -E -- "$0" "$@" # '''"""
+                )
+            ),
+        )
+        self.assertThat(file_path3, FileContains("#!/usr/bin/python3"))
+
 
 class TestClearExecstack(unit.TestCase):
     def setUp(self):
@@ -0,0 +1,472 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import lzma
+import os
+import random
+import stat
+import struct
+import subprocess
+import zlib
+from textwrap import dedent
+from typing import Callable, Dict  # noqa: F401
+from unittest import mock
+
+from testtools.matchers import Equals, FileExists, IsInstance, Not
+
+import tests
+from snapcraft.internal import errors, squashfs
+from tests import unit
+
+
+def _get_snap_path(name):
+    return os.path.join(os.path.dirname(tests.__file__), "data", name)
+
+
+_SNAP_YAML = dedent(
+    """\
+    architectures:
+    - amd64
+    description: Description of the most simple snap
+    name: basic
+    summary: Summary of the most simple snap
+    version: 0.1
+    """
+).encode()
+
+_GZIP = 1
+_XZ = 4
+_COMPRESSORS = {
+    _GZIP: zlib.compress,
+    _XZ: lzma.compress,
+}  # type: Dict[int, Callable[[bytes], bytes]]
+
+
+class _ImageWriter:
+    """Write squashfs 4.0 images of trees of files.
+
+    A tree maps names to the contents of regular files (bytes) or to other
+    trees for directories. Every file that is not a multiple of block_size
+    has its tail packed in the single fragment block of the image unless
+    fragments is False. Extended inodes are used for everything if extended
+    is True. Blocks that do not shrink when compressed are stored as is.
+    """
+
+    def __init__(
+        self, *, compressor=_XZ, block_size=4096, fragments=True, extended=False
+    ):
+        self._compressor = compressor
+        self._block_size = block_size
+        self._fragments = fragments
+        self._extended = extended
+
+    def write(self, path, tree):
+        self._image = bytearray(96)
+        self._inodes = bytearray()
+        self._directories = bytearray()
+        self._fragment = bytearray()
+        self._inode_count = 0
+
+        root_inode, _ = self._write_directory(tree)
+        fragment_entries = bytearray()
+        if self._fragment:
+            fragment_start = len(self._image)
+            stored, size = self._compress(self._fragment, 1 << 24)
+            self._image.extend(stored)
+            fragment_entries.extend(struct.pack("<QII", fragment_start, size, 0))
+        inode_table = self._write_metadata(self._inodes)
+        directory_table = self._write_metadata(self._directories)
+        fragment_table = len(self._image)
+        if fragment_entries:
+            fragment_entries_position = self._write_metadata(fragment_entries)
+            fragment_table = len(self._image)
+            self._image.extend(struct.pack("<Q", fragment_entries_position))
+
+        struct.pack_into(
+            "<IIIIIHHHHHHQQQQQQQQ",
+            self._image,
+            0,
+            0x73717368,
+            self._inode_count,
+            0,
+            self._block_size,
+            1 if fragment_entries else 0,
+            self._compressor,
+            self._block_size.bit_length() - 1,
+            0,
+            1,
+            4,
+            0,
+            root_inode,
+            len(self._image),
+            len(self._image),
+            0xFFFFFFFFFFFFFFFF,
+            inode_table,
+            directory_table,
+            fragment_table,
+            0xFFFFFFFFFFFFFFFF,
+        )
+        with open(path, "wb") as image_file:
+            image_file.write(self._image)
+
+    def _compress(self, block, uncompressed_flag):
+        compressed = _COMPRESSORS[self._compressor](bytes(block))
+        if len(compressed) < len(block):
+            return compressed, len(compressed)
+        return bytes(block), len(block) | uncompressed_flag
+
+    def _write_metadata(self, metadata):
+        position = len(self._image)
+        stored, size = self._compress(metadata, 0x8000)
+        self._image.extend(struct.pack("<H", size))
+        self._image.extend(stored)
+        return position
+
+    def _write_inode(self, inode_type, *parts):
+        # Returns the reference to the inode and its number.
+        self._inode_count += 1
+        if self._extended:
+            inode_type += 7
+        reference = len(self._inodes)
+        self._inodes.extend(
+            struct.pack("<HHHHII", inode_type, 0o755, 0, 0, 0, self._inode_count)
+        )
+        for part in parts:
+            self._inodes.extend(part)
+        return reference, self._inode_count
+
+    def _write_file(self, contents):
+        start = len(self._image)
+        block_count = len(contents) // self._block_size
+        if not self._fragments and len(contents) % self._block_size:
+            block_count += 1
+        sizes = []
+        for index in range(block_count):
+            block = contents[index * self._block_size : (index + 1) * self._block_size]
+            stored, size = self._compress(block, 1 << 24)
+            self._image.extend(stored)
+            sizes.append(size)
+        tail = contents[block_count * self._block_size :]
+        fragment_index, fragment_offset = 0xFFFFFFFF, 0
+        if tail:
+            fragment_index, fragment_offset = 0, len(self._fragment)
+            self._fragment.extend(tail)
+
+        if self._extended:
+            inode = struct.pack(
+                "<QQQIIII",
+                start,
+                len(contents),
+                0,
+                1,
+                fragment_index,
+                fragment_offset,
+                0xFFFFFFFF,
+            )
+        else:
+            inode = struct.pack(
+                "<IIII", start, fragment_index, fragment_offset, len(contents)
+            )
+        return self._write_inode(
+            2, inode, struct.pack("<{}I".format(len(sizes)), *sizes)
+        )
+
+    def _write_directory(self, tree):
+        children = []
+        for name in sorted(tree):
+            if isinstance(tree[name], dict):
+                children.append((name, 1) + self._write_directory(tree[name]))
+            else:
+                children.append((name, 2) + self._write_file(tree[name]))
+
+        # All the inodes are in the first metadata block, a single header
+        # is enough.
+        listing = bytearray()
+        if children:
+            base_number = children[0][3]
+            listing.extend(struct.pack("<III", len(children) - 1, 0, base_number))
+        for name, entry_type, reference, number in children:
+            encoded_name = name.encode()
+            listing.extend(
+                struct.pack(
+                    "<HhHH",
+                    reference,
+                    number - base_number,
+                    entry_type,
+                    len(encoded_name) - 1,
+                )
+            )
+            listing.extend(encoded_name)
+        offset = len(self._directories)
+        self._directories.extend(listing)
+
+        if self._extended:
+            inode = struct.pack(
+                "<IIIIHHI", 2, len(listing) + 3, 0, 0, 0, offset, 0xFFFFFFFF
+            )
+        else:
+            inode = struct.pack("<IIHHI", 0, 2, len(listing) + 3, offset, 0)
+        return self._write_inode(1, inode)
+
+
+def _make_contents(size, seed=0):
+    # Random text, which compresses but not entirely.
+    rng = random.Random(seed)
+    return bytes(rng.choice(b"abcdefghij\n") for _ in range(size))
+
+
+class SquashFSTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.snap = squashfs.SquashFS(_get_snap_path("test-snap-with-icon.snap"))
+        self.addCleanup(self.snap.close)
+
+    def test_read(self):
+        self.assertThat(self.snap.read("meta/snap.yaml"), Equals(_SNAP_YAML))
+
+    def test_read_normalizes_paths(self):
+        self.assertThat(self.snap.read("/meta/gui/../snap.yaml"), Equals(_SNAP_YAML))
+
+    def test_open_is_seekable(self):
+        with self.snap.open("meta/snap.yaml") as yaml_file:
+            self.assertThat(yaml_file.name, Equals("meta/snap.yaml"))
+            self.assertThat(yaml_file.read(14), Equals(b"architectures:"))
+            yaml_file.seek(0)
+            self.assertThat(yaml_file.read(), Equals(_SNAP_YAML))
+            yaml_file.seek(-4, io.SEEK_END)
+            self.assertThat(yaml_file.read(), Equals(b"0.1\n"))
+
+    def test_open_missing_file(self):
+        self.assertRaises(FileNotFoundError, self.snap.open, "meta/missing.yaml")
+        self.assertRaises(
+            NotADirectoryError, self.snap.open, "meta/snap.yaml/missing.yaml"
+        )
+
+    def test_open_directory(self):
+        self.assertRaises(IsADirectoryError, self.snap.open, "meta/gui")
+
+    def test_exists(self):
+        self.assertTrue(self.snap.exists("meta/gui/icon.svg"))
+        self.assertFalse(self.snap.exists("meta/gui/icon.png"))
+        self.assertFalse(self.snap.exists("meta/snap.yaml/icon.png"))
+
+    def test_listdir(self):
+        self.assertThat(self.snap.listdir(), Equals(["meta"]))
+        self.assertThat(self.snap.listdir("meta"), Equals(["gui", "snap.yaml"]))
+        self.assertRaises(NotADirectoryError, self.snap.listdir, "meta/snap.yaml")
+
+    def test_walk(self):
+        entries = list(self.snap.walk())
+
+        self.assertThat(
+            [e.path for e in entries],
+            Equals(["meta", "meta/gui", "meta/gui/icon.svg", "meta/snap.yaml"]),
+        )
+        self.assertTrue(stat.S_ISDIR(entries[0].mode))
+        self.assertTrue(stat.S_ISREG(entries[3].mode))
+        self.assertThat(stat.S_IMODE(entries[3].mode), Equals(0o664))
+        self.assertThat(entries[3].size, Equals(len(_SNAP_YAML)))
+
+    def test_walk_directory(self):
+        self.assertThat(
+            [e.path for e in self.snap.walk("meta/gui")], Equals(["meta/gui/icon.svg"]),
+        )
+
+    def test_nothing_is_extracted(self):
+        self.snap.read("meta/snap.yaml")
+
+        self.assertThat(os.path.join("meta", "snap.yaml"), Not(FileExists()))
+        self.assertThat(
+            os.path.join("squashfs-root", "meta", "snap.yaml"), Not(FileExists())
+        )
+
+
+class GeneratedImageTestCase(unit.TestCase):
+    def test_multi_block_file(self):
+        contents = _make_contents(3 * 4096 + 100)
+        _ImageWriter(fragments=False).write("multi-block.snap", {"file": contents})
+
+        with squashfs.SquashFS("multi-block.snap") as snap:
+            self.assertThat(snap.read("file"), Equals(contents))
+            with snap.open("file") as member_file:
+                member_file.seek(4096 - 10)
+                self.assertThat(
+                    member_file.read(20), Equals(contents[4096 - 10 : 4096 + 10])
+                )
+            (entry,) = snap.walk()
+
+        self.assertThat(entry.size, Equals(len(contents)))
+        self.assertThat(len(entry.block_sizes), Equals(4))
+
+    def test_uncompressed_blocks(self):
+        contents = os.urandom(2 * 4096)
+        _ImageWriter(fragments=False).write("uncompressed.snap", {"file": contents})
+
+        with squashfs.SquashFS("uncompressed.snap") as snap:
+            self.assertThat(snap.read("file"), Equals(contents))
+            (entry,) = snap.walk()
+
+        self.assertThat(entry.block_sizes, Equals((4096 | 1 << 24,) * 2))
+
+    def test_fragment_packed_files(self):
+        tree = {
+            "a": b"contents of a\n",
+            "b": b"contents of b\n",
+            "c": _make_contents(4096 + 50, seed=1),
+            "empty": b"",
+        }
+        _ImageWriter().write("fragments.snap", tree)
+
+        with squashfs.SquashFS("fragments.snap") as snap:
+            for name, contents in tree.items():
+                self.expectThat(snap.read(name), Equals(contents))
+            entries = {e.path: e for e in snap.walk()}
+
+        # Only the first block of c is not in the fragment.
+        self.assertThat(len(entries["a"].block_sizes), Equals(0))
+        self.assertThat(len(entries["c"].block_sizes), Equals(1))
+
+    def test_extended_inodes(self):
+        contents = _make_contents(2 * 4096 + 10)
+        tree = {"dir": {"file": contents, "subdir": {}}, "small": b"small\n"}
+        _ImageWriter(extended=True).write("extended.snap", tree)
+
+        with squashfs.SquashFS("extended.snap") as snap:
+            self.assertThat(snap.listdir(), Equals(["dir", "small"]))
+            self.assertThat(snap.listdir("dir"), Equals(["file", "subdir"]))
+            self.assertThat(snap.listdir("dir/subdir"), Equals([]))
+            self.assertThat(snap.read("dir/file"), Equals(contents))
+            self.assertThat(snap.read("small"), Equals(b"small\n"))
+            entries = list(snap.walk())
+
+        self.assertThat(
+            [e.path for e in entries],
+            Equals(["dir", "dir/file", "dir/subdir", "small"]),
+        )
+        self.assertTrue(stat.S_ISDIR(entries[0].mode))
+        self.assertTrue(stat.S_ISREG(entries[1].mode))
+        self.assertThat(entries[1].size, Equals(len(contents)))
+
+    def test_gzip_image(self):
+        tree = {"meta": {"snap.yaml": _SNAP_YAML}, "file": _make_contents(5000)}
+        _ImageWriter(compressor=_GZIP).write("gzip.snap", tree)
+
+        with squashfs.open_image("gzip.snap") as snap:
+            self.assertThat(snap, IsInstance(squashfs.SquashFS))
+            self.assertThat(snap.read("meta/snap.yaml"), Equals(_SNAP_YAML))
+            self.assertThat(snap.read("file"), Equals(tree["file"]))
+
+
+class InvalidSquashFSTestCase(unit.TestCase):
+    def test_not_a_squashfs_image(self):
+        with open("not-a-snap", "wb") as f:
+            f.write(bytes(4096))
+
+        raised = self.assertRaises(
+            errors.InvalidSquashFSError, squashfs.SquashFS, "not-a-snap"
+        )
+        self.assertThat(
+            str(raised),
+            Equals("Cannot read squashfs image 'not-a-snap': not a squashfs image."),
+        )
+
+    def test_truncated_image(self):
+        self.assertRaises(
+            errors.InvalidSquashFSError,
+            squashfs.SquashFS,
+            _get_snap_path("invalid.snap"),
+        )
+
+    def test_corrupted_data(self):
+        with open(_get_snap_path("test-snap.snap"), "rb") as f:
+            data = bytearray(f.read())
+        # Garble the compressed data, which comes right after the superblock.
+        data[100:140] = bytes(40)
+        with open("corrupted.snap", "wb") as f:
+            f.write(data)
+
+        with squashfs.SquashFS("corrupted.snap") as snap:
+            self.assertRaises(errors.InvalidSquashFSError, snap.read, "meta/snap.yaml")
+
+
+class OpenImageTestCase(unit.TestCase):
+    def setUp(self):
+        super().setUp()
+        with open(_get_snap_path("test-snap-with-icon.snap"), "rb") as f:
+            data = bytearray(f.read())
+        # Mark the image as zstd compressed, which SquashFS cannot read.
+        struct.pack_into("<H", data, 20, 6)
+        with open("zstd.snap", "wb") as f:
+            f.write(data)
+
+        def fake_unsquashfs(command, **kwargs):
+            root, member = command[3], command[5]
+            if member == "meta/snap.yaml":
+                os.makedirs(os.path.join(root, "meta"), exist_ok=True)
+                with open(os.path.join(root, member), "wb") as f:
+                    f.write(_SNAP_YAML)
+            return b""
+
+        patcher = mock.patch("subprocess.check_output", side_effect=fake_unsquashfs)
+        self.check_output_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            "snapcraft.file_utils.get_tool_path", return_value="unsquashfs"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_supported_compression_uses_squashfs(self):
+        with squashfs.open_image(_get_snap_path("test-snap.snap")) as snap:
+            self.assertThat(snap.read("meta/snap.yaml"), Equals(_SNAP_YAML))
+
+        self.check_output_mock.assert_not_called()
+
+    def test_unsupported_compression_falls_back_to_unsquashfs(self):
+        with squashfs.open_image("zstd.snap") as snap:
+            self.assertThat(snap.read("meta/snap.yaml"), Equals(_SNAP_YAML))
+            self.assertFalse(snap.exists("meta/gui/icon.png"))
+            root = os.path.dirname(os.path.dirname(snap.open("meta/snap.yaml").name))
+
+        self.check_output_mock.assert_has_calls(
+            [
+                mock.call(
+                    ["unsquashfs", "-f", "-d", root, "zstd.snap", "meta/snap.yaml"],
+                    stderr=mock.ANY,
+                ),
+                mock.call(
+                    ["unsquashfs", "-f", "-d", root, "zstd.snap", "meta/gui/icon.png"],
+                    stderr=mock.ANY,
+                ),
+            ]
+        )
+        self.assertThat(root, Not(FileExists()))
+
+    def test_unsupported_compression_without_unsquashfs(self):
+        self.check_output_mock.side_effect = subprocess.CalledProcessError(
+            1, ["unsquashfs"], output=b"zstd not supported"
+        )
+
+        with squashfs.open_image("zstd.snap") as snap:
+            raised = self.assertRaises(
+                errors.InvalidSquashFSError, snap.read, "meta/snap.yaml"
+            )
+
+        self.assertThat(
+            str(raised),
+            Equals("Cannot read squashfs image 'zstd.snap': zstd not supported."),
+        )
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare resolving ELF dependencies with ldd and with DependencyResolver.
+
+A fixture tree is made of copies of the ELF files found in the host
+directories given (by default the binaries and libraries of the host), as
+if they had been staged, and the dependencies of every file in it are
+loaded both ways. The time each took and the files they disagree on are
+reported.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import sysconfig
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapcraft.internal import elf  # noqa: E402
+
+_DEFAULT_SOURCES = [
+    "/usr/bin",
+    "/usr/sbin",
+    os.path.join("/usr/lib", sysconfig.get_config_var("MULTIARCH") or ""),
+]
+
+
+def _make_fixture_tree(root, sources, max_files):
+    copied = []
+    for source in sources:
+        for directory, _, names in os.walk(source):
+            for name in sorted(names):
+                path = os.path.join(directory, name)
+                if len(copied) >= max_files:
+                    return copied
+                if os.path.islink(path) or not os.path.isfile(path):
+                    continue
+                if not elf.ElfFile.is_elf(path):
+                    continue
+                relative_path = os.path.relpath(path, "/")
+                destination = os.path.join(root, relative_path)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.copy2(path, destination)
+                copied.append(relative_path)
+    return copied
+
+
+def _load_all(root, file_list, *, resolver):
+    # An empty base keeps libraries missing from root from being looked for
+    # in the whole filesystem.
+    core_base_path = os.path.join(root, "base")
+    os.makedirs(core_base_path, exist_ok=True)
+    dependencies = dict()
+    start = time.monotonic()
+    for elf_file in elf.get_elf_files(root, file_list):
+        if not elf_file.needed:
+            continue
+        dependencies[elf_file.path] = elf_file.load_dependencies(
+            root_path=root, core_base_path=core_base_path, resolver=resolver
+        )
+    return time.monotonic() - start, dependencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "sources", nargs="*", default=_DEFAULT_SOURCES, help="host directories"
+    )
+    parser.add_argument(
+        "--max-files", type=int, default=2000, help="size of the fixture tree"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        file_list = _make_fixture_tree(root, args.sources, args.max_files)
+        print("Fixture tree: {} ELF files".format(len(file_list)))
+
+        ldd_time, ldd_dependencies = _load_all(root, file_list, resolver=None)
+        print("ldd:                {:8.2f}s".format(ldd_time))
+
+        resolver = elf.DependencyResolver(root_path=root)
+        resolver_time, resolver_dependencies = _load_all(
+            root, file_list, resolver=resolver
+        )
+        print("DependencyResolver: {:8.2f}s".format(resolver_time))
+
+        different = sorted(
+            path
+            for path in ldd_dependencies
+            if ldd_dependencies[path] != resolver_dependencies.get(path)
+        )
+        print("Files resolved differently: {}".format(len(different)))
+        for path in different:
+            print("  {}".format(os.path.relpath(path, root)))
+            ldd_only = ldd_dependencies[path] - resolver_dependencies[path]
+            resolver_only = resolver_dependencies[path] - ldd_dependencies[path]
+            print("    ldd only:      {}".format(sorted(ldd_only)))
+            print("    resolver only: {}".format(sorted(resolver_only)))
+
+    return 1 if different else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+
+# Copyright (C) 2019 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Time loading a synthetic project with a large after graph in PartsConfig.
+
+Every part of the project is after a few random parts with lower numbers,
+and the parts are named in a different order than they depend on each
+other. The plugins are not loaded, so what is timed is sorting the parts
+and looking up their direct and transitive dependencies.
+"""
+
+import argparse
+import collections
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapcraft.internal.project_loader._parts_config import PartsConfig  # noqa: E402
+
+
+class _Part:
+    def __init__(self, name):
+        self.name = name
+        self.deps = []
+
+
+def _load_part(parts_config, part_name, plugin_name, properties):
+    part = _Part(part_name)
+    parts_config.all_parts.append(part)
+    return part
+
+
+def _make_parts(count, max_after, seed):
+    rng = random.Random(seed)
+    names = ["part-{}".format(rng.random()) for _ in range(count)]
+    parts = collections.OrderedDict()
+    for i, name in enumerate(names):
+        after = {names[rng.randrange(i)] for _ in range(min(i, max_after))}
+        parts[name] = dict(plugin="nil", after=sorted(after))
+    return parts
+
+
+def _time(function, *args):
+    start = time.monotonic()
+    result = function(*args)
+    return time.monotonic() - start, result
+
+
+def _load(parts):
+    return PartsConfig(
+        parts=dict(parts=parts),
+        project=mock.Mock(),
+        validator=mock.Mock(),
+        build_snaps=set(),
+        build_tools=set(),
+    )
+
+
+def _look_up_all(parts_config, *, recursive):
+    for name in parts_config.part_names:
+        parts_config.get_dependencies(name, recursive=recursive)
+        parts_config.get_reverse_dependencies(name, recursive=recursive)
+        parts_config.get_part(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--parts", type=int, default=500, help="number of parts")
+    parser.add_argument(
+        "--max-after", type=int, default=3, help="parts each part is after"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    parts = _make_parts(args.parts, args.max_after, args.seed)
+    print("Project: {} parts".format(len(parts)))
+
+    with mock.patch.object(PartsConfig, "load_part", _load_part):
+        load_time, parts_config = _time(_load, parts)
+    print("Load and sort:       {:8.3f}s".format(load_time))
+
+    direct_time, _ = _time(lambda: _look_up_all(parts_config, recursive=False))
+    print("Direct lookups:      {:8.3f}s".format(direct_time))
+
+    recursive_time, _ = _time(lambda: _look_up_all(parts_config, recursive=True))
+    print("Transitive lookups:  {:8.3f}s".format(recursive_time))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())